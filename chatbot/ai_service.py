@@ -1,19 +1,13 @@
 from openai import OpenAI
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from legajos.models import Ciudadano
-from .models import ChatbotKnowledge
+from .knowledge_index import indice
+from .signals import CLAVE_ESTADISTICAS
 
 
-class ChatbotAIService:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.model = "gpt-3.5-turbo"
-        self.max_tokens = 500
-    
-    def get_system_context(self):
-        """Obtiene contexto del sistema SEDRONAR"""
-        context = """
+CONTEXTO_SISTEMA = """
         Eres un asistente virtual del Sistema SEDRONAR (Secretaría Nacional de Políticas Integrales sobre Drogas).
         
         FUNCIONALIDADES DEL SISTEMA:
@@ -28,25 +22,39 @@ class ChatbotAIService:
         - Si no sabes algo, sugiere contactar al administrador
         - No proporciones información personal de ciudadanos
         """
+
+
+class ChatbotAIService:
+    def __init__(self):
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.model = "gpt-3.5-turbo"
+        self.max_tokens = 500
+    
+    def get_system_context(self, question=None):
+        """Obtiene contexto del sistema SEDRONAR con el conocimiento relevante para la pregunta"""
+        context = CONTEXTO_SISTEMA
         
-        # Agregar conocimiento personalizado (optimizado)
-        knowledge = ChatbotKnowledge.objects.filter(is_active=True).only('title', 'content')
-        if knowledge.exists():
-            context += "\n\nCONOCIMIENTO ADICIONAL:\n"
-            for item in knowledge:
-                context += f"- {item.title}: {item.content}\n"
+        # Agregar conocimiento personalizado: solo las entradas más relevantes (índice BM25 en memoria)
+        if question:
+            top_k = getattr(settings, 'CHATBOT_CONOCIMIENTO_TOP_K', 5)
+            knowledge = indice().buscar(question, k=top_k)
+            if knowledge:
+                context += "\n\nCONOCIMIENTO ADICIONAL:\n"
+                for _, title, content in knowledge:
+                    context += f"- {title}: {content}\n"
         
         return context
     
     def get_system_stats(self):
-        """Obtiene estadísticas básicas del sistema (optimizado)"""
+        """Obtiene estadísticas básicas del sistema (en cache hasta un alta o baja)"""
         try:
-            from django.db.models import Count
-            # Usar una sola consulta para obtener ambos conteos
-            stats = {
-                'ciudadanos': Ciudadano.objects.count(),
-                'usuarios': User.objects.count()
-            }
+            stats = cache.get(CLAVE_ESTADISTICAS)
+            if stats is None:
+                stats = {
+                    'ciudadanos': Ciudadano.objects.count(),
+                    'usuarios': User.objects.count()
+                }
+                cache.set(CLAVE_ESTADISTICAS, stats, getattr(settings, 'CHATBOT_ESTADISTICAS_TTL', 300))
             return f"Estadísticas actuales: {stats['ciudadanos']} ciudadanos registrados, {stats['usuarios']} usuarios del sistema."
         except Exception as e:
             return f"Error obteniendo estadísticas: {str(e)}"
@@ -54,7 +62,7 @@ class ChatbotAIService:
     def generate_response(self, message, conversation_history=None):
         """Genera respuesta usando OpenAI"""
         try:
-            system_prompt = self.get_system_context()
+            system_prompt = self.get_system_context(message)
             stats = self.get_system_stats()
             
             messages = [
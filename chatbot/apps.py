@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
-    verbose_name = 'Chatbot'
\ No newline at end of file
+    verbose_name = 'Chatbot'
+
+    def ready(self):
+        import chatbot.signals  # noqa: F401, pylint: disable=import-outside-toplevel,unused-import
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Índice de recuperación de la base de conocimiento del chatbot
+Sistema SEDRONAR - Solo las entradas relevantes en el prompt
+
+BM25 en memoria sobre título + contenido de las ChatbotKnowledge activas. Los
+textos se pliegan (minúsculas, sin acentos), se descartan palabras vacías y se
+reducen plurales simples. Los pesos BM25 de cada término por entrada se
+calculan al construir el índice, así una consulta solo suma los de sus términos.
+
+El índice se construye una vez por proceso y se reconstruye cuando cambia la
+versión de ChatbotKnowledge (core.etag_versionado; chatbot.signals la incrementa
+en cada alta, edición o borrado, también al cargar fixtures).
+"""
+
+import heapq
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from core.etag_versionado import versiones
+from legajos.services_busqueda import tokenizar
+from .models import ChatbotKnowledge
+
+logger = logging.getLogger("django")
+
+K1 = 1.5
+B = 0.75
+
+# Las palabras del título cuentan como si aparecieran esta cantidad de veces
+PESO_TITULO = 2
+
+PALABRAS_VACIAS = frozenset("""
+    a al algo como con cual cuando de del donde el ella ellos en era es esa ese eso esta este esto
+    fue ha hay la las le les lo los mas me mi mis muy no nos o para pero por que quien se ser si
+    sin sobre son su sus tambien te tiene tu un una uno unos y ya yo
+""".split())
+
+
+def raiz(token):
+    """Reducción mínima de plurales: acciones -> accion, legajos -> legajo"""
+    if token.endswith('iones'):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s'):
+        return token[:-1]
+    return token
+
+
+def terminos(texto):
+    return [raiz(token) for token in tokenizar(texto) if token not in PALABRAS_VACIAS]
+
+
+class KnowledgeIndex:
+    """BM25 sobre entradas (id, título, contenido)"""
+
+    def __init__(self, entradas):
+        self.entradas = []
+        frecuencias = []
+        for pk, title, content in entradas:
+            conteo = Counter(terminos(title) * PESO_TITULO + terminos(content))
+            self.entradas.append((pk, title, content))
+            frecuencias.append(conteo)
+
+        total = len(self.entradas)
+        largos = [sum(conteo.values()) for conteo in frecuencias]
+        promedio = (sum(largos) / total) if total else 0
+        documentos_por_termino = Counter(termino for conteo in frecuencias for termino in conteo)
+
+        self.postings = defaultdict(list)
+        for doc, conteo in enumerate(frecuencias):
+            norma = K1 * (1 - B + B * largos[doc] / promedio) if promedio else K1
+            for termino, tf in conteo.items():
+                df = documentos_por_termino[termino]
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                self.postings[termino].append((doc, idf * tf * (K1 + 1) / (tf + norma)))
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def buscar(self, consulta, k=5):
+        """Las ``k`` entradas más relevantes como (id, título, contenido), de mayor a menor puntaje"""
+        puntajes = defaultdict(float)
+        for termino in set(terminos(consulta)):
+            for doc, peso in self.postings.get(termino, ()):
+                puntajes[doc] += peso
+        mejores = heapq.nlargest(k, puntajes.items(), key=itemgetter(1))
+        return [self.entradas[doc] for doc, _ in mejores]
+
+
+_cargado = {'indice': None, 'version': None}
+_carga_lock = threading.Lock()
+
+
+def indice():
+    """Índice de las entradas activas; se reconstruye si la base de conocimiento cambió"""
+    version = versiones([ChatbotKnowledge])[0]
+    if _cargado['indice'] is not None and _cargado['version'] == version:
+        return _cargado['indice']
+    with _carga_lock:
+        if _cargado['indice'] is None or _cargado['version'] != version:
+            entradas = ChatbotKnowledge.objects.filter(is_active=True).values_list('id', 'title', 'content')
+            _cargado['indice'] = KnowledgeIndex(entradas.iterator())
+            _cargado['version'] = version
+            logger.info(f"Índice de conocimiento del chatbot construido: {len(_cargado['indice'])} entradas")
+        return _cargado['indice']
@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.ai_service import CONTEXTO_SISTEMA
+from chatbot.knowledge_index import KnowledgeIndex
+
+VOCABULARIO = (
+    'ciudadano legajo atención derivación seguimiento turno dispositivo programa evaluación consentimiento '
+    'alerta contacto familiar vínculo reporte usuario permiso grupo dashboard estadística conversación operador '
+    'cierre admisión tratamiento consumo prevención asistencia provincia municipio institución documento '
+    'historial entrevista profesional equipo agenda formulario exportación importación búsqueda filtro'
+).split()
+RELLENO = 'el la de para con por en los las una un que se del al como sobre cada'.split()
+
+
+def _texto(palabras):
+    return ' '.join(
+        random.choice(VOCABULARIO) if random.random() < 0.4 else random.choice(RELLENO + [f'x{random.randint(0, 20000)}'])
+        for _ in range(palabras)
+    )
+
+
+def _tokens(texto):
+    try:
+        import tiktoken
+    except ImportError:
+        return len(texto) / 4, '≈'
+    return len(tiktoken.get_encoding('cl100k_base').encode(texto)), ''
+
+
+class Command(BaseCommand):
+    help = 'Mide construcción y consulta del índice de conocimiento y el tamaño del prompt (sin base de datos ni OpenAI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entradas', type=int, default=10000, help='Entradas sintéticas de conocimiento')
+        parser.add_argument('--consultas', type=int, default=500, help='Preguntas a medir')
+        parser.add_argument('--top-k', type=int, default=5, help='Entradas por pregunta')
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        entradas = [
+            (pk, _texto(random.randint(3, 8)), _texto(random.randint(30, 80)))
+            for pk in range(options['entradas'])
+        ]
+        preguntas = [f'¿Cómo hago {_texto(random.randint(4, 10))}?' for _ in range(options['consultas'])]
+
+        inicio = time.perf_counter()
+        indice = KnowledgeIndex(entradas)
+        construccion = (time.perf_counter() - inicio) * 1000
+
+        tiempos = []
+        for pregunta in preguntas:
+            inicio = time.perf_counter()
+            indice.buscar(pregunta, k=options['top_k'])
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        p50 = tiempos[len(tiempos) // 2]
+        p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+
+        completo = CONTEXTO_SISTEMA + ''.join(f'- {title}: {content}\n' for _, title, content in entradas)
+        recuperado = CONTEXTO_SISTEMA + ''.join(
+            f'- {title}: {content}\n' for _, title, content in indice.buscar(preguntas[0], k=options['top_k'])
+        )
+        tokens_completo, aproximado = _tokens(completo)
+        tokens_recuperado, _ = _tokens(recuperado)
+
+        self.stdout.write(f'=== KnowledgeIndex ({len(indice)} entradas, {len(preguntas)} consultas, top {options["top_k"]}) ===')
+        self.stdout.write(f'Construcción del índice: {construccion:.0f} ms')
+        estilo = self.style.SUCCESS if p95 < 20 else self.style.WARNING
+        self.stdout.write(estilo(f'Consulta: p50 {p50:.2f} ms, p95 {p95:.2f} ms, máx {tiempos[-1]:.2f} ms'))
+        self.stdout.write(
+            f'Tokens del prompt de sistema: todas las entradas {aproximado}{tokens_completo:,.0f}, '
+            f'top {options["top_k"]} {aproximado}{tokens_recuperado:,.0f}'
+            + (' (tiktoken no instalado: 4 caracteres por token)' if aproximado else '')
+        )
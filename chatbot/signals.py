@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.etag_versionado import invalidar_version
+from legajos.models import Ciudadano
+from .models import ChatbotKnowledge
+
+CLAVE_ESTADISTICAS = "chatbot_estadisticas"
+
+
+@receiver([post_save, post_delete], sender=ChatbotKnowledge)
+def invalidar_indice_conocimiento(sender, **kwargs):
+    """Nueva versión de la base de conocimiento (también con loaddata, que guarda en modo raw)"""
+    invalidar_version(ChatbotKnowledge)
+
+
+@receiver([post_save, post_delete], sender=Ciudadano)
+@receiver([post_save, post_delete], sender=User)
+def invalidar_estadisticas(sender, created=True, **kwargs):
+    """Los conteos del prompt solo cambian con altas y bajas"""
+    if created:
+        transaction.on_commit(lambda: cache.delete(CLAVE_ESTADISTICAS))
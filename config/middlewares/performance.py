@@ -1,5 +1,5 @@
+import hashlib
 import time
-from django.core.cache import cache
 from django.http import HttpResponse
 
 class PerformanceMiddleware:
@@ -10,10 +10,9 @@ class PerformanceMiddleware:
     
     def __call__(self, request):
         start_time = time.time()
-        # Nota: No devolvemos 304 antes de procesar la vista.
-        # Para contenido dinámico, el ETag debe calcularse sobre la
-        # respuesta real. Devolver 304 en esta etapa puede congelar
-        # páginas con datos obsoletos.
+        # Nota: acá no se devuelve 304 antes de procesar la vista. Las vistas que
+        # declaran sus modelos (core.etag_versionado) ya lo resuelven antes de
+        # ejecutarse; para el resto el ETag se calcula sobre la respuesta real.
 
         response = self.get_response(request)
 
@@ -31,8 +30,16 @@ class PerformanceMiddleware:
             # ETag correcto para páginas dinámicas
             # Calculamos el ETag sobre el contenido ya generado y, si coincide
             # con If-None-Match, devolvemos 304 Not Modified en ese momento.
-            if request.method == 'GET' and not request.path.startswith(('/static/', '/media/')):
-                current_etag = f'"{hash(response.content)}"'
+            # (las respuestas en streaming no tienen `content`: no se les calcula ETag)
+            # hash() de Python es aleatorio por proceso: el digest es estable entre workers.
+            if (
+                request.method == 'GET'
+                and not response.streaming
+                and not response.has_header('ETag')
+                and not request.path.startswith(('/static/', '/media/'))
+            ):
+                digest = hashlib.md5(response.content, usedforsecurity=False).hexdigest()
+                current_etag = f'"{digest}"'
                 response['ETag'] = current_etag
 
                 # Para vistas autenticadas, indicar que la respuesta varía por cookie
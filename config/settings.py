@@ -95,18 +95,19 @@ MIDDLEWARE = [
     "core.middleware_concurrency.ConcurrencyLimitMiddleware",  # Limitar antes de medir
     "silk.middleware.SilkyMiddleware",  # Performance profiling
     "django.middleware.gzip.GZipMiddleware",
-    "core.middleware_concurrency.RequestMetricsMiddleware",    # Métricas en tiempo real
-    "core.monitoring.MonitoringMiddleware",  # Sistema de monitoreo avanzado
+    "core.metricas_requests.MetricasRequestMiddleware",  # Histogramas de latencia por vista
     "config.middlewares.performance.PerformanceMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.etag_versionado.EtagVersionadoMiddleware",  # 304 antes de la vista (necesita request.user)
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django.contrib.admindocs.middleware.XViewMiddleware",
     "config.middlewares.xss_protection.XSSProtectionMiddleware",
     "config.middlewares.threadlocals.ThreadLocalMiddleware",
+    "core.middleware_notificaciones.NotificacionesMiddleware",  # WebSocket agrupado por request
     # Nuevos middleware de auditoría
     "core.middleware_auditoria.AuditoriaMiddleware",
     "core.middleware_auditoria.AccesoSensibleMiddleware",
@@ -149,6 +150,8 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Archivos privados (exportaciones): fuera de MEDIA_ROOT, que nginx sirve sin autenticación
+EXPORTACIONES_ROOT = Path(os.getenv("EXPORTACIONES_ROOT", BASE_DIR / "exportaciones"))
 
 # Static files optimization
 STATICFILES_FINDERS = [
@@ -205,7 +208,8 @@ DATABASES = {
     }
 }
 
-if "pytest" in sys.argv or os.environ.get("PYTEST_RUNNING") == "1":
+TESTING = "pytest" in sys.argv or os.environ.get("PYTEST_RUNNING") == "1"
+if TESTING:
     DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
 
 # --- Cache ---
@@ -281,6 +285,53 @@ DEFAULT_CACHE_TIMEOUT = 600  # Aumentado a 10 minutos
 DASHBOARD_CACHE_TIMEOUT = 600
 CIUDADANO_CACHE_TIMEOUT = 600
 
+# --- Auditoría ---
+# async: los signals encolan y un flusher escribe con bulk_create; sync: INSERT inmediato
+AUDITORIA_MODO = os.getenv("AUDITORIA_MODO", "sync" if TESTING else "async")
+AUDITORIA_BUFFER_MAX = int(os.getenv("AUDITORIA_BUFFER_MAX", "10000"))
+AUDITORIA_BATCH_SIZE = int(os.getenv("AUDITORIA_BATCH_SIZE", "500"))
+AUDITORIA_FLUSH_INTERVAL = float(os.getenv("AUDITORIA_FLUSH_INTERVAL", "2"))
+AUDITORIA_BACKPRESSURE = os.getenv("AUDITORIA_BACKPRESSURE", "sync")  # sync|block|drop
+AUDITORIA_REINTENTOS = int(os.getenv("AUDITORIA_REINTENTOS", "5"))
+AUDITORIA_ACCESO_AGRUPAR = int(os.getenv("AUDITORIA_ACCESO_AGRUPAR", "60"))  # segundos: vistas repetidas en una fila
+SESIONES_ACTIVIDAD_INTERVALO = int(os.getenv("SESIONES_ACTIVIDAD_INTERVALO", "60"))  # segundos entre escrituras de ultima_actividad
+SESIONES_EN_LINEA = int(os.getenv("SESIONES_EN_LINEA", "300"))  # segundos de inactividad para dejar de contar como en línea
+
+# --- Control de admisión (ConcurrencyLimitMiddleware) ---
+# Límites globales (todos los workers) por clase de ruta; los locales son por worker y clase
+CONCURRENCIA_LIMITE_API = int(os.getenv("CONCURRENCIA_LIMITE_API", "1000"))
+CONCURRENCIA_LIMITE_HTML = int(os.getenv("CONCURRENCIA_LIMITE_HTML", "500"))
+CONCURRENCIA_LIMITE_WS = int(os.getenv("CONCURRENCIA_LIMITE_WS", "2000"))
+CONCURRENCIA_LIMITE_ESPERA = int(os.getenv("CONCURRENCIA_LIMITE_ESPERA", "2000"))  # long-poll (?esperar=)
+CONCURRENCIA_LIMITE_LOCAL = int(os.getenv("CONCURRENCIA_LIMITE_LOCAL", "500"))
+CONCURRENCIA_ESPERA_MS = int(os.getenv("CONCURRENCIA_ESPERA_MS", "250"))  # espera máxima antes del 503
+CONCURRENCIA_COLA_MAX = int(os.getenv("CONCURRENCIA_COLA_MAX", "100"))
+CONCURRENCIA_RECONCILIAR = float(os.getenv("CONCURRENCIA_RECONCILIAR", "10"))  # segundos
+
+# --- Métricas de requests ---
+METRICAS_FLUSH_INTERVAL = float(os.getenv("METRICAS_FLUSH_INTERVAL", "5"))  # segundos entre envíos a Redis
+
+# --- ETags versionados ---
+ETAG_VERSION_APP = os.getenv("APP_VERSION", "")  # cambia los ETags en cada despliegue
+
+# --- Presencia de operadores (asignación automática) ---
+PRESENCIA_TTL = int(os.getenv("PRESENCIA_TTL", "90"))  # segundos sin latido para dejar de asignarle conversaciones
+
+# --- Chat ciudadano ---
+# Espera máxima del long-poll de mensajes (?after_id=&esperar=); 0 lo desactiva
+MENSAJES_LONG_POLL_MAX = float(os.getenv("MENSAJES_LONG_POLL_MAX", "25"))
+# Vigencia del token de los canales push del chat (WebSocket / SSE)
+CHAT_CIUDADANO_TOKEN_HORAS = int(os.getenv("CHAT_CIUDADANO_TOKEN_HORAS", "24"))
+
+# --- Léxico de riesgo (mensajes de ciudadanos) ---
+RIESGO_MODO = os.getenv("RIESGO_MODO", "sync" if TESTING else "async")  # async: hilo fuera del request
+RIESGO_UMBRAL = int(os.getenv("RIESGO_UMBRAL", "5"))  # puntaje desde el que se alerta
+RIESGO_RECARGA = float(os.getenv("RIESGO_RECARGA", "30"))  # segundos entre chequeos de cambios del léxico
+
+# --- Chatbot ---
+CHATBOT_CONOCIMIENTO_TOP_K = int(os.getenv("CHATBOT_CONOCIMIENTO_TOP_K", "5"))  # entradas de conocimiento por pregunta
+CHATBOT_ESTADISTICAS_TTL = int(os.getenv("CHATBOT_ESTADISTICAS_TTL", "300"))  # segundos; también se invalidan con altas y bajas
+
 # --- DRF ---
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -294,11 +345,20 @@ RENAPER_API_USERNAME = os.getenv("RENAPER_API_USERNAME")
 RENAPER_API_PASSWORD = os.getenv("RENAPER_API_PASSWORD")
 RENAPER_API_URL = os.getenv("RENAPER_API_URL")
 RENAPER_TEST_MODE = os.getenv("RENAPER_TEST_MODE", "False") == "True"
+RENAPER_TIMEOUT_SECONDS = int(os.getenv("RENAPER_TIMEOUT_SECONDS", "10"))
+RENAPER_CACHE_TTL = int(os.getenv("RENAPER_CACHE_TTL", "3600"))  # segundos por (dni, sexo)
+RENAPER_CIRCUITO_UMBRAL = int(os.getenv("RENAPER_CIRCUITO_UMBRAL", "5"))  # fallas que abren el circuito
+RENAPER_CIRCUITO_VENTANA = int(os.getenv("RENAPER_CIRCUITO_VENTANA", "60"))  # segundos en que se cuentan las fallas
+RENAPER_CIRCUITO_ESPERA = int(os.getenv("RENAPER_CIRCUITO_ESPERA", "30"))  # segundos sin consultar con el circuito abierto
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY", os.getenv("SUPABASE_KEY", ""))
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 SUPABASE_TIMEOUT_SECONDS = int(os.getenv("SUPABASE_TIMEOUT_SECONDS", "12"))
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "8"))  # consultas en paralelo por proceso
+SUPABASE_CACHE_INSTITUCIONES = int(os.getenv("SUPABASE_CACHE_INSTITUCIONES", "300"))  # segundos
+SUPABASE_CACHE_USUARIOS = int(os.getenv("SUPABASE_CACHE_USUARIOS", "3600"))  # segundos (user_id -> username)
+RELEVAMIENTOS_SYNC_SOLAPAMIENTO = int(os.getenv("RELEVAMIENTOS_SYNC_SOLAPAMIENTO", "120"))  # segundos que se releen antes de la marca
 
 # --- Logging ---
 LOG_DIR = BASE_DIR / "logs"
@@ -9,4 +9,5 @@ urlpatterns = [
     path('alertas/preview/', api_views.alertas_conversaciones_preview, name='alertas_preview'),
     path('alertas/marcar-leidos/<int:conversacion_id>/', api_views.marcar_mensajes_leidos, name='marcar_leidos'),
     path('conversacion/<int:conversacion_id>/', conversacion_detalle, name='conversacion_detalle'),
+    path('presencia/latido/', api_views.latido_presencia, name='latido_presencia'),
 ]
@@ -95,4 +95,16 @@ def marcar_mensajes_leidos(request, conversacion_id):
         
         return JsonResponse({'success': True})
     except Conversacion.DoesNotExist:
-        return JsonResponse({'error': 'Conversación no encontrada'}, status=404)
\ No newline at end of file
+        return JsonResponse({'error': 'Conversación no encontrada'}, status=404)
+
+@login_required
+@api_view(['POST'])
+def latido_presencia(request):
+    """Latido del operador cuando el WebSocket de conversaciones no está conectado"""
+    if not (request.user.groups.filter(name__in=['Conversaciones', 'OperadorCharla']).exists()
+            or request.user.is_superuser):
+        return JsonResponse({'success': False}, status=403)
+    
+    from .presencia import PresenciaOperadores
+    PresenciaOperadores.latido(request.user.id)
+    return JsonResponse({'success': True})
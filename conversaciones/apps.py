@@ -10,4 +10,7 @@ class ConversacionesConfig(AppConfig):
     
     def ready(self):
         import conversaciones.signals_alertas
+        import conversaciones.signals_asignacion
+        import conversaciones.signals_contadores
+        import conversaciones.signals_mensajes
     verbose_name = 'Conversaciones'
\ No newline at end of file
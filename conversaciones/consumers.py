@@ -1,17 +1,33 @@
 import json
+import logging
+from datetime import timedelta
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
+from django.db import transaction
+from core.notificaciones_ws import LoteNotificacionesMixin
+from .mensajes import grupo_chat, token_valido
 from .models import Conversacion, Mensaje
+from .presencia import PresenciaOperadores
 
+logger = logging.getLogger("django")
 
-class ConversacionConsumer(AsyncWebsocketConsumer):
+
+class ConversacionConsumer(LoteNotificacionesMixin, AsyncWebsocketConsumer):
+    """
+    Chat del operador. El permiso, la asignación de la conversación y el nombre del
+    usuario se leen una vez al conectar y viven lo que dura el socket; las
+    reasignaciones llegan como 'conversacion.actualizada' al grupo.
+    """
+    
     async def connect(self):
         self.conversacion_id = self.scope['url_route']['kwargs']['conversacion_id']
         self.room_group_name = f'conversacion_{self.conversacion_id}'
         
-        # Verificar permisos
-        if not await self.tiene_permiso():
+        # Verificar permisos y cargar el estado de la conversación (un solo paso por el pool)
+        self.estado = await self.cargar_estado()
+        if self.estado is None:
             await self.close()
             return
         
@@ -22,19 +38,29 @@ class ConversacionConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        await self.latido()
     
     async def disconnect(self, close_code):
         # Salir del grupo
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        if getattr(self, 'estado', None) is not None:
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
     
     async def receive(self, text_data):
         data = json.loads(text_data)
+        if data.get('type') == 'latido':
+            await self.latido()
+            return
         mensaje = data['mensaje']
         
-        # Guardar mensaje en BD
+        # Asignada a otro operador: se rechaza sin consultar la base
+        operador_id = self.estado['operador_id']
+        if operador_id and operador_id != self.scope['user'].id:
+            return
+        
+        # Guardar mensaje (y asignación y alertas) en BD
         mensaje_obj = await self.crear_mensaje(mensaje)
         
         if mensaje_obj:
@@ -48,13 +74,10 @@ class ConversacionConsumer(AsyncWebsocketConsumer):
                         'contenido': mensaje_obj.contenido,
                         'remitente': mensaje_obj.remitente,
                         'fecha': mensaje_obj.fecha_envio.strftime('%H:%M'),
-                        'usuario': self.scope['user'].get_full_name() or self.scope['user'].username
+                        'usuario': self.estado['usuario']
                     }
                 }
             )
-            
-            # Generar alerta por respuesta del operador
-            await self.generar_alerta_respuesta_operador(mensaje_obj)
     
     async def chat_message(self, event):
         # Enviar mensaje al WebSocket
@@ -63,108 +86,114 @@ class ConversacionConsumer(AsyncWebsocketConsumer):
             'mensaje': event['mensaje']
         }))
     
+    async def conversacion_actualizada(self, event):
+        # Asignación o reasignación (signals_asignacion): refrescar el estado del socket
+        self.estado['operador_id'] = event['operador_id']
+    
     @database_sync_to_async
-    def tiene_permiso(self):
+    def latido(self):
+        PresenciaOperadores.latido(self.scope['user'].id)
+    
+    @database_sync_to_async
+    def cargar_estado(self):
+        """Estado del socket, o None si el usuario no puede usar el chat o la conversación no existe"""
         user = self.scope['user']
         if not user.is_authenticated:
-            return False
+            return None
         
         # Verificar si tiene permisos de conversaciones
-        return (user.groups.filter(name__in=['Conversaciones', 'OperadorCharla']).exists() 
-                or user.is_superuser)
+        if not (user.is_superuser
+                or user.groups.filter(name__in=['Conversaciones', 'OperadorCharla']).exists()):
+            return None
+        
+        conversacion = Conversacion.objects.filter(id=self.conversacion_id).first()
+        if conversacion is None:
+            return None
+        ciudadano = getattr(conversacion, 'ciudadano_relacionado', None)
+        return {
+            'operador_id': conversacion.operador_asignado_id,
+            'ciudadano': ciudadano,
+            'usuario': user.get_full_name() or user.username,
+        }
     
     @database_sync_to_async
     def crear_mensaje(self, contenido):
+        """Asignación (si falta), mensaje y alertas en una sola transacción"""
+        user = self.scope['user']
         try:
-            conversacion = Conversacion.objects.get(id=self.conversacion_id)
-            user = self.scope['user']
-            
-            # Verificar que puede responder
-            if conversacion.operador_asignado and conversacion.operador_asignado != user:
-                return None
-            
-            # Asignar operador si no tiene
-            if not conversacion.operador_asignado:
-                conversacion.operador_asignado = user
-                conversacion.save()
-                # Generar alerta de asignación
-                self.generar_alerta_asignacion(conversacion, user)
-            
-            mensaje = Mensaje.objects.create(
-                conversacion=conversacion,
-                remitente='operador',
-                contenido=contenido
-            )
+            with transaction.atomic():
+                if not self.estado['operador_id']:
+                    conversacion = Conversacion.objects.select_for_update().get(id=self.conversacion_id)
+                    # Verificar que puede responder (otro operador pudo tomarla recién)
+                    if conversacion.operador_asignado_id and conversacion.operador_asignado_id != user.id:
+                        self.estado['operador_id'] = conversacion.operador_asignado_id
+                        return None
+                    conversacion.operador_asignado = user
+                    conversacion.save()
+                    asignada = True
+                else:
+                    asignada = False
+                
+                mensaje = Mensaje.objects.create(
+                    conversacion_id=self.conversacion_id,
+                    remitente='operador',
+                    contenido=contenido
+                )
+                
+                if self.estado['ciudadano']:
+                    self.generar_alertas(mensaje, user if asignada else None)
+            if asignada:
+                self.estado['operador_id'] = user.id
             return mensaje
-        except:
+        except Exception as e:
+            logger.error(f"Error guardando mensaje del operador en conversación {self.conversacion_id}: {e}")
             return None
     
-    @database_sync_to_async
-    def generar_alerta_asignacion(self, conversacion, operador):
-        """Genera alerta cuando se asigna operador a conversación"""
+    def generar_alertas(self, mensaje, operador_asignado=None):
+        """Alertas del ciudadano relacionado; un error no descarta el mensaje (savepoint)"""
         try:
-            from legajos.models import AlertaCiudadano
-            from legajos.services_alertas import AlertasService
-            
-            # Buscar ciudadano relacionado si existe
-            ciudadano = None
-            if hasattr(conversacion, 'ciudadano_relacionado'):
-                ciudadano = conversacion.ciudadano_relacionado
+            with transaction.atomic():
+                if operador_asignado is not None:
+                    self.generar_alerta_asignacion(operador_asignado)
+                self.generar_alerta_respuesta_operador(mensaje)
+        except Exception as e:
+            logger.warning(f"Error generando alertas de la conversación {self.conversacion_id}: {e}")
+    
+    def generar_alerta_asignacion(self, operador):
+        """Genera alerta cuando se asigna operador a conversación"""
+        from legajos.models import AlertaCiudadano
+        from legajos.services_alertas import AlertasService
+        
+        alerta = AlertaCiudadano.objects.create(
+            ciudadano=self.estado['ciudadano'],
+            tipo='OPERADOR_ASIGNADO',
+            prioridad='BAJA',
+            mensaje=f'Operador {operador.get_full_name() or operador.username} asignado a conversación'
+        )
+        AlertasService._enviar_notificacion_alerta(alerta)
+    
+    def generar_alerta_respuesta_operador(self, mensaje):
+        """Genera alerta por respuesta rápida del operador"""
+        from legajos.models import AlertaCiudadano
+        from legajos.services_alertas import AlertasService
+        
+        # Verificar tiempo de respuesta
+        ultimo_mensaje_ciudadano = Mensaje.objects.filter(
+            conversacion_id=self.conversacion_id, remitente='ciudadano'
+        ).order_by('-fecha_envio').only('fecha_envio').first()
+        
+        if ultimo_mensaje_ciudadano:
+            tiempo_respuesta = mensaje.fecha_envio - ultimo_mensaje_ciudadano.fecha_envio
             
-            if ciudadano:
+            # Alerta si respuesta muy rápida (< 1 minuto) - posible respuesta automática
+            if tiempo_respuesta < timedelta(minutes=1):
                 alerta = AlertaCiudadano.objects.create(
-                    ciudadano=ciudadano,
-                    tipo='OPERADOR_ASIGNADO',
+                    ciudadano=self.estado['ciudadano'],
+                    tipo='RESPUESTA_RAPIDA',
                     prioridad='BAJA',
-                    mensaje=f'Operador {operador.get_full_name() or operador.username} asignado a conversación'
+                    mensaje=f'Respuesta muy rápida del operador ({tiempo_respuesta.seconds}s)'
                 )
                 AlertasService._enviar_notificacion_alerta(alerta)
-        except:
-            pass
-    
-    async def generar_alerta_respuesta_operador(self, mensaje):
-        """Genera alerta por respuesta rápida del operador"""
-        try:
-            await self.database_sync_to_async(self._crear_alerta_respuesta)(mensaje)
-        except:
-            pass
-    
-    @database_sync_to_async
-    def _crear_alerta_respuesta(self, mensaje):
-        """Crea alerta de respuesta del operador"""
-        try:
-            from legajos.models import AlertaCiudadano
-            from legajos.services_alertas import AlertasService
-            from django.utils import timezone
-            from datetime import timedelta
-            
-            conversacion = mensaje.conversacion
-            
-            # Verificar si hay ciudadano relacionado
-            ciudadano = None
-            if hasattr(conversacion, 'ciudadano_relacionado'):
-                ciudadano = conversacion.ciudadano_relacionado
-            
-            if ciudadano:
-                # Verificar tiempo de respuesta
-                ultimo_mensaje_ciudadano = conversacion.mensajes.filter(
-                    remitente='ciudadano'
-                ).order_by('-fecha_envio').first()
-                
-                if ultimo_mensaje_ciudadano:
-                    tiempo_respuesta = mensaje.fecha_envio - ultimo_mensaje_ciudadano.fecha_envio
-                    
-                    # Alerta si respuesta muy rápida (< 1 minuto) - posible respuesta automática
-                    if tiempo_respuesta < timedelta(minutes=1):
-                        alerta = AlertaCiudadano.objects.create(
-                            ciudadano=ciudadano,
-                            tipo='RESPUESTA_RAPIDA',
-                            prioridad='BAJA',
-                            mensaje=f'Respuesta muy rápida del operador ({tiempo_respuesta.seconds}s)'
-                        )
-                        AlertasService._enviar_notificacion_alerta(alerta)
-        except:
-            pass
 
 
 class ConversacionesListConsumer(AsyncWebsocketConsumer):
@@ -224,7 +253,7 @@ class ConversacionesListConsumer(AsyncWebsocketConsumer):
                 or user.is_superuser)
 
 
-class AlertasConsumer(AsyncWebsocketConsumer):
+class AlertasConsumer(LoteNotificacionesMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # Verificar permisos
         if not await self.tiene_permiso_alertas():
@@ -279,7 +308,7 @@ class AlertasConsumer(AsyncWebsocketConsumer):
                 or user.is_superuser)
 
 
-class AlertasConversacionesConsumer(AsyncWebsocketConsumer):
+class AlertasConversacionesConsumer(LoteNotificacionesMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # Verificar permisos para conversaciones
         if not await self.tiene_permiso_conversaciones():
@@ -296,6 +325,7 @@ class AlertasConversacionesConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        await self.latido()
     
     async def disconnect(self, close_code):
         # Salir del grupo
@@ -304,6 +334,15 @@ class AlertasConversacionesConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
     
+    async def receive(self, text_data):
+        # El panel envía un latido periódico mientras el operador tiene la página abierta
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            return
+        if data.get('type') == 'latido':
+            await self.latido()
+    
     async def nueva_alerta_conversacion(self, event):
         # Notificar nueva alerta de conversación
         await self.send(text_data=json.dumps({
@@ -311,6 +350,10 @@ class AlertasConversacionesConsumer(AsyncWebsocketConsumer):
             'alerta': event['alerta']
         }))
     
+    @database_sync_to_async
+    def latido(self):
+        PresenciaOperadores.latido(self.scope['user'].id)
+    
     @database_sync_to_async
     def tiene_permiso_conversaciones(self):
         user = self.scope['user']
@@ -318,4 +361,40 @@ class AlertasConversacionesConsumer(AsyncWebsocketConsumer):
             return False
         
         return (user.groups.filter(name__in=['Conversaciones', 'OperadorCharla']).exists() 
-                or user.is_superuser)
\ No newline at end of file
+                or user.is_superuser)
+
+
+class ChatCiudadanoConsumer(LoteNotificacionesMixin, AsyncWebsocketConsumer):
+    """Mensajes nuevos para el chat público: anónimo, autorizado por el token de iniciar_conversacion"""
+    
+    async def connect(self):
+        self.conversacion_id = self.scope['url_route']['kwargs']['conversacion_id']
+        parametros = parse_qs(self.scope.get('query_string', b'').decode())
+        if not token_valido(parametros.get('token', [''])[0], self.conversacion_id):
+            await self.close()
+            return
+        
+        self.room_group_name = grupo_chat(self.conversacion_id)
+        await self.channel_layer.group_add(
+            self.room_group_name,
+            self.channel_name
+        )
+        
+        await self.accept()
+    
+    async def disconnect(self, close_code):
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
+    
+    async def receive(self, text_data):
+        # Solo lectura: el ciudadano envía por HTTP (enviar_mensaje_ciudadano)
+        pass
+    
+    async def mensaje_nuevo(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'mensaje',
+            'mensaje': event['mensaje']
+        }))
@@ -0,0 +1,80 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from conversaciones.models import TerminoRiesgo
+from conversaciones.riesgo import DetectorRiesgo, plegar
+
+FRASES = [
+    'Hola, necesito ayuda con un familiar que consume hace años',
+    'No sé a quién más recurrir, estoy muy angustiada',
+    '¿Dónde queda el centro de atención más cercano a mi casa?',
+    'Mi hijo volvió a consumir y tengo miedo de que le pase algo',
+    'Quería saber si atienden los sábados a la tarde',
+    'Ya no aguanto más esta situación, pienso en morirme',
+    'Me dijeron que llame a este número para pedir un turno',
+    'Hace tres días que no duermo y me siento muy mal',
+]
+
+
+def _palabra(largo):
+    return ''.join(random.choices(string.ascii_lowercase, k=largo))
+
+
+class Command(BaseCommand):
+    help = 'Mide el throughput (mensajes/s) del detector de riesgo con un léxico sintético o el de la base'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terminos', type=int, default=5000, help='Tamaño del léxico sintético')
+        parser.add_argument('--mensajes', type=int, default=20000, help='Mensajes a analizar')
+        parser.add_argument('--lexico-base', action='store_true',
+                            help='Usar los términos activos de TerminoRiesgo en lugar del léxico sintético')
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        if options['lexico_base']:
+            terminos = list(TerminoRiesgo.objects.filter(activo=True).values_list('termino', 'peso', 'variantes'))
+        else:
+            # Palabras y frases sintéticas más las raíces habituales, mitad con variantes
+            terminos = [('suicid', 10, True), ('morir', 6, True), ('matar', 8, True)]
+            while len(terminos) < options['terminos']:
+                palabras = [_palabra(random.randint(4, 10)) for _ in range(random.choice((1, 1, 1, 2)))]
+                terminos.append((' '.join(palabras), random.randint(1, 10), random.random() < 0.5))
+
+        mensajes = [random.choice(FRASES) for _ in range(options['mensajes'])]
+        bytes_totales = sum(len(mensaje.encode()) for mensaje in mensajes)
+
+        inicio = time.perf_counter()
+        detector = DetectorRiesgo(terminos)
+        compilacion = (time.perf_counter() - inicio) * 1000
+
+        self.stdout.write(
+            f'=== DetectorRiesgo ({len(detector)} términos, {len(mensajes)} mensajes, '
+            f'compilado en {compilacion:.0f} ms) ==='
+        )
+        self.stdout.write(f'{"Método":<28}{"mensajes/s":>14}{"MB/s":>10}{"con riesgo":>12}')
+
+        inicio = time.perf_counter()
+        con_riesgo = sum(bool(detector.analizar(mensaje)[0]) for mensaje in mensajes)
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{"regex (trie)":<28}{len(mensajes) / duracion:>14,.0f}'
+            f'{bytes_totales / duracion / 1e6:>10.2f}{con_riesgo:>12}'
+        ))
+
+        # Referencia: una búsqueda de subcadena por término (el método anterior), sobre una muestra
+        muestra = mensajes[:max(1, min(len(mensajes), 200000 // max(1, len(terminos))))]
+        claves = [plegar(termino) for termino, _, _ in terminos]
+        inicio = time.perf_counter()
+        con_riesgo = 0
+        for mensaje in muestra:
+            texto = plegar(mensaje)
+            con_riesgo += any(clave in texto for clave in claves)
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.WARNING(
+            f'{"subcadena por término":<28}{len(muestra) / duracion:>14,.0f}'
+            f'{sum(len(m.encode()) for m in muestra) / duracion / 1e6:>10.2f}{con_riesgo:>12}'
+            f'  (muestra de {len(muestra)})'
+        ))
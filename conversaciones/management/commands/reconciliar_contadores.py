@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from conversaciones.services import AsignadorAutomatico, MetricasService
+
+
+class Command(BaseCommand):
+    help = (
+        'Corrige la deriva de ColaAsignacion.conversaciones_actuales y MetricasOperador '
+        '(escrituras que no disparan signals) con una consulta agrupada. Pensado para cron.'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        colas = AsignadorAutomatico.actualizar_todas_las_colas()
+        metricas = MetricasService.actualizar_todas_las_metricas()
+        duracion = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores reconciliados en {duracion:.2f}s: '
+            f'{colas} colas y {metricas} métricas de operador corregidas'
+        ))
@@ -0,0 +1,263 @@
+"""
+Lectura incremental de mensajes de una conversación
+Sistema SEDRONAR - Polling del chat sin releer la conversación completa
+
+El cursor es el id del mensaje: ``conversacion_id = X AND id > cursor ORDER BY id``
+recorre solo los mensajes nuevos sobre el índice de la FK (en InnoDB las
+entradas de un índice secundario están ordenadas por la PK, así que equivale a
+un índice (conversacion, id); los ids crecen en el mismo orden que fecha_envio).
+
+Cada mensaje nuevo (post_save de Mensaje, al confirmar) se empuja una sola vez
+a los ciudadanos conectados:
+
+- WebSocket ``ws/chat-ciudadano/<id>/?token=`` (ChatCiudadanoConsumer) y SSE bajo
+  ASGI: grupo ``chat_ciudadano_<id>`` del channel layer.
+- SSE bajo WSGI (gevent) y long-poll: canal pub/sub de Redis de la conversación.
+
+Los canales push son anónimos; los autoriza el token firmado que entrega
+``iniciar_conversacion`` (válido para esa conversación y por
+``CHAT_CIUDADANO_TOKEN_HORAS``). En los canales que esperan, la suscripción se
+hace antes de consultar la base para no perder un mensaje creado entre ambas.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core import signing
+from django.db import connection, transaction
+
+from core.notificaciones_ws import notificar
+from .models import Mensaje
+
+logger = logging.getLogger("django")
+
+CANAL = "sedronar:conversacion:{}:mensajes"
+
+LIMITE_DEFAULT = 50
+LIMITE_MAXIMO = 200
+
+SALT_TOKEN = "conversaciones.chat_ciudadano"
+
+# SSE: el navegador reconecta solo (con Last-Event-ID) al cerrarse el flujo
+DURACION_SSE = 300
+KEEPALIVE_SSE = 15
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def grupo_chat(conversacion_id):
+    return f"chat_ciudadano_{conversacion_id}"
+
+
+def emitir_token(conversacion_id):
+    """Token firmado que autoriza los canales push del chat de una conversación"""
+    return signing.TimestampSigner(salt=SALT_TOKEN).sign(str(conversacion_id))
+
+
+def token_valido(token, conversacion_id):
+    horas = getattr(settings, 'CHAT_CIUDADANO_TOKEN_HORAS', 24)
+    try:
+        valor = signing.TimestampSigner(salt=SALT_TOKEN).unsign(token or '', max_age=horas * 3600)
+    except signing.BadSignature:
+        return False
+    return valor == str(conversacion_id)
+
+
+def _evento_sse(mensaje):
+    return f"id: {mensaje['id']}\nevent: mensaje\ndata: {json.dumps(mensaje)}\n\n"
+
+
+def serializar(mensaje):
+    return {
+        'id': mensaje.id,
+        'remitente': mensaje.remitente,
+        'contenido': mensaje.contenido,
+        'fecha': mensaje.fecha_envio.strftime('%H:%M'),
+    }
+
+
+class MensajesIncrementales:
+    """Páginas de mensajes por cursor y espera de mensajes nuevos"""
+
+    @staticmethod
+    def pagina(conversacion_id, after_id=None, before_id=None, limite=LIMITE_DEFAULT):
+        """
+        Mensajes en orden cronológico.
+
+        - ``after_id``: los siguientes al cursor (polling).
+        - ``before_id``: los ``limite`` anteriores al cursor (historial hacia atrás).
+        - Sin cursor: los últimos ``limite`` mensajes.
+
+        Retorna (mensajes, hay_mas): hay_mas indica que quedan mensajes más allá
+        de la página en la dirección pedida.
+        """
+        limite = max(1, min(limite, LIMITE_MAXIMO))
+        queryset = Mensaje.objects.filter(conversacion_id=conversacion_id).only(
+            'id', 'remitente', 'contenido', 'fecha_envio'
+        )
+        if after_id is not None:
+            mensajes = list(queryset.filter(id__gt=after_id).order_by('id')[:limite + 1])
+            return mensajes[:limite], len(mensajes) > limite
+
+        if before_id is not None:
+            queryset = queryset.filter(id__lt=before_id)
+        mensajes = list(queryset.order_by('-id')[:limite + 1])
+        hay_mas = len(mensajes) > limite
+        return mensajes[:limite][::-1], hay_mas
+
+    @staticmethod
+    def esperar(conversacion_id, after_id, limite=LIMITE_DEFAULT, segundos=0):
+        """
+        Como ``pagina(after_id=...)`` pero, si no hay mensajes nuevos, espera hasta
+        ``segundos`` a que se publique uno. Retorna (mensajes, hay_mas, esperado):
+        ``esperado`` es False si no se pudo esperar (sin Redis o long-poll desactivado).
+        """
+        segundos = min(segundos, getattr(settings, 'MENSAJES_LONG_POLL_MAX', 25))
+        if segundos <= 0:
+            return (*MensajesIncrementales.pagina(conversacion_id, after_id=after_id, limite=limite), False)
+
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CANAL.format(conversacion_id))
+        except Exception as e:
+            logger.debug(f"Long-poll de mensajes sin Redis: {e}")
+            return (*MensajesIncrementales.pagina(conversacion_id, after_id=after_id, limite=limite), False)
+
+        try:
+            mensajes, hay_mas = MensajesIncrementales.pagina(conversacion_id, after_id=after_id, limite=limite)
+            if mensajes:
+                return mensajes, hay_mas, True
+            # Durante la espera no se retiene la conexión a MySQL (con gevent habría una
+            # por cada chat esperando); se reabre para la consulta final
+            if not connection.in_atomic_block:
+                connection.close()
+            limite_espera = time.monotonic() + segundos
+            while True:
+                restante = limite_espera - time.monotonic()
+                if restante <= 0:
+                    return [], False, True
+                if pubsub.get_message(timeout=restante) is not None:
+                    break
+            mensajes, hay_mas = MensajesIncrementales.pagina(conversacion_id, after_id=after_id, limite=limite)
+            return mensajes, hay_mas, True
+        except Exception as e:
+            logger.warning(f"Error esperando mensajes de la conversación {conversacion_id}: {e}")
+            return [], False, False
+        finally:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def publicar(mensaje):
+        """Empuja el mensaje nuevo a los canales del ciudadano cuando confirma la transacción"""
+        datos = serializar(mensaje)
+        notificar(
+            grupo_chat(mensaje.conversacion_id),
+            {'type': 'mensaje.nuevo', 'mensaje': datos},
+            clave=f"mensaje:{mensaje.id}",
+        )
+
+        def _publicar():
+            try:
+                _redis().publish(CANAL.format(mensaje.conversacion_id), json.dumps(datos))
+            except Exception as e:
+                logger.debug(f"No se pudo publicar el mensaje {mensaje.id}: {e}")
+        transaction.on_commit(_publicar)
+
+    @staticmethod
+    def flujo_sse(conversacion_id, after_id, asgi=False):
+        """
+        Iterador de eventos SSE desde ``after_id`` (asíncrono bajo ASGI, donde Django
+        no transmite iteradores síncronos) o None si no hay canal push disponible.
+        """
+        if asgi:
+            if get_channel_layer() is None:
+                return None
+            return _eventos_sse_asgi(conversacion_id, after_id)
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CANAL.format(conversacion_id))
+        except Exception as e:
+            logger.debug(f"SSE de mensajes sin Redis: {e}")
+            return None
+        return _eventos_sse_wsgi(pubsub, conversacion_id, after_id)
+
+
+def _eventos_sse_wsgi(pubsub, conversacion_id, after_id):
+    fin = time.monotonic() + DURACION_SSE
+    try:
+        yield "retry: 3000\n\n"
+        hay_mas = True
+        while hay_mas:
+            mensajes, hay_mas = MensajesIncrementales.pagina(
+                conversacion_id, after_id=after_id, limite=LIMITE_MAXIMO
+            )
+            for mensaje in mensajes:
+                after_id = mensaje.id
+                yield _evento_sse(serializar(mensaje))
+        # Lo que sigue llega por pub/sub con el mensaje serializado: sin consultas
+        if not connection.in_atomic_block:
+            connection.close()
+        while True:
+            restante = fin - time.monotonic()
+            if restante <= 0:
+                return
+            aviso = pubsub.get_message(timeout=min(restante, KEEPALIVE_SSE))
+            if aviso is None:
+                yield ": ping\n\n"
+                continue
+            mensaje = json.loads(aviso['data'])
+            if mensaje['id'] > after_id:
+                after_id = mensaje['id']
+                yield _evento_sse(mensaje)
+    finally:
+        try:
+            pubsub.close()
+        except Exception:
+            pass
+
+
+async def _eventos_sse_asgi(conversacion_id, after_id):
+    channel_layer = get_channel_layer()
+    canal = await channel_layer.new_channel()
+    await channel_layer.group_add(grupo_chat(conversacion_id), canal)
+    fin = time.monotonic() + DURACION_SSE
+    try:
+        yield "retry: 3000\n\n"
+        hay_mas = True
+        while hay_mas:
+            mensajes, hay_mas = await database_sync_to_async(MensajesIncrementales.pagina)(
+                conversacion_id, after_id=after_id, limite=LIMITE_MAXIMO
+            )
+            for mensaje in mensajes:
+                after_id = mensaje.id
+                yield _evento_sse(serializar(mensaje))
+        while True:
+            restante = fin - time.monotonic()
+            if restante <= 0:
+                return
+            try:
+                evento = await asyncio.wait_for(
+                    channel_layer.receive(canal), timeout=min(restante, KEEPALIVE_SSE)
+                )
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            eventos = evento['eventos'] if evento.get('type') == 'notificaciones.lote' else [evento]
+            for evento in eventos:
+                mensaje = evento.get('mensaje')
+                if evento.get('type') == 'mensaje.nuevo' and mensaje['id'] > after_id:
+                    after_id = mensaje['id']
+                    yield _evento_sse(mensaje)
+    finally:
+        await channel_layer.group_discard(grupo_chat(conversacion_id), canal)
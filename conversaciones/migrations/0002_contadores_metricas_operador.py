@@ -0,0 +1,68 @@
+# Generated by Django 4.2.20 on 2026-10-17 18:13
+
+from django.db import migrations, models
+
+
+def cargar_acumulados(apps, schema_editor):
+    """Acumulados de las métricas existentes y carga de las colas, en una consulta agrupada"""
+    from django.db.models import Count, Q, Sum
+
+    Conversacion = apps.get_model('conversaciones', 'Conversacion')
+    MetricasOperador = apps.get_model('conversaciones', 'MetricasOperador')
+    ColaAsignacion = apps.get_model('conversaciones', 'ColaAsignacion')
+    estadisticas = {
+        fila['operador_asignado']: fila
+        for fila in Conversacion.objects.filter(operador_asignado__isnull=False)
+        .order_by().values('operador_asignado').annotate(
+            activas=Count('id', filter=Q(estado='activa')),
+            suma_tiempo=Sum('tiempo_respuesta_segundos'),
+            respuestas=Count('tiempo_respuesta_segundos'),
+            suma_satisfaccion=Sum('satisfaccion'),
+            evaluaciones=Count('satisfaccion'),
+        )
+    }
+    metricas = list(MetricasOperador.objects.all())
+    for fila in metricas:
+        stats = estadisticas.get(fila.operador_id, {})
+        fila.segundos_respuesta_total = stats.get('suma_tiempo') or 0
+        fila.respuestas_medidas = stats.get('respuestas') or 0
+        fila.satisfaccion_total = stats.get('suma_satisfaccion') or 0
+        fila.evaluaciones = stats.get('evaluaciones') or 0
+    MetricasOperador.objects.bulk_update(
+        metricas, ['segundos_respuesta_total', 'respuestas_medidas', 'satisfaccion_total', 'evaluaciones']
+    )
+    colas = list(ColaAsignacion.objects.all())
+    for cola in colas:
+        cola.conversaciones_actuales = estadisticas.get(cola.operador_id, {}).get('activas', 0)
+    ColaAsignacion.objects.bulk_update(colas, ['conversaciones_actuales'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricasoperador',
+            name='evaluaciones',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='metricasoperador',
+            name='respuestas_medidas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='metricasoperador',
+            name='satisfaccion_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='metricasoperador',
+            name='segundos_respuesta_total',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(cargar_acumulados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.20 on 2026-10-17 18:23
+
+from django.db import migrations, models
+
+# Las palabras que se buscaban antes en signals_alertas, como raíces con variantes
+TERMINOS_INICIALES = [
+    ('suicid', 10),
+    ('matar', 8),
+    ('morir', 6),
+    ('lastim', 6),
+    ('violen', 5),
+    ('droga', 5),
+]
+
+
+def cargar_terminos(apps, schema_editor):
+    TerminoRiesgo = apps.get_model('conversaciones', 'TerminoRiesgo')
+    TerminoRiesgo.objects.bulk_create(
+        [TerminoRiesgo(termino=termino, peso=peso, variantes=True) for termino, peso in TERMINOS_INICIALES],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversaciones', '0002_contadores_metricas_operador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoRiesgo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=100, unique=True)),
+                ('peso', models.PositiveSmallIntegerField(default=5)),
+                ('variantes', models.BooleanField(default=True, help_text='Coincide también con las palabras que empiezan con el término (suicid: suicidio, suicidarme)')),
+                ('activo', models.BooleanField(db_index=True, default=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('modificado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Término de riesgo',
+                'verbose_name_plural': 'Términos de riesgo',
+                'ordering': ['termino'],
+            },
+        ),
+        migrations.RunPython(cargar_terminos, migrations.RunPython.noop),
+    ]
@@ -183,6 +183,11 @@ class MetricasOperador(models.Model):
     tiempo_respuesta_promedio = models.FloatField(default=0.0)  # en minutos
     satisfaccion_promedio = models.FloatField(default=0.0)
     conversaciones_cerradas = models.IntegerField(default=0)
+    # Acumulados para mantener los promedios con incrementos (ver ContadoresOperador)
+    segundos_respuesta_total = models.BigIntegerField(default=0)
+    respuestas_medidas = models.IntegerField(default=0)
+    satisfaccion_total = models.IntegerField(default=0)
+    evaluaciones = models.IntegerField(default=0)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -197,23 +202,35 @@ class MetricasOperador(models.Model):
     
     def actualizar_metricas(self):
         """Actualiza las métricas del operador usando aggregate (optimizado)"""
-        from django.db.models import Avg, Count, Q
+        from django.db.models import Count, Q, Sum
         
         stats = Conversacion.objects.filter(
             operador_asignado=self.operador
         ).aggregate(
             total=Count('id'),
             cerradas=Count('id', filter=Q(estado='cerrada')),
-            avg_tiempo=Avg('tiempo_respuesta_segundos'),
-            avg_satisfaccion=Avg('satisfaccion')
+            suma_tiempo=Sum('tiempo_respuesta_segundos'),
+            respuestas=Count('tiempo_respuesta_segundos'),
+            suma_satisfaccion=Sum('satisfaccion'),
+            evaluaciones=Count('satisfaccion')
         )
-        
+        self.aplicar_estadisticas(stats)
+        self.save()
+    
+    def aplicar_estadisticas(self, stats):
+        """Asigna contadores y promedios a partir de un aggregate sobre Conversacion"""
         self.conversaciones_atendidas = stats['total'] or 0
         self.conversaciones_cerradas = stats['cerradas'] or 0
-        self.tiempo_respuesta_promedio = (stats['avg_tiempo'] or 0) / 60
-        self.satisfaccion_promedio = stats['avg_satisfaccion'] or 0.0
-        
-        self.save()
+        self.segundos_respuesta_total = stats['suma_tiempo'] or 0
+        self.respuestas_medidas = stats['respuestas'] or 0
+        self.satisfaccion_total = stats['suma_satisfaccion'] or 0
+        self.evaluaciones = stats['evaluaciones'] or 0
+        self.tiempo_respuesta_promedio = (
+            self.segundos_respuesta_total / self.respuestas_medidas / 60 if self.respuestas_medidas else 0.0
+        )
+        self.satisfaccion_promedio = (
+            self.satisfaccion_total / self.evaluaciones if self.evaluaciones else 0.0
+        )
 
 
 class NuevaConversacionAlerta(models.Model):
@@ -259,4 +276,24 @@ class HistorialAlertaConversacion(models.Model):
         ]
         
     def __str__(self):
-        return f'{self.tipo} - Conv #{self.conversacion.id} - {self.operador.username}'
\ No newline at end of file
+        return f'{self.tipo} - Conv #{self.conversacion.id} - {self.operador.username}'
+
+class TerminoRiesgo(models.Model):
+    """Palabra o frase del léxico de riesgo que se busca en los mensajes de ciudadanos"""
+    termino = models.CharField(max_length=100, unique=True)
+    peso = models.PositiveSmallIntegerField(default=5)
+    variantes = models.BooleanField(
+        default=True,
+        help_text='Coincide también con las palabras que empiezan con el término (suicid: suicidio, suicidarme)'
+    )
+    activo = models.BooleanField(default=True, db_index=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    modificado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['termino']
+        verbose_name = 'Término de riesgo'
+        verbose_name_plural = 'Términos de riesgo'
+        
+    def __str__(self):
+        return f'{self.termino} ({self.peso})'
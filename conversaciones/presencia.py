@@ -0,0 +1,208 @@
+"""
+Presencia de operadores para la asignación automática
+Sistema SEDRONAR - Operadores en línea ordenados por carga en Redis
+
+Cada operador conectado (WebSocket de conversaciones o latido del panel) renueva
+``sedronar:presencia:vivo:{id}`` con TTL y queda en un sorted set cuyo score es
+su carga: ``conversaciones activas + fracción de la última asignación``. La parte
+entera ordena por carga y la fracción (epoch en ms / 1e13, siempre < 1) desempata
+por el que hace más tiempo que no recibe una conversación.
+
+La elección es un script Lua: recorre el sorted set desde el menos cargado, quita
+los operadores cuyo latido venció y que tampoco tuvieron requests en ese lapso
+(set de actividad de core.actividad_sesiones), toma el primero con carga <
+max_conversaciones y le suma 1 en la misma operación, así dos conversaciones
+simultáneas nunca eligen sobre la misma carga. Sin Redis se usa el latido en cache y la consulta
+ordenada sobre ColaAsignacion.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+
+from core.actividad_sesiones import CLAVE_USUARIOS as CLAVE_ACTIVIDAD
+from core.redis_pausable import RedisPausable
+from .models import ColaAsignacion
+
+CLAVE_CARGA = "sedronar:presencia:carga"
+CLAVE_MAXIMO = "sedronar:presencia:maximo"
+PREFIJO_VIVO = "sedronar:presencia:vivo:"
+PREFIJO_CACHE = "presencia_operador"
+
+# KEYS: carga, maximo, actividad | ARGV: prefijo vivo, forzar (1/0), fracción de ahora, actividad mínima
+SCRIPT_ELEGIR = """
+local offset = 0
+local menos_cargado = nil
+while true do
+    local miembros = redis.call('ZRANGE', KEYS[1], offset, offset + 19, 'WITHSCORES')
+    if #miembros == 0 then break end
+    local quitados = 0
+    for i = 1, #miembros, 2 do
+        local id = miembros[i]
+        if redis.call('EXISTS', ARGV[1] .. id) == 0
+                and tonumber(redis.call('ZSCORE', KEYS[3], id) or '0') < tonumber(ARGV[4]) then
+            redis.call('ZREM', KEYS[1], id)
+            redis.call('HDEL', KEYS[2], id)
+            quitados = quitados + 1
+        else
+            local carga = math.floor(tonumber(miembros[i + 1]))
+            local maximo = tonumber(redis.call('HGET', KEYS[2], id) or '0')
+            if carga < maximo then
+                redis.call('ZADD', KEYS[1], carga + 1 + tonumber(ARGV[3]), id)
+                return {id, carga + 1}
+            end
+            if menos_cargado == nil then
+                menos_cargado = {id, carga}
+            end
+        end
+    end
+    offset = offset + 20 - quitados
+end
+if menos_cargado ~= nil and ARGV[2] == '1' then
+    redis.call('ZADD', KEYS[1], menos_cargado[2] + 1 + tonumber(ARGV[3]), menos_cargado[1])
+    return {menos_cargado[1], menos_cargado[2] + 1}
+end
+return false
+"""
+
+# KEYS: carga | ARGV: operador_id, delta (sin bajar de 0 ni agregar ausentes)
+SCRIPT_AJUSTAR = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not score then return false end
+score = tonumber(score)
+local nuevo = score + tonumber(ARGV[2])
+if nuevo < 0 then nuevo = score - math.floor(score) end
+redis.call('ZADD', KEYS[1], nuevo, ARGV[1])
+return tostring(nuevo)
+"""
+
+_redis = RedisPausable(
+    "Presencia de operadores", "se usa la base de datos", scripts=(SCRIPT_ELEGIR, SCRIPT_AJUSTAR)
+)
+
+
+def _fraccion(momento=None):
+    """Desempate dentro de una misma carga: epoch en ms / 1e13 (< 1 hasta el año 2286)"""
+    segundos = momento.timestamp() if momento is not None else time.time()
+    return int(segundos * 1000) / 1e13
+
+
+def _ttl():
+    return getattr(settings, 'PRESENCIA_TTL', 90)
+
+
+class PresenciaOperadores:
+    """Registro de operadores en línea y elección atómica del menos cargado"""
+
+    @staticmethod
+    def latido(operador_id):
+        """Marca al operador como en línea; la primera vez carga su cola desde la base de datos"""
+        cache.set(f"{PREFIJO_CACHE}:{operador_id}", 1, _ttl())
+        conexion = _redis.conexion()
+        if conexion is None:
+            return
+        try:
+            pipe = conexion.pipeline(transaction=False)
+            pipe.set(f"{PREFIJO_VIVO}{operador_id}", 1, ex=_ttl())
+            pipe.zscore(CLAVE_CARGA, operador_id)
+            _, score = pipe.execute()
+            if score is None:
+                PresenciaOperadores.registrar(operador_id)
+        except Exception as e:
+            _redis.pausar(e)
+
+    @staticmethod
+    def registrar(operador_id, cola=None):
+        """Agrega (o actualiza) al operador en el sorted set según su ColaAsignacion"""
+        conexion = _redis.conexion()
+        if conexion is None:
+            return
+        if cola is None:
+            cola = ColaAsignacion.objects.filter(operador_id=operador_id).first()
+        try:
+            if cola is None or not cola.activo:
+                PresenciaOperadores._quitar(conexion, operador_id)
+                return
+            pipe = conexion.pipeline(transaction=False)
+            pipe.hset(CLAVE_MAXIMO, operador_id, cola.max_conversaciones)
+            pipe.zadd(CLAVE_CARGA, {operador_id: cola.conversaciones_actuales + _fraccion(cola.ultima_asignacion)})
+            pipe.execute()
+        except Exception as e:
+            _redis.pausar(e)
+
+    @staticmethod
+    def _quitar(conexion, operador_id):
+        pipe = conexion.pipeline(transaction=False)
+        pipe.zrem(CLAVE_CARGA, operador_id)
+        pipe.hdel(CLAVE_MAXIMO, operador_id)
+        pipe.execute()
+
+    @staticmethod
+    def sincronizar(colas=None):
+        """Copia a Redis la carga de las colas de operadores en línea (reconciliación, configuración)"""
+        conexion = _redis.conexion()
+        if conexion is None:
+            return
+        if colas is None:
+            colas = ColaAsignacion.objects.all()
+        try:
+            presentes = {int(miembro) for miembro in conexion.zrange(CLAVE_CARGA, 0, -1)}
+        except Exception as e:
+            _redis.pausar(e)
+            return
+        for cola in colas:
+            if cola.operador_id in presentes:
+                PresenciaOperadores.registrar(cola.operador_id, cola)
+
+    @staticmethod
+    def ajustar(operador_id, delta):
+        """Suma ``delta`` a la carga del operador si está en línea (cierres, reasignaciones)"""
+        if not operador_id or not delta:
+            return
+        conexion = _redis.conexion()
+        if conexion is None:
+            return
+        try:
+            _redis.scripts[1](keys=[CLAVE_CARGA], args=[operador_id, delta])
+        except Exception as e:
+            _redis.pausar(e)
+
+    @staticmethod
+    def elegir(forzar=True):
+        """
+        Elige al operador en línea menos cargado y le suma una conversación.
+        Con ``forzar`` y todos al máximo, elige igual al menos cargado.
+        Retorna el id del operador o None.
+        """
+        conexion = _redis.conexion()
+        if conexion is not None:
+            try:
+                resultado = _redis.scripts[0](
+                    keys=[CLAVE_CARGA, CLAVE_MAXIMO, CLAVE_ACTIVIDAD],
+                    args=[PREFIJO_VIVO, '1' if forzar else '0', _fraccion(), time.time() - _ttl()],
+                )
+                return int(resultado[0]) if resultado else None
+            except Exception as e:
+                _redis.pausar(e)
+        return PresenciaOperadores._elegir_sin_redis(forzar)
+
+    @staticmethod
+    def _elegir_sin_redis(forzar):
+        colas = ColaAsignacion.objects.filter(activo=True)
+        operadores = list(colas.values_list('operador_id', flat=True))
+        vivos = cache.get_many([f"{PREFIJO_CACHE}:{operador_id}" for operador_id in operadores])
+        en_linea = [
+            operador_id for operador_id in operadores
+            if f"{PREFIJO_CACHE}:{operador_id}" in vivos
+        ]
+        if not en_linea:
+            return None
+        colas = colas.filter(operador_id__in=en_linea)
+        cola = colas.filter(
+            conversaciones_actuales__lt=models.F('max_conversaciones')
+        ).order_by('conversaciones_actuales', 'ultima_asignacion').first()
+        if cola is None and forzar:
+            cola = colas.order_by('conversaciones_actuales').first()
+        return cola.operador_id if cola else None
@@ -0,0 +1,265 @@
+"""
+Detección de riesgo en mensajes de ciudadanos
+Sistema SEDRONAR - Léxico configurable compilado en una sola expresión regular
+
+Los términos (TerminoRiesgo, editables en el admin) se comparan contra el texto
+plegado: minúsculas, sin acentos y palabras separadas por un espacio. El léxico
+activo se compila en una expresión regular con forma de trie (los términos que
+comparten prefijo comparten rama), así cada mensaje se recorre una sola vez en
+C sin importar la cantidad de términos. Un término con ``variantes`` coincide
+también con las palabras que empiezan con él ("suicid" -> suicidio, suicidarme);
+sin ``variantes`` debe coincidir con palabras completas.
+
+El detector compilado se reutiliza en el proceso y se recompila cuando cambia la
+versión de TerminoRiesgo (core.etag_versionado, compartida por cache entre
+procesos), consultada a lo sumo cada ``RIESGO_RECARGA`` segundos.
+
+El análisis corre fuera del request: el signal del mensaje encola su id al
+confirmar y un hilo del proceso lo evalúa (``RIESGO_MODO`` "async"; "sync" lo
+evalúa en línea, para tests y comandos). Al detenerse el proceso (atexit o
+``worker_exit`` de gunicorn) los mensajes que quedaron en la cola se analizan
+en línea.
+"""
+
+import logging
+import queue
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from core.etag_versionado import invalidar_version, versionar, versiones
+from core.notificaciones_ws import notificar
+from core.segundo_plano import HiloSegundoPlano, PorProceso
+from legajos.services_busqueda import tokenizar
+from .models import Conversacion, HistorialAlertaConversacion, Mensaje, TerminoRiesgo
+
+logger = logging.getLogger("django")
+
+versionar(TerminoRiesgo)
+
+# Mensajes pendientes de análisis; con la cola llena se analizan en línea
+COLA_MAXIMA = 10000
+
+_FIN = ''
+
+
+def plegar(texto):
+    """Texto comparable con el léxico: minúsculas, sin acentos, palabras separadas por un espacio"""
+    return ' '.join(tokenizar(texto))
+
+
+def _trie(terminos):
+    """Trie de caracteres; en ``_FIN`` cada término marca si admite variantes"""
+    raiz = {}
+    for termino, variantes in terminos:
+        nodo = raiz
+        for letra in termino:
+            nodo = nodo.setdefault(letra, {})
+        nodo[_FIN] = nodo.get(_FIN, False) or variantes
+    return raiz
+
+
+def _expresion(nodo):
+    # Las ramas más largas van primero: la alternancia prueba en orden y prefiere el término más largo
+    ramas = [re.escape(letra) + _expresion(hijo) for letra, hijo in sorted(nodo.items()) if letra != _FIN]
+    if _FIN in nodo:
+        ramas.append('[a-z0-9]*' if nodo[_FIN] else '(?![a-z0-9])')
+    if len(ramas) == 1:
+        return ramas[0]
+    return '(?:' + '|'.join(ramas) + ')'
+
+
+class DetectorRiesgo:
+    """Léxico compilado; se construye con pares (termino, peso, variantes)"""
+
+    def __init__(self, terminos):
+        self.exactos = {}
+        self.raices = {}
+        for termino, peso, variantes in terminos:
+            clave = plegar(termino)
+            if clave:
+                destino = self.raices if variantes else self.exactos
+                destino[clave] = max(peso, destino.get(clave, 0))
+        self.largo_raiz = max(map(len, self.raices), default=0)
+        claves = [(clave, False) for clave in self.exactos] + [(clave, True) for clave in self.raices]
+        self.patron = (
+            re.compile('(?<![a-z0-9])' + _expresion(_trie(claves))) if claves else None
+        )
+
+    def __len__(self):
+        return len(self.exactos) + len(self.raices)
+
+    def _termino(self, coincidencia):
+        if coincidencia in self.exactos:
+            return coincidencia, self.exactos[coincidencia]
+        for largo in range(min(len(coincidencia), self.largo_raiz), 0, -1):
+            raiz = coincidencia[:largo]
+            if raiz in self.raices:
+                return raiz, self.raices[raiz]
+        return None, 0
+
+    def analizar(self, texto):
+        """Retorna (términos encontrados en orden de aparición, puntaje = suma de sus pesos)"""
+        if self.patron is None or not texto:
+            return [], 0
+        encontrados = {}
+        for coincidencia in self.patron.finditer(plegar(texto)):
+            termino, peso = self._termino(coincidencia.group())
+            if termino is not None:
+                encontrados.setdefault(termino, peso)
+        return list(encontrados), sum(encontrados.values())
+
+
+_cargado = {'detector': None, 'version': None, 'revisado': 0.0}
+_carga_lock = threading.Lock()
+
+
+def detector():
+    """Detector del léxico activo; se recompila si el léxico cambió desde el último chequeo"""
+    recarga = getattr(settings, 'RIESGO_RECARGA', 30)
+    if _cargado['detector'] is not None and time.monotonic() < _cargado['revisado'] + recarga:
+        return _cargado['detector']
+    with _carga_lock:
+        if _cargado['detector'] is not None and time.monotonic() < _cargado['revisado'] + recarga:
+            return _cargado['detector']
+        # La versión se lee antes que los términos: un cambio concurrente fuerza otra recarga
+        version = versiones([TerminoRiesgo])[0]
+        if _cargado['detector'] is None or version != _cargado['version']:
+            terminos = TerminoRiesgo.objects.filter(activo=True).values_list('termino', 'peso', 'variantes')
+            _cargado['detector'] = DetectorRiesgo(terminos)
+            _cargado['version'] = version
+            logger.info(f"Léxico de riesgo compilado: {len(_cargado['detector'])} términos")
+        _cargado['revisado'] = time.monotonic()
+        return _cargado['detector']
+
+
+def analizar_mensaje(mensaje_id):
+    """Evalúa un mensaje de ciudadano y alerta si su puntaje alcanza ``RIESGO_UMBRAL``"""
+    mensaje = Mensaje.objects.select_related('conversacion__operador_asignado').filter(pk=mensaje_id).first()
+    if mensaje is None:
+        return [], 0
+    terminos, puntaje = detector().analizar(mensaje.contenido)
+    if terminos and puntaje >= getattr(settings, 'RIESGO_UMBRAL', 5):
+        _alertar(mensaje.conversacion, mensaje, terminos, puntaje)
+    return terminos, puntaje
+
+
+def _alertar(conversacion, mensaje, terminos, puntaje):
+    from legajos.services_alertas import AlertasService
+
+    texto = f"RIESGO CRÍTICO ({puntaje}): {', '.join(terminos)} en conversación #{conversacion.id}"
+    with transaction.atomic():
+        if conversacion.prioridad != 'urgente':
+            Conversacion.objects.filter(pk=conversacion.pk).update(prioridad='urgente')
+            invalidar_version(Conversacion)
+
+        operador = conversacion.operador_asignado
+        if operador is not None:
+            HistorialAlertaConversacion.objects.create(
+                conversacion=conversacion,
+                operador=operador,
+                tipo='RIESGO_CRITICO',
+                mensaje=texto[:200]
+            )
+            notificar(f'conversaciones_operador_{operador.id}', {
+                'type': 'nueva_alerta_conversacion',
+                'alerta': {
+                    'id': f'riesgo_{conversacion.id}_{mensaje.id}',
+                    'conversacion_id': conversacion.id,
+                    'tipo': 'RIESGO_CRITICO',
+                    'prioridad': 'CRITICA',
+                    'mensaje': texto,
+                    'terminos': terminos,
+                    'puntaje': puntaje,
+                    'fecha': mensaje.fecha_envio.strftime('%d/%m/%Y %H:%M'),
+                    'operador_id': operador.id,
+                }
+            }, clave=f'riesgo_{mensaje.id}')
+
+        # Crear alerta crítica en el sistema principal
+        if getattr(conversacion, 'ciudadano_relacionado', None):
+            from legajos.models import AlertaCiudadano
+
+            alerta = AlertaCiudadano.objects.create(
+                ciudadano=conversacion.ciudadano_relacionado,
+                tipo='RIESGO_CRITICO_CONVERSACION',
+                prioridad='CRITICA',
+                mensaje=texto
+            )
+            AlertasService._enviar_notificacion_alerta(alerta)
+
+
+class AnalizadorRiesgo(HiloSegundoPlano):
+    """Cola de mensajes a analizar con un hilo consumidor por proceso"""
+
+    nombre = 'analizador-riesgo'
+
+    def __init__(self, max_size=COLA_MAXIMA):
+        super().__init__()
+        self._cola = queue.Queue(maxsize=max_size)
+
+    def encolar(self, mensaje_id):
+        self.iniciar()
+        try:
+            self._cola.put_nowait(mensaje_id)
+        except queue.Full:
+            logger.warning(f"Cola de análisis de riesgo llena: mensaje {mensaje_id} analizado en línea")
+            _analizar_seguro(mensaje_id)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                mensaje_id = self._cola.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                _analizar_seguro(mensaje_id)
+            finally:
+                close_old_connections()
+
+    def vaciar(self):
+        """Analiza en línea los mensajes que quedaron en la cola; retorna cuántos"""
+        analizados = 0
+        while True:
+            try:
+                mensaje_id = self._cola.get_nowait()
+            except queue.Empty:
+                return analizados
+            _analizar_seguro(mensaje_id)
+            analizados += 1
+
+    def detener(self):
+        super().detener()
+        # El hilo termina el mensaje en curso y sale; lo que quede se analiza acá
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        try:
+            analizados = self.vaciar()
+        finally:
+            close_old_connections()
+        if analizados:
+            logger.info(f"Análisis de riesgo: {analizados} mensajes pendientes analizados al detener")
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+
+def _analizar_seguro(mensaje_id):
+    try:
+        analizar_mensaje(mensaje_id)
+    except Exception as e:
+        logger.error(f"Error analizando riesgo del mensaje {mensaje_id}: {e}", exc_info=True)
+
+
+get_analizador = PorProceso(AnalizadorRiesgo)
+
+
+def encolar_mensaje(mensaje_id):
+    """Programa el análisis del mensaje para cuando confirme la transacción actual"""
+    if getattr(settings, 'RIESGO_MODO', 'sync') == 'async':
+        transaction.on_commit(lambda: get_analizador().encolar(mensaje_id))
+    else:
+        transaction.on_commit(lambda: _analizar_seguro(mensaje_id))
@@ -6,4 +6,5 @@ websocket_urlpatterns = [
     re_path(r'ws/conversaciones/$', consumers.ConversacionesListConsumer.as_asgi()),
     re_path(r'ws/alertas/$', consumers.AlertasConsumer.as_asgi()),
     re_path(r'ws/alertas-conversaciones/$', consumers.AlertasConversacionesConsumer.as_asgi()),
+    re_path(r'ws/chat-ciudadano/(?P<conversacion_id>\d+)/$', consumers.ChatCiudadanoConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -1,7 +1,11 @@
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Greatest
+from core.etag_versionado import invalidar_version
 from .models import Conversacion, ColaAsignacion, MetricasOperador
+from .presencia import PresenciaOperadores
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,38 +16,16 @@ class AsignadorAutomatico:
     
     @staticmethod
     def obtener_operador_disponible():
-        """Obtiene el operador más adecuado para asignar una conversación (solo operadores logueados)"""
+        """
+        Elige el operador en línea menos cargado (ver conversaciones.presencia) y
+        reserva la conversación en su carga. Si todos están al máximo elige igual
+        al menos cargado.
+        """
         try:
-            from django.contrib.sessions.models import Session
-            from django.utils import timezone
-            
-            # Obtener usuarios actualmente logueados
-            sesiones_activas = Session.objects.filter(expire_date__gte=timezone.now())
-            usuarios_logueados = []
-            
-            for sesion in sesiones_activas:
-                data = sesion.get_decoded()
-                user_id = data.get('_auth_user_id')
-                if user_id:
-                    usuarios_logueados.append(int(user_id))
-            
-            # Buscar operadores disponibles que estén logueados
-            cola_disponible = ColaAsignacion.objects.filter(
-                activo=True,
-                operador_id__in=usuarios_logueados,
-                conversaciones_actuales__lt=models.F('max_conversaciones')
-            ).select_related('operador').order_by('conversaciones_actuales', 'ultima_asignacion').first()
-            
-            if cola_disponible:
-                return cola_disponible.operador
-            
-            # Si no hay operadores disponibles con capacidad, buscar el menos cargado que esté logueado
-            cola_menos_cargada = ColaAsignacion.objects.filter(
-                activo=True,
-                operador_id__in=usuarios_logueados
-            ).select_related('operador').order_by('conversaciones_actuales').first()
-            
-            return cola_menos_cargada.operador if cola_menos_cargada else None
+            operador_id = PresenciaOperadores.elegir()
+            if operador_id is None:
+                return None
+            return User.objects.filter(pk=operador_id).first()
             
         except Exception as e:
             logger.error(f"Error al obtener operador disponible: {e}")
@@ -56,16 +38,16 @@ class AsignadorAutomatico:
             operador = AsignadorAutomatico.obtener_operador_disponible()
             
             if operador:
-                conversacion.asignar_operador(operador)
+                # La carga en Redis ya se reservó al elegirlo: los contadores no la vuelven a sumar
+                conversacion._carga_reservada = operador.id
+                try:
+                    conversacion.asignar_operador(operador)
+                except Exception:
+                    PresenciaOperadores.ajustar(operador.id, -1)
+                    raise
                 
-                # Actualizar cola del operador
-                cola, created = ColaAsignacion.objects.get_or_create(
-                    operador=operador,
-                    defaults={'max_conversaciones': 5}
-                )
-                cola.actualizar_contador()
-                cola.ultima_asignacion = timezone.now()
-                cola.save()
+                ColaAsignacion.objects.filter(operador=operador).update(ultima_asignacion=timezone.now())
+                invalidar_version(ColaAsignacion)
                 
                 logger.info(f"Conversación {conversacion.id} asignada automáticamente a {operador.username}")
                 return True
@@ -94,13 +76,155 @@ class AsignadorAutomatico:
             cola.save()
         
         cola.actualizar_contador()
+        PresenciaOperadores.sincronizar([cola])
         return cola
     
     @staticmethod
     def actualizar_todas_las_colas():
-        """Actualiza los contadores de todas las colas"""
-        for cola in ColaAsignacion.objects.select_related('operador'):
-            cola.actualizar_contador()
+        """
+        Reconciliación: recalcula conversaciones_actuales de todas las colas con una
+        consulta agrupada y guarda solo las que difieren. Retorna las colas corregidas.
+        """
+        estadisticas = ContadoresOperador.estadisticas_por_operador()
+        colas = list(ColaAsignacion.objects.all())
+        corregidas = []
+        for cola in colas:
+            activas = estadisticas.get(cola.operador_id, {}).get('activas', 0)
+            if cola.conversaciones_actuales != activas:
+                cola.conversaciones_actuales = activas
+                corregidas.append(cola)
+        if corregidas:
+            ColaAsignacion.objects.bulk_update(corregidas, ['conversaciones_actuales'])
+            invalidar_version(ColaAsignacion)
+        PresenciaOperadores.sincronizar(colas)
+        return len(corregidas)
+
+
+# Contadores de MetricasOperador que aporta cada conversación a su operador
+CAMPOS_METRICAS = (
+    'conversaciones_atendidas',
+    'conversaciones_cerradas',
+    'segundos_respuesta_total',
+    'respuestas_medidas',
+    'satisfaccion_total',
+    'evaluaciones',
+)
+
+
+class ContadoresOperador:
+    """
+    Contadores por operador mantenidos por eventos.
+    
+    Cada guardado de una Conversacion resta lo que aportaba con sus valores
+    anteriores y suma lo que aporta con los nuevos (signals_contadores). Las
+    diferencias se aplican con F() sobre ColaAsignacion y MetricasOperador, sin
+    recorrer Conversacion. Lo que no pasa por signals (update, bulk) se corrige
+    con el comando ``reconciliar_contadores``.
+    """
+    
+    @staticmethod
+    def aportes(valores):
+        """(operador_id, {campo: valor}) que suma una conversación dada como dict attname -> valor"""
+        if not valores or not valores.get('operador_asignado_id'):
+            return None, {}
+        tiempo = valores.get('tiempo_respuesta_segundos')
+        satisfaccion = valores.get('satisfaccion')
+        return valores['operador_asignado_id'], {
+            'conversaciones_actuales': int(valores.get('estado') == 'activa'),
+            'conversaciones_atendidas': 1,
+            'conversaciones_cerradas': int(valores.get('estado') == 'cerrada'),
+            'segundos_respuesta_total': tiempo or 0,
+            'respuestas_medidas': int(tiempo is not None),
+            'satisfaccion_total': satisfaccion or 0,
+            'evaluaciones': int(satisfaccion is not None),
+        }
+    
+    @staticmethod
+    def diferencias(anterior, actual):
+        """{operador_id: {campo: delta}} entre dos estados de una conversación, sin ceros"""
+        deltas = {}
+        for valores, signo in ((anterior, -1), (actual, 1)):
+            operador_id, aportes = ContadoresOperador.aportes(valores)
+            if operador_id is None:
+                continue
+            cambios = deltas.setdefault(operador_id, {})
+            for campo, valor in aportes.items():
+                cambios[campo] = cambios.get(campo, 0) + signo * valor
+        return {
+            operador_id: {campo: delta for campo, delta in cambios.items() if delta}
+            for operador_id, cambios in deltas.items()
+            if any(cambios.values())
+        }
+    
+    @staticmethod
+    def aplicar(deltas, carga_reservada=None):
+        """
+        Aplica las diferencias. ``carga_reservada`` es el operador al que el
+        asignador ya le sumó la conversación en Redis al elegirlo.
+        """
+        for operador_id, cambios in deltas.items():
+            cambios = dict(cambios)
+            carga = cambios.pop('conversaciones_actuales', 0)
+            if carga:
+                ColaAsignacion.objects.filter(operador_id=operador_id).update(
+                    conversaciones_actuales=Greatest(F('conversaciones_actuales') + carga, 0)
+                )
+                invalidar_version(ColaAsignacion)
+                if operador_id == carga_reservada and carga > 0:
+                    carga -= 1
+                if carga:
+                    transaction.on_commit(
+                        lambda operador_id=operador_id, carga=carga: PresenciaOperadores.ajustar(operador_id, carga)
+                    )
+            if cambios:
+                ContadoresOperador._aplicar_metricas(operador_id, cambios)
+    
+    @staticmethod
+    def _aplicar_metricas(operador_id, cambios):
+        metricas = MetricasOperador.objects.filter(operador_id=operador_id)
+        actualizadas = metricas.update(
+            fecha_actualizacion=timezone.now(),
+            **{campo: F(campo) + delta for campo, delta in cambios.items()}
+        )
+        if not actualizadas:
+            # Primera conversación del operador: se crea la fila con el conteo completo
+            MetricasService.actualizar_metricas_operador(User(pk=operador_id))
+            return
+        # Los promedios van en un segundo UPDATE: MySQL evalúa el SET de izquierda a
+        # derecha con los valores ya actualizados y otros motores con los anteriores
+        promedios = {}
+        if 'segundos_respuesta_total' in cambios or 'respuestas_medidas' in cambios:
+            promedios['tiempo_respuesta_promedio'] = Case(
+                When(respuestas_medidas__gt=0, then=(
+                    Cast(F('segundos_respuesta_total'), FloatField()) / F('respuestas_medidas') / 60
+                )),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        if 'satisfaccion_total' in cambios or 'evaluaciones' in cambios:
+            promedios['satisfaccion_promedio'] = Case(
+                When(evaluaciones__gt=0, then=Cast(F('satisfaccion_total'), FloatField()) / F('evaluaciones')),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        if promedios:
+            metricas.update(**promedios)
+    
+    @staticmethod
+    def estadisticas_por_operador():
+        """Contadores de todos los operadores en una consulta agrupada: {operador_id: dict}"""
+        filas = Conversacion.objects.filter(
+            operador_asignado__isnull=False
+        ).order_by().values('operador_asignado').annotate(
+            total=Count('id'),
+            activas=Count('id', filter=Q(estado='activa')),
+            cerradas=Count('id', filter=Q(estado='cerrada')),
+            suma_tiempo=Sum('tiempo_respuesta_segundos'),
+            respuestas=Count('tiempo_respuesta_segundos'),
+            suma_satisfaccion=Sum('satisfaccion'),
+            evaluaciones=Count('satisfaccion'),
+        )
+        return {fila.pop('operador_asignado'): fila for fila in filas}
 
 
 class MetricasService:
@@ -166,13 +290,47 @@ class MetricasService:
     
     @staticmethod
     def actualizar_todas_las_metricas():
-        """Actualiza las métricas de todos los operadores"""
-        operadores = User.objects.filter(
-            groups__name__in=['Conversaciones', 'OperadorCharla']
-        ).prefetch_related('groups')
+        """
+        Reconciliación: recalcula las métricas de todos los operadores con una
+        consulta agrupada, crea las que faltan y guarda solo las que difieren.
+        Retorna la cantidad de filas creadas o corregidas.
+        """
+        estadisticas = ContadoresOperador.estadisticas_por_operador()
+        existentes = {m.operador_id: m for m in MetricasOperador.objects.all()}
+        operadores = set(estadisticas) | set(
+            User.objects.filter(
+                groups__name__in=['Conversaciones', 'OperadorCharla']
+            ).values_list('id', flat=True)
+        )
+        vacio = dict.fromkeys(['total', 'cerradas', 'suma_tiempo', 'respuestas', 'suma_satisfaccion', 'evaluaciones'], 0)
+        campos = list(CAMPOS_METRICAS) + ['tiempo_respuesta_promedio', 'satisfaccion_promedio']
+        
+        def valores(metricas):
+            # Los promedios se comparan redondeados: SQL y Python no dividen bit a bit igual
+            return [
+                round(valor, 6) if isinstance(valor, float) else valor
+                for valor in (getattr(metricas, campo) for campo in campos)
+            ]
+        
+        nuevas, corregidas = [], []
+        for operador_id in operadores:
+            metricas = existentes.get(operador_id)
+            if metricas is None:
+                metricas = MetricasOperador(operador_id=operador_id)
+                metricas.aplicar_estadisticas(estadisticas.get(operador_id, vacio))
+                nuevas.append(metricas)
+                continue
+            antes = valores(metricas)
+            metricas.aplicar_estadisticas(estadisticas.get(operador_id, vacio))
+            if valores(metricas) != antes:
+                metricas.fecha_actualizacion = timezone.now()
+                corregidas.append(metricas)
         
-        for operador in operadores:
-            MetricasService.actualizar_metricas_operador(operador)
+        if nuevas:
+            MetricasOperador.objects.bulk_create(nuevas)
+        if corregidas:
+            MetricasOperador.objects.bulk_update(corregidas, campos + ['fecha_actualizacion'])
+        return len(nuevas) + len(corregidas)
 
 
 class NotificacionService:
@@ -3,9 +3,13 @@ from django.dispatch import receiver
 from django.utils import timezone
 from datetime import timedelta
 
+from core.estado_cargado import estado_anterior, rastrear
 from .models import Conversacion, Mensaje
+from .riesgo import encolar_mensaje
 from legajos.services_alertas import AlertasService
 
+rastrear(Conversacion)
+
 
 @receiver(post_save, sender=Conversacion)
 def alerta_nueva_conversacion(sender, instance, created, **kwargs):
@@ -46,10 +50,10 @@ def alerta_nueva_conversacion(sender, instance, created, **kwargs):
 @receiver(pre_save, sender=Conversacion)
 def alerta_conversacion_cerrada(sender, instance, **kwargs):
     """Genera alerta cuando se cierra conversación"""
-    if instance.pk:
+    anterior = estado_anterior(instance)
+    if anterior is not None:
         try:
-            conversacion_anterior = Conversacion.objects.get(pk=instance.pk)
-            if conversacion_anterior.estado != 'CERRADA' and instance.estado == 'CERRADA':
+            if anterior['estado'] != 'CERRADA' and instance.estado == 'CERRADA':
                 if hasattr(instance, 'ciudadano_relacionado') and instance.ciudadano_relacionado:
                     from legajos.models import AlertaCiudadano
                     
@@ -63,8 +67,6 @@ def alerta_conversacion_cerrada(sender, instance, **kwargs):
                         mensaje=f'Conversación cerrada. Duración: {duracion.seconds//60} minutos'
                     )
                     AlertasService._enviar_notificacion_alerta(alerta)
-        except Conversacion.DoesNotExist:
-            pass
         except Exception as e:
             print(f"Error generando alerta de conversación cerrada: {e}")
 
@@ -76,9 +78,9 @@ def verificar_tiempo_respuesta(sender, instance, created, **kwargs):
         try:
             conversacion = instance.conversacion
             
-            # Verificar palabras clave de riesgo PRIMERO
+            # Verificar palabras clave de riesgo PRIMERO (léxico de riesgo, fuera del request)
             if conversacion.operador_asignado:
-                _verificar_palabras_riesgo(conversacion, instance)
+                encolar_mensaje(instance.id)
                 _generar_alerta_mensaje_ciudadano(conversacion, instance)
                 _crear_historial_mensaje(conversacion, instance)
             
@@ -111,35 +113,10 @@ def verificar_tiempo_respuesta(sender, instance, created, **kwargs):
             print(f"Error verificando tiempo de respuesta: {e}")
 
 
-def _verificar_palabras_riesgo(conversacion, mensaje):
-    """Verifica palabras clave de riesgo en el mensaje"""
-    try:
-        palabras_riesgo = ['suicidio', 'lastimar', 'drogas', 'violencia', 'matar', 'morir', 'suicidar']
-        contenido_lower = mensaje.contenido.lower()
-        
-        palabras_encontradas = [palabra for palabra in palabras_riesgo if palabra in contenido_lower]
-        
-        if palabras_encontradas:
-            # Crear alerta crítica en el sistema principal
-            if hasattr(conversacion, 'ciudadano_relacionado') and conversacion.ciudadano_relacionado:
-                from legajos.models import AlertaCiudadano
-                
-                alerta = AlertaCiudadano.objects.create(
-                    ciudadano=conversacion.ciudadano_relacionado,
-                    tipo='RIESGO_CRITICO_CONVERSACION',
-                    prioridad='CRITICA',
-                    mensaje=f'RIESGO CRÍTICO: Palabras de riesgo detectadas en conversación #{conversacion.id}'
-                )
-                AlertasService._enviar_notificacion_alerta(alerta)
-    except Exception as e:
-        print(f"Error verificando palabras de riesgo: {e}")
-
-
 def _generar_alerta_mensaje_ciudadano(conversacion, mensaje):
     """Genera alerta específica para operadores de conversaciones"""
     try:
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
+        from core.notificaciones_ws import notificar
         
         # Datos de la alerta
         alerta_data = {
@@ -153,14 +130,14 @@ def _generar_alerta_mensaje_ciudadano(conversacion, mensaje):
             'contenido_mensaje': mensaje.contenido[:100] + '...' if len(mensaje.contenido) > 100 else mensaje.contenido
         }
         
-        # Enviar notificación WebSocket específica para conversaciones
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
+        # Notificación WebSocket específica para conversaciones (agrupada tras el commit)
+        notificar(
             f'conversaciones_operador_{conversacion.operador_asignado.id}',
             {
                 'type': 'nueva_alerta_conversacion',
                 'alerta': alerta_data
-            }
+            },
+            clave=alerta_data['id']
         )
         
     except Exception as e:
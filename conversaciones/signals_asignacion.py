@@ -0,0 +1,39 @@
+"""
+Aviso de asignación a los WebSocket de una conversación.
+
+ConversacionConsumer guarda el operador asignado mientras dura el socket; cada
+cambio de ``operador_asignado`` (asignación, reasignación, liberación) se le
+envía al grupo ``conversacion_<id>`` cuando confirma la transacción.
+"""
+
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from core.estado_cargado import estado_anterior, rastrear
+from core.notificaciones_ws import notificar
+from .models import Conversacion
+
+rastrear(Conversacion)
+
+
+@receiver(pre_save, sender=Conversacion)
+def capturar_operador_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = estado_anterior(instance)
+    if anterior is not None:
+        instance._operador_anterior = anterior.get('operador_asignado_id')
+
+
+@receiver(post_save, sender=Conversacion)
+def avisar_asignacion(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    if 'operador_asignado_id' not in instance.__dict__:
+        return
+    anterior = instance.__dict__.pop('_operador_anterior', None)
+    if instance.operador_asignado_id != anterior:
+        notificar(f'conversacion_{instance.pk}', {
+            'type': 'conversacion.actualizada',
+            'operador_id': instance.operador_asignado_id,
+        })
@@ -0,0 +1,56 @@
+"""
+Contadores por operador (ColaAsignacion.conversaciones_actuales y MetricasOperador).
+
+Cada guardado o borrado de una Conversacion aplica la diferencia entre lo que
+aportaba antes y lo que aporta ahora (asignación, reasignación, cierre,
+evaluación). Las escrituras que no pasan por signals se corrigen con el comando
+`reconciliar_contadores`.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.estado_cargado import estado_anterior, rastrear
+from .models import Conversacion
+from .services import ContadoresOperador
+
+rastrear(Conversacion)
+
+CAMPOS = ('operador_asignado_id', 'estado', 'tiempo_respuesta_segundos', 'satisfaccion')
+
+
+def _valores(instance, anterior=None):
+    """Campos que aportan a los contadores; los diferidos (only/defer) no cambiaron"""
+    valores = {}
+    for campo in CAMPOS:
+        if campo in instance.__dict__:
+            valores[campo] = instance.__dict__[campo]
+        elif anterior is not None:
+            valores[campo] = anterior.get(campo)
+        else:
+            valores[campo] = getattr(instance, campo)
+    return valores
+
+
+@receiver(pre_save, sender=Conversacion)
+def capturar_estado_contadores(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._contadores_anteriores = estado_anterior(instance)
+
+
+@receiver(post_save, sender=Conversacion)
+def actualizar_contadores(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = instance.__dict__.pop('_contadores_anteriores', None)
+    deltas = ContadoresOperador.diferencias(anterior, _valores(instance, anterior))
+    if deltas:
+        ContadoresOperador.aplicar(deltas, instance.__dict__.pop('_carga_reservada', None))
+
+
+@receiver(post_delete, sender=Conversacion)
+def descontar_contadores(sender, instance, **kwargs):
+    deltas = ContadoresOperador.diferencias(_valores(instance), None)
+    if deltas:
+        ContadoresOperador.aplicar(deltas)
@@ -0,0 +1,15 @@
+"""
+Aviso de mensajes nuevos a los canales del chat del ciudadano (ver conversaciones.mensajes).
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .mensajes import MensajesIncrementales
+from .models import Mensaje
+
+
+@receiver(post_save, sender=Mensaje)
+def publicar_mensaje_nuevo(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        MensajesIncrementales.publicar(instance)
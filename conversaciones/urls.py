@@ -12,6 +12,7 @@ urlpatterns = [
     path('iniciar/', views.iniciar_conversacion, name='iniciar_conversacion'),
     path('<int:conversacion_id>/enviar/', views.enviar_mensaje_ciudadano, name='enviar_mensaje_ciudadano'),
     path('<int:conversacion_id>/mensajes/', views.obtener_mensajes_ciudadano, name='obtener_mensajes_ciudadano'),
+    path('<int:conversacion_id>/eventos/', views.eventos_chat_ciudadano, name='eventos_chat_ciudadano'),
     
     # URLs del backoffice
     path('', views.lista_conversaciones, name='lista'),
@@ -1,5 +1,6 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -8,6 +9,7 @@ from django.contrib import messages
 from django.db import models
 from django.core.cache import cache
 from core.cache_decorators import cache_view, cache_queryset, invalidate_cache_pattern
+from core.etag_versionado import etag_versionado
 from .models import Conversacion, Mensaje
 import json
 
@@ -131,9 +133,11 @@ def iniciar_conversacion(request):
             except Exception as e:
                 print(f"DEBUG: Error notificando WebSocket: {e}")
             
+            from .mensajes import emitir_token
             return JsonResponse({
                 'success': True,
-                'conversacion_id': conversacion.id
+                'conversacion_id': conversacion.id,
+                'token': emitir_token(conversacion.id)
             })
         except Exception as e:
             return JsonResponse({
@@ -219,19 +223,80 @@ def enviar_mensaje_ciudadano(request, conversacion_id):
 
 @csrf_exempt
 def obtener_mensajes_ciudadano(request, conversacion_id):
-    conversacion = get_object_or_404(Conversacion, id=conversacion_id)
-    mensajes = conversacion.mensajes.all()
-    
-    print(f"DEBUG: Obteniendo mensajes para conversación {conversacion_id} - Total: {mensajes.count()}")
+    """
+    Mensajes por cursor (ver conversaciones.mensajes):
+    - ?after_id=N: mensajes nuevos después de N (polling). Con &esperar=S espera
+      hasta S segundos a que llegue uno (long-poll).
+    - ?before_id=N&limit=L: los L anteriores a N (historial).
+    - Sin parámetros: los últimos ``limit`` mensajes.
+    Requiere ?token= firmado por iniciar_conversacion.
+    """
+    from .mensajes import LIMITE_DEFAULT, MensajesIncrementales, serializar, token_valido
+    
+    if not token_valido(request.GET.get('token'), conversacion_id):
+        return JsonResponse({'error': 'Token inválido'}, status=403)
+    try:
+        after_id = int(request.GET['after_id']) if request.GET.get('after_id') else None
+        before_id = int(request.GET['before_id']) if request.GET.get('before_id') else None
+        limite = int(request.GET.get('limit') or LIMITE_DEFAULT)
+        esperar = float(request.GET.get('esperar') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    if not Conversacion.objects.filter(id=conversacion_id).exists():
+        return JsonResponse({'error': 'Conversación no encontrada'}, status=404)
+    
+    long_poll = False
+    # Bajo ASGI la espera ocuparía un hilo del pool de vistas síncronas: ahí el
+    # ciudadano recibe los mensajes por WebSocket o SSE
+    if after_id is not None and esperar > 0 and not isinstance(request, ASGIRequest):
+        mensajes, hay_mas, long_poll = MensajesIncrementales.esperar(
+            conversacion_id, after_id, limite=limite, segundos=esperar
+        )
+    else:
+        mensajes, hay_mas = MensajesIncrementales.pagina(
+            conversacion_id, after_id=after_id, before_id=before_id, limite=limite
+        )
     
-    mensajes_data = [{
-        'id': msg.id,
-        'remitente': msg.remitente,
-        'contenido': msg.contenido,
-        'fecha': msg.fecha_envio.strftime('%H:%M')
-    } for msg in mensajes]
+    if mensajes:
+        ultimo_id = mensajes[-1].id
+    else:
+        ultimo_id = after_id
+    return JsonResponse({
+        'mensajes': [serializar(msg) for msg in mensajes],
+        'ultimo_id': ultimo_id,
+        'primer_id': mensajes[0].id if mensajes else None,
+        'hay_mas': hay_mas,
+        'long_poll': long_poll,
+    })
+
+
+def eventos_chat_ciudadano(request, conversacion_id):
+    """
+    Server-Sent Events con los mensajes nuevos (alternativa al WebSocket del chat).
+    ?token= firmado por iniciar_conversacion; reanuda desde Last-Event-ID o ?after_id=.
+    Responde 204 si no hay canal push: EventSource no reintenta y el cliente pasa a polling.
+    """
+    from .mensajes import MensajesIncrementales, token_valido
     
-    return JsonResponse({'mensajes': mensajes_data})
+    if not token_valido(request.GET.get('token'), conversacion_id):
+        return JsonResponse({'error': 'Token inválido'}, status=403)
+    try:
+        after_id = int(request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('after_id') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    flujo = MensajesIncrementales.flujo_sse(
+        conversacion_id, after_id, asgi=isinstance(request, ASGIRequest)
+    )
+    if flujo is None:
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(flujo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no acumular eventos
+    # GZipMiddleware comprime cada evento por separado: se envía sin comprimir
+    response['Content-Encoding'] = 'identity'
+    return response
 
 
 # Vistas del backoffice
@@ -383,10 +448,6 @@ def asignar_conversacion(request, conversacion_id):
             conversacion.asignar_operador(request.user, request.user)
             messages.success(request, 'Conversación asignada exitosamente.')
         
-        # Actualizar colas después de la asignación
-        from .services import AsignadorAutomatico
-        AsignadorAutomatico.actualizar_todas_las_colas()
-        
         # Invalidar cache de la lista
         invalidate_cache_pattern('conversaciones:lista_conversaciones')
         
@@ -503,10 +564,6 @@ def reasignar_conversacion(request, conversacion_id):
             
             conversacion.asignar_operador(operador, request.user)
             
-            # Actualizar colas
-            from .services import AsignadorAutomatico
-            AsignadorAutomatico.actualizar_todas_las_colas()
-            
             # Invalidar cache
             invalidate_cache_pattern('conversaciones:lista_conversaciones')
             
@@ -595,8 +652,6 @@ def asignacion_automatica(request):
                 logging.warning(f"Error asignando conversación {conversacion.id}: {e}")
                 sin_operadores += 1
         
-        AsignadorAutomatico.actualizar_todas_las_colas()
-        
         if asignadas > 0:
             messages.success(request, f'{asignadas} conversaciones asignadas automáticamente')
         if sin_operadores > 0:
@@ -623,11 +678,6 @@ def evaluar_conversacion(request, conversacion_id):
             conversacion.satisfaccion = int(satisfaccion)
             conversacion.save()
             
-            # Actualizar métricas del operador
-            if conversacion.operador_asignado:
-                from .services import MetricasService
-                MetricasService.actualizar_metricas_operador(conversacion.operador_asignado)
-            
             return JsonResponse({'success': True})
     
     return JsonResponse({'success': False})
@@ -635,8 +685,9 @@ def evaluar_conversacion(request, conversacion_id):
 
 @login_required
 @user_passes_test(tiene_permiso_conversaciones)
+@etag_versionado('conversaciones.Conversacion', 'conversaciones.ColaAsignacion', vigencia=60)
 def api_metricas_tiempo_real(request):
-    """API para obtener métricas en tiempo real"""
+    """API para obtener métricas en tiempo real (304 mientras no cambien conversaciones ni la cola)"""
     from .services import MetricasService
     
     metricas = MetricasService.calcular_metricas_globales()
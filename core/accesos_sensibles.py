@@ -0,0 +1,150 @@
+"""
+Accesos a datos sensibles
+Sistema SEDRONAR - Registro de visualizaciones sin queries en el request
+
+AccesoSensibleMiddleware solo consulta la cache (Redis en producción):
+
+- Accesos múltiples: contador de ventana deslizante por (usuario, objeto) de
+  VENTANA_MULTIPLE segundos. Se aproxima con dos contadores de ventana fija,
+  el actual y el anterior pesado por la fracción que todavía cae dentro de la
+  ventana deslizante, en lugar de un COUNT sobre AuditoriaAccesoSensible.
+- Agrupación: la primera visualización de un objeto por un usuario dentro de
+  AUDITORIA_ACCESO_AGRUPAR segundos crea la fila (buffer de auditoría, con
+  bulk_create). Las siguientes solo se suman en memoria y un hilo flusher las
+  aplica a esa fila como ``cantidad`` y ``ultimo_acceso``.
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from core.buffer_auditoria import flush_auditoria, modo_async
+from core.models_auditoria_extendida import AuditoriaAccesoSensible
+from core.segundo_plano import FlusherPeriodico, PorProceso
+
+logger = logging.getLogger("django")
+
+PREFIJO = "acceso_sensible"
+
+# UMBRAL_MULTIPLE o más accesos previos en VENTANA_MULTIPLE segundos es acceso múltiple
+VENTANA_MULTIPLE = 300
+UMBRAL_MULTIPLE = 3
+
+# Flushes que una repetición espera a que exista la fila de su primer acceso
+INTENTOS_REPETICION = 5
+
+
+def _ventana_agrupar():
+    return getattr(settings, 'AUDITORIA_ACCESO_AGRUPAR', 60)
+
+
+def contar_acceso(usuario_id, content_type_id, object_id):
+    """Suma el acceso y retorna los de los últimos VENTANA_MULTIPLE segundos (incluido este)"""
+    ahora = time.time()
+    ventana = int(ahora // VENTANA_MULTIPLE)
+    base = f"{PREFIJO}:n:{usuario_id}:{content_type_id}:{object_id}"
+    actual = f"{base}:{ventana}"
+    try:
+        accesos = cache.incr(actual)
+    except ValueError:
+        accesos = 1 if cache.add(actual, 1, 2 * VENTANA_MULTIPLE) else cache.incr(actual)
+    anteriores = cache.get(f"{base}:{ventana - 1}") or 0
+    return accesos + anteriores * (1 - (ahora % VENTANA_MULTIPLE) / VENTANA_MULTIPLE)
+
+
+def primer_acceso(usuario_id, content_type_id, object_id):
+    """True si es la primera visualización del objeto por el usuario en la ventana de agrupación"""
+    return cache.add(f"{PREFIJO}:fila:{usuario_id}:{content_type_id}:{object_id}", 1, _ventana_agrupar())
+
+
+def alertar_una_vez(usuario_id, content_type_id, object_id):
+    """True una sola vez por VENTANA_MULTIPLE segundos para el mismo usuario y objeto"""
+    return cache.add(f"{PREFIJO}:alerta:{usuario_id}:{content_type_id}:{object_id}", 1, VENTANA_MULTIPLE)
+
+
+def _aplicar_repeticiones(clave, cantidad, momento, multiple):
+    """Suma las repeticiones a la fila más reciente del acceso. False si todavía no se escribió."""
+    usuario_id, content_type_id, object_id = clave
+    pk = (
+        AuditoriaAccesoSensible.objects.filter(
+            usuario_id=usuario_id,
+            content_type_id=content_type_id,
+            object_id=object_id,
+            timestamp__gte=momento - timedelta(seconds=_ventana_agrupar()),
+        )
+        .order_by('-timestamp')
+        .values_list('pk', flat=True)
+        .first()
+    )
+    if pk is None:
+        return False
+    cambios = {'cantidad': F('cantidad') + cantidad, 'ultimo_acceso': momento}
+    if multiple:
+        cambios['acceso_multiple'] = True
+    AuditoriaAccesoSensible.objects.filter(pk=pk).update(**cambios)
+    return True
+
+
+class AgrupadorRepeticiones(FlusherPeriodico):
+    """Repeticiones pendientes por (usuario, content_type, objeto) con flusher en segundo plano"""
+
+    nombre = 'accesos-flusher'
+
+    def __init__(self, flush_interval=2.0):
+        super().__init__(intervalo=flush_interval)
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def sumar(self, clave, momento, multiple=False):
+        self.iniciar()
+        with self._lock:
+            cantidad, _, previo, intentos = self._pendientes.get(clave, (0, None, False, 0))
+            self._pendientes[clave] = (cantidad + 1, momento, previo or multiple, intentos)
+
+    def flush(self):
+        """Aplica las repeticiones acumuladas. Retorna la cantidad de filas actualizadas."""
+        with self._flush_lock:
+            with self._lock:
+                pendientes, self._pendientes = self._pendientes, {}
+            aplicadas = 0
+            for clave, (cantidad, momento, multiple, intentos) in pendientes.items():
+                if _aplicar_repeticiones(clave, cantidad, momento, multiple):
+                    aplicadas += 1
+                elif intentos + 1 < INTENTOS_REPETICION:
+                    self._reincorporar(clave, cantidad, momento, multiple, intentos + 1)
+                else:
+                    logger.warning(f"Sin registro de acceso sensible para {clave}: descartadas {cantidad} repeticiones")
+            return aplicadas
+
+    def _reincorporar(self, clave, cantidad, momento, multiple, intentos):
+        with self._lock:
+            actual = self._pendientes.get(clave)
+            if actual is None:
+                self._pendientes[clave] = (cantidad, momento, multiple, intentos)
+            else:
+                self._pendientes[clave] = (actual[0] + cantidad, actual[1], actual[2] or multiple, intentos)
+
+    def vaciar(self):
+        # Primero las filas de los primeros accesos que sigan en el buffer
+        flush_auditoria()
+        self.flush()
+
+
+# Agrupador del proceso. Espera un flush del buffer de auditoría para que la fila del primer acceso ya exista.
+get_agrupador = PorProceso(lambda: AgrupadorRepeticiones(
+    flush_interval=2 * getattr(settings, 'AUDITORIA_FLUSH_INTERVAL', 2.0)
+))
+
+
+def registrar_repeticion(clave, momento, multiple=False):
+    """Suma una visualización repetida a la fila del primer acceso (inmediato en modo sync)"""
+    if not modo_async():
+        _aplicar_repeticiones(clave, 1, momento, multiple)
+        return
+    get_agrupador().sumar(clave, momento, multiple)
@@ -0,0 +1,148 @@
+"""
+Actividad de sesiones de usuario
+Sistema SEDRONAR - Última actividad sin un UPDATE por request
+
+SesionUsuarioMiddleware registra cada request autenticado en dos sorted sets
+de Redis, en un solo round-trip: ``sesiones`` (session_key -> epoch) y
+``usuarios`` (id -> epoch). Un hilo flusher pasa cada
+SESIONES_ACTIVIDAD_INTERVALO segundos la actividad acumulada a
+SesionUsuario.ultima_actividad con ``bulk_update`` y la quita del set; un lock
+en la cache hace que lo ejecute un solo worker por intervalo.
+
+El set ``usuarios`` es la fuente de los usuarios en línea (monitoreo, métrica
+"usuarios conectados" del dashboard) y de la presencia de operadores
+(conversaciones.presencia lo consulta al elegir operador).
+
+Sin Redis se actualiza la base directamente, como mucho una vez por
+SESIONES_ACTIVIDAD_INTERVALO segundos por sesión (marca en la cache).
+"""
+
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.models_auditoria import SesionUsuario
+from core.redis_pausable import RedisPausable
+from core.segundo_plano import FlusherPeriodico, PorProceso
+
+CLAVE_SESIONES = "sedronar:actividad:sesiones"
+CLAVE_USUARIOS = "sedronar:actividad:usuarios"
+CLAVE_FLUSH = "actividad_sesiones_flush"
+PREFIJO_ESCRITA = "actividad_sesion_escrita"
+
+# Segundos que se conserva la actividad de cada usuario en el set
+RETENCION_USUARIOS = 86400
+
+_redis = RedisPausable("Actividad de sesiones", "se escribe en la base de datos")
+
+
+def _intervalo():
+    return getattr(settings, 'SESIONES_ACTIVIDAD_INTERVALO', 60)
+
+
+def _en_linea():
+    return getattr(settings, 'SESIONES_EN_LINEA', 300)
+
+
+class ActividadSesiones:
+    """Registro de actividad por sesión y usuario, y consultas de usuarios en línea"""
+
+    @staticmethod
+    def registrar(session_key, usuario_id):
+        conexion = _redis.conexion()
+        if conexion is not None:
+            try:
+                ahora = time.time()
+                pipe = conexion.pipeline(transaction=False)
+                pipe.zadd(CLAVE_SESIONES, {session_key: ahora})
+                pipe.zadd(CLAVE_USUARIOS, {usuario_id: ahora})
+                pipe.execute()
+                get_flusher().iniciar()
+                return
+            except Exception as e:
+                _redis.pausar(e)
+
+        try:
+            escribir = cache.add(f"{PREFIJO_ESCRITA}:{session_key}", 1, _intervalo())
+        except Exception:
+            escribir = True
+        if escribir:
+            SesionUsuario.objects.filter(
+                session_key=session_key,
+                activa=True
+            ).update(ultima_actividad=timezone.now())
+
+    @staticmethod
+    def flush():
+        """Pasa a SesionUsuario la actividad registrada en Redis. Retorna las sesiones actualizadas."""
+        conexion = _redis.conexion()
+        if conexion is None:
+            return 0
+        hasta = time.time()
+        try:
+            pares = conexion.zrangebyscore(CLAVE_SESIONES, '-inf', hasta, withscores=True)
+        except Exception as e:
+            _redis.pausar(e)
+            return 0
+
+        momentos = {
+            (clave.decode() if isinstance(clave, bytes) else clave): score
+            for clave, score in pares
+        }
+        actualizadas = 0
+        claves = list(momentos)
+        for inicio in range(0, len(claves), 500):
+            sesiones = list(
+                SesionUsuario.objects.filter(session_key__in=claves[inicio:inicio + 500], activa=True)
+                .only('pk', 'session_key')
+            )
+            for sesion in sesiones:
+                sesion.ultima_actividad = datetime.datetime.fromtimestamp(
+                    momentos[sesion.session_key], tz=datetime.timezone.utc
+                )
+            SesionUsuario.objects.bulk_update(sesiones, ['ultima_actividad'])
+            actualizadas += len(sesiones)
+
+        try:
+            pipe = conexion.pipeline(transaction=False)
+            pipe.zremrangebyscore(CLAVE_SESIONES, '-inf', hasta)
+            pipe.zremrangebyscore(CLAVE_USUARIOS, '-inf', hasta - RETENCION_USUARIOS)
+            pipe.execute()
+        except Exception as e:
+            _redis.pausar(e)
+        return actualizadas
+
+    @staticmethod
+    def usuarios_en_linea(segundos=None):
+        """Usuarios con actividad en los últimos ``segundos`` (SESIONES_EN_LINEA por defecto)"""
+        segundos = segundos or _en_linea()
+        conexion = _redis.conexion()
+        if conexion is not None:
+            try:
+                return conexion.zcount(CLAVE_USUARIOS, time.time() - segundos, '+inf')
+            except Exception as e:
+                _redis.pausar(e)
+        return SesionUsuario.objects.filter(
+            activa=True,
+            ultima_actividad__gte=timezone.now() - datetime.timedelta(seconds=segundos)
+        ).values('usuario').distinct().count()
+
+
+class FlusherActividad(FlusherPeriodico):
+    """Hilo que ejecuta ActividadSesiones.flush en un solo worker por intervalo"""
+
+    nombre = 'actividad-flusher'
+
+    def flush(self):
+        return ActividadSesiones.flush()
+
+    def ciclo(self):
+        if cache.add(CLAVE_FLUSH, 1, max(1, int(self.intervalo * 0.9))):
+            self.flush()
+
+
+# Flusher del proceso, creado a partir de settings
+get_flusher = PorProceso(lambda: FlusherActividad(intervalo=_intervalo()))
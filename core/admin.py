@@ -10,6 +10,8 @@ from core.models import (
     Turno,
     Institucion,
     DocumentoRequerido,
+    MarcaSincronizacion,
+    RelevamientoMirror,
 )
 from core.models_auditoria import LogAccion, LogDescargaArchivo, SesionUsuario, AlertaAuditoria
 from core.models_auditoria_extendida import (
@@ -261,10 +263,10 @@ class AuditoriaConsentimientoAdmin(admin.ModelAdmin):
 
 @admin.register(AuditoriaAccesoSensible)
 class AuditoriaAccesoSensibleAdmin(admin.ModelAdmin):
-    list_display = ('content_type', 'object_id', 'usuario', 'tipo_acceso', 'timestamp', 'fuera_horario', 'acceso_multiple')
+    list_display = ('content_type', 'object_id', 'usuario', 'tipo_acceso', 'timestamp', 'cantidad', 'fuera_horario', 'acceso_multiple')
     list_filter = ('tipo_acceso', 'fuera_horario', 'acceso_multiple', 'timestamp')
     search_fields = ('usuario__username', 'object_id')
-    readonly_fields = ('content_type', 'object_id', 'usuario', 'tipo_acceso', 'campos_accedidos', 'ip_address', 'user_agent', 'timestamp', 'justificacion', 'url_acceso', 'metodo_http')
+    readonly_fields = ('content_type', 'object_id', 'usuario', 'tipo_acceso', 'campos_accedidos', 'ip_address', 'user_agent', 'timestamp', 'justificacion', 'url_acceso', 'metodo_http', 'cantidad', 'ultimo_acceso')
     ordering = ('-timestamp',)
     date_hierarchy = 'timestamp'
     
@@ -334,3 +336,23 @@ class OperacionMasivaAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return False
+
+
+@admin.register(RelevamientoMirror)
+class RelevamientoMirrorAdmin(admin.ModelAdmin):
+    list_display = ('responsable_apellido', 'responsable_nombre', 'responsable_dni', 'institucion_nombre', 'created_at', 'deleted_at', 'sincronizado')
+    list_filter = ('sync_estado',)
+    search_fields = ('responsable_dni', 'busqueda')
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MarcaSincronizacion)
+class MarcaSincronizacionAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'updated_at', 'ultimo_id', 'ultima_ejecucion', 'ultimo_error')
+    readonly_fields = ('ultima_ejecucion', 'ultimo_error')
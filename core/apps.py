@@ -6,7 +6,10 @@ class CoreConfig(AppConfig):
     name = "core"
 
     def ready(self):
-        """Importa las señales de cache y auditoría cuando la app está lista."""
+        """Importa las señales de cache y auditoría y conecta los contadores de versión."""
         import core.cache_utils  # noqa: F401, pylint: disable=import-outside-toplevel,unused-import
         import core.signals_auditoria  # noqa: F401, pylint: disable=import-outside-toplevel,unused-import
         import core.signals_auditoria_historial  # noqa: F401, pylint: disable=import-outside-toplevel,unused-import
+        from core.etag_versionado import MODELOS_VERSIONADOS, versionar  # pylint: disable=import-outside-toplevel
+
+        versionar(*MODELOS_VERSIONADOS)
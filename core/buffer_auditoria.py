@@ -0,0 +1,291 @@
+"""
+Buffer asíncrono de auditoría
+Sistema SEDRONAR - Escritura por lotes de registros de auditoría
+
+Los signals de auditoría encolan registros compactos (modelo + valores de
+campos) en lugar de ejecutar INSERTs dentro de la request. Un hilo flusher
+los agrupa por modelo y los persiste con ``bulk_create``.
+
+La hora del evento se toma en ``registrar()`` (campos con default
+``timezone.now``), no al escribir: el flush puede demorarse con la cola llena.
+Si la base no responde (OperationalError / InterfaceError) el lote vuelve a la
+cola, hasta AUDITORIA_REINTENTOS veces; solo se descartan los registros
+inválidos (IntegrityError y similares).
+
+Configuración (settings):
+    AUDITORIA_MODO            "async" (buffer + flusher) o "sync" (INSERT inmediato)
+    AUDITORIA_BUFFER_MAX      tamaño máximo de la cola en memoria
+    AUDITORIA_BATCH_SIZE      registros por bulk_create
+    AUDITORIA_FLUSH_INTERVAL  segundos entre flushes
+    AUDITORIA_BACKPRESSURE    política con cola llena: "sync", "block" o "drop"
+    AUDITORIA_REINTENTOS      flushes que se reintenta un lote ante errores de conexión
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, models, transaction
+from django.utils import timezone
+
+from core.segundo_plano import FlusherPeriodico, PorProceso
+
+logger = logging.getLogger("django")
+
+
+class BufferAuditoria(FlusherPeriodico):
+    """Cola acotada de registros de auditoría con flusher en segundo plano"""
+
+    nombre = 'auditoria-flusher'
+
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=2.0, backpressure='sync', reintentos=5):
+        super().__init__(intervalo=flush_interval)
+        self.batch_size = batch_size
+        self.backpressure = backpressure
+        self.reintentos = reintentos
+        self._cola = queue.Queue(maxsize=max_size)
+        # Registros que fallaron por la conexión: se toman antes que la cola en el próximo flush
+        self._reintentar = deque()
+        self._flush_lock = threading.Lock()
+        self.stats = {
+            'encolados': 0,
+            'escritos': 0,
+            'descartados': 0,
+            'escritos_sync': 0,
+            'errores': 0,
+            'reintentos': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Productores
+    # ------------------------------------------------------------------
+
+    def encolar(self, modelo, valores):
+        """Encola un registro; aplica la política de backpressure si la cola está llena"""
+        self.iniciar()
+        registro = (modelo, valores, 0)
+
+        try:
+            self._cola.put_nowait(registro)
+            self.stats['encolados'] += 1
+            return
+        except queue.Full:
+            pass
+
+        if self.backpressure == 'block':
+            try:
+                self._cola.put(registro, timeout=self.intervalo)
+                self.stats['encolados'] += 1
+                return
+            except queue.Full:
+                pass
+        elif self.backpressure == 'drop':
+            self.stats['descartados'] += 1
+            logger.warning(f"Buffer de auditoría lleno: descartado registro de {modelo.__name__}")
+            return
+
+        # Política "sync" (o "block" agotado): escribir en línea para no perder el registro
+        self.stats['escritos_sync'] += 1
+        _escribir_registro(modelo, valores)
+
+    # ------------------------------------------------------------------
+    # Consumidor
+    # ------------------------------------------------------------------
+
+    def flush(self):
+        """Vacía la cola y persiste los registros agrupados por modelo. Retorna la cantidad escrita."""
+        with self._flush_lock:
+            # Lo que vuelva a fallar por la conexión queda para el próximo flush
+            reintentar, self._reintentar = self._reintentar, deque()
+            total = 0
+            while True:
+                lote = self._tomar_lote(reintentar)
+                if not lote:
+                    break
+                escritos, sin_conexion = self._escribir_lote(lote)
+                total += escritos
+                if sin_conexion:
+                    # La base no responde: no seguir vaciando la cola en un loop de errores
+                    self._reintentar.extend(reintentar)
+                    break
+            return total
+
+    def _tomar_lote(self, reintentar):
+        lote = []
+        while len(lote) < self.batch_size and reintentar:
+            lote.append(reintentar.popleft())
+        while len(lote) < self.batch_size:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir_lote(self, lote):
+        """Retorna (registros escritos, True si hubo errores de conexión)"""
+        por_modelo = defaultdict(list)
+        for registro in lote:
+            modelo, valores, _ = registro
+            por_modelo[modelo].append((modelo(**valores), registro))
+
+        escritos = 0
+        sin_conexion = False
+        for modelo, filas in por_modelo.items():
+            try:
+                modelo.objects.bulk_create([obj for obj, _ in filas], batch_size=self.batch_size)
+                escritos += len(filas)
+                continue
+            except (OperationalError, InterfaceError) as e:
+                self._reencolar([registro for _, registro in filas], e)
+                sin_conexion = True
+                continue
+            except Exception as e:
+                # Un registro inválido no debe perder el lote completo
+                logger.warning(f"bulk_create de {modelo.__name__} falló ({e}); reintentando uno a uno")
+            for obj, registro in filas:
+                try:
+                    obj.save(force_insert=True)
+                    escritos += 1
+                except (OperationalError, InterfaceError) as e_obj:
+                    self._reencolar([registro], e_obj)
+                    sin_conexion = True
+                except Exception as e_obj:
+                    self.stats['errores'] += 1
+                    logger.error(f"Registro de auditoría {modelo.__name__} descartado: {e_obj}")
+
+        self.stats['escritos'] += escritos
+        return escritos, sin_conexion
+
+    def _reencolar(self, registros, error):
+        """Devuelve registros al próximo flush; descarta los que agotaron los reintentos"""
+        for modelo, valores, intentos in registros:
+            if intentos < self.reintentos:
+                self._reintentar.append((modelo, valores, intentos + 1))
+                self.stats['reintentos'] += 1
+            else:
+                self.stats['errores'] += 1
+                logger.error(
+                    f"Registro de auditoría {modelo.__name__} descartado tras {intentos + 1} intentos: {error}"
+                )
+
+    def pendientes(self):
+        return self._cola.qsize() + len(self._reintentar)
+
+
+def _escribir_registro(modelo, valores):
+    modelo.objects.create(**valores)
+
+
+def _compactar(valores):
+    """Reemplaza instancias de modelos por su PK para no retener objetos en la cola"""
+    compactos = {}
+    for campo, valor in valores.items():
+        if isinstance(valor, models.Model):
+            compactos[f'{campo}_id'] = valor.pk
+        else:
+            compactos[campo] = valor
+    return compactos
+
+
+# Buffer del proceso, creado a partir de settings
+get_buffer = PorProceso(lambda: BufferAuditoria(
+    max_size=getattr(settings, 'AUDITORIA_BUFFER_MAX', 10000),
+    batch_size=getattr(settings, 'AUDITORIA_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'AUDITORIA_FLUSH_INTERVAL', 2.0),
+    backpressure=getattr(settings, 'AUDITORIA_BACKPRESSURE', 'sync'),
+    reintentos=getattr(settings, 'AUDITORIA_REINTENTOS', 5),
+))
+
+
+@lru_cache(maxsize=None)
+def _campos_momento(modelo):
+    """Campos de fecha del modelo cuyo default es timezone.now (hora del evento)"""
+    return tuple(
+        campo.attname for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'default', None) is timezone.now
+    )
+
+
+def modo_async():
+    return getattr(settings, 'AUDITORIA_MODO', 'sync') == 'async'
+
+
+def registrar(modelo, /, **valores):
+    """
+    Registra una fila de auditoría.
+
+    En modo "async" la fila se encola recién cuando la transacción actual
+    confirma, de modo que un rollback no deja auditoría de cambios que no
+    ocurrieron. En modo "sync" se inserta inmediatamente.
+
+    Los campos con default ``timezone.now`` se fijan aquí con la hora del
+    evento, no la del flush.
+    """
+    ahora = timezone.now()
+    for campo in _campos_momento(modelo):
+        valores.setdefault(campo, ahora)
+
+    if not modo_async():
+        _escribir_registro(modelo, valores)
+        return
+
+    compactos = _compactar(valores)
+    transaction.on_commit(lambda: get_buffer().encolar(modelo, compactos))
+
+
+def registrar_lote(modelo, filas, /):
+    """
+    Registra varias filas de auditoría de un cambio aplicado en bloque
+    (bulk_create/update no emiten los signals que auditan de a una).
+
+    En modo "sync" se insertan con un ``bulk_create``; en "async" se encolan
+    al confirmar la transacción, igual que ``registrar``.
+    """
+    if not filas:
+        return
+    ahora = timezone.now()
+    campos = _campos_momento(modelo)
+    for valores in filas:
+        for campo in campos:
+            valores.setdefault(campo, ahora)
+
+    if not modo_async():
+        modelo.objects.bulk_create(
+            [modelo(**valores) for valores in filas],
+            batch_size=getattr(settings, 'AUDITORIA_BATCH_SIZE', 500),
+        )
+        return
+
+    compactos = [_compactar(valores) for valores in filas]
+
+    def encolar():
+        buffer = get_buffer()
+        for valores in compactos:
+            buffer.encolar(modelo, valores)
+
+    transaction.on_commit(encolar)
+
+
+def flush_auditoria():
+    """Fuerza la escritura de los registros pendientes (tests, comandos, shutdown)"""
+    buffer = get_buffer.existente()
+    if buffer is None:
+        return 0
+    return buffer.flush()
+
+
+def estadisticas_auditoria():
+    """Contadores del buffer para monitoreo"""
+    buffer = get_buffer.existente()
+    if buffer is None:
+        return {'modo': 'async' if modo_async() else 'sync', 'pendientes': 0}
+    return {
+        'modo': 'async' if modo_async() else 'sync',
+        'pendientes': buffer.pendientes(),
+        'timestamp': time.time(),
+        **buffer.stats,
+    }
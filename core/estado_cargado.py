@@ -0,0 +1,136 @@
+"""
+Rastreo del estado cargado de instancias
+Sistema SEDRONAR - Detección de cambios sin re-consultar la base
+
+Los signals de auditoría, alertas e historial necesitan comparar los valores
+que se van a guardar con los que había en la base. En lugar de hacer un
+``Model.objects.get(pk=...)`` en cada pre_save, este módulo guarda una copia
+de los valores de campo cuando la instancia se construye desde la base
+(post_init) y la actualiza después de cada guardado (post_save).
+
+Uso en un pre_save:
+    anterior = estado_anterior(instance)   # dict attname -> valor, o None si es nueva
+    if anterior is not None and anterior['estado'] != instance.estado: ...
+
+El estado debe leerse en pre_save: el post_save del rastreador lo reemplaza
+por los valores recién guardados.
+"""
+
+import copy
+
+from django.db.models.signals import post_init, post_save
+
+ATRIBUTO_ESTADO = '_estado_cargado'
+ATRIBUTO_CONSULTADO = '_estado_cargado_consultado'
+
+_modelos_rastreados = set()
+
+
+def _valores_concretos(instance, campos=None):
+    """Valores por attname de los campos concretos presentes en la instancia"""
+    datos = instance.__dict__
+    valores = {}
+    for field in instance._meta.concrete_fields:
+        if campos is not None and field.name not in campos and field.attname not in campos:
+            continue
+        if field.attname in datos:
+            valor = datos[field.attname]
+            # JSONField: copiar para que una mutación in-place no altere el estado guardado
+            if isinstance(valor, (dict, list)):
+                valor = copy.deepcopy(valor)
+            valores[field.attname] = valor
+    return valores
+
+
+def _capturar_post_init(sender, instance, **kwargs):
+    instance.__dict__[ATRIBUTO_ESTADO] = _valores_concretos(instance)
+
+
+def _capturar_post_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if update_fields:
+        estado = instance.__dict__.setdefault(ATRIBUTO_ESTADO, {})
+        estado.update(_valores_concretos(instance, set(update_fields)))
+    else:
+        instance.__dict__[ATRIBUTO_ESTADO] = _valores_concretos(instance)
+
+
+def rastrear(*modelos):
+    """
+    Registra modelos (clase o "app_label.Modelo") para rastrear su estado cargado.
+    Es idempotente: varios módulos de signals pueden pedir el mismo modelo.
+    """
+    for modelo in modelos:
+        label = modelo if isinstance(modelo, str) else modelo._meta.label
+        if label in _modelos_rastreados:
+            continue
+        _modelos_rastreados.add(label)
+        post_init.connect(
+            _capturar_post_init, sender=label, weak=False,
+            dispatch_uid=f'estado_cargado_init_{label}'
+        )
+        post_save.connect(
+            _capturar_post_save, sender=label, weak=False,
+            dispatch_uid=f'estado_cargado_save_{label}'
+        )
+
+
+def estado_anterior(instance):
+    """
+    Retorna los valores persistidos de la instancia (attname -> valor) o None
+    si la instancia es nueva.
+
+    Sin consultas cuando la instancia vino de la base y se cargaron todos sus
+    campos. Si no (instancia construida a mano con pk, campos diferidos con
+    ``only()``/``defer()``), hace un único SELECT y lo deja cacheado en la
+    instancia para que el resto de los signals del mismo guardado lo reutilicen.
+    """
+    if instance.pk is None:
+        return None
+    if instance._state.adding and instance._meta.pk.has_default() and not instance.__dict__.get(ATRIBUTO_CONSULTADO):
+        # PK con default (UUID): igual que Model.save(), se asume INSERT sin consultar
+        return None
+
+    estado = instance.__dict__.get(ATRIBUTO_ESTADO)
+    completo = (
+        estado is not None
+        and (not instance._state.adding or instance.__dict__.get(ATRIBUTO_CONSULTADO))
+        and all(f.attname in estado for f in instance._meta.concrete_fields)
+    )
+    if completo:
+        return estado
+
+    model = type(instance)
+    try:
+        persistida = model._base_manager.using(instance._state.db or 'default').get(pk=instance.pk)
+    except model.DoesNotExist:
+        return None
+
+    estado = _valores_concretos(persistida)
+    instance.__dict__[ATRIBUTO_ESTADO] = estado
+    instance.__dict__[ATRIBUTO_CONSULTADO] = True
+    return estado
+
+
+def valor_anterior(instance, campo, default=None):
+    """Valor persistido de un campo (acepta name o attname); default si la instancia es nueva"""
+    estado = estado_anterior(instance)
+    if estado is None:
+        return default
+    field = instance._meta.get_field(campo)
+    return estado.get(field.attname, default)
+
+
+def estado_anterior_dict(instance):
+    """
+    Estado persistido con el mismo formato que ``signals_auditoria.modelo_a_dict``
+    (clave = nombre de campo, valores serializados a texto), o None si es nueva.
+    """
+    from core.signals_auditoria import serializar_valor
+
+    estado = estado_anterior(instance)
+    if estado is None:
+        return None
+    return {
+        field.name: serializar_valor(estado.get(field.attname))
+        for field in instance._meta.fields
+    }
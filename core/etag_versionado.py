@@ -0,0 +1,205 @@
+"""
+ETags por versión de modelos
+Sistema SEDRONAR - GET condicional sin ejecutar la vista
+
+Cada modelo versionado tiene un contador de generación en cache que se
+incrementa (al confirmar la transacción) en post_save/post_delete, o a mano con
+``invalidar_version`` después de operaciones masivas (update, bulk_create).
+
+Las vistas declaran de qué modelos dependen::
+
+    @login_required
+    @etag_versionado(Conversacion, ColaAsignacion, vigencia=60)
+    def api_metricas(request): ...
+
+    @etag_versionado(Ciudadano)
+    class CiudadanoViewSet(viewsets.ModelViewSet): ...
+
+EtagVersionadoMiddleware calcula el ETag antes de la vista (path + usuario +
+versiones + ventana de vigencia) y, si coincide con If-None-Match, responde 304
+sin tocar la base de datos. El ETag solo se emite en respuestas 200 y lleva el
+id de usuario, así un 304 únicamente confirma a quien ya recibió ese contenido.
+``vigencia`` (segundos) acota cuánto puede reutilizarse una respuesta que además
+depende del tiempo (conteos "de hoy", reglas por días sin contacto).
+"""
+
+import hashlib
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+logger = logging.getLogger("django")
+
+PREFIJO = "version_modelo"
+
+# Modelos versionados desde el arranque (CoreConfig.ready), así también los cambios
+# hechos fuera de requests (comandos, shell) invalidan. Las vistas pueden declarar
+# otros modelos: se conectan al importarse la vista.
+MODELOS_VERSIONADOS = [
+    'legajos.Ciudadano',
+    'legajos.LegajoAtencion',
+    'legajos.AlertaCiudadano',
+    'legajos.EvaluacionInicial',
+    'legajos.SeguimientoContacto',
+    'legajos.EventoCritico',
+    'legajos.Derivacion',
+    'legajos.Consentimiento',
+    'legajos.HistorialContacto',
+    'legajos.VinculoFamiliar',
+    'legajos.PlanIntervencion',
+    'conversaciones.Conversacion',
+    'conversaciones.ColaAsignacion',
+]
+
+
+def _clave(modelo):
+    return f"{PREFIJO}:{modelo._meta.label_lower}"
+
+
+def _modelo(modelo):
+    return apps.get_model(modelo) if isinstance(modelo, str) else modelo
+
+
+def versiones(modelos):
+    """Generación actual de cada modelo (una lectura de cache para todos)"""
+    claves = [_clave(modelo) for modelo in modelos]
+    actuales = cache.get_many(claves)
+    resultado = []
+    for clave in claves:
+        if clave not in actuales:
+            # Arranca en un valor basado en el reloj: si la clave se pierde (evicción,
+            # flush de Redis) no vuelve a una versión que ya emitió ETags
+            cache.add(clave, int(time.time() * 1000), timeout=None)
+            actuales[clave] = cache.get(clave)
+        resultado.append(actuales[clave])
+    return resultado
+
+
+def _incrementar(modelos):
+    for modelo in modelos:
+        clave = _clave(modelo)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.add(clave, int(time.time() * 1000), timeout=None)
+        except Exception as e:
+            logger.warning(f"No se pudo invalidar la versión de {modelo._meta.label}: {e}")
+
+
+def invalidar_version(*modelos):
+    """Incrementa la generación de los modelos cuando confirma la transacción actual"""
+    modelos = [_modelo(modelo) for modelo in modelos]
+    transaction.on_commit(lambda: _incrementar(modelos))
+
+
+def _al_cambiar(sender, raw=False, **kwargs):
+    if not raw:
+        invalidar_version(sender)
+
+
+def versionar(*modelos):
+    """Conecta post_save/post_delete de los modelos a su contador (idempotente)"""
+    for modelo in modelos:
+        modelo = _modelo(modelo)
+        uid = f"etag_versionado:{modelo._meta.label_lower}"
+        post_save.connect(_al_cambiar, sender=modelo, dispatch_uid=uid)
+        post_delete.connect(_al_cambiar, sender=modelo, dispatch_uid=uid)
+
+
+class EtagVersionado:
+    """Dependencias de una vista; se usa como decorador de funciones o de clases"""
+
+    def __init__(self, modelos, vigencia=None, por_usuario=True):
+        self.modelos = modelos
+        self.vigencia = vigencia
+        self.por_usuario = por_usuario
+        self._resueltos = None
+        if apps.ready:
+            self.modelos_resueltos()
+
+    def __call__(self, vista):
+        vista.etag_versionado = self
+        return vista
+
+    def modelos_resueltos(self):
+        if self._resueltos is None:
+            self._resueltos = [_modelo(modelo) for modelo in self.modelos]
+            versionar(*self._resueltos)
+        return self._resueltos
+
+    def etag(self, request):
+        partes = [
+            getattr(settings, 'ETAG_VERSION_APP', ''),
+            request.get_full_path(),
+            *map(str, versiones(self.modelos_resueltos())),
+        ]
+        if self.por_usuario:
+            user = getattr(request, 'user', None)
+            partes.append(str(user.pk) if user is not None and user.is_authenticated else 'anon')
+        if self.vigencia:
+            partes.append(str(int(time.time() // self.vigencia)))
+        digest = hashlib.blake2b('|'.join(partes).encode(), digest_size=12).hexdigest()
+        return f'W/"{digest}"'
+
+
+def etag_versionado(*modelos, vigencia=None, por_usuario=True):
+    """Declara los modelos (clases o 'app.Modelo') de los que depende la respuesta de la vista"""
+    return EtagVersionado(modelos, vigencia=vigencia, por_usuario=por_usuario)
+
+
+def _config_de_vista(view_func):
+    config = getattr(view_func, 'etag_versionado', None)
+    if config is None:
+        # Vistas basadas en clases (Django: view_class) y DRF (cls)
+        clase = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        config = getattr(clase, 'etag_versionado', None)
+    return config if isinstance(config, EtagVersionado) else None
+
+
+def _etags_de_request(request):
+    valor = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return {etag.strip().removeprefix('W/') for etag in valor.split(',') if etag.strip()}
+
+
+class EtagVersionadoMiddleware:
+    """Responde 304 antes de ejecutar la vista si las versiones de sus modelos no cambiaron"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        etag = getattr(request, '_etag_versionado', None)
+        if etag and response.status_code == 200 and not response.has_header('ETag'):
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Cookie',))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        config = _config_de_vista(view_func)
+        if config is None:
+            return None
+        try:
+            etag = config.etag(request)
+        except Exception as e:
+            logger.warning(f"ETag versionado no disponible: {e}")
+            return None
+
+        request._etag_versionado = etag
+        if etag.removeprefix('W/') in _etags_de_request(request):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return None
@@ -0,0 +1,273 @@
+"""
+Exportación CSV en streaming
+Sistema SEDRONAR - Exportaciones con memoria constante
+
+Una ``ExportacionCSV`` describe columnas como proyecciones de ``values_list``
+(sin instanciar modelos) y recorre el queryset por keyset sobre la PK en
+bloques de ``chunk_size`` filas. Con MySQL, ``.iterator()`` no evita que el
+driver cargue todo el resultado en memoria; el keyset sí: cada bloque es una
+query acotada ``WHERE pk > ultimo ORDER BY pk LIMIT n``.
+
+Salidas:
+    - ``streaming_response()``: StreamingHttpResponse (opcionalmente .csv.gz)
+    - ``escribir_archivo()``: exporta a disco (jobs en segundo plano y comandos)
+
+Los jobs en segundo plano escriben en EXPORTACIONES_ROOT, fuera de MEDIA_ROOT:
+los archivos solo se entregan por la vista de descarga, que verifica el
+usuario. Los archivos de más de JOB_CACHE_TIMEOUT se borran y un job sin
+latido por LATIDO_MAXIMO segundos (proceso reiniciado) pasa a ERROR.
+"""
+
+import csv
+import gzip
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+logger = logging.getLogger("django")
+
+CHUNK_SIZE = 2000
+JOB_CACHE_TIMEOUT = 60 * 60 * 24
+# Segundos sin progreso tras los que un job EN_CURSO se da por muerto
+LATIDO_MAXIMO = 300
+# Segundos entre barridos de archivos vencidos
+INTERVALO_LIMPIEZA = 60 * 60
+CLAVE_LIMPIEZA = 'exportaciones:limpieza'
+
+
+class Columna:
+    """Columna CSV: encabezado, campo para values_list y formateador opcional del valor crudo"""
+
+    def __init__(self, encabezado, campo, formato=None):
+        self.encabezado = encabezado
+        self.campo = campo
+        self.formato = formato
+
+    def valor(self, crudo):
+        if self.formato is not None:
+            return self.formato(crudo)
+        return '' if crudo is None else crudo
+
+
+def fmt_fecha(formato='%d/%m/%Y'):
+    """Formateador de fechas/datetimes; vacío si es None"""
+    def _formatear(valor):
+        return valor.strftime(formato) if valor else ''
+    return _formatear
+
+
+def fmt_choices(choices):
+    """Formateador que traduce el valor almacenado a su etiqueta de choices"""
+    etiquetas = dict(choices)
+
+    def _formatear(valor):
+        return etiquetas.get(valor, valor or '')
+    return _formatear
+
+
+def fmt_si_no(valor):
+    return 'Sí' if valor else 'No'
+
+
+class ExportacionCSV:
+    """Exportación de un queryset a CSV por bloques con keyset sobre la PK"""
+
+    def __init__(self, queryset, columnas, nombre_archivo, descendente=False, chunk_size=CHUNK_SIZE):
+        self.queryset = queryset.order_by()
+        self.columnas = columnas
+        self.nombre_archivo = nombre_archivo
+        self.descendente = descendente
+        self.chunk_size = chunk_size
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def filas(self):
+        """Genera las filas ya formateadas (listas de valores), bloque a bloque"""
+        campos = [c.campo for c in self.columnas]
+        orden = '-pk' if self.descendente else 'pk'
+        filtro_keyset = 'pk__lt' if self.descendente else 'pk__gt'
+        ultimo = None
+
+        while True:
+            bloque = self.queryset
+            if ultimo is not None:
+                bloque = bloque.filter(**{filtro_keyset: ultimo})
+            bloque = list(bloque.order_by(orden).values_list('pk', *campos)[:self.chunk_size])
+            if not bloque:
+                return
+            for pk, *valores in bloque:
+                yield [col.valor(v) for col, v in zip(self.columnas, valores)]
+            ultimo = bloque[-1][0]
+            if len(bloque) < self.chunk_size:
+                return
+
+    def bloques_csv(self):
+        """Genera el CSV como bloques de texto (encabezado + un bloque por chunk)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([c.encabezado for c in self.columnas])
+
+        pendientes = 0
+        for fila in self.filas():
+            writer.writerow(fila)
+            pendientes += 1
+            if pendientes >= self.chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pendientes = 0
+        yield buffer.getvalue()
+
+    # ------------------------------------------------------------------
+    # Salidas
+    # ------------------------------------------------------------------
+
+    def streaming_response(self, comprimir=False):
+        """StreamingHttpResponse; con comprimir=True entrega un .csv.gz generado al vuelo"""
+        if comprimir:
+            contenido = _gzip_stream(self.bloques_csv())
+            response = StreamingHttpResponse(contenido, content_type='application/gzip')
+            nombre = f'{self.nombre_archivo}.gz'
+        else:
+            contenido = (bloque.encode('utf-8') for bloque in self.bloques_csv())
+            response = StreamingHttpResponse(contenido, content_type='text/csv; charset=utf-8')
+            nombre = self.nombre_archivo
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
+
+    def escribir_archivo(self, ruta, comprimir=False, progreso=None):
+        """Escribe el CSV en disco. Retorna la cantidad de filas exportadas."""
+        apertura = gzip.open if comprimir else open
+        filas = 0
+        with apertura(ruta, 'wt', encoding='utf-8', newline='') as archivo:
+            writer = csv.writer(archivo)
+            writer.writerow([c.encabezado for c in self.columnas])
+            for fila in self.filas():
+                writer.writerow(fila)
+                filas += 1
+                if progreso is not None and filas % self.chunk_size == 0:
+                    progreso(filas)
+        return filas
+
+
+def _gzip_stream(bloques):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for bloque in bloques:
+        comprimido = compresor.compress(bloque.encode('utf-8'))
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+# ============================================================================
+# EXPORTACIONES EN SEGUNDO PLANO
+# ============================================================================
+
+def _clave_job(job_id):
+    return f'exportacion:{job_id}'
+
+
+def ruta_exportaciones():
+    directorio = str(settings.EXPORTACIONES_ROOT)
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def limpiar_exportaciones(antiguedad=JOB_CACHE_TIMEOUT):
+    """Borra los archivos exportados hace más de ``antiguedad`` segundos. Retorna la cantidad borrada."""
+    limite = time.time() - antiguedad
+    borrados = 0
+    with os.scandir(ruta_exportaciones()) as entradas:
+        for entrada in entradas:
+            try:
+                if entrada.is_file() and entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    borrados += 1
+            except OSError as e:
+                logger.warning(f"No se pudo borrar la exportación {entrada.name}: {e}")
+    return borrados
+
+
+def _limpiar_si_corresponde():
+    """Barrido de archivos vencidos, como mucho una vez por INTERVALO_LIMPIEZA entre todos los workers"""
+    try:
+        if cache.add(CLAVE_LIMPIEZA, 1, INTERVALO_LIMPIEZA):
+            limpiar_exportaciones()
+    except Exception as e:
+        logger.warning(f"Error limpiando exportaciones: {e}")
+
+
+def iniciar_exportacion(exportacion, usuario, comprimir=True):
+    """
+    Lanza la exportación en un hilo que escribe a EXPORTACIONES_ROOT.
+    El estado del job queda en cache (``estado_exportacion``). Retorna el id del job.
+    """
+    _limpiar_si_corresponde()
+    job_id = uuid.uuid4().hex
+    nombre = exportacion.nombre_archivo + ('.gz' if comprimir else '')
+    ruta = os.path.join(ruta_exportaciones(), f'{job_id}_{nombre}')
+    estado = {
+        'id': job_id,
+        'estado': 'PENDIENTE',
+        'usuario_id': usuario.pk,
+        'nombre': nombre,
+        'ruta': ruta,
+        'filas': 0,
+        'inicio': timezone.now().isoformat(),
+        'latido': time.time(),
+        'fin': None,
+        'error': '',
+    }
+    cache.set(_clave_job(job_id), estado, JOB_CACHE_TIMEOUT)
+
+    def _ejecutar():
+        def _progreso(filas):
+            estado.update(estado='EN_CURSO', filas=filas, latido=time.time())
+            cache.set(_clave_job(job_id), estado, JOB_CACHE_TIMEOUT)
+
+        try:
+            _progreso(0)
+            filas = exportacion.escribir_archivo(ruta, comprimir=comprimir, progreso=_progreso)
+            estado.update(estado='COMPLETADO', filas=filas)
+        except Exception as e:
+            logger.error(f"Error en exportación {job_id}: {e}", exc_info=True)
+            estado.update(estado='ERROR', error=str(e))
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        finally:
+            estado['fin'] = timezone.now().isoformat()
+            cache.set(_clave_job(job_id), estado, JOB_CACHE_TIMEOUT)
+            close_old_connections()
+
+    threading.Thread(target=_ejecutar, name=f'exportacion-{job_id}', daemon=True).start()
+    return job_id
+
+
+def estado_exportacion(job_id):
+    """Estado del job de exportación o None si no existe/expiró"""
+    estado = cache.get(_clave_job(job_id))
+    if (
+        estado is not None
+        and estado['estado'] in ('PENDIENTE', 'EN_CURSO')
+        and time.time() - estado.get('latido', 0) > LATIDO_MAXIMO
+    ):
+        # El hilo es daemon: si el proceso se reinició el job no va a terminar nunca
+        estado.update(
+            estado='ERROR',
+            error='La exportación se interrumpió; vuelva a iniciarla',
+            fin=timezone.now().isoformat(),
+        )
+        cache.set(_clave_job(job_id), estado, JOB_CACHE_TIMEOUT)
+    return estado
@@ -0,0 +1,57 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.buffer_auditoria import modo_async
+from core.signals_auditoria import MODELOS_AUDITADOS
+
+
+class Command(BaseCommand):
+    help = 'Cuenta las queries que dispara un save() de cada modelo auditado (los cambios se revierten)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Cantidad de saves consecutivos sobre la misma instancia')
+        parser.add_argument('--detalle', action='store_true',
+                            help='Mostrar el SQL de cada query')
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        modo = 'async' if modo_async() else 'sync'
+
+        self.stdout.write(f'=== QUERIES POR SAVE (auditoría {modo}) ===')
+        self.stdout.write(f'{"Modelo":<28}{"queries/save":>14}{"SELECT propios":>16}')
+
+        for label in MODELOS_AUDITADOS:
+            model = apps.get_model(label)
+            instancia = model.objects.order_by('pk').first()
+            if instancia is None:
+                self.stdout.write(f'{label:<28}{"sin datos":>14}')
+                continue
+
+            tabla = model._meta.db_table
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as ctx:
+                    for _ in range(repeticiones):
+                        instancia.save()
+                transaction.set_rollback(True)
+
+            queries = ctx.captured_queries
+            selects_propios = [
+                q for q in queries
+                if q['sql'].lstrip().upper().startswith('SELECT') and tabla in q['sql'].split(' WHERE ')[0]
+            ]
+            total = len(queries) / repeticiones
+            propios = len(selects_propios) / repeticiones
+            estilo = self.style.SUCCESS if propios == 0 else self.style.WARNING
+            self.stdout.write(estilo(f'{label:<28}{total:>14.1f}{propios:>16.1f}'))
+
+            if options['detalle']:
+                for q in queries:
+                    self.stdout.write(f'    {q["sql"][:160]}')
+
+        self.stdout.write(
+            '\n"SELECT propios" son lecturas de la propia tabla para detectar cambios; '
+            'con el rastreador de estado cargado deben ser 0.'
+        )
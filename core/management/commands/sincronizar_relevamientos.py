@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.services.relevamientos_mirror import TAMANO_PAGINA, SincronizacionRelevamientos
+
+
+class Command(BaseCommand):
+    help = (
+        'Sincroniza la copia local de relevamientos con Supabase trayendo solo los cambios '
+        'posteriores a la marca de agua. --completa vuelve a traer todo y elimina de la copia '
+        'lo borrado físicamente en Supabase; --intervalo deja el comando corriendo como worker'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completa', action='store_true',
+                            help='Ignorar la marca de agua y reconciliar toda la tabla')
+        parser.add_argument('--tamano-pagina', type=int, default=TAMANO_PAGINA,
+                            help='Filas por página pedida a Supabase')
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help='Segundos entre corridas (0 = una sola corrida)')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if not options['intervalo']:
+            try:
+                self._corrida(options['completa'], options['tamano_pagina'])
+            except Exception as e:
+                raise CommandError(f'Error sincronizando relevamientos: {e}')
+            return
+
+        self.stdout.write(f'Sincronizando relevamientos cada {options["intervalo"]}s...')
+        completa = options['completa']
+        while True:
+            close_old_connections()
+            try:
+                self._corrida(completa, options['tamano_pagina'])
+                completa = False
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Error sincronizando relevamientos: {e}'))
+            time.sleep(options['intervalo'])
+
+    def _corrida(self, completa, tamano_pagina):
+        inicio = time.monotonic()
+        progreso = None
+        if self.verbosity > 1:
+            progreso = lambda total: self.stdout.write(f'  {total} filas aplicadas')
+
+        aplicadas, borradas = SincronizacionRelevamientos.sincronizar(
+            completa=completa, tamano_pagina=tamano_pagina, progreso=progreso
+        )
+
+        duracion = time.monotonic() - inicio
+        if aplicadas or borradas or self.verbosity > 1:
+            self.stdout.write(self.style.SUCCESS(
+                f'{"Sincronización completa" if completa else "Cambios"}: {aplicadas} aplicadas, '
+                f'{borradas} borradas en {duracion:.1f}s'
+            ))
@@ -0,0 +1,267 @@
+"""
+Métricas de requests en proceso
+Sistema SEDRONAR - Histogramas de latencia por vista sin round-trips por request
+
+Cada worker acumula, por vista (``resolver_match.view_name``), un histograma de
+latencia con buckets fijos en escala logarítmica, contadores por clase de status
+y tiempo/cantidad de queries. El request solo incrementa enteros en memoria; un
+hilo flusher toma la tabla completa cada METRICAS_FLUSH_INTERVAL segundos (la
+reemplaza por una vacía, sin locks en el camino del request) y la suma en un hash
+de Redis por minuto, donde quedan combinados los datos de todos los workers.
+
+Los percentiles se estiman con el límite superior del bucket (error máximo del
+ancho de un bucket, ~19%).
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+from core.segundo_plano import FlusherPeriodico, PorProceso
+
+logger = logging.getLogger("django")
+
+PREFIJO = "sedronar:metricas"
+
+# Límites superiores de los buckets en segundos: 0.5 ms * 2^(i/4) hasta ~65 s
+LIMITES = [0.0005 * 2 ** (i / 4) for i in range(69)]
+INFINITO = len(LIMITES)
+
+# Minutos que se conserva cada hash en Redis
+RETENCION_MINUTOS = 60
+
+SIN_RUTA = '<sin_ruta>'
+
+_local = threading.local()
+
+
+class SerieVista:
+    """Acumulado de una vista: histograma de latencia, status y tiempo de base de datos"""
+
+    __slots__ = ('conteo', 'segundos', 'db_segundos', 'consultas', 'buckets', 'estados')
+
+    def __init__(self):
+        self.conteo = 0
+        self.segundos = 0.0
+        self.db_segundos = 0.0
+        self.consultas = 0
+        self.buckets = [0] * (INFINITO + 1)
+        self.estados = {}
+
+    def registrar(self, segundos, status, db_segundos, consultas):
+        self.conteo += 1
+        self.segundos += segundos
+        self.db_segundos += db_segundos
+        self.consultas += consultas
+        self.buckets[bisect_left(LIMITES, segundos)] += 1
+        clase = f'{status // 100}xx'
+        self.estados[clase] = self.estados.get(clase, 0) + 1
+
+    def sumar(self, otra):
+        self.conteo += otra.conteo
+        self.segundos += otra.segundos
+        self.db_segundos += otra.db_segundos
+        self.consultas += otra.consultas
+        for i, valor in enumerate(otra.buckets):
+            self.buckets[i] += valor
+        for clase, valor in otra.estados.items():
+            self.estados[clase] = self.estados.get(clase, 0) + valor
+
+    def campos(self, vista):
+        """Campos del hash de Redis (sin ceros)"""
+        campos = {
+            f'{vista}|conteo': self.conteo,
+            f'{vista}|segundos': self.segundos,
+            f'{vista}|db_segundos': self.db_segundos,
+            f'{vista}|consultas': self.consultas,
+        }
+        for i, valor in enumerate(self.buckets):
+            if valor:
+                campos[f'{vista}|b{i}'] = valor
+        for clase, valor in self.estados.items():
+            campos[f'{vista}|s{clase}'] = valor
+        return campos
+
+    def percentil(self, p):
+        """Latencia (segundos) bajo la que cae el ``p`` por ciento de los requests"""
+        if not self.conteo:
+            return None
+        objetivo = self.conteo * p / 100
+        acumulado = 0
+        for i, valor in enumerate(self.buckets):
+            acumulado += valor
+            if acumulado >= objetivo:
+                return LIMITES[i] if i < INFINITO else LIMITES[-1]
+        return LIMITES[-1]
+
+    def resumen(self, segundos_ventana):
+        def ms(valor):
+            return round(valor * 1000, 1) if valor is not None else None
+
+        errores = self.estados.get('5xx', 0)
+        return {
+            'requests': self.conteo,
+            'rps': round(self.conteo / segundos_ventana, 3),
+            'promedio_ms': ms(self.segundos / self.conteo) if self.conteo else None,
+            'p50_ms': ms(self.percentil(50)),
+            'p95_ms': ms(self.percentil(95)),
+            'p99_ms': ms(self.percentil(99)),
+            'db_promedio_ms': ms(self.db_segundos / self.conteo) if self.conteo else None,
+            'consultas_promedio': round(self.consultas / self.conteo, 2) if self.conteo else None,
+            'tasa_error': round(errores * 100 / self.conteo, 2) if self.conteo else 0,
+            'estados': dict(sorted(self.estados.items())),
+        }
+
+
+def _serie_desde_hash(valores):
+    """Series por vista a partir de los campos ``vista|campo`` de un hash de Redis"""
+    series = {}
+    for clave, valor in valores.items():
+        clave = clave.decode() if isinstance(clave, bytes) else clave
+        vista, _, campo = clave.rpartition('|')
+        serie = series.get(vista)
+        if serie is None:
+            serie = series[vista] = SerieVista()
+        if campo in ('segundos', 'db_segundos'):
+            setattr(serie, campo, getattr(serie, campo) + float(valor))
+        elif campo in ('conteo', 'consultas'):
+            setattr(serie, campo, getattr(serie, campo) + int(valor))
+        elif campo.startswith('b'):
+            serie.buckets[int(campo[1:])] += int(valor)
+        elif campo.startswith('s'):
+            serie.estados[campo[1:]] = serie.estados.get(campo[1:], 0) + int(valor)
+    return series
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+class ColectorMetricas(FlusherPeriodico):
+    """Tabla de series del worker y flusher periódico hacia Redis"""
+
+    nombre = 'metricas-flusher'
+
+    def __init__(self, flush_interval=5.0):
+        super().__init__(intervalo=flush_interval)
+        self.series = {}
+        self._flush_lock = threading.Lock()
+
+    def registrar(self, vista, segundos, status, db_segundos=0.0, consultas=0):
+        self.iniciar()
+        serie = self.series.get(vista)
+        if serie is None:
+            serie = self.series.setdefault(vista, SerieVista())
+        serie.registrar(segundos, status, db_segundos, consultas)
+
+    def flush(self):
+        """Suma la tabla acumulada en el hash del minuto actual. Retorna las vistas enviadas."""
+        with self._flush_lock:
+            series, self.series = self.series, {}
+            if not series:
+                return 0
+            clave = f'{PREFIJO}:{int(time.time() // 60)}'
+            try:
+                pipe = _redis().pipeline(transaction=False)
+                for vista, serie in series.items():
+                    for campo, valor in serie.campos(vista).items():
+                        if isinstance(valor, float):
+                            pipe.hincrbyfloat(clave, campo, valor)
+                        else:
+                            pipe.hincrby(clave, campo, valor)
+                pipe.expire(clave, RETENCION_MINUTOS * 60)
+                pipe.execute()
+            except Exception as e:
+                # Sin Redis los datos siguen acumulándose en el worker
+                logger.debug(f"No se pudieron enviar métricas a Redis: {e}")
+                self._reincorporar(series)
+                return 0
+            return len(series)
+
+    def _reincorporar(self, series):
+        for vista, serie in series.items():
+            actual = self.series.get(vista)
+            if actual is None:
+                self.series[vista] = serie
+            else:
+                actual.sumar(serie)
+
+    def combinadas(self, minutos=5):
+        """Series de todos los workers en los últimos ``minutos`` (más lo no enviado de este worker)"""
+        series = {}
+        actual = int(time.time() // 60)
+        try:
+            pipe = _redis().pipeline(transaction=False)
+            for minuto in range(actual - minutos + 1, actual + 1):
+                pipe.hgetall(f'{PREFIJO}:{minuto}')
+            for valores in pipe.execute():
+                for vista, serie in _serie_desde_hash(valores).items():
+                    series.setdefault(vista, SerieVista()).sumar(serie)
+        except Exception as e:
+            logger.debug(f"No se pudieron leer métricas de Redis: {e}")
+        for vista, serie in list(self.series.items()):
+            series.setdefault(vista, SerieVista()).sumar(serie)
+        return series
+
+
+# Colector del proceso, creado a partir de settings
+get_colector = PorProceso(lambda: ColectorMetricas(
+    flush_interval=getattr(settings, 'METRICAS_FLUSH_INTERVAL', 5.0),
+))
+
+
+def resumen_metricas(minutos=5):
+    """Resumen por vista y total de los últimos ``minutos``, ordenado por volumen"""
+    series = get_colector().combinadas(minutos)
+    total = SerieVista()
+    for serie in series.values():
+        total.sumar(serie)
+    ventana = minutos * 60
+    vistas = sorted(series.items(), key=lambda item: item[1].conteo, reverse=True)
+    return {
+        'minutos': minutos,
+        'total': total.resumen(ventana),
+        'vistas': {vista: serie.resumen(ventana) for vista, serie in vistas},
+    }
+
+
+def _medir_db(execute, sql, params, many, context):
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _local.db_segundos += time.perf_counter() - inicio
+        _local.consultas += 1
+
+
+class MetricasRequestMiddleware:
+    """Registra latencia, status y tiempo de base de datos de cada request en el colector"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.colector = get_colector()
+
+    def __call__(self, request):
+        _local.db_segundos = 0.0
+        _local.consultas = 0
+        inicio = time.perf_counter()
+        status = 500
+        try:
+            with connection.execute_wrapper(_medir_db):
+                response = self.get_response(request)
+            status = response.status_code
+        finally:
+            segundos = time.perf_counter() - inicio
+            match = getattr(request, 'resolver_match', None)
+            vista = match.view_name if match is not None else SIN_RUTA
+            self.colector.registrar(vista, segundos, status, _local.db_segundos, _local.consultas)
+
+        response['X-Response-Time'] = f"{segundos:.3f}s"
+        if hasattr(request, 'concurrencia_activos'):
+            response['X-Active-Requests'] = str(request.concurrencia_activos)
+        return response
@@ -7,6 +7,15 @@ from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.dispatch import receiver
 from django.utils import timezone
+from core.accesos_sensibles import (
+    UMBRAL_MULTIPLE,
+    alertar_una_vez,
+    contar_acceso,
+    primer_acceso,
+    registrar_repeticion,
+)
+from core.actividad_sesiones import ActividadSesiones
+from core.buffer_auditoria import registrar
 from core.signals_auditoria import set_current_request
 from core.models_auditoria import LogAccion, SesionUsuario
 from core.models_auditoria_extendida import AuditoriaAccesoSensible
@@ -33,87 +42,67 @@ class AuditoriaMiddleware(MiddlewareMixin):
 
 class AccesoSensibleMiddleware(MiddlewareMixin):
     """
-    Middleware que audita accesos a vistas con datos sensibles
-    """
+    Middleware que audita accesos a vistas con datos sensibles.
     
-    # Vistas que contienen datos sensibles
-    VISTAS_SENSIBLES = [
-        'legajos:detalle',
-        'legajos:ciudadano_detalle',
-        'legajos:evaluacion_detalle',
-        'legajos:evento_critico_detalle',
-        'legajos:consentimiento_detalle',
-    ]
+    La vista se identifica por ``resolver_match.view_name`` (Django ya resolvió
+    la URL) y el registro solo usa la cache: las visualizaciones repetidas se
+    agrupan en una fila y se escriben fuera del request (core.accesos_sensibles).
+    """
     
-    # Patrones de URL sensibles
-    PATRONES_SENSIBLES = [
-        '/legajos/ciudadano/',
-        '/legajos/legajo/',
-        '/legajos/evaluacion/',
-        '/legajos/evento/',
-        '/legajos/consentimiento/',
-    ]
+    # Vistas que contienen datos sensibles -> (app_label, model, kwarg de la URL con el id del objeto)
+    VISTAS_SENSIBLES = {
+        'legajos:detalle': ('legajos', 'legajoatencion', 'pk'),
+        'legajos:ciudadano_detalle': ('legajos', 'ciudadano', 'pk'),
+        # La evaluación inicial es 1-1 con el legajo y su URL solo trae el legajo
+        'legajos:evaluacion': ('legajos', 'legajoatencion', 'legajo_id'),
+        'legajos:evaluaciones': ('legajos', 'legajoatencion', 'legajo_id'),
+        'legajos:eventos': ('legajos', 'legajoatencion', 'legajo_id'),
+        'legajos:evento_editar': ('legajos', 'eventocritico', 'pk'),
+    }
     
     def process_view(self, request, view_func, view_args, view_kwargs):
         """
         Audita el acceso a vistas sensibles
         """
-        # Solo auditar usuarios autenticados
-        if not request.user.is_authenticated:
+        # Solo visualizaciones (GET) de usuarios autenticados
+        if request.method != 'GET' or not request.user.is_authenticated:
             return None
         
-        # Verificar si es una vista sensible
-        es_sensible = False
-        
-        # Verificar por nombre de vista
-        if hasattr(view_func, '__name__'):
-            for vista in self.VISTAS_SENSIBLES:
-                if vista in str(view_func.__name__):
-                    es_sensible = True
-                    break
-        
-        # Verificar por patrón de URL
-        if not es_sensible:
-            for patron in self.PATRONES_SENSIBLES:
-                if patron in request.path:
-                    es_sensible = True
-                    break
-        
-        # Si es sensible y es GET (visualización), auditar
-        if es_sensible and request.method == 'GET':
-            self._auditar_acceso(request, view_kwargs)
+        match = request.resolver_match
+        vista = self.VISTAS_SENSIBLES.get(match.view_name) if match else None
+        if vista:
+            app_label, model, kwarg = vista
+            self._auditar_acceso(request, (app_label, model), view_kwargs.get(kwarg))
         
         return None
     
-    def _auditar_acceso(self, request, view_kwargs):
+    def _auditar_acceso(self, request, modelo, object_id):
         """
-        Crea un registro de auditoría de acceso sensible
+        Registra el acceso: una fila por usuario y objeto en la ventana de agrupación
         """
         try:
-            # Determinar el objeto accedido
-            object_id = view_kwargs.get('pk') or view_kwargs.get('id')
             if not object_id:
                 return
             
-            # Determinar el tipo de contenido
-            content_type = self._determinar_content_type(request.path)
-            if not content_type:
-                return
+            # get_by_natural_key usa la cache de ContentTypeManager
+            content_type = ContentType.objects.get_by_natural_key(*modelo)
+            clave = (request.user.pk, content_type.pk, str(object_id))
+            ahora = timezone.now()
             
-            # Verificar si es fuera de horario
-            fuera_horario = self._es_fuera_horario()
+            acceso_multiple = contar_acceso(*clave) >= UMBRAL_MULTIPLE + 1
+            alertar_multiple = acceso_multiple and alertar_una_vez(*clave)
             
-            # Verificar accesos múltiples
-            acceso_multiple = self._verificar_acceso_multiple(
-                request.user,
-                content_type,
-                object_id
-            )
+            if not primer_acceso(*clave):
+                registrar_repeticion(clave, ahora, acceso_multiple)
+                if alertar_multiple:
+                    self._generar_alerta_acceso(request, False, True)
+                return
             
-            # Crear registro de auditoría
-            AuditoriaAccesoSensible.objects.create(
+            fuera_horario = self._es_fuera_horario()
+            registrar(
+                AuditoriaAccesoSensible,
                 content_type=content_type,
-                object_id=str(object_id),
+                object_id=clave[2],
                 usuario=request.user,
                 tipo_acceso='VIEW',
                 campos_accedidos=['all'],  # TODO: Especificar campos específicos
@@ -123,34 +112,18 @@ class AccesoSensibleMiddleware(MiddlewareMixin):
                 metodo_http=request.method,
                 justificacion=request.GET.get('justificacion', ''),
                 fuera_horario=fuera_horario,
-                acceso_multiple=acceso_multiple
+                acceso_multiple=acceso_multiple,
+                ultimo_acceso=ahora,
             )
             
             # Si es fuera de horario o acceso múltiple, generar alerta
-            if fuera_horario or acceso_multiple:
-                self._generar_alerta_acceso(request, fuera_horario, acceso_multiple)
+            if fuera_horario or alertar_multiple:
+                self._generar_alerta_acceso(request, fuera_horario, alertar_multiple)
         
         except Exception as e:
             # No interrumpir el flujo si falla la auditoría
             print(f"Error en auditoría de acceso: {e}")
     
-    def _determinar_content_type(self, path):
-        """Determina el ContentType basado en la URL"""
-        try:
-            if '/ciudadano/' in path:
-                return ContentType.objects.get(app_label='legajos', model='ciudadano')
-            elif '/legajo/' in path:
-                return ContentType.objects.get(app_label='legajos', model='legajoatencion')
-            elif '/evaluacion/' in path:
-                return ContentType.objects.get(app_label='legajos', model='evaluacioninicial')
-            elif '/evento/' in path:
-                return ContentType.objects.get(app_label='legajos', model='eventocritico')
-            elif '/consentimiento/' in path:
-                return ContentType.objects.get(app_label='legajos', model='consentimiento')
-        except ContentType.DoesNotExist:
-            pass
-        return None
-    
     def _get_client_ip(self, request):
         """Obtiene la IP del cliente"""
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -165,24 +138,6 @@ class AccesoSensibleMiddleware(MiddlewareMixin):
         hora_actual = datetime.now().time()
         return hora_actual >= time(22, 0) or hora_actual < time(6, 0)
     
-    def _verificar_acceso_multiple(self, usuario, content_type, object_id):
-        """
-        Verifica si hay múltiples accesos en corto tiempo (5 minutos)
-        """
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        hace_5_minutos = timezone.now() - timedelta(minutes=5)
-        
-        accesos_recientes = AuditoriaAccesoSensible.objects.filter(
-            usuario=usuario,
-            content_type=content_type,
-            object_id=str(object_id),
-            timestamp__gte=hace_5_minutos
-        ).count()
-        
-        return accesos_recientes >= 3
-    
     def _generar_alerta_acceso(self, request, fuera_horario, acceso_multiple):
         """Genera alerta de auditoría por acceso sospechoso"""
         from core.models_auditoria import AlertaAuditoria
@@ -196,7 +151,8 @@ class AccesoSensibleMiddleware(MiddlewareMixin):
         if acceso_multiple:
             descripcion = f'Múltiples accesos a datos sensibles en corto tiempo'
         
-        AlertaAuditoria.objects.create(
+        registrar(
+            AlertaAuditoria,
             tipo=tipo_alerta,
             severidad=severidad,
             usuario_afectado=request.user,
@@ -326,19 +282,13 @@ class SesionUsuarioMiddleware(MiddlewareMixin):
         return None
     
     def _actualizar_sesion(self, request):
-        """Actualiza la última actividad de la sesión"""
-        from core.models_auditoria import SesionUsuario
-        from django.utils import timezone
-        
+        """Registra la actividad de la sesión (Redis; la base se actualiza por lotes)"""
         try:
             session_key = request.session.session_key
             if not session_key:
                 return
             
-            SesionUsuario.objects.filter(
-                session_key=session_key,
-                activa=True
-            ).update(ultima_actividad=timezone.now())
+            ActividadSesiones.registrar(session_key, request.user.pk)
         
         except Exception as e:
             print(f"Error actualizando sesión: {e}")
@@ -1,75 +1,404 @@
-import time
-import threading
+"""
+Control de admisión por concurrencia
+Sistema SEDRONAR - Límite de requests simultáneos entre todos los workers
+
+Cada clase de ruta (api, html, ws, espera) tiene su propio límite global. Los
+long-poll (``?esperar=``) quedan abiertos hasta MENSAJES_LONG_POLL_MAX segundos:
+van a la clase ``espera`` para no ocupar los lugares de las páginas. El conteo
+global vive en un hash de Redis con un campo por worker: un script Lua suma los
+campos y reserva el lugar atómicamente (un round-trip al entrar y un HINCRBY al
+salir). Cada worker lleva además su contador local, que es la fuente de verdad:
+periódicamente reescribe su campo y elimina los de workers muertos (sin latido),
+así el contador global no deriva aunque un worker se caiga con requests activos.
+
+Sin lugar libre, el request espera en una cola corta (CONCURRENCIA_ESPERA_MS,
+hasta CONCURRENCIA_COLA_MAX en espera por worker) antes de responder 503. Si Redis
+no responde se aplica solo el límite local del worker.
+
+Bajo ASGI (daphne) el middleware corre en modo async: la espera usa
+``asyncio.sleep`` y las llamadas a Redis van a hilos aparte, sin ocupar el
+executor thread-sensitive de Django. Un hilo de latido reescribe el campo de
+cada worker con requests o conexiones activas aunque no entren nuevos, y
+``liberar`` nunca deja un campo por debajo de 0.
+"""
+
+import asyncio
 import logging
-from django.core.cache import cache
-from django.http import HttpResponse
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from core.redis_pausable import RedisPausable
+from core.segundo_plano import FlusherPeriodico
 
 logger = logging.getLogger(__name__)
 
-class ConcurrencyLimitMiddleware:
-    """Middleware para controlar concurrencia y evitar sobrecarga"""
-    
-    def __init__(self, get_response):
-        self.get_response = get_response
-        self.active_requests = threading.local()
-        
-    def __call__(self, request):
+PREFIJO = "sedronar:concurrencia"
+
+# Intervalo para reintentar un lugar global mientras se espera
+INTERVALO_REINTENTO = 0.02
+
+RUTAS_EXENTAS = ('/health/', '/static/', '/media/')
+
+SCRIPT_ADQUIRIR = """
+local total = 0
+for _, valor in ipairs(redis.call('HVALS', KEYS[1])) do
+    total = total + tonumber(valor)
+end
+if total >= tonumber(ARGV[2]) then
+    return -total
+end
+redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+return total + 1
+"""
+
+# Si el campo se borró por falta de latido, el -1 no debe dejarlo negativo
+SCRIPT_LIBERAR = """
+local valor = redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+if valor < 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], 0)
+    return 0
+end
+return valor
+"""
+
+SCRIPT_RECONCILIAR = """
+redis.call('SET', ARGV[3] .. ARGV[1], 1, 'EX', ARGV[4])
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+for _, worker in ipairs(redis.call('HKEYS', KEYS[1])) do
+    if worker ~= ARGV[1] and redis.call('EXISTS', ARGV[3] .. worker) == 0 then
+        redis.call('HDEL', KEYS[1], worker)
+    end
+end
+return 1
+"""
+
+Permiso = namedtuple('Permiso', 'total en_redis')
+
+_redis = RedisPausable(
+    "Control de concurrencia", "solo límite local",
+    scripts=(SCRIPT_ADQUIRIR, SCRIPT_RECONCILIAR, SCRIPT_LIBERAR),
+)
+
+
+def _worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LimitadorConcurrencia:
+    """Semáforo global (Redis) + local (worker) para una clase de ruta"""
+
+    def __init__(self, clase, limite, limite_local, espera, cola_max, reconciliar):
+        self.clase = clase
+        self.clave = f"{PREFIJO}:{clase}"
+        self.limite = limite
+        self.limite_local = limite_local
+        self.espera = espera
+        self.cola_max = cola_max
+        self.reconciliar = reconciliar
+        self.activos = 0
+        self.en_espera = 0
+        self._cond = threading.Condition()
+        self._proxima_reconciliacion = 0.0
+        self.stats = {
+            'admitidos': 0,
+            'admitidos_tras_espera': 0,
+            'rechazados': 0,
+            'rechazados_cola_llena': 0,
+            'segundos_espera': 0.0,
+            'sin_redis': 0,
+        }
+
+    def adquirir(self, espera=None):
+        """Permiso para atender el request, o None si hay que rechazarlo"""
+        permiso = self._intentar()
+        if permiso is not None:
+            self.stats['admitidos'] += 1
+            return permiso
+
+        espera = self.espera if espera is None else espera
+        if not self._entrar_en_espera(espera):
+            return None
+
+        inicio = time.monotonic()
         try:
-            current_load = cache.get('active_requests', 0)
-            
-            if current_load > 1500:
-                logger.warning(f"Sistema sobrecargado: {current_load} requests activos")
-                return HttpResponse(
-                    "Sistema temporalmente sobrecargado. Intente en unos segundos.",
-                    status=503
-                )
-            
-            cache.set('active_requests', current_load + 1, 60)
-            
-            try:
-                response = self.get_response(request)
-            finally:
+            while True:
+                restante = inicio + espera - time.monotonic()
+                if restante <= 0:
+                    self.stats['rechazados'] += 1
+                    return None
+                # Despierta al liberarse un lugar local; los globales se reintentan por tiempo
+                with self._cond:
+                    self._cond.wait(min(restante, INTERVALO_REINTENTO))
+                permiso = self._intentar()
+                if permiso is not None:
+                    self._admitido_tras_espera(inicio)
+                    return permiso
+        finally:
+            self._salir_de_espera()
+
+    async def adquirir_async(self, espera=None):
+        """Como ``adquirir`` pero espera con asyncio.sleep, sin bloquear el event loop ni el executor"""
+        intentar = sync_to_async(self._intentar, thread_sensitive=False)
+        permiso = await intentar()
+        if permiso is not None:
+            self.stats['admitidos'] += 1
+            return permiso
+
+        espera = self.espera if espera is None else espera
+        if not self._entrar_en_espera(espera):
+            return None
+
+        inicio = time.monotonic()
+        try:
+            while True:
+                restante = inicio + espera - time.monotonic()
+                if restante <= 0:
+                    self.stats['rechazados'] += 1
+                    return None
+                await asyncio.sleep(min(restante, INTERVALO_REINTENTO))
+                permiso = await intentar()
+                if permiso is not None:
+                    self._admitido_tras_espera(inicio)
+                    return permiso
+        finally:
+            self._salir_de_espera()
+
+    def _entrar_en_espera(self, espera):
+        with self._cond:
+            if espera <= 0 or self.en_espera >= self.cola_max:
+                self.stats['rechazados_cola_llena' if espera > 0 else 'rechazados'] += 1
+                return False
+            self.en_espera += 1
+            return True
+
+    def _salir_de_espera(self):
+        with self._cond:
+            self.en_espera -= 1
+
+    def _admitido_tras_espera(self, inicio):
+        self.stats['admitidos_tras_espera'] += 1
+        self.stats['segundos_espera'] += time.monotonic() - inicio
+
+    def liberar(self, permiso):
+        with self._cond:
+            self.activos -= 1
+            self._cond.notify()
+        if permiso.en_redis:
+            conexion = _redis.conexion()
+            if conexion is not None:
                 try:
-                    current_load = cache.get('active_requests', 1)
-                    cache.set('active_requests', max(0, current_load - 1), 60)
+                    _redis.scripts[2](keys=[self.clave], args=[_worker_id()])
                 except Exception as e:
-                    logger.error(f"Error decrementando contador: {e}")
-            
-            return response
+                    _redis.pausar(e)
+
+    def _intentar(self):
+        with self._cond:
+            if self.activos >= self.limite_local:
+                return None
+            self.activos += 1
+
+        total = self._reservar_global()
+        if total is None:
+            with self._cond:
+                self.activos -= 1
+                self._cond.notify()
+            return None
+        return total
+
+    def _reservar_global(self):
+        """Permiso con el total global, None si el límite global está completo"""
+        conexion = _redis.conexion()
+        if conexion is not None:
+            try:
+                self._reconciliar_si_corresponde()
+                total = _redis.scripts[0](keys=[self.clave], args=[_worker_id(), self.limite])
+                if total < 0:
+                    return None
+                return Permiso(total, True)
+            except Exception as e:
+                _redis.pausar(e)
+        self.stats['sin_redis'] += 1
+        return Permiso(self.activos, False)
+
+    def _reconciliar_si_corresponde(self):
+        """Reescribe el campo de este worker con el contador local y limpia workers muertos"""
+        ahora = time.monotonic()
+        if ahora < self._proxima_reconciliacion:
+            return
+        self._proxima_reconciliacion = ahora + self.reconciliar
+        _redis.scripts[1](
+            keys=[self.clave],
+            args=[_worker_id(), self.activos, f"{PREFIJO}:latido:{self.clase}:", int(self.reconciliar * 3)],
+        )
+
+    def latir(self):
+        """Latido desde el hilo de fondo: mantiene vivo el campo del worker mientras tenga activos"""
+        if self.activos <= 0 or _redis.conexion() is None:
+            return
+        try:
+            self._reconciliar_si_corresponde()
         except Exception as e:
-            logger.error(f"Error en ConcurrencyLimitMiddleware: {e}", exc_info=True)
-            return self.get_response(request)
+            _redis.pausar(e)
+
+    def total_global(self):
+        conexion = _redis.conexion()
+        if conexion is None:
+            return None
+        try:
+            return sum(int(v) for v in conexion.hvals(self.clave))
+        except Exception as e:
+            _redis.pausar(e)
+            return None
+
+    def estado(self):
+        return {
+            'limite': self.limite,
+            'limite_local': self.limite_local,
+            'activos_worker': self.activos,
+            'en_espera_worker': self.en_espera,
+            'activos_global': self.total_global(),
+            **self.stats,
+        }
+
+
+_limitadores = {}
+_limitadores_lock = threading.Lock()
+
+
+class LatidoConcurrencia(FlusherPeriodico):
+    """Refresca el latido de los limitadores: un worker inactivo con WS/SSE abiertos no pierde su campo"""
+
+    nombre = 'concurrencia-latido'
+
+    def flush(self):
+        for limitador in list(_limitadores.values()):
+            limitador.latir()
+
+    def vaciar(self):
+        pass
+
+
+_latido = LatidoConcurrencia(intervalo=getattr(settings, 'CONCURRENCIA_RECONCILIAR', 10))
+
+
+def obtener_limitador(clase):
+    limitador = _limitadores.get(clase)
+    if limitador is None:
+        with _limitadores_lock:
+            limitador = _limitadores.get(clase)
+            if limitador is None:
+                limitador = LimitadorConcurrencia(
+                    clase,
+                    limite=getattr(settings, f'CONCURRENCIA_LIMITE_{clase.upper()}', 1000),
+                    limite_local=getattr(settings, 'CONCURRENCIA_LIMITE_LOCAL', 500),
+                    espera=getattr(settings, 'CONCURRENCIA_ESPERA_MS', 250) / 1000,
+                    cola_max=getattr(settings, 'CONCURRENCIA_COLA_MAX', 100),
+                    reconciliar=getattr(settings, 'CONCURRENCIA_RECONCILIAR', 10),
+                )
+                _limitadores[clase] = limitador
+                _latido.iniciar()
+    return limitador
+
+
+def estado_concurrencia():
+    """Métricas de admisión de este worker y totales globales, por clase de ruta"""
+    return {
+        'worker': _worker_id(),
+        'clases': {clase: obtener_limitador(clase).estado() for clase in ('api', 'html', 'ws', 'espera')},
+    }
+
+
+def clase_de_ruta(request):
+    if request.GET.get('esperar'):
+        return 'espera'
+    path = request.path
+    if (
+        path.startswith('/api/') or '/api/' in path or path.rstrip('/').endswith('api')
+        or request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    ):
+        return 'api'
+    return 'html'
+
+
+class ConcurrencyLimitMiddleware:
+    """Middleware para controlar concurrencia y evitar sobrecarga (WSGI y ASGI)"""
+
+    sync_capable = True
+    async_capable = True
 
-class RequestMetricsMiddleware:
-    """Middleware para métricas de performance en tiempo real"""
-    
     def __init__(self, get_response):
         self.get_response = get_response
-        
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
     def __call__(self, request):
-        start_time = time.time()
-        
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path.startswith(RUTAS_EXENTAS):
+            return self.get_response(request)
+
+        clase = clase_de_ruta(request)
+        limitador = obtener_limitador(clase)
+        permiso = limitador.adquirir()
+        if permiso is None:
+            logger.warning(f"Sistema sobrecargado: request {clase} rechazado ({limitador.limite} activos)")
+            return self._sobrecargado(clase)
+
+        request.concurrencia_activos = permiso.total
         try:
-            response = self.get_response(request)
-            response_time = time.time() - start_time
-            
-            try:
-                metrics_key = f"metrics:{int(time.time() // 60)}"
-                current_metrics = cache.get(metrics_key, {'count': 0, 'total_time': 0})
-                current_metrics['count'] += 1
-                current_metrics['total_time'] += response_time
-                cache.set(metrics_key, current_metrics, 300)
-            except Exception as e:
-                logger.debug(f"Error guardando métricas: {e}")
-            
-            if hasattr(response, '__setitem__'):
-                response['X-Response-Time'] = f"{response_time:.3f}s"
-                try:
-                    response['X-Active-Requests'] = str(cache.get('active_requests', 0))
-                except:
-                    pass
-            
-            return response
-        except Exception as e:
-            logger.error(f"Error en RequestMetricsMiddleware: {e}", exc_info=True)
-            return self.get_response(request)
\ No newline at end of file
+            return self.get_response(request)
+        finally:
+            limitador.liberar(permiso)
+
+    async def __acall__(self, request):
+        if request.path.startswith(RUTAS_EXENTAS):
+            return await self.get_response(request)
+
+        clase = clase_de_ruta(request)
+        limitador = obtener_limitador(clase)
+        permiso = await limitador.adquirir_async()
+        if permiso is None:
+            logger.warning(f"Sistema sobrecargado: request {clase} rechazado ({limitador.limite} activos)")
+            return self._sobrecargado(clase)
+
+        request.concurrencia_activos = permiso.total
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(limitador.liberar, thread_sensitive=False)(permiso)
+
+    def _sobrecargado(self, clase):
+        mensaje = "Sistema temporalmente sobrecargado. Intente en unos segundos."
+        if clase in ('api', 'espera'):
+            response = JsonResponse({'error': mensaje}, status=503)
+        else:
+            response = HttpResponse(mensaje, status=503)
+        response['Retry-After'] = '1'
+        return response
+
+
+class LimiteConexionesWebSocket:
+    """Aplicación ASGI que limita las conexiones WebSocket abiertas (sin cola: rechaza el handshake)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limitador = obtener_limitador('ws')
+        permiso = await sync_to_async(limitador.adquirir, thread_sensitive=False)(espera=0)
+        if permiso is None:
+            logger.warning(f"Conexión WebSocket rechazada: {limitador.limite} conexiones activas")
+            await receive()  # websocket.connect
+            await send({'type': 'websocket.close', 'code': 1013})
+            return
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            await sync_to_async(limitador.liberar, thread_sensitive=False)(permiso)
@@ -0,0 +1,12 @@
+from .notificaciones_ws import agrupar
+
+
+class NotificacionesMiddleware:
+    """Agrupa las notificaciones WebSocket del request y las envía al terminarlo"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with agrupar():
+            return self.get_response(request)
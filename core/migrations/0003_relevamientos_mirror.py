@@ -0,0 +1,65 @@
+# Generated by Django 4.2.20 on 2026-10-17 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaSincronizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_id', models.CharField(blank=True, default='', max_length=64)),
+                ('ultima_ejecucion', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Marca de sincronización',
+                'verbose_name_plural': 'Marcas de sincronización',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelevamientoMirror',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('client_uid', models.CharField(blank=True, default='', max_length=64)),
+                ('id_institucion', models.IntegerField(blank=True, null=True)),
+                ('institucion_nombre', models.CharField(blank=True, default='', max_length=255)),
+                ('responsable_nombre', models.CharField(blank=True, default='', max_length=150)),
+                ('responsable_apellido', models.CharField(blank=True, default='', max_length=150)),
+                ('responsable_dni', models.CharField(blank=True, default='', max_length=20)),
+                ('responsable_telefono', models.CharField(blank=True, default='', max_length=50)),
+                ('responsable_email', models.CharField(blank=True, default='', max_length=254)),
+                ('responsable_funcion', models.CharField(blank=True, default='', max_length=150)),
+                ('latitud', models.FloatField(blank=True, null=True)),
+                ('longitud', models.FloatField(blank=True, null=True)),
+                ('observaciones', models.TextField(blank=True, default='')),
+                ('sync_estado', models.CharField(blank=True, default='', max_length=30)),
+                ('sync_error', models.TextField(blank=True, default='')),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('relevado_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.CharField(blank=True, default='', max_length=36)),
+                ('usuario_username', models.CharField(blank=True, default='', max_length=150)),
+                ('usuario_relevamiento', models.CharField(blank=True, default='', max_length=150)),
+                ('adjuntos', models.PositiveIntegerField(default=0)),
+                ('busqueda', models.CharField(blank=True, default='', max_length=400)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('sincronizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Relevamiento (copia local)',
+                'verbose_name_plural': 'Relevamientos (copia local)',
+                'indexes': [models.Index(fields=['deleted_at', 'created_at'], name='core_releva_deleted_511080_idx'), models.Index(fields=['id_institucion', 'deleted_at', 'created_at'], name='core_releva_id_inst_33f46e_idx'), models.Index(fields=['responsable_dni'], name='core_releva_respons_4c25b1_idx'), models.Index(fields=['sync_estado', 'deleted_at', 'created_at'], name='core_releva_sync_es_0a093f_idx'), models.Index(fields=['sincronizado'], name='core_releva_sincron_26a140_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-17 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_relevamientos_mirror'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditoriaaccesosensible',
+            name='cantidad',
+            field=models.PositiveIntegerField(default=1, help_text='Accesos agrupados en este registro'),
+        ),
+        migrations.AddField(
+            model_name='auditoriaaccesosensible',
+            name='ultimo_acceso',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
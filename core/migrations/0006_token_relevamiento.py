@@ -0,0 +1,44 @@
+# Generated by Django 4.2.20 on 2026-10-17 18:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def indexar_relevamientos(apps, schema_editor):
+    """Tokens de los relevamientos ya copiados, a partir de su texto plegado"""
+    RelevamientoMirror = apps.get_model('core', 'RelevamientoMirror')
+    TokenRelevamiento = apps.get_model('core', 'TokenRelevamiento')
+    tokens = []
+    for pk, busqueda in RelevamientoMirror.objects.values_list('pk', 'busqueda').iterator(chunk_size=2000):
+        tokens.extend(
+            TokenRelevamiento(relevamiento_id=pk, token=token[:60])
+            for token in dict.fromkeys(busqueda.split())
+        )
+        if len(tokens) >= 5000:
+            TokenRelevamiento.objects.bulk_create(tokens)
+            tokens = []
+    TokenRelevamiento.objects.bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_auditoria_timestamp_evento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenRelevamiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=60)),
+                ('relevamiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_busqueda', to='core.relevamientomirror')),
+            ],
+            options={
+                'verbose_name': 'Token de búsqueda de relevamiento',
+                'verbose_name_plural': 'Tokens de búsqueda de relevamientos',
+                'indexes': [models.Index(fields=['token', 'relevamiento'], name='core_tokenr_token_8cca19_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_relevamientos, migrations.RunPython.noop),
+    ]
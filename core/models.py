@@ -371,3 +371,7 @@ class DocumentoRequerido(TimeStamped):
     
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.institucion.nombre}"
+
+
+# Importar copia local de relevamientos de Supabase
+from .models_relevamientos import MarcaSincronizacion, RelevamientoMirror, TokenRelevamiento
@@ -33,7 +33,7 @@ class LogAccion(models.Model):
     detalles = models.JSONField(blank=True, null=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         verbose_name = "Log de Acción"
@@ -130,7 +130,7 @@ class AlertaAuditoria(models.Model):
     )
     descripcion = models.TextField()
     detalles = models.JSONField(blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     revisada = models.BooleanField(default=False)
     revisada_por = models.ForeignKey(
         User, 
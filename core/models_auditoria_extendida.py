@@ -49,7 +49,7 @@ class AuditoriaCiudadano(models.Model):
     # Información de la sesión
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     
     # Justificación del cambio
     motivo = models.TextField(
@@ -104,7 +104,7 @@ class AuditoriaLegajo(models.Model):
     
     # Información de la sesión
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     
     # Justificación
     motivo = models.TextField(blank=True)
@@ -147,7 +147,7 @@ class AuditoriaEvaluacion(models.Model):
     datos_anteriores = models.JSONField(blank=True, null=True)
     datos_nuevos = models.JSONField(blank=True, null=True)
     
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
     # Alertas especiales para cambios críticos
@@ -194,7 +194,7 @@ class AuditoriaEventoCritico(models.Model):
     datos_anteriores = models.JSONField(blank=True, null=True)
     datos_nuevos = models.JSONField(blank=True, null=True)
     
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
     # Notificaciones realizadas
@@ -236,7 +236,7 @@ class AuditoriaConsentimiento(models.Model):
         help_text="Snapshot completo del consentimiento"
     )
     
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
     # Hash del archivo para verificar integridad
@@ -301,7 +301,7 @@ class AuditoriaAccesoSensible(models.Model):
     # Información de la sesión
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     
     # Justificación del acceso
     justificacion = models.TextField(
@@ -322,6 +322,13 @@ class AuditoriaAccesoSensible(models.Model):
         help_text="Múltiples accesos en corto tiempo"
     )
     
+    # Visualizaciones repetidas del mismo objeto por el mismo usuario agrupadas en esta fila
+    cantidad = models.PositiveIntegerField(
+        default=1,
+        help_text="Accesos agrupados en este registro"
+    )
+    ultimo_acceso = models.DateTimeField(null=True, blank=True)
+    
     class Meta:
         verbose_name = "Auditoría de Acceso Sensible"
         verbose_name_plural = "Auditorías de Accesos Sensibles"
@@ -356,7 +363,7 @@ class AuditoriaDerivacion(models.Model):
     # Datos completos
     datos_completos = models.JSONField()
     
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
     # Instituciones involucradas
@@ -408,7 +415,7 @@ class AuditoriaPlanIntervencion(models.Model):
     datos_anteriores = models.JSONField(blank=True, null=True)
     datos_nuevos = models.JSONField(blank=True, null=True)
     
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
     # Cambio de vigencia
@@ -448,7 +455,7 @@ class AuditoriaInstitucion(models.Model):
     datos_anteriores = models.JSONField(blank=True, null=True)
     datos_nuevos = models.JSONField(blank=True, null=True)
     
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
     # Cambio de estado de registro
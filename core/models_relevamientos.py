@@ -0,0 +1,97 @@
+from django.db import models
+
+
+class RelevamientoMirror(models.Model):
+    """
+    Copia local de los relevamientos de Supabase (tabla ``relevamientos`` de la
+    app mobile) para el backoffice. La mantiene el comando
+    `sincronizar_relevamientos` trayendo solo las filas con ``updated_at``
+    posterior a la marca de agua; las bajas lógicas llegan como ``deleted_at``.
+    Institución, usuario y cantidad de adjuntos se resuelven al sincronizar.
+    """
+
+    id = models.UUIDField(primary_key=True)
+    client_uid = models.CharField(max_length=64, blank=True, default="")
+    id_institucion = models.IntegerField(null=True, blank=True)
+    institucion_nombre = models.CharField(max_length=255, blank=True, default="")
+    responsable_nombre = models.CharField(max_length=150, blank=True, default="")
+    responsable_apellido = models.CharField(max_length=150, blank=True, default="")
+    responsable_dni = models.CharField(max_length=20, blank=True, default="")
+    responsable_telefono = models.CharField(max_length=50, blank=True, default="")
+    responsable_email = models.CharField(max_length=254, blank=True, default="")
+    responsable_funcion = models.CharField(max_length=150, blank=True, default="")
+    latitud = models.FloatField(null=True, blank=True)
+    longitud = models.FloatField(null=True, blank=True)
+    observaciones = models.TextField(blank=True, default="")
+    sync_estado = models.CharField(max_length=30, blank=True, default="")
+    sync_error = models.TextField(blank=True, default="")
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    relevado_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.CharField(max_length=36, blank=True, default="")
+    usuario_username = models.CharField(max_length=150, blank=True, default="")
+    usuario_relevamiento = models.CharField(max_length=150, blank=True, default="")
+    adjuntos = models.PositiveIntegerField(default=0)
+    # Texto plegado (minúsculas, sin acentos) de responsable y DNI; fuente de TokenRelevamiento
+    busqueda = models.CharField(max_length=400, blank=True, default="")
+    # Fila completa de Supabase (campos que el listado no usa, para el detalle sin conexión)
+    datos = models.JSONField(default=dict, blank=True)
+    sincronizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Relevamiento (copia local)"
+        verbose_name_plural = "Relevamientos (copia local)"
+        indexes = [
+            models.Index(fields=["deleted_at", "created_at"]),
+            models.Index(fields=["id_institucion", "deleted_at", "created_at"]),
+            models.Index(fields=["responsable_dni"]),
+            models.Index(fields=["sync_estado", "deleted_at", "created_at"]),
+            models.Index(fields=["sincronizado"]),
+        ]
+
+    def __str__(self):
+        return f"{self.responsable_apellido} {self.responsable_nombre} ({self.id})"
+
+
+class TokenRelevamiento(models.Model):
+    """
+    Índice de búsqueda de la copia local: una fila por palabra de ``busqueda``.
+    Lo reescribe la sincronización junto con cada página; BusquedaRelevamientos
+    lo consulta por prefijo (LIKE 'x%') en lugar de recorrer la tabla.
+    """
+
+    relevamiento = models.ForeignKey(
+        RelevamientoMirror,
+        on_delete=models.CASCADE,
+        related_name="tokens_busqueda"
+    )
+    token = models.CharField(max_length=60)
+
+    class Meta:
+        verbose_name = "Token de búsqueda de relevamiento"
+        verbose_name_plural = "Tokens de búsqueda de relevamientos"
+        indexes = [
+            models.Index(fields=["token", "relevamiento"]),
+        ]
+
+    def __str__(self):
+        return f"{self.token} ({self.relevamiento_id})"
+
+
+class MarcaSincronizacion(models.Model):
+    """Marca de agua de una sincronización incremental: último (updated_at, id) aplicado"""
+
+    nombre = models.CharField(max_length=50, unique=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
+    ultimo_id = models.CharField(max_length=64, blank=True, default="")
+    ultima_ejecucion = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        verbose_name = "Marca de sincronización"
+        verbose_name_plural = "Marcas de sincronización"
+
+    def __str__(self):
+        return f"{self.nombre}: {self.updated_at} / {self.ultimo_id}"
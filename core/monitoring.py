@@ -145,11 +145,7 @@ class SystemMonitor:
                     'active': conversacion_stats['active'],
                     'messages_today': messages_today
                 },
-                'performance': {
-                    'avg_response_time': self._get_avg_response_time(),
-                    'error_rate': self._get_error_rate(),
-                    'throughput': self._get_throughput()
-                }
+                'performance': self._get_performance()
             }
             
             cache.set('application_metrics', metrics, 60)
@@ -261,77 +257,30 @@ class SystemMonitor:
         }
     
     def _get_online_users(self):
-        """Usuarios online (últimos 5 minutos)"""
+        """Usuarios online (actividad en los últimos SESIONES_EN_LINEA segundos)"""
         try:
-            from users.models import User
-            return User.objects.filter(
-                last_login__gte=timezone.now() - timedelta(minutes=5)
-            ).count()
+            from .actividad_sesiones import ActividadSesiones
+            return ActividadSesiones.usuarios_en_linea()
         except Exception as e:
             import logging
             logging.debug(f"Error contando usuarios online: {e}")
             return 0
     
-    def _get_avg_response_time(self):
-        """Tiempo promedio de respuesta"""
-        # Obtener de middleware de performance
-        metrics = cache.get('performance_metrics', {})
-        return metrics.get('avg_response_time', 0)
-    
-    def _get_error_rate(self):
-        """Tasa de errores"""
-        metrics = cache.get('performance_metrics', {})
-        return metrics.get('error_rate', 0)
-    
-    def _get_throughput(self):
-        """Throughput (requests por segundo)"""
-        metrics = cache.get('performance_metrics', {})
-        return metrics.get('throughput', 0)
+    def _get_performance(self):
+        """Tiempos, errores y throughput de los últimos 5 minutos (colector de métricas de requests)"""
+        try:
+            from .metricas_requests import resumen_metricas
+            total = resumen_metricas()['total']
+        except Exception as e:
+            import logging
+            logging.debug(f"Error leyendo métricas de requests: {e}")
+            total = {}
+        return {
+            'avg_response_time': (total.get('promedio_ms') or 0) / 1000,  # segundos
+            'p95_response_time': (total.get('p95_ms') or 0) / 1000,
+            'error_rate': total.get('tasa_error', 0),  # % de 5xx
+            'throughput': total.get('rps', 0),  # requests por segundo
+        }
 
 # Instancia global del monitor
 system_monitor = SystemMonitor()
-
-class MonitoringMiddleware:
-    """Middleware para recolectar métricas de requests"""
-    
-    def __init__(self, get_response):
-        self.get_response = get_response
-        self.request_times = deque(maxlen=1000)
-        self.error_count = 0
-        self.request_count = 0
-    
-    def __call__(self, request):
-        start_time = time.time()
-        
-        response = self.get_response(request)
-        
-        # Calcular tiempo de respuesta
-        response_time = time.time() - start_time
-        self.request_times.append(response_time)
-        self.request_count += 1
-        
-        # Contar errores
-        if response.status_code >= 400:
-            self.error_count += 1
-        
-        # Actualizar métricas en cache
-        self._update_performance_metrics()
-        
-        return response
-    
-    def _update_performance_metrics(self):
-        """Actualiza métricas de performance"""
-        if self.request_times:
-            avg_time = sum(self.request_times) / len(self.request_times)
-            error_rate = (self.error_count / self.request_count) * 100 if self.request_count > 0 else 0
-            throughput = len(self.request_times) / 60  # requests por minuto
-            
-            metrics = {
-                'avg_response_time': avg_time,
-                'error_rate': error_rate,
-                'throughput': throughput,
-                'total_requests': self.request_count,
-                'total_errors': self.error_count
-            }
-            
-            cache.set('performance_metrics', metrics, 300)
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Despacho agrupado de notificaciones WebSocket
+Sistema SEDRONAR - Notificaciones fuera de la latencia de escritura
+
+``notificar(grupo, evento)`` no envía nada en el momento: el evento se encola
+cuando la transacción actual confirma (``transaction.on_commit``; si hay rollback
+no se notifica) y, dentro de un request (NotificacionesMiddleware) o de un bloque
+``agrupar()``, se acumula hasta el final. Entonces se envía un único group_send por
+grupo con todos sus eventos, sin duplicados.
+
+Un lote de un solo evento se envía tal cual; uno de varios viaja como
+``{'type': 'notificaciones.lote', 'eventos': [...]}`` y el consumer lo reparte a sus
+handlers habituales (LoteNotificacionesMixin), así el cliente recibe los mismos
+mensajes que antes.
+"""
+
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger("django")
+
+# Eventos por group_send (acota el tamaño de cada mensaje en el channel layer)
+EVENTOS_POR_MENSAJE = 100
+
+_local = threading.local()
+
+
+class LoteNotificaciones:
+    """Eventos pendientes por grupo, deduplicados por clave y en orden de llegada"""
+
+    def __init__(self):
+        self.grupos = {}
+
+    def agregar(self, grupo, evento, clave):
+        self.grupos.setdefault(grupo, {}).setdefault(clave, evento)
+
+    def enviar(self):
+        for grupo, eventos in self.grupos.items():
+            _enviar_grupo(grupo, list(eventos.values()))
+        self.grupos = {}
+
+
+def _enviar_grupo(grupo, eventos):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for inicio in range(0, len(eventos), EVENTOS_POR_MENSAJE):
+        parte = eventos[inicio:inicio + EVENTOS_POR_MENSAJE]
+        mensaje = parte[0] if len(parte) == 1 else {'type': 'notificaciones.lote', 'eventos': parte}
+        try:
+            async_to_sync(channel_layer.group_send)(grupo, mensaje)
+        except Exception as e:
+            logger.warning(f"Error enviando notificación WebSocket a {grupo}: {e}")
+
+
+def _encolar(grupo, evento, clave):
+    lote = getattr(_local, 'lote', None)
+    if lote is None:
+        _enviar_grupo(grupo, [evento])
+    else:
+        lote.agregar(grupo, evento, clave)
+
+
+def notificar(grupo, evento, clave=None):
+    """
+    Encola ``evento`` (dict con 'type' = handler del consumer) para el grupo.
+    ``clave`` identifica duplicados dentro del lote; por defecto, el contenido del evento.
+    """
+    if clave is None:
+        clave = json.dumps(evento, sort_keys=True, default=str)
+    transaction.on_commit(lambda: _encolar(grupo, evento, clave))
+
+
+@contextmanager
+def agrupar():
+    """Acumula las notificaciones del bloque y las envía agrupadas al salir (reentrante)"""
+    if getattr(_local, 'lote', None) is not None:
+        yield
+        return
+    _local.lote = LoteNotificaciones()
+    try:
+        yield
+    finally:
+        lote, _local.lote = _local.lote, None
+        lote.enviar()
+
+
+class LoteNotificacionesMixin:
+    """Para consumers: reparte un lote de notificaciones a los handlers de cada evento"""
+
+    async def notificaciones_lote(self, event):
+        for evento in event['eventos']:
+            handler = getattr(self, evento['type'].replace('.', '_'), None)
+            if handler is not None:
+                await handler(evento)
@@ -6,6 +6,8 @@ from django.utils import timezone
 from datetime import timedelta
 from .performance_analyzer import PerformanceAnalyzer
 from .monitoring import system_monitor
+from .middleware_concurrency import estado_concurrencia
+from .metricas_requests import resumen_metricas
 from .phase2_manager import phase2_manager
 import json
 
@@ -177,6 +179,30 @@ def realtime_metrics_api(request):
     
     return JsonResponse(realtime_data)
 
+@extend_schema(
+    description="API para métricas de control de admisión (concurrencia por clase de ruta)",
+    responses={200: 'Métricas de concurrencia del worker y globales'}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def concurrency_metrics_api(request):
+    """Admission control metrics API"""
+    return JsonResponse(estado_concurrencia())
+
+@extend_schema(
+    description="Latencia por vista (p50/p95/p99), status y tiempo de base de datos de todos los workers",
+    responses={200: 'Métricas de requests por vista'}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def request_metrics_api(request):
+    """Per-view request metrics API (?minutos=1..60, default 5)"""
+    try:
+        minutos = min(max(int(request.GET.get('minutos', 5)), 1), 60)
+    except ValueError:
+        minutos = 5
+    return JsonResponse(resumen_metricas(minutos))
+
 @extend_schema(
     description="API para métricas de Fase 2 (particionamiento, optimización, índices)",
     responses={200: 'Métricas avanzadas de Fase 2'}
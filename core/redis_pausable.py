@@ -0,0 +1,55 @@
+"""
+Conexión a Redis con pausa tras errores
+Sistema SEDRONAR - Degradar a la base de datos sin reintentar en cada request
+
+Los componentes que usan Redis directamente (concurrencia, actividad de
+sesiones, presencia de operadores) tienen un camino alternativo sin Redis. Tras
+un error dejan de intentar durante PAUSA_REDIS segundos, así una caída de Redis
+no suma un timeout a cada request; el aviso se registra una vez por pausa.
+"""
+
+import logging
+import time
+
+logger = logging.getLogger("django")
+
+# Segundos sin Redis después de un error
+PAUSA_REDIS = 5
+
+
+class RedisPausable:
+    """
+    Conexión ``default`` de django-redis compartida por un componente.
+
+    ``scripts`` (fuentes Lua) se registran al conectar y quedan en
+    ``self.scripts`` en el mismo orden.
+    """
+
+    def __init__(self, componente, alternativa, scripts=(), pausa=PAUSA_REDIS):
+        self.componente = componente
+        self.alternativa = alternativa
+        self.pausa = pausa
+        self._fuentes = scripts
+        self._conexion = None
+        self.scripts = None
+        self._pausa_hasta = 0.0
+
+    def conexion(self):
+        """Conexión y scripts registrados, o None si Redis está en pausa por errores"""
+        if time.monotonic() < self._pausa_hasta:
+            return None
+        if self._conexion is None:
+            try:
+                from django_redis import get_redis_connection
+                conexion = get_redis_connection("default")
+            except Exception as e:
+                self.pausar(e)
+                return None
+            self.scripts = tuple(conexion.register_script(fuente) for fuente in self._fuentes)
+            self._conexion = conexion
+        return self._conexion
+
+    def pausar(self, error):
+        if time.monotonic() >= self._pausa_hasta:
+            logger.warning(f"{self.componente} sin Redis por {self.pausa}s ({self.alternativa}): {error}")
+        self._pausa_hasta = time.monotonic() + self.pausa
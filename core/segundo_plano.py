@@ -0,0 +1,110 @@
+"""
+Hilos en segundo plano por proceso
+Sistema SEDRONAR - Flushers periódicos y consumidores compartidos
+
+Base común de los componentes que acumulan trabajo en memoria y lo persisten
+desde un hilo daemon (buffer de auditoría, accesos sensibles, actividad de
+sesiones, métricas de requests, análisis de riesgo, latido de concurrencia):
+
+- ``HiloSegundoPlano``: arranca el hilo una sola vez, con el primer uso.
+- ``FlusherPeriodico``: llama a ``ciclo()`` (por defecto ``flush()``) cada
+  ``intervalo`` segundos y a ``vaciar()`` al detenerse.
+- ``PorProceso``: instancia perezosa por proceso, detenida con atexit::
+
+      get_buffer = PorProceso(lambda: BufferAuditoria(...))
+      get_buffer().encolar(...)
+"""
+
+import atexit
+import logging
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger("django")
+
+
+class HiloSegundoPlano:
+    """Hilo daemon que se inicia con el primer uso; las subclases implementan ``_loop``"""
+
+    nombre = 'segundo-plano'
+
+    def __init__(self):
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name=self.nombre, daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        raise NotImplementedError
+
+    def detener(self):
+        self._stop.set()
+
+
+class FlusherPeriodico(HiloSegundoPlano):
+    """Ejecuta ``ciclo()`` cada ``intervalo`` segundos y ``vaciar()`` al detenerse"""
+
+    nombre = 'flusher'
+
+    def __init__(self, intervalo):
+        super().__init__()
+        self.intervalo = intervalo
+
+    def flush(self):
+        raise NotImplementedError
+
+    def ciclo(self):
+        """Trabajo de cada intervalo"""
+        self.flush()
+
+    def vaciar(self):
+        """Lo pendiente al terminar el proceso"""
+        self.flush()
+
+    def _loop(self):
+        while not self._stop.wait(self.intervalo):
+            try:
+                self.ciclo()
+            except Exception as e:
+                logger.error(f"Error en {self.nombre}: {e}", exc_info=True)
+            finally:
+                close_old_connections()
+
+    def detener(self):
+        super().detener()
+        try:
+            self.vaciar()
+        except Exception as e:
+            logger.error(f"Error vaciando {self.nombre}: {e}")
+
+
+class PorProceso:
+    """Instancia única por proceso creada por ``fabrica`` al primer uso; su ``detener`` se registra en atexit"""
+
+    def __init__(self, fabrica):
+        self._fabrica = fabrica
+        self._instancia = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._instancia is None:
+            with self._lock:
+                if self._instancia is None:
+                    instancia = self._fabrica()
+                    atexit.register(instancia.detener)
+                    self._instancia = instancia
+        return self._instancia
+
+    def existente(self):
+        """La instancia si ya se creó, sin crearla"""
+        return self._instancia
@@ -0,0 +1,226 @@
+"""
+Sincronización incremental de relevamientos Supabase -> RelevamientoMirror.
+
+Cada corrida trae en páginas las filas con (updated_at, id) posterior a la marca
+de agua, ordenadas por ese par (keyset: no se salta ni repite filas aunque
+varias compartan updated_at), resuelve institución, usuario y adjuntos de la
+página en paralelo y las inserta o actualiza en bloque. La marca avanza en la
+misma transacción que la página, así una corrida interrumpida continúa donde
+quedó. Cada corrida relee RELEVAMIENTOS_SYNC_SOLAPAMIENTO segundos antes de la
+marca: una fila confirmada tarde con un updated_at anterior no se pierde, y el
+upsert hace que releer sea inocuo. Las bajas lógicas llegan como filas con ``deleted_at``; las bajas físicas
+en Supabase solo se detectan con una sincronización completa.
+
+El backoffice lee solo la copia local (BusquedaRelevamientos): el listado no
+depende de la latencia ni de la disponibilidad de Supabase. La búsqueda por
+texto usa TokenRelevamiento (prefijo de palabra sobre un índice), como la de
+ciudadanos.
+"""
+
+import logging
+import re
+import unicodedata
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import MarcaSincronizacion, RelevamientoMirror, TokenRelevamiento
+from core.services import relevamientos_supabase as supabase
+
+logger = logging.getLogger("django")
+
+MARCA = "relevamientos"
+TAMANO_PAGINA = 500
+
+CAMPOS_TEXTO = (
+    "client_uid", "responsable_nombre", "responsable_apellido", "responsable_dni",
+    "responsable_telefono", "responsable_email", "responsable_funcion", "observaciones",
+    "sync_estado", "sync_error", "created_by", "usuario_username",
+)
+CAMPOS_FECHA = ("last_synced_at", "relevado_at", "created_at", "updated_at", "deleted_at")
+CAMPOS_ACTUALIZABLES = [
+    field.name for field in RelevamientoMirror._meta.concrete_fields if field.name != "id"
+]
+
+SEPARADORES = re.compile(r"[^a-z0-9]+")
+
+
+def plegar(texto):
+    """Minúsculas, sin acentos y palabras separadas por un espacio"""
+    texto = unicodedata.normalize("NFKD", (texto or "").lower()).encode("ascii", "ignore").decode()
+    return " ".join(token for token in SEPARADORES.split(texto) if token)
+
+
+def _tokens(relevamientos):
+    """Filas de TokenRelevamiento (sin guardar) a partir del texto plegado de cada relevamiento"""
+    return [
+        TokenRelevamiento(relevamiento_id=relevamiento.pk, token=token[:60])
+        for relevamiento in relevamientos
+        for token in dict.fromkeys(relevamiento.busqueda.split())
+    ]
+
+
+def _texto(valor, largo):
+    return "" if valor is None else str(valor)[:largo]
+
+
+def _numero(valor):
+    try:
+        return float(valor) if valor is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _fila(row, instituciones, adjuntos, usernames):
+    """RelevamientoMirror (sin guardar) a partir de una fila de Supabase"""
+    valores = {}
+    for campo in CAMPOS_TEXTO:
+        largo = RelevamientoMirror._meta.get_field(campo).max_length or 100000
+        valores[campo] = _texto(row.get(campo), largo)
+    for campo in CAMPOS_FECHA:
+        valores[campo] = parse_datetime(row[campo]) if row.get(campo) else None
+
+    id_institucion = row.get("id_institucion")
+    try:
+        id_institucion = int(id_institucion) if id_institucion is not None else None
+    except (TypeError, ValueError):
+        id_institucion = None
+    if id_institucion:
+        institucion_nombre = instituciones.get(id_institucion) or f"Institucion #{id_institucion}"
+    else:
+        institucion_nombre = ""
+
+    usuario = valores["usuario_username"].strip()
+    if not usuario and valores["created_by"]:
+        usuario = usernames.get(valores["created_by"], "")
+
+    return RelevamientoMirror(
+        id=row["id"],
+        id_institucion=id_institucion,
+        institucion_nombre=institucion_nombre[:255],
+        latitud=_numero(row.get("latitud")),
+        longitud=_numero(row.get("longitud")),
+        usuario_relevamiento=usuario[:150],
+        adjuntos=adjuntos.get(str(row["id"]), 0),
+        busqueda=plegar(
+            f'{valores["responsable_apellido"]} {valores["responsable_nombre"]} {valores["responsable_dni"]}'
+        )[:400],
+        datos=row,
+        **valores,
+    )
+
+
+class SincronizacionRelevamientos:
+    """Sincronización incremental por marca de agua"""
+
+    @staticmethod
+    def marca():
+        marca, _ = MarcaSincronizacion.objects.get_or_create(nombre=MARCA)
+        return marca
+
+    @staticmethod
+    def sincronizar(completa=False, tamano_pagina=TAMANO_PAGINA, progreso=None):
+        """
+        Aplica los cambios desde la marca de agua. Con ``completa`` vuelve a traer
+        todo y borra de la copia lo que ya no existe en Supabase.
+        Retorna (filas aplicadas, filas borradas).
+        """
+        if not supabase.is_configured():
+            raise RuntimeError("Supabase no configurado (SUPABASE_URL / SUPABASE_ANON_KEY)")
+
+        marca = SincronizacionRelevamientos.marca()
+        inicio = timezone.now()
+        desde_updated_at = None if completa else marca.updated_at
+        desde_id = ""
+        if desde_updated_at is not None:
+            desde_updated_at -= timedelta(seconds=getattr(settings, 'RELEVAMIENTOS_SYNC_SOLAPAMIENTO', 120))
+        aplicadas = 0
+        try:
+            while True:
+                rows = supabase.fetch_relevamientos_changes(
+                    desde_updated_at.isoformat() if desde_updated_at else None, desde_id, tamano_pagina
+                )
+                if not rows:
+                    break
+                ultima = rows[-1]
+                desde_updated_at = parse_datetime(ultima["updated_at"]) if ultima.get("updated_at") else desde_updated_at
+                desde_id = str(ultima["id"])
+                SincronizacionRelevamientos._aplicar_pagina(rows, desde_updated_at, desde_id)
+                aplicadas += len(rows)
+                if progreso is not None:
+                    progreso(aplicadas)
+                if len(rows) < tamano_pagina:
+                    break
+        except Exception as e:
+            MarcaSincronizacion.objects.filter(pk=marca.pk).update(
+                ultima_ejecucion=timezone.now(), ultimo_error=str(e)[:2000]
+            )
+            raise
+
+        borradas = 0
+        if completa:
+            # Toda fila vigente se reescribió en esta corrida; las demás ya no están en Supabase
+            borradas, _ = RelevamientoMirror.objects.filter(sincronizado__lt=inicio).delete()
+        MarcaSincronizacion.objects.filter(pk=marca.pk).update(ultima_ejecucion=timezone.now(), ultimo_error="")
+        return aplicadas, borradas
+
+    @staticmethod
+    def _aplicar_pagina(rows, updated_at, ultimo_id):
+        ids = [str(row["id"]) for row in rows]
+        usuarios = [
+            str(row["created_by"]) for row in rows
+            if row.get("created_by") and not (row.get("usuario_username") or "").strip()
+        ]
+        # Instituciones desde la cache; adjuntos y usernames en lotes paralelos
+        instituciones = supabase.instituciones_map()
+        adjuntos = supabase.count_adjuntos(ids)
+        usernames = supabase.fetch_usernames_by_user_ids(usuarios)
+        filas = [_fila(row, instituciones, adjuntos, usernames) for row in rows if row.get("id")]
+        with transaction.atomic():
+            RelevamientoMirror.objects.bulk_create(
+                filas,
+                update_conflicts=True,
+                # MySQL resuelve el conflicto por cualquier clave única (ON DUPLICATE KEY) y no admite indicarla
+                unique_fields=["id"] if connection.features.supports_update_conflicts_with_target else None,
+                update_fields=CAMPOS_ACTUALIZABLES,
+            )
+            TokenRelevamiento.objects.filter(relevamiento_id__in=[fila.pk for fila in filas]).delete()
+            TokenRelevamiento.objects.bulk_create(_tokens(filas), batch_size=TAMANO_PAGINA)
+            # La ventana de solapamiento relee filas anteriores: la marca nunca retrocede
+            MarcaSincronizacion.objects.filter(nombre=MARCA).filter(
+                Q(updated_at__isnull=True) | Q(updated_at__lte=updated_at)
+            ).update(updated_at=updated_at, ultimo_id=ultimo_id)
+
+
+class BusquedaRelevamientos:
+    """Consultas del backoffice sobre la copia local"""
+
+    @staticmethod
+    def listar(query="", institucion_id=None, limite=300):
+        queryset = RelevamientoMirror.objects.filter(deleted_at__isnull=True).defer("datos", "observaciones", "sync_error")
+        if institucion_id:
+            queryset = queryset.filter(id_institucion=institucion_id)
+        texto = plegar(query)
+        if texto.replace(" ", "").isdigit():
+            # DNI: prefijo sobre el índice
+            queryset = queryset.filter(responsable_dni__startswith=texto.replace(" ", ""))
+        else:
+            # Cada palabra es un range scan por prefijo sobre TokenRelevamiento
+            for token in dict.fromkeys(texto.split()):
+                queryset = queryset.filter(
+                    pk__in=TokenRelevamiento.objects.filter(token__startswith=token[:60]).values("relevamiento_id")
+                )
+        return list(queryset.order_by("-created_at")[:limite])
+
+    @staticmethod
+    def instituciones():
+        """Instituciones con relevamientos vigentes, por nombre (para el filtro)"""
+        filas = (
+            RelevamientoMirror.objects.filter(deleted_at__isnull=True, id_institucion__isnull=False)
+            .values_list("id_institucion", "institucion_nombre").distinct().order_by("institucion_nombre")
+        )
+        return [{"id": id_institucion, "nombre": nombre} for id_institucion, nombre in filas]
@@ -1,14 +1,40 @@
+"""
+Cliente de Supabase (PostgREST, Auth Admin y Storage) para relevamientos.
+
+Todas las llamadas comparten una ``requests.Session`` con pool de conexiones
+keep-alive (sin un handshake TCP/TLS por request). Las consultas independientes
+se lanzan en paralelo en un pool de hilos acotado (``SUPABASE_MAX_WORKERS``):
+lotes de conteo de adjuntos, usernames sin cache, detalle + adjuntos + campos
+extra y URLs firmadas. Las instituciones y los usernames se guardan en la cache
+de Django (``SUPABASE_CACHE_INSTITUCIONES`` / ``SUPABASE_CACHE_USUARIOS``
+segundos); los usernames se resuelven en bloque con ``get_many``.
+"""
+
 import logging
 import os
-from typing import Any, Dict, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 from urllib.parse import quote
 
 import requests
 from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
 
 
 logger = logging.getLogger(__name__)
 
+CACHE_INSTITUCIONES = "supabase:instituciones"
+CACHE_USERNAME = "supabase:username:{}"
+
+# IDs por consulta de conteo de adjuntos (acota el largo de la URL de ``in.(...)``)
+ADJUNTOS_POR_CONSULTA = 100
+
+_client_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
 
 def _get_supabase_url() -> str:
     return (
@@ -47,6 +73,48 @@ def _get_service_role_key() -> str:
     )
 
 
+def _get_max_workers() -> int:
+    return max(1, int(getattr(settings, "SUPABASE_MAX_WORKERS", 8)))
+
+
+def _get_session() -> requests.Session:
+    """Session compartida; el pool admite una conexión por hilo del executor más la del request."""
+    global _session
+    if _session is None:
+        with _client_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_get_max_workers() + 2)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_get_max_workers(), thread_name_prefix="supabase")
+    return _executor
+
+
+def run_parallel(calls: List[Callable[[], Any]]) -> List[Any]:
+    """Ejecuta las llamadas en el pool y retorna sus resultados en orden (propaga la primera excepción)."""
+    # Desde un hilo del pool se ejecuta en línea: esperar tareas del mismo pool podría bloquearlo
+    if len(calls) <= 1 or threading.current_thread().name.startswith("supabase"):
+        return [call() for call in calls]
+    futures = [_get_executor().submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def _get_json(url: str, headers: Dict[str, str], params: Optional[Dict[str, str]] = None) -> Any:
+    response = _get_session().get(url, headers=headers, params=params, timeout=_get_timeout_seconds())
+    response.raise_for_status()
+    return response.json()
+
+
 def _build_headers() -> Dict[str, str]:
     key = _get_supabase_key()
     return {
@@ -67,25 +135,36 @@ def _is_ready() -> bool:
     return bool(supabase_url and supabase_key)
 
 
+def is_configured() -> bool:
+    return _is_ready()
+
+
+def _fetch_instituciones_rows() -> List[Dict[str, Any]]:
+    """Instituciones ordenadas por nombre (cache compartida); lanza RequestException si falla."""
+    rows = cache.get(CACHE_INSTITUCIONES)
+    if rows is None:
+        params = {
+            "select": "id,nombre",
+            "order": "nombre.asc",
+            "limit": "2000",
+        }
+        rows = _get_json(f"{_base_url()}/instituciones", _build_headers(), params) or []
+        cache.set(CACHE_INSTITUCIONES, rows, getattr(settings, "SUPABASE_CACHE_INSTITUCIONES", 300))
+    return rows
+
+
+def instituciones_map() -> Dict[int, str]:
+    """id -> nombre de las instituciones (cache compartida); lanza RequestException si falla."""
+    rows = _fetch_instituciones_rows()
+    return {int(row["id"]): row.get("nombre", "") for row in rows if row.get("id") is not None}
+
+
 def _fetch_instituciones() -> Dict[int, str]:
     if not _is_ready():
         return {}
 
-    url = f"{_base_url()}/instituciones"
-    params = {
-        "select": "id,nombre",
-        "limit": "2000",
-    }
     try:
-        response = requests.get(
-            url,
-            headers=_build_headers(),
-            params=params,
-            timeout=_get_timeout_seconds(),
-        )
-        response.raise_for_status()
-        rows = response.json() or []
-        return {int(row["id"]): row.get("nombre", "") for row in rows if row.get("id") is not None}
+        return instituciones_map()
     except Exception:
         logger.exception("No se pudo obtener instituciones desde Supabase")
         return {}
@@ -132,14 +211,7 @@ def fetch_relevamientos(
             )
 
     try:
-        response = requests.get(
-            url,
-            headers=_build_headers(),
-            params=params,
-            timeout=_get_timeout_seconds(),
-        )
-        response.raise_for_status()
-        rows: List[Dict[str, Any]] = response.json() or []
+        rows: List[Dict[str, Any]] = _get_json(url, _build_headers(), params) or []
     except requests.RequestException as exc:
         logger.exception("Error consultando relevamientos en Supabase")
         return {
@@ -164,57 +236,77 @@ def fetch_instituciones_list() -> List[Dict[str, Any]]:
     if not _is_ready():
         return []
 
-    url = f"{_base_url()}/instituciones"
-    params = {
-        "select": "id,nombre",
-        "order": "nombre.asc",
-        "limit": "2000",
-    }
     try:
-        response = requests.get(
-            url,
-            headers=_build_headers(),
-            params=params,
-            timeout=_get_timeout_seconds(),
-        )
-        response.raise_for_status()
-        return response.json() or []
+        return list(_fetch_instituciones_rows())
     except requests.RequestException:
         logger.exception("Error consultando instituciones en Supabase")
         return []
 
 
-def fetch_adjuntos_counts(relevamiento_ids: List[str]) -> Dict[str, int]:
-    if not _is_ready() or not relevamiento_ids:
-        return {}
-
-    ids = ",".join(relevamiento_ids)
-    url = f"{_base_url()}/relevamiento_adjuntos"
+def _fetch_adjuntos_rows(relevamiento_ids: List[str]) -> List[Dict[str, Any]]:
     params = {
         "select": "relevamiento_id",
-        "relevamiento_id": f"in.({ids})",
+        "relevamiento_id": f"in.({','.join(relevamiento_ids)})",
     }
+    return _get_json(f"{_base_url()}/relevamiento_adjuntos", _build_headers(), params) or []
+
+
+def count_adjuntos(relevamiento_ids: List[str]) -> Dict[str, int]:
+    """Adjuntos por relevamiento (lotes en paralelo); lanza RequestException si falla."""
+    lotes = [
+        relevamiento_ids[inicio:inicio + ADJUNTOS_POR_CONSULTA]
+        for inicio in range(0, len(relevamiento_ids), ADJUNTOS_POR_CONSULTA)
+    ]
+    resultados = run_parallel([lambda lote=lote: _fetch_adjuntos_rows(lote) for lote in lotes])
+
+    counts: Dict[str, int] = {}
+    for rows in resultados:
+        for row in rows:
+            rid = row.get("relevamiento_id")
+            if not rid:
+                continue
+            counts[rid] = counts.get(rid, 0) + 1
+    return counts
+
+
+def fetch_adjuntos_counts(relevamiento_ids: List[str]) -> Dict[str, int]:
+    if not _is_ready() or not relevamiento_ids:
+        return {}
 
     try:
-        response = requests.get(
-            url,
-            headers=_build_headers(),
-            params=params,
-            timeout=_get_timeout_seconds(),
-        )
-        response.raise_for_status()
-        rows: List[Dict[str, Any]] = response.json() or []
+        return count_adjuntos(relevamiento_ids)
     except requests.RequestException:
         logger.exception("Error consultando adjuntos en Supabase")
         return {}
 
-    counts: Dict[str, int] = {}
-    for row in rows:
-        rid = row.get("relevamiento_id")
-        if not rid:
-            continue
-        counts[rid] = counts.get(rid, 0) + 1
-    return counts
+
+def fetch_relevamientos_changes(
+    after_updated_at: Optional[str] = None,
+    after_id: Optional[str] = None,
+    limit: int = 500,
+) -> List[Dict[str, Any]]:
+    """
+    Relevamientos (incluidos los borrados lógicos) posteriores a (updated_at, id),
+    en ese orden, para la sincronización incremental; sin ``after_id``, los de
+    updated_at >= ``after_updated_at``. Lanza RequestException si falla.
+    """
+    params: Dict[str, str] = {
+        "select": "*",
+        "order": "updated_at.asc,id.asc",
+        "limit": str(limit),
+    }
+    if after_updated_at and after_id:
+        params["or"] = (
+            f'(updated_at.gt."{after_updated_at}",'
+            f'and(updated_at.eq."{after_updated_at}",id.gt."{after_id}"))'
+        )
+    elif after_updated_at:
+        # Sin id de desempate (inicio de la ventana de solapamiento): id es uuid y no admite ""
+        params["updated_at"] = f"gte.{after_updated_at}"
+    return _get_json(f"{_base_url()}/relevamientos", _build_headers(), params) or []
+
+
+ERROR_NO_ENCONTRADO = "No se encontro el relevamiento solicitado"
 
 
 def fetch_relevamiento_detail(relevamiento_id: str) -> Dict[str, Any]:
@@ -223,7 +315,6 @@ def fetch_relevamiento_detail(relevamiento_id: str) -> Dict[str, Any]:
 
     base = _base_url()
     headers = _build_headers()
-    timeout = _get_timeout_seconds()
 
     item_url = f"{base}/relevamientos"
     item_params = {
@@ -247,20 +338,17 @@ def fetch_relevamiento_detail(relevamiento_id: str) -> Dict[str, Any]:
     }
 
     try:
-        item_resp = requests.get(item_url, headers=headers, params=item_params, timeout=timeout)
-        item_resp.raise_for_status()
-        item_rows = item_resp.json() or []
+        # Las tres consultas son independientes: se lanzan juntas
+        item_rows, adjuntos, campos_extra = run_parallel([
+            lambda: _get_json(item_url, headers, item_params),
+            lambda: _get_json(adjuntos_url, headers, adjuntos_params),
+            lambda: _get_json(extras_url, headers, extras_params),
+        ])
         item = item_rows[0] if item_rows else None
         if not item:
-            return {"success": False, "error": "No se encontro el relevamiento solicitado", "item": None, "adjuntos": [], "campos_extra": []}
-
-        adjuntos_resp = requests.get(adjuntos_url, headers=headers, params=adjuntos_params, timeout=timeout)
-        adjuntos_resp.raise_for_status()
-        adjuntos = adjuntos_resp.json() or []
-
-        extras_resp = requests.get(extras_url, headers=headers, params=extras_params, timeout=timeout)
-        extras_resp.raise_for_status()
-        campos_extra = extras_resp.json() or []
+            return {"success": False, "error": ERROR_NO_ENCONTRADO, "item": None, "adjuntos": [], "campos_extra": []}
+        adjuntos = adjuntos or []
+        campos_extra = campos_extra or []
     except requests.RequestException as exc:
         logger.exception("Error consultando detalle de relevamiento en Supabase")
         return {"success": False, "error": f"No se pudo consultar Supabase: {exc}", "item": None, "adjuntos": [], "campos_extra": []}
@@ -278,17 +366,31 @@ def fetch_relevamiento_detail(relevamiento_id: str) -> Dict[str, Any]:
     }
 
 
-def fetch_username_by_user_id(user_id: Optional[str]) -> str:
-    """Resuelve username de auth.users por UUID usando Supabase Admin API."""
-    if not user_id:
-        return "-"
-
-    supabase_url = _get_supabase_url()
-    service_key = _get_service_role_key()
-    if not (supabase_url and service_key):
+def _username_from_user(user: Optional[Dict[str, Any]], user_id: str) -> str:
+    if not user:
         return user_id
 
-    url = f"{supabase_url}/auth/v1/admin/users/{user_id}"
+    user_metadata = user.get("user_metadata") or {}
+    raw_meta = user.get("raw_user_meta_data") or {}
+    username = (
+        user_metadata.get("username")
+        or raw_meta.get("username")
+        or user_metadata.get("name")
+        or raw_meta.get("name")
+    )
+    if username:
+        return str(username)
+
+    email = user.get("email")
+    if email and "@" in email:
+        return email.split("@", 1)[0]
+    return user_id
+
+
+def _fetch_username(user_id: str) -> Optional[str]:
+    """Username desde la Admin API, o None si la consulta falló (no se cachea)."""
+    service_key = _get_service_role_key()
+    url = f"{_get_supabase_url()}/auth/v1/admin/users/{user_id}"
     headers = {
         "apikey": service_key,
         "Authorization": f"Bearer {service_key}",
@@ -296,38 +398,47 @@ def fetch_username_by_user_id(user_id: Optional[str]) -> str:
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=_get_timeout_seconds())
-        response.raise_for_status()
-        payload = response.json() or {}
-        user = payload.get("user") if isinstance(payload, dict) else None
-        if not user:
-            return user_id
-
-        user_metadata = user.get("user_metadata") or {}
-        raw_meta = user.get("raw_user_meta_data") or {}
-        username = (
-            user_metadata.get("username")
-            or raw_meta.get("username")
-            or user_metadata.get("name")
-            or raw_meta.get("name")
-        )
-        if username:
-            return str(username)
-
-        email = user.get("email")
-        if email and "@" in email:
-            return email.split("@", 1)[0]
-        return user_id
+        payload = _get_json(url, headers) or {}
     except requests.RequestException:
         logger.exception("No se pudo resolver username en Supabase para user_id=%s", user_id)
-        return user_id
+        return None
+    user = payload.get("user") if isinstance(payload, dict) else None
+    return _username_from_user(user, user_id)
+
+
+def fetch_username_by_user_id(user_id: Optional[str]) -> str:
+    """Resuelve username de auth.users por UUID usando Supabase Admin API."""
+    if not user_id:
+        return "-"
+    return fetch_usernames_by_user_ids([user_id]).get(user_id, user_id)
 
 
 def fetch_usernames_by_user_ids(user_ids: List[str]) -> Dict[str, str]:
-    """Resuelve varios user_id -> username con cache simple en memoria."""
+    """Resuelve varios user_id -> username: cache en bloque y los faltantes en paralelo."""
+    user_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+    if not user_ids:
+        return {}
+    if not (_get_supabase_url() and _get_service_role_key()):
+        return {user_id: user_id for user_id in user_ids}
+
+    en_cache = cache.get_many([CACHE_USERNAME.format(user_id) for user_id in user_ids])
     resolved: Dict[str, str] = {}
-    for user_id in set([uid for uid in user_ids if uid]):
-        resolved[user_id] = fetch_username_by_user_id(user_id)
+    faltantes = []
+    for user_id in user_ids:
+        username = en_cache.get(CACHE_USERNAME.format(user_id))
+        if username is None:
+            faltantes.append(user_id)
+        else:
+            resolved[user_id] = username
+
+    nuevos = {}
+    usernames = run_parallel([lambda user_id=user_id: _fetch_username(user_id) for user_id in faltantes])
+    for user_id, username in zip(faltantes, usernames):
+        resolved[user_id] = username or user_id
+        if username is not None:
+            nuevos[CACHE_USERNAME.format(user_id)] = username
+    if nuevos:
+        cache.set_many(nuevos, getattr(settings, "SUPABASE_CACHE_USUARIOS", 3600))
     return resolved
 
 
@@ -369,7 +480,7 @@ def get_storage_signed_url(storage_path: Optional[str], bucket: str = "relevamie
     }
 
     try:
-        response = requests.post(
+        response = _get_session().post(
             url,
             headers=headers,
             json={"expiresIn": int(expires_in)},
@@ -386,3 +497,13 @@ def get_storage_signed_url(storage_path: Optional[str], bucket: str = "relevamie
     except requests.RequestException:
         logger.exception("No se pudo generar signed URL para storage_path=%s", storage_path)
         return get_storage_public_url(storage_path, bucket=bucket)
+
+
+def get_storage_signed_urls(storage_paths: List[str], bucket: str = "relevamientos", expires_in: int = 3600) -> Dict[str, str]:
+    """Firma varias rutas del mismo bucket en paralelo: ruta -> URL."""
+    storage_paths = list(dict.fromkeys(path for path in storage_paths if path))
+    urls = run_parallel([
+        lambda path=path: get_storage_signed_url(path, bucket=bucket, expires_in=expires_in)
+        for path in storage_paths
+    ])
+    return dict(zip(storage_paths, urls))
@@ -11,6 +11,9 @@ import json
 import hashlib
 from datetime import datetime, time
 
+from core.buffer_auditoria import registrar
+from core.estado_cargado import estado_anterior, estado_anterior_dict, rastrear
+
 # Thread local para almacenar información de la request
 import threading
 _thread_locals = threading.local()
@@ -73,20 +76,25 @@ def calcular_hash_archivo(archivo):
         return ''
 
 
+def serializar_valor(field_value):
+    """Serializa un valor de campo para guardarlo en los JSON de auditoría"""
+    if hasattr(field_value, 'pk'):
+        return str(field_value.pk)
+    elif isinstance(field_value, datetime):
+        return field_value.isoformat()
+    return str(field_value) if field_value is not None else None
+
+
 def modelo_a_dict(instance):
     """Convierte un modelo a diccionario para auditoría"""
     data = {}
     for field in instance._meta.fields:
-        field_name = field.name
-        field_value = getattr(instance, field_name)
-        
-        # Convertir valores especiales
-        if hasattr(field_value, 'pk'):
-            data[field_name] = str(field_value.pk)
-        elif isinstance(field_value, datetime):
-            data[field_name] = field_value.isoformat()
+        # Para FKs se usa el id (attname) y no se dispara la carga del objeto relacionado
+        if field.is_relation:
+            field_value = getattr(instance, field.attname)
         else:
-            data[field_name] = str(field_value) if field_value is not None else None
+            field_value = getattr(instance, field.name)
+        data[field.name] = serializar_valor(field_value)
     
     return data
 
@@ -107,6 +115,19 @@ def detectar_campos_modificados(instance, datos_anteriores):
     return campos_modificados
 
 
+# Modelos auditados: su estado anterior se toma del rastreador, sin re-consultar la base
+MODELOS_AUDITADOS = (
+    'legajos.Ciudadano',
+    'legajos.LegajoAtencion',
+    'legajos.EvaluacionInicial',
+    'legajos.Consentimiento',
+    'legajos.Derivacion',
+    'legajos.PlanIntervencion',
+    'core.Institucion',
+)
+rastrear(*MODELOS_AUDITADOS)
+
+
 # ============================================================================
 # SIGNALS PARA CIUDADANO
 # ============================================================================
@@ -114,15 +135,7 @@ def detectar_campos_modificados(instance, datos_anteriores):
 @receiver(pre_save, sender='legajos.Ciudadano')
 def ciudadano_pre_save(sender, instance, **kwargs):
     """Captura el estado anterior del ciudadano antes de guardar"""
-    if instance.pk:
-        try:
-            instance._estado_anterior = modelo_a_dict(
-                sender.objects.get(pk=instance.pk)
-            )
-        except sender.DoesNotExist:
-            instance._estado_anterior = None
-    else:
-        instance._estado_anterior = None
+    instance._estado_anterior = estado_anterior_dict(instance)
 
 
 @receiver(post_save, sender='legajos.Ciudadano')
@@ -136,7 +149,8 @@ def ciudadano_post_save(sender, instance, created, **kwargs):
     accion = 'CREATE' if created else 'UPDATE'
     
     # Crear LogAccion para vista general
-    LogAccion.objects.create(
+    registrar(
+        LogAccion,
         usuario=request_info['usuario'],
         accion=accion,
         modelo='Ciudadano',
@@ -149,7 +163,8 @@ def ciudadano_post_save(sender, instance, created, **kwargs):
     
     if created:
         # Creación
-        AuditoriaCiudadano.objects.create(
+        registrar(
+            AuditoriaCiudadano,
             ciudadano=instance,
             accion='CREATE',
             usuario=request_info['usuario'],
@@ -168,7 +183,8 @@ def ciudadano_post_save(sender, instance, created, **kwargs):
             campos_sensibles = {'dni', 'nombre', 'apellido', 'fecha_nacimiento'}
             modifico_datos_personales = bool(campos_sensibles & set(campos_modificados.keys()))
             
-            AuditoriaCiudadano.objects.create(
+            registrar(
+                AuditoriaCiudadano,
                 ciudadano=instance,
                 accion='UPDATE',
                 usuario=request_info['usuario'],
@@ -190,7 +206,8 @@ def ciudadano_post_delete(sender, instance, **kwargs):
     request_info = get_request_info()
     
     # No usar ForeignKey para DELETE, guardar solo el ID
-    AuditoriaCiudadano.objects.create(
+    registrar(
+        AuditoriaCiudadano,
         ciudadano=None,  # No podemos referenciar un objeto eliminado
         accion='DELETE',
         usuario=request_info['usuario'],
@@ -208,15 +225,12 @@ def ciudadano_post_delete(sender, instance, **kwargs):
 @receiver(pre_save, sender='legajos.LegajoAtencion')
 def legajo_pre_save(sender, instance, **kwargs):
     """Captura el estado anterior del legajo"""
-    if instance.pk:
-        try:
-            anterior = sender.objects.get(pk=instance.pk)
-            instance._estado_anterior = modelo_a_dict(anterior)
-            instance._responsable_anterior = anterior.responsable
-            instance._estado_anterior_valor = anterior.estado
-            instance._nivel_riesgo_anterior = anterior.nivel_riesgo
-        except sender.DoesNotExist:
-            instance._estado_anterior = None
+    anterior = estado_anterior(instance)
+    instance._estado_anterior = estado_anterior_dict(instance)
+    if anterior is not None:
+        instance._responsable_anterior_id = anterior['responsable_id']
+        instance._estado_anterior_valor = anterior['estado']
+        instance._nivel_riesgo_anterior = anterior['nivel_riesgo']
 
 
 @receiver(post_save, sender='legajos.LegajoAtencion')
@@ -229,7 +243,8 @@ def legajo_post_save(sender, instance, created, **kwargs):
     datos_nuevos = modelo_a_dict(instance)
     
     # Crear LogAccion
-    LogAccion.objects.create(
+    registrar(
+        LogAccion,
         usuario=request_info['usuario'],
         accion='CREATE' if created else 'UPDATE',
         modelo='LegajoAtencion',
@@ -241,7 +256,8 @@ def legajo_post_save(sender, instance, created, **kwargs):
     )
     
     if created:
-        AuditoriaLegajo.objects.create(
+        registrar(
+            AuditoriaLegajo,
             legajo=instance,
             accion='CREATE',
             usuario=request_info['usuario'],
@@ -258,8 +274,8 @@ def legajo_post_save(sender, instance, created, **kwargs):
             instance._estado_anterior_valor != instance.estado
         )
         cambio_responsable = (
-            hasattr(instance, '_responsable_anterior') and
-            instance._responsable_anterior != instance.responsable
+            hasattr(instance, '_responsable_anterior_id') and
+            instance._responsable_anterior_id != instance.responsable_id
         )
         cambio_nivel_riesgo = (
             hasattr(instance, '_nivel_riesgo_anterior') and
@@ -267,7 +283,8 @@ def legajo_post_save(sender, instance, created, **kwargs):
         )
         
         if datos_anteriores:
-            AuditoriaLegajo.objects.create(
+            registrar(
+                AuditoriaLegajo,
                 legajo=instance,
                 accion='UPDATE',
                 usuario=request_info['usuario'],
@@ -282,14 +299,16 @@ def legajo_post_save(sender, instance, created, **kwargs):
             
             # Generar alertas para cambios críticos
             if cambio_responsable and request_info['usuario']:
-                AlertaAuditoria.objects.create(
+                responsable_anterior = User.objects.filter(pk=instance._responsable_anterior_id).first()
+                registrar(
+                    AlertaAuditoria,
                     tipo='CAMBIOS_CRITICOS',
                     severidad='MEDIA',
                     usuario_afectado=instance.responsable,
                     descripcion=f'Cambio de responsable en legajo {instance.codigo}',
                     detalles={
                         'legajo': str(instance.pk),
-                        'responsable_anterior': str(instance._responsable_anterior),
+                        'responsable_anterior': str(responsable_anterior),
                         'responsable_nuevo': str(instance.responsable),
                     }
                 )
@@ -302,14 +321,11 @@ def legajo_post_save(sender, instance, created, **kwargs):
 @receiver(pre_save, sender='legajos.EvaluacionInicial')
 def evaluacion_pre_save(sender, instance, **kwargs):
     """Captura el estado anterior de la evaluación"""
-    if instance.pk:
-        try:
-            anterior = sender.objects.get(pk=instance.pk)
-            instance._estado_anterior = modelo_a_dict(anterior)
-            instance._riesgo_suicida_anterior = anterior.riesgo_suicida
-            instance._violencia_anterior = anterior.violencia
-        except sender.DoesNotExist:
-            instance._estado_anterior = None
+    anterior = estado_anterior(instance)
+    instance._estado_anterior = estado_anterior_dict(instance)
+    if anterior is not None:
+        instance._riesgo_suicida_anterior = anterior['riesgo_suicida']
+        instance._violencia_anterior = anterior['violencia']
 
 
 @receiver(post_save, sender='legajos.EvaluacionInicial')
@@ -322,7 +338,8 @@ def evaluacion_post_save(sender, instance, created, **kwargs):
     datos_nuevos = modelo_a_dict(instance)
     
     if created:
-        AuditoriaEvaluacion.objects.create(
+        registrar(
+            AuditoriaEvaluacion,
             evaluacion=instance,
             accion='CREATE',
             usuario=request_info['usuario'],
@@ -334,7 +351,8 @@ def evaluacion_post_save(sender, instance, created, **kwargs):
         
         # Alertas para evaluación inicial con riesgos
         if instance.riesgo_suicida or instance.violencia:
-            AlertaAuditoria.objects.create(
+            registrar(
+                AlertaAuditoria,
                 tipo='CAMBIOS_CRITICOS',
                 severidad='CRITICA',
                 usuario_afectado=instance.legajo.responsable,
@@ -362,7 +380,8 @@ def evaluacion_post_save(sender, instance, created, **kwargs):
         genera_alerta = cambio_riesgo_suicida or cambio_violencia
         
         if campos_modificados:
-            AuditoriaEvaluacion.objects.create(
+            registrar(
+                AuditoriaEvaluacion,
                 evaluacion=instance,
                 accion='UPDATE',
                 usuario=request_info['usuario'],
@@ -382,7 +401,8 @@ def evaluacion_post_save(sender, instance, created, **kwargs):
             # Generar alertas críticas
             if genera_alerta:
                 severidad = 'CRITICA' if (instance.riesgo_suicida or instance.violencia) else 'ALTA'
-                AlertaAuditoria.objects.create(
+                registrar(
+                    AlertaAuditoria,
                     tipo='CAMBIOS_CRITICOS',
                     severidad=severidad,
                     usuario_afectado=instance.legajo.responsable,
@@ -411,7 +431,8 @@ def evento_critico_post_save(sender, instance, created, **kwargs):
     datos_nuevos = modelo_a_dict(instance)
     
     if created:
-        AuditoriaEventoCritico.objects.create(
+        registrar(
+            AuditoriaEventoCritico,
             evento=instance,
             accion='CREATE',
             usuario=request_info['usuario'],
@@ -421,7 +442,8 @@ def evento_critico_post_save(sender, instance, created, **kwargs):
         )
         
         # SIEMPRE generar alerta para eventos críticos nuevos
-        AlertaAuditoria.objects.create(
+        registrar(
+            AlertaAuditoria,
             tipo='CAMBIOS_CRITICOS',
             severidad='CRITICA',
             usuario_afectado=instance.legajo.responsable,
@@ -441,13 +463,7 @@ def evento_critico_post_save(sender, instance, created, **kwargs):
 @receiver(pre_save, sender='legajos.Consentimiento')
 def consentimiento_pre_save(sender, instance, **kwargs):
     """Captura el estado anterior del consentimiento"""
-    if instance.pk:
-        try:
-            instance._estado_anterior = modelo_a_dict(
-                sender.objects.get(pk=instance.pk)
-            )
-        except sender.DoesNotExist:
-            instance._estado_anterior = None
+    instance._estado_anterior = estado_anterior_dict(instance)
 
 
 @receiver(post_save, sender='legajos.Consentimiento')
@@ -467,7 +483,8 @@ def consentimiento_post_save(sender, instance, created, **kwargs):
     
     accion = 'CREATE' if created else 'UPDATE'
     
-    AuditoriaConsentimiento.objects.create(
+    registrar(
+        AuditoriaConsentimiento,
         consentimiento=instance,
         accion=accion,
         usuario=request_info['usuario'],
@@ -497,6 +514,7 @@ def consentimiento_pre_delete(sender, instance, **kwargs):
     if instance.archivo:
         archivo_hash = calcular_hash_archivo(instance.archivo)
     
+    # Escritura síncrona: el registro referencia al consentimiento antes de que se elimine
     AuditoriaConsentimiento.objects.create(
         consentimiento_id=instance.pk,
         accion='DELETE',
@@ -509,7 +527,8 @@ def consentimiento_pre_delete(sender, instance, **kwargs):
     )
     
     # Generar alerta crítica
-    AlertaAuditoria.objects.create(
+    registrar(
+        AlertaAuditoria,
         tipo='CAMBIOS_CRITICOS',
         severidad='CRITICA',
         usuario_afectado=request_info['usuario'] or User.objects.first(),
@@ -528,14 +547,11 @@ def consentimiento_pre_delete(sender, instance, **kwargs):
 @receiver(pre_save, sender='legajos.Derivacion')
 def derivacion_pre_save(sender, instance, **kwargs):
     """Captura el estado anterior de la derivación"""
-    if instance.pk:
-        try:
-            anterior = sender.objects.get(pk=instance.pk)
-            instance._estado_anterior = modelo_a_dict(anterior)
-            instance._estado_anterior_valor = anterior.estado
-            instance._urgencia_anterior = anterior.urgencia
-        except sender.DoesNotExist:
-            instance._estado_anterior = None
+    anterior = estado_anterior(instance)
+    instance._estado_anterior = estado_anterior_dict(instance)
+    if anterior is not None:
+        instance._estado_anterior_valor = anterior['estado']
+        instance._urgencia_anterior = anterior['urgencia']
 
 
 @receiver(post_save, sender='legajos.Derivacion')
@@ -555,7 +571,8 @@ def derivacion_post_save(sender, instance, created, **kwargs):
         instance._urgencia_anterior != instance.urgencia
     )
     
-    AuditoriaDerivacion.objects.create(
+    registrar(
+        AuditoriaDerivacion,
         derivacion=instance,
         accion='CREATE' if created else 'UPDATE',
         usuario=request_info['usuario'],
@@ -577,13 +594,10 @@ def derivacion_post_save(sender, instance, created, **kwargs):
 @receiver(pre_save, sender='legajos.PlanIntervencion')
 def plan_pre_save(sender, instance, **kwargs):
     """Captura el estado anterior del plan"""
-    if instance.pk:
-        try:
-            anterior = sender.objects.get(pk=instance.pk)
-            instance._estado_anterior = modelo_a_dict(anterior)
-            instance._vigente_anterior = anterior.vigente
-        except sender.DoesNotExist:
-            instance._estado_anterior = None
+    anterior = estado_anterior(instance)
+    instance._estado_anterior = estado_anterior_dict(instance)
+    if anterior is not None:
+        instance._vigente_anterior = anterior['vigente']
 
 
 @receiver(post_save, sender='legajos.PlanIntervencion')
@@ -600,7 +614,8 @@ def plan_post_save(sender, instance, created, **kwargs):
     )
     
     if created:
-        AuditoriaPlanIntervencion.objects.create(
+        registrar(
+            AuditoriaPlanIntervencion,
             plan=instance,
             accion='CREATE',
             usuario=request_info['usuario'],
@@ -613,7 +628,8 @@ def plan_post_save(sender, instance, created, **kwargs):
         campos_modificados = detectar_campos_modificados(instance, datos_anteriores)
         
         if campos_modificados:
-            AuditoriaPlanIntervencion.objects.create(
+            registrar(
+                AuditoriaPlanIntervencion,
                 plan=instance,
                 accion='UPDATE',
                 usuario=request_info['usuario'],
@@ -634,14 +650,11 @@ def plan_post_save(sender, instance, created, **kwargs):
 @receiver(pre_save, sender='core.Institucion')
 def institucion_pre_save(sender, instance, **kwargs):
     """Captura el estado anterior de la institución"""
-    if instance.pk:
-        try:
-            anterior = sender.objects.get(pk=instance.pk)
-            instance._estado_anterior = modelo_a_dict(anterior)
-            instance._estado_registro_anterior = anterior.estado_registro
-            instance._activo_anterior = anterior.activo
-        except sender.DoesNotExist:
-            instance._estado_anterior = None
+    anterior = estado_anterior(instance)
+    instance._estado_anterior = estado_anterior_dict(instance)
+    if anterior is not None:
+        instance._estado_registro_anterior = anterior['estado_registro']
+        instance._activo_anterior = anterior['activo']
 
 
 @receiver(post_save, sender='core.Institucion')
@@ -653,7 +666,8 @@ def institucion_post_save(sender, instance, created, **kwargs):
     datos_nuevos = modelo_a_dict(instance)
     
     if created:
-        AuditoriaInstitucion.objects.create(
+        registrar(
+            AuditoriaInstitucion,
             institucion=instance,
             accion='CREATE',
             usuario=request_info['usuario'],
@@ -674,7 +688,8 @@ def institucion_post_save(sender, instance, created, **kwargs):
         )
         
         if campos_modificados:
-            AuditoriaInstitucion.objects.create(
+            registrar(
+                AuditoriaInstitucion,
                 institucion=instance,
                 accion='UPDATE',
                 usuario=request_info['usuario'],
@@ -0,0 +1,73 @@
+"""
+Servidor HTTP de prueba para los clientes de servicios externos.
+
+``ConServidorFalso`` levanta el manejador del TestCase en un puerto libre,
+aplica caches locmem y los ajustes que dependen de la URL del servidor, y lo
+detiene al terminar la clase.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import override_settings
+
+CACHES_PRUEBA = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-sessions'},
+}
+
+
+class ManejadorFalso(BaseHTTPRequestHandler):
+    """Manejador con keep-alive (la sesión del cliente reutiliza la conexión) y respuestas JSON"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def responder(self, payload, status=200):
+        cuerpo = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConServidorFalso:
+    """
+    Mixin de TestCase. Las subclases definen ``manejador`` y, si hace falta,
+    ``ajustes_servidor(url)`` (settings) y ``parches_servidor(url)`` (mock.patch).
+    """
+
+    manejador = ManejadorFalso
+
+    @classmethod
+    def ajustes_servidor(cls, url):
+        return {}
+
+    @classmethod
+    def parches_servidor(cls, url):
+        return []
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), cls.manejador)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.url_servidor = f'http://127.0.0.1:{cls.servidor.server_port}'
+        cls._ajustes = override_settings(CACHES=CACHES_PRUEBA, **cls.ajustes_servidor(cls.url_servidor))
+        cls._ajustes.enable()
+        cls._parches = cls.parches_servidor(cls.url_servidor)
+        for parche in cls._parches:
+            parche.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for parche in cls._parches:
+            parche.stop()
+        cls._ajustes.disable()
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
@@ -0,0 +1,35 @@
+"""
+Vistas auditadas por AccesoSensibleMiddleware.
+
+Cada entrada de VISTAS_SENSIBLES debe nombrar una ruta existente cuya URL
+incluya el kwarg declarado con el id del objeto; si no, el acceso no se audita.
+"""
+
+from django.test import SimpleTestCase
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from core.middleware_auditoria import AccesoSensibleMiddleware
+
+
+def _rutas(patrones, namespace=''):
+    """view_name -> kwargs de la URL (prefijo del include incluido)"""
+    rutas = {}
+    for patron in patrones:
+        if isinstance(patron, URLResolver):
+            prefijo = f'{namespace}{patron.namespace}:' if patron.namespace else namespace
+            for nombre, kwargs in _rutas(patron.url_patterns, prefijo).items():
+                rutas.setdefault(nombre, set()).update(kwargs | set(patron.pattern.converters))
+        elif isinstance(patron, URLPattern) and patron.name:
+            rutas.setdefault(f'{namespace}{patron.name}', set()).update(patron.pattern.converters)
+    return rutas
+
+
+class VistasSensiblesTests(SimpleTestCase):
+
+    def test_vistas_existen_y_traen_el_id_del_objeto(self):
+        rutas = _rutas(get_resolver().url_patterns)
+
+        for vista, (_, _, kwarg) in AccesoSensibleMiddleware.VISTAS_SENSIBLES.items():
+            with self.subTest(vista=vista):
+                self.assertIn(vista, rutas)
+                self.assertIn(kwarg, rutas[vista])
@@ -0,0 +1,111 @@
+"""
+Sincronización incremental de relevamientos contra un PostgREST de prueba.
+
+El servidor aplica los filtros de la consulta incremental (``updated_at=gte``
+y el keyset ``or=(...)``) y, como PostgreSQL, responde 400 ante un id vacío
+en la comparación con la columna uuid.
+"""
+
+import re
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils.dateparse import parse_datetime
+
+from core.models import MarcaSincronizacion, RelevamientoMirror
+from core.services import relevamientos_supabase as supabase
+from core.services.relevamientos_mirror import MARCA, SincronizacionRelevamientos
+from core.tests.servidor_falso import ConServidorFalso
+from core.tests.test_relevamientos_supabase import _SupabaseFalso
+
+KEYSET = re.compile(
+    r'^\(updated_at\.gt\."(?P<ts>[^"]+)",and\(updated_at\.eq\."(?P=ts)",id\.gt\."(?P<id>[^"]*)"\)\)$'
+)
+INICIO = datetime(2026, 3, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+
+class _RelevamientosFalso(_SupabaseFalso):
+    """Agrega /rest/v1/relevamientos, ordenado por (updated_at, id) y filtrado como PostgREST"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/rest/v1/relevamientos':
+            return super().do_GET()
+        params = parse_qs(url.query)
+        self.server.requests.append((url.path, params, self.client_address[1]))
+
+        filas = sorted(self.server.filas, key=lambda fila: (parse_datetime(fila['updated_at']), fila['id']))
+        if 'updated_at' in params:
+            desde = parse_datetime(params['updated_at'][0][len('gte.'):])
+            filas = [fila for fila in filas if parse_datetime(fila['updated_at']) >= desde]
+        if 'or' in params:
+            keyset = KEYSET.match(params['or'][0])
+            if keyset is None or not keyset['id']:
+                return self.responder({'code': '22P02', 'message': 'invalid input syntax for type uuid: ""'}, 400)
+            desde, ultimo_id = parse_datetime(keyset['ts']), keyset['id']
+            filas = [fila for fila in filas if (parse_datetime(fila['updated_at']), fila['id']) > (desde, ultimo_id)]
+        self.responder(filas[:int(params['limit'][0])])
+
+
+class SincronizacionIncrementalTests(ConServidorFalso, TestCase):
+
+    manejador = _RelevamientosFalso
+
+    @classmethod
+    def ajustes_servidor(cls, url):
+        return {
+            'SUPABASE_URL': url,
+            'SUPABASE_ANON_KEY': 'anon',
+            'SUPABASE_SERVICE_ROLE_KEY': 'service',
+            'RELEVAMIENTOS_SYNC_SOLAPAMIENTO': 120,
+        }
+
+    def setUp(self):
+        cache.clear()
+        supabase._session = None
+        self.servidor.requests = []
+        self.servidor.filas = []
+
+    def _agregar(self, segundos, apellido):
+        fila = {
+            'id': str(uuid.uuid4()),
+            'id_institucion': 1,
+            'responsable_apellido': apellido,
+            'responsable_nombre': 'Ana',
+            'responsable_dni': '30111222',
+            'usuario_username': 'relevador',
+            'updated_at': (INICIO + timedelta(seconds=segundos)).isoformat(),
+        }
+        self.servidor.filas.append(fila)
+        return fila
+
+    def _consultas(self):
+        return [params for ruta, params, _ in self.servidor.requests if ruta == '/rest/v1/relevamientos']
+
+    def test_dos_sincronizaciones_incrementales_seguidas(self):
+        self._agregar(0, 'Gómez')
+        segunda = self._agregar(10, 'Pérez')
+
+        self.assertEqual(SincronizacionRelevamientos.sincronizar(tamano_pagina=2), (2, 0))
+        marca = MarcaSincronizacion.objects.get(nombre=MARCA)
+        self.assertEqual((marca.updated_at, marca.ultimo_id), (parse_datetime(segunda['updated_at']), segunda['id']))
+
+        nueva = self._agregar(20, 'Ruiz')
+        self.servidor.requests.clear()
+
+        # La ventana de solapamiento relee las dos primeras y pagina por keyset hasta la nueva
+        self.assertEqual(SincronizacionRelevamientos.sincronizar(tamano_pagina=2), (3, 0))
+
+        primera_pagina, segunda_pagina = self._consultas()
+        self.assertNotIn('or', primera_pagina)
+        self.assertTrue(primera_pagina['updated_at'][0].startswith('gte.'))
+        self.assertIn(f'id.gt."{segunda["id"]}"', segunda_pagina['or'][0])
+
+        marca.refresh_from_db()
+        self.assertEqual(marca.ultimo_error, '')
+        self.assertEqual(marca.ultimo_id, nueva['id'])
+        self.assertEqual(RelevamientoMirror.objects.count(), 3)
+        self.assertEqual(RelevamientoMirror.objects.get(pk=nueva['id']).institucion_nombre, 'Centro Norte')
@@ -0,0 +1,109 @@
+"""
+Cliente de Supabase para relevamientos contra un servidor PostgREST de prueba.
+
+El servidor registra cada request (ruta, query y puerto del cliente) para
+verificar conexiones reutilizadas, consultas en lote y aciertos de cache.
+"""
+
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core.services import relevamientos_supabase as supabase
+from core.tests.servidor_falso import ConServidorFalso, ManejadorFalso
+
+ADJUNTOS_POR_RELEVAMIENTO = 2
+
+
+class _SupabaseFalso(ManejadorFalso):
+    """Responde /rest/v1/instituciones, /rest/v1/relevamiento_adjuntos y /auth/v1/admin/users/<id>"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        self.server.requests.append((url.path, params, self.client_address[1]))
+
+        if url.path == '/rest/v1/instituciones':
+            payload = [{'id': 1, 'nombre': 'Centro Norte'}, {'id': 2, 'nombre': 'Centro Sur'}]
+        elif url.path == '/rest/v1/relevamiento_adjuntos':
+            ids = params['relevamiento_id'][0][len('in.('):-1].split(',')
+            payload = [{'relevamiento_id': rid} for rid in ids for _ in range(ADJUNTOS_POR_RELEVAMIENTO)]
+        elif url.path.startswith('/auth/v1/admin/users/'):
+            user_id = url.path.rsplit('/', 1)[-1]
+            payload = {'user': {'id': user_id, 'user_metadata': {'username': f'usuario-{user_id}'}}}
+        else:
+            self.send_error(404)
+            return
+
+        self.responder(payload)
+
+
+class ClienteSupabaseTests(ConServidorFalso, SimpleTestCase):
+
+    manejador = _SupabaseFalso
+
+    @classmethod
+    def ajustes_servidor(cls, url):
+        return {
+            'SUPABASE_URL': url,
+            'SUPABASE_ANON_KEY': 'anon',
+            'SUPABASE_SERVICE_ROLE_KEY': 'service',
+            'SUPABASE_MAX_WORKERS': 4,
+        }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor.requests = []
+
+    def setUp(self):
+        cache.clear()
+        self.servidor.requests.clear()
+        supabase._session = None
+
+    def _rutas(self, prefijo=''):
+        return [ruta for ruta, _, _ in self.servidor.requests if ruta.startswith(prefijo)]
+
+    def test_sesion_compartida_reutiliza_la_conexion(self):
+        sesion = supabase._get_session()
+        for _ in range(3):
+            cache.clear()
+            supabase.instituciones_map()
+
+        self.assertIs(supabase._get_session(), sesion)
+        puertos = {puerto for _, _, puerto in self.servidor.requests}
+        self.assertEqual(len(self.servidor.requests), 3)
+        self.assertEqual(len(puertos), 1)
+
+    def test_instituciones_desde_cache(self):
+        primera = supabase.instituciones_map()
+        segunda = supabase.instituciones_map()
+
+        self.assertEqual(primera, {1: 'Centro Norte', 2: 'Centro Sur'})
+        self.assertEqual(segunda, primera)
+        self.assertEqual(self._rutas('/rest/v1/instituciones'), ['/rest/v1/instituciones'])
+
+    def test_count_adjuntos_en_lotes(self):
+        ids = [f'rel-{n}' for n in range(supabase.ADJUNTOS_POR_CONSULTA * 2 + 50)]
+
+        conteos = supabase.count_adjuntos(ids)
+
+        self.assertEqual(len(self._rutas('/rest/v1/relevamiento_adjuntos')), 3)
+        self.assertEqual(conteos, {rid: ADJUNTOS_POR_RELEVAMIENTO for rid in ids})
+
+    def test_usernames_solo_consulta_los_faltantes(self):
+        cache.set(supabase.CACHE_USERNAME.format('u1'), 'en-cache')
+
+        usernames = supabase.fetch_usernames_by_user_ids(['u1', 'u2', 'u3', 'u2'])
+
+        self.assertEqual(usernames, {'u1': 'en-cache', 'u2': 'usuario-u2', 'u3': 'usuario-u3'})
+        self.assertCountEqual(
+            self._rutas('/auth/v1/admin/users/'),
+            ['/auth/v1/admin/users/u2', '/auth/v1/admin/users/u3'],
+        )
+        self.assertEqual(cache.get(supabase.CACHE_USERNAME.format('u3')), 'usuario-u3')
+
+        self.servidor.requests.clear()
+        supabase.fetch_usernames_by_user_ids(['u1', 'u2', 'u3'])
+        self.assertEqual(self._rutas('/auth/v1/admin/users/'), [])
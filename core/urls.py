@@ -16,6 +16,8 @@ from .performance_dashboard import (
     system_metrics_api,
     alerts_api,
     realtime_metrics_api,
+    concurrency_metrics_api,
+    request_metrics_api,
     phase2_metrics_api,
     run_phase2_tests_api,
 )
@@ -43,6 +45,8 @@ urlpatterns = [
     path("system-metrics-api/", system_metrics_api, name="system_metrics_api"),
     path("alerts-api/", alerts_api, name="alerts_api"),
     path("realtime-metrics-api/", realtime_metrics_api, name="realtime_metrics_api"),
+    path("concurrency-metrics-api/", concurrency_metrics_api, name="concurrency_metrics_api"),
+    path("metrics/", request_metrics_api, name="request_metrics"),
     path("phase2-metrics-api/", phase2_metrics_api, name="phase2_metrics_api"),
     path("run-phase2-tests-api/", run_phase2_tests_api, name="run_phase2_tests_api"),
 ]
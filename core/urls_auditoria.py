@@ -11,6 +11,8 @@ urlpatterns = [
     path('logs/acciones/', views_auditoria.logs_acciones, name='logs_acciones'),
     path('logs/descargas/', views_auditoria.logs_descargas, name='logs_descargas'),
     path('logs/exportar/', views_auditoria.exportar_logs, name='exportar_logs'),
+    path('logs/exportar/<str:job_id>/', views_auditoria.estado_exportacion_logs, name='estado_exportacion'),
+    path('logs/exportar/<str:job_id>/descargar/', views_auditoria.descargar_exportacion_logs, name='descargar_exportacion'),
     
     # Sesiones
     path('sesiones/', views_auditoria.sesiones_usuario, name='sesiones'),
@@ -1,5 +1,4 @@
 # Create your views here.
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
@@ -10,15 +9,16 @@ from django.views.decorators.http import require_GET
 
 from core.models import (
     Localidad,
+    MarcaSincronizacion,
     Municipio,
+    RelevamientoMirror,
 )
+from core.services.relevamientos_mirror import MARCA, BusquedaRelevamientos
 from core.services.relevamientos_supabase import (
-    fetch_adjuntos_counts,
-    fetch_instituciones_list,
+    ERROR_NO_ENCONTRADO,
     fetch_relevamiento_detail,
-    fetch_relevamientos,
     get_storage_signed_url,
-    fetch_usernames_by_user_ids,
+    get_storage_signed_urls,
     fetch_username_by_user_id,
 )
 
@@ -77,42 +77,35 @@ def inicio_view(request):
 
 @login_required
 def relevamientos_view(request):
-    """Vista de listado de relevamientos web."""
+    """Vista de listado de relevamientos web (copia local sincronizada desde Supabase)."""
     query = (request.GET.get("q") or "").strip()
     institucion_id = (request.GET.get("institucion_id") or "").strip()
-    result = fetch_relevamientos(limit=300, query=query, institucion_id=institucion_id or None)
-    items = result.get("items", [])
-    adjuntos_counts = fetch_adjuntos_counts([str(x.get("id")) for x in items if x.get("id")])
-    instituciones = fetch_instituciones_list()
-    usernames_by_user_id = fetch_usernames_by_user_ids([str(x.get("created_by")) for x in items if x.get("created_by")])
+    items = BusquedaRelevamientos.listar(
+        query=query, institucion_id=int(institucion_id) if institucion_id.isdigit() else None
+    )
+    instituciones = BusquedaRelevamientos.instituciones()
 
     for row in items:
-        created_at = parse_datetime(row.get("created_at") or "")
-        row["created_at_fmt"] = localtime(created_at).strftime("%d/%m/%Y %H:%M") if created_at else "-"
-
-        nombre = (row.get("responsable_nombre") or "").strip()
-        apellido = (row.get("responsable_apellido") or "").strip()
-        full_name = f"{nombre} {apellido}".strip()
-        row["responsable_full_name"] = full_name or "-"
-        row["tiene_adjuntos"] = adjuntos_counts.get(str(row.get("id")), 0) > 0
-        created_by = str(row.get("created_by") or "")
-        row["usuario_relevamiento"] = (
-            (row.get("usuario_username") or "").strip()
-            or (usernames_by_user_id.get(created_by, "-") if created_by else "-")
+        row.created_at_fmt = localtime(row.created_at).strftime("%d/%m/%Y %H:%M") if row.created_at else "-"
+        row.responsable_full_name = f"{row.responsable_nombre.strip()} {row.responsable_apellido.strip()}".strip() or "-"
+        row.tiene_adjuntos = row.adjuntos > 0
+        row.usuario_relevamiento = row.usuario_relevamiento or "sin_usuario"
+
+    marca = MarcaSincronizacion.objects.filter(nombre=MARCA).first()
+    if not marca or not marca.ultima_ejecucion:
+        messages.warning(
+            request, "La copia local de relevamientos aun no se sincronizo. Ejecuta: python manage.py sincronizar_relevamientos"
         )
-        if not row["usuario_relevamiento"] or row["usuario_relevamiento"] == "-":
-            row["usuario_relevamiento"] = "sin_usuario"
-
-    if not result.get("success"):
-        messages.error(request, result.get("error") or "No se pudo cargar relevamientos")
-    elif not (getattr(settings, "SUPABASE_URL", "") and (getattr(settings, "SUPABASE_ANON_KEY", "") or getattr(settings, "SUPABASE_KEY", ""))):
-        messages.warning(request, "Supabase no esta configurado. Defini SUPABASE_URL y SUPABASE_ANON_KEY en .env")
+    elif marca.ultimo_error:
+        messages.error(request, f"La ultima sincronizacion con Supabase fallo: {marca.ultimo_error}")
 
     context = {
         "relevamientos": items,
         "q": query,
         "instituciones": instituciones,
         "institucion_id": institucion_id,
+        "ultima_sincronizacion": localtime(marca.ultima_ejecucion).strftime("%d/%m/%Y %H:%M")
+        if marca and marca.ultima_ejecucion else "",
     }
     return render(request, "core/relevamientos.html", context)
 
@@ -121,6 +114,15 @@ def relevamientos_view(request):
 def relevamiento_detail_view(request, relevamiento_id):
     """Vista de detalle de un relevamiento."""
     result = fetch_relevamiento_detail(str(relevamiento_id))
+    if not result.get("success") and result.get("error") != ERROR_NO_ENCONTRADO:
+        # Supabase no responde: datos de la copia local, sin adjuntos ni campos extra
+        mirror = RelevamientoMirror.objects.filter(pk=relevamiento_id).first()
+        if mirror:
+            messages.warning(request, f"{result.get('error')}. Se muestran los datos de la ultima sincronizacion, sin adjuntos.")
+            item = {**mirror.datos, "institucion_nombre": mirror.institucion_nombre or "-"}
+            if mirror.usuario_relevamiento:
+                item["usuario_username"] = mirror.usuario_relevamiento
+            result = {"success": True, "item": item, "adjuntos": [], "campos_extra": []}
     if not result.get("success"):
         messages.error(request, result.get("error") or "No se pudo cargar el detalle del relevamiento")
         return render(request, "core/relevamiento_detail.html", {"item": None, "adjuntos": [], "campos_extra": []})
@@ -152,10 +154,20 @@ def relevamiento_detail_view(request, relevamiento_id):
     image_adjuntos = []
     file_adjuntos = []
     signature_attachment = None
+    # Una URL firmada por adjunto: se piden en paralelo por bucket
+    rutas_por_bucket = {}
+    for adjunto in result.get("adjuntos", []):
+        path = (adjunto.get("storage_path") or "").strip()
+        bucket = (adjunto.get("storage_bucket") or "relevamientos").strip() or "relevamientos"
+        rutas_por_bucket.setdefault(bucket, []).append(path)
+    signed_urls = {
+        bucket: get_storage_signed_urls(paths, bucket=bucket)
+        for bucket, paths in rutas_por_bucket.items()
+    }
     for adjunto in result.get("adjuntos", []):
         path = (adjunto.get("storage_path") or "").strip()
         bucket = (adjunto.get("storage_bucket") or "relevamientos").strip() or "relevamientos"
-        signed_url = get_storage_signed_url(path, bucket=bucket) if path else ""
+        signed_url = signed_urls[bucket].get(path, "") if path else ""
         mime_type = (adjunto.get("mime_type") or "").lower()
         tipo_archivo = (adjunto.get("tipo_archivo") or "").upper()
         categoria = (adjunto.get("categoria") or "").upper()
@@ -1,15 +1,17 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
 from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.core.paginator import Paginator
 from django.contrib import messages
-import csv
+from django.urls import reverse
 import json
+import os
 
+from .exportacion import Columna, ExportacionCSV, estado_exportacion, fmt_choices, fmt_fecha, iniciar_exportacion
 from .models_auditoria import LogAccion, LogDescargaArchivo, SesionUsuario, AlertaAuditoria
 from .models_auditoria_extendida import (
     AuditoriaCiudadano, AuditoriaLegajo, AuditoriaEvaluacion,
@@ -336,39 +338,75 @@ def historial_cambios(request):
     return render(request, 'core/auditoria/historial_cambios.html', context)
 
 
+def _exportacion_logs(tipo):
+    """Exportación de logs de auditoría (más recientes primero), o None si el tipo no existe"""
+    usuario = Columna('Usuario', 'usuario__username', lambda username: username or 'Anónimo')
+    fecha = Columna('Fecha', 'timestamp', fmt_fecha('%Y-%m-%d %H:%M:%S'))
+    ip = Columna('IP', 'ip_address')
+    nombre_archivo = f'logs_{tipo}_{timezone.now().strftime("%Y%m%d")}.csv'
+
+    if tipo == 'acciones':
+        columnas = [
+            usuario,
+            Columna('Acción', 'accion', fmt_choices(LogAccion.TipoAccion.choices)),
+            Columna('Modelo', 'modelo'),
+            Columna('Objeto', 'objeto_repr'),
+            fecha,
+            ip,
+        ]
+        return ExportacionCSV(LogAccion.objects.all(), columnas, nombre_archivo, descendente=True)
+
+    if tipo == 'descargas':
+        columnas = [usuario, Columna('Archivo', 'archivo_nombre'), fecha, ip]
+        return ExportacionCSV(LogDescargaArchivo.objects.all(), columnas, nombre_archivo, descendente=True)
+
+    return None
+
+
 @login_required
 @user_passes_test(es_administrador)
 def exportar_logs(request):
-    """Exportar logs a CSV"""
+    """
+    Exportar logs a CSV en streaming (?gzip=1 para comprimir).
+    Con ?modo=archivo la exportación corre en segundo plano y se descarga desde
+    `estado_exportacion` / `descargar_exportacion` cuando termina.
+    """
     tipo = request.GET.get('tipo', 'acciones')
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="logs_{tipo}_{timezone.now().strftime("%Y%m%d")}.csv"'
-    
-    writer = csv.writer(response)
-    
-    if tipo == 'acciones':
-        writer.writerow(['Usuario', 'Acción', 'Modelo', 'Objeto', 'Fecha', 'IP'])
-        logs = LogAccion.objects.select_related('usuario').all()[:1000]
-        for log in logs:
-            writer.writerow([
-                log.usuario.username if log.usuario else 'Anónimo',
-                log.get_accion_display(),
-                log.modelo,
-                log.objeto_repr,
-                log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                log.ip_address
-            ])
-    
-    elif tipo == 'descargas':
-        writer.writerow(['Usuario', 'Archivo', 'Fecha', 'IP'])
-        logs = LogDescargaArchivo.objects.select_related('usuario').all()[:1000]
-        for log in logs:
-            writer.writerow([
-                log.usuario.username if log.usuario else 'Anónimo',
-                log.archivo_nombre,
-                log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                log.ip_address
-            ])
-    
-    return response
\ No newline at end of file
+    exportacion = _exportacion_logs(tipo)
+    if exportacion is None:
+        return JsonResponse({'error': f'Tipo de log inválido: {tipo}'}, status=400)
+
+    if request.GET.get('modo') == 'archivo':
+        job_id = iniciar_exportacion(exportacion, request.user, comprimir=True)
+        return JsonResponse({
+            'job_id': job_id,
+            'estado_url': reverse('auditoria:estado_exportacion', args=[job_id]),
+            'descarga_url': reverse('auditoria:descargar_exportacion', args=[job_id]),
+        }, status=202)
+
+    return exportacion.streaming_response(comprimir=request.GET.get('gzip') == '1')
+
+
+def _job_del_usuario(request, job_id):
+    job = estado_exportacion(job_id)
+    if job is None or job['usuario_id'] != request.user.pk:
+        raise Http404('Exportación inexistente o expirada')
+    return job
+
+
+@login_required
+@user_passes_test(es_administrador)
+def estado_exportacion_logs(request, job_id):
+    """Estado de una exportación en segundo plano"""
+    job = _job_del_usuario(request, job_id)
+    return JsonResponse({campo: valor for campo, valor in job.items() if campo != 'ruta'})
+
+
+@login_required
+@user_passes_test(es_administrador)
+def descargar_exportacion_logs(request, job_id):
+    """Descarga del archivo generado por una exportación completada"""
+    job = _job_del_usuario(request, job_id)
+    if job['estado'] != 'COMPLETADO' or not os.path.exists(job['ruta']):
+        return JsonResponse({'error': 'La exportación no está disponible', 'estado': job['estado']}, status=409)
+    return FileResponse(open(job['ruta'], 'rb'), as_attachment=True, filename=job['nombre'])
@@ -3,10 +3,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db.models import Count, Q
 from django.utils import timezone
-from django.utils.html import escape
 from datetime import datetime, timedelta
 from legajos.models import LegajoAtencion, Ciudadano, SeguimientoContacto, AlertaCiudadano
-from users.models import User
+from legajos.services_metricas import MetricasLegajosService
+from legajos.services_busqueda import CiudadanoSearch
+from core.actividad_sesiones import ActividadSesiones
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,21 +19,17 @@ def metricas_dashboard(request):
     
     # Métricas básicas
     total_ciudadanos = Ciudadano.objects.count()
-    total_legajos = LegajoAtencion.objects.count()
-    legajos_activos = LegajoAtencion.objects.filter(estado__in=['ABIERTO', 'EN_SEGUIMIENTO']).count()
     alertas_activas = AlertaCiudadano.objects.filter(activa=True).count()
     
-    # Seguimientos hoy
-    hoy = timezone.now().date()
-    seguimientos_hoy = SeguimientoContacto.objects.filter(creado__date=hoy).count()
+    # Legajos y seguimientos desde las tablas de métricas pre-agregadas
+    legajos_activos = MetricasLegajosService.resumen()['legajos_activos']
+    seguimientos_hoy = MetricasLegajosService.seguimientos_del_dia()
     
     # Estados de legajos
-    estados = LegajoAtencion.objects.values('estado').annotate(count=Count('id'))
-    estados_dict = {estado['estado']: estado['count'] for estado in estados}
+    estados_dict = {fila['estado']: fila['total'] for fila in MetricasLegajosService.por_estado()}
     
-    # Usuarios conectados (últimas 24 horas)
-    hace_24h = timezone.now() - timedelta(hours=24)
-    usuarios_activos = User.objects.filter(last_login__gte=hace_24h).count()
+    # Usuarios conectados (actividad reciente registrada por SesionUsuarioMiddleware)
+    usuarios_activos = ActividadSesiones.usuarios_en_linea()
     
     return Response({
         'metricas': {
@@ -54,17 +51,15 @@ def metricas_dashboard(request):
 @permission_classes([IsAuthenticated])
 def buscar_ciudadanos(request):
     """Búsqueda rápida de ciudadanos"""
-    query = escape(request.GET.get('q', '').strip())
+    query = request.GET.get('q', '').strip()
     
     if len(query) < 3:
         return Response({'results': []})
     
     try:
-        ciudadanos = Ciudadano.objects.only('id', 'nombre', 'apellido', 'dni').filter(
-            Q(nombre__icontains=query) |
-            Q(apellido__icontains=query) |
-            Q(dni__icontains=query)
-        )[:8]
+        ciudadanos = CiudadanoSearch.buscar(
+            query, limite=8, solo_activos=False, campos=('id', 'nombre', 'apellido', 'dni')
+        )
         
         resultados = [{
             'id': c.id,
@@ -1,4 +1,5 @@
 # Configuración Gunicorn para 1000+ usuarios
+import importlib
 import multiprocessing
 import os
 
@@ -41,4 +42,23 @@ def worker_int(worker):
     worker.log.info("Worker interrumpido")
 
 def pre_fork(server, worker):
-    server.log.info("Worker %s iniciando", worker.pid)
\ No newline at end of file
+    server.log.info("Worker %s iniciando", worker.pid)
+
+def _detener(worker, modulo, nombre):
+    """Detiene el componente por proceso ``modulo.nombre`` (PorProceso) si este worker lo creó"""
+    try:
+        instancia = getattr(importlib.import_module(modulo), nombre).existente()
+        if instancia is not None:
+            instancia.detener()
+    except Exception as e:
+        worker.log.error("No se pudo detener %s.%s: %s", modulo, nombre, e)
+
+def worker_exit(server, worker):
+    # Analizar los mensajes de riesgo que quedaron en la cola (puede generar auditoría)
+    _detener(worker, "conversaciones.riesgo", "get_analizador")
+    # Sumar las repeticiones de accesos sensibles pendientes a sus filas de auditoría
+    _detener(worker, "core.accesos_sensibles", "get_agrupador")
+    # Escribir la última actividad de sesiones acumulada en Redis
+    _detener(worker, "core.actividad_sesiones", "get_flusher")
+    # Persistir auditoría pendiente del buffer antes de reciclar el worker
+    _detener(worker, "core.buffer_auditoria", "get_buffer")
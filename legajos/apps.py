@@ -10,4 +10,6 @@ class LegajosConfig(AppConfig):
         import legajos.signals
         import legajos.signals_alertas
         import legajos.signals_historial
+        import legajos.signals_metricas  # Métricas pre-agregadas de reportes
         import legajos.signals_programas  # Importar signals de programas
+        import legajos.signals_busqueda  # Índice de búsqueda de ciudadanos
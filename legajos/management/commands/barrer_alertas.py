@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.notificaciones_ws import agrupar
+from legajos.motor_alertas import MotorAlertas
+from legajos.services_alertas import AlertasService
+
+
+class Command(BaseCommand):
+    help = (
+        'Evalúa todas las reglas de alertas sobre toda la población (una query por regla) '
+        'y sincroniza AlertaCiudadano en bloque. Ejecutar periódicamente para las '
+        'condiciones que dependen del paso del tiempo (sin contacto, sin evaluación, etc.); '
+        '--intervalo deja el comando corriendo como worker'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notificar', action='store_true',
+                            help='Enviar notificación WebSocket por cada alerta nueva')
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help='Segundos entre barridos (0 = un solo barrido)')
+
+    def handle(self, *args, **options):
+        if not options['intervalo']:
+            self._barrido(options['notificar'])
+            return
+
+        self.stdout.write(f'Barriendo alertas cada {options["intervalo"]}s...')
+        while True:
+            close_old_connections()
+            try:
+                self._barrido(options['notificar'])
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Error barriendo alertas: {e}'))
+            time.sleep(options['intervalo'])
+
+    def _barrido(self, notificar):
+        inicio = time.monotonic()
+        self.stdout.write('Barriendo alertas...')
+
+        resultado = MotorAlertas.barrer(recuperar=notificar)
+        if notificar:
+            with agrupar():
+                AlertasService._notificar_alertas(resultado['creadas'])
+
+        for tipo, (coincidencias, segundos) in resultado['reglas'].items():
+            self.stdout.write(f'  {tipo:<22} {coincidencias:>8} coincidencias  {segundos:6.2f}s')
+
+        duracion = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado["legajos"]} legajos / {resultado["ciudadanos"]} ciudadanos en {duracion:.1f}s '
+            f'({resultado["legajos"] / duracion if duracion else 0:.0f} legajos/s): '
+            f'{len(resultado["creadas"])} creadas, {resultado["actualizadas"]} actualizadas, '
+            f'{resultado["desactivadas"]} desactivadas'
+        ))
@@ -0,0 +1,56 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from legajos.models import Ciudadano
+from legajos.services_busqueda import CiudadanoSearch
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de CiudadanoSearch con consultas tomadas de ciudadanos existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consultas', type=int, default=200,
+                            help='Ciudadanos de muestra (cada uno genera una consulta por tipo)')
+        parser.add_argument('--limite', type=int, default=10, help='Resultados por consulta')
+
+    def handle(self, *args, **options):
+        total = Ciudadano.objects.count()
+        if not total:
+            self.stdout.write(self.style.WARNING('No hay ciudadanos para medir'))
+            return
+
+        # Muestra por rangos de pk (un OFFSET aleatorio recorrería la tabla)
+        primero, ultimo = Ciudadano.objects.order_by('pk').values_list('pk', flat=True)[0], \
+            Ciudadano.objects.order_by('-pk').values_list('pk', flat=True)[0]
+        muestra = [
+            Ciudadano.objects.filter(pk__gte=random.randint(primero, ultimo))
+            .order_by('pk').values('dni', 'nombre', 'apellido').first()
+            for _ in range(options['consultas'])
+        ]
+        tipos = {
+            'dni exacto': lambda c: c['dni'],
+            'prefijo dni': lambda c: c['dni'][:4],
+            'prefijo apellido': lambda c: c['apellido'][:3],
+            'apellido nombre': lambda c: f"{c['apellido']} {c['nombre'][:2]}",
+            'difusa': lambda c: c['apellido'].replace('z', 's').replace('v', 'b'),
+        }
+
+        self.stdout.write(f'=== CiudadanoSearch ({total} ciudadanos, {len(muestra)} consultas por tipo) ===')
+        self.stdout.write(f'{"Tipo":<20}{"p50 ms":>10}{"p95 ms":>10}{"máx ms":>10}{"con resultados":>16}')
+        for nombre, consulta in tipos.items():
+            tiempos = []
+            encontrados = 0
+            for ciudadano in muestra:
+                inicio = time.perf_counter()
+                resultado = CiudadanoSearch.buscar_ids(consulta(ciudadano), limite=options['limite'])
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                encontrados += bool(resultado)
+            tiempos.sort()
+            p50 = tiempos[len(tiempos) // 2]
+            p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+            estilo = self.style.SUCCESS if p95 < 20 else self.style.WARNING
+            self.stdout.write(estilo(
+                f'{nombre:<20}{p50:>10.2f}{p95:>10.2f}{tiempos[-1]:>10.2f}{encontrados:>16}'
+            ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from legajos.services_riesgo import TAMANO_LOTE, ScoringRiesgoService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula en lote las predicciones de riesgo de todos los legajos activos (ejecutar periódicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help=f'Legajos por lote de carga de features (default {TAMANO_LOTE})')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        self.stdout.write('Calculando predicciones de riesgo...')
+
+        def progreso(procesados, total):
+            self.stdout.write(f'  {procesados}/{total} legajos')
+
+        total = ScoringRiesgoService.recalcular_todo(tamano_lote=options['lote'], progreso=progreso)
+
+        duracion = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'Predicciones guardadas: {total} legajos en {duracion:.1f}s '
+            f'({total / duracion if duracion else 0:.0f} legajos/s)'
+        ))
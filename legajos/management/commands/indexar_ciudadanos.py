@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from legajos.services_busqueda import TAMANO_LOTE, CiudadanoSearch
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de ciudadanos (tras cargas masivas que no disparan signals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help=f'Ciudadanos por lote (default {TAMANO_LOTE})')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        self.stdout.write('Indexando ciudadanos...')
+
+        def progreso(procesados):
+            self.stdout.write(f'  {procesados} ciudadanos')
+
+        total = CiudadanoSearch.reindexar_todo(tamano_lote=options['lote'], progreso=progreso)
+
+        duracion = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruido: {total} ciudadanos en {duracion:.1f}s '
+            f'({total / duracion if duracion else 0:.0f} ciudadanos/s)'
+        ))
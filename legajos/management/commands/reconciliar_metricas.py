@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from legajos.services_metricas import MetricasLegajosService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las métricas pre-agregadas de legajos y corrige el drift de los contadores incrementales (ejecutar cada noche)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Calcula y reporta sin reemplazar las tablas')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        self.stdout.write('Reconciliando métricas de legajos...')
+
+        if options['dry_run']:
+            filas_legajos, filas_seguimientos = MetricasLegajosService.calcular_desde_cero()
+            cantidades = (len(filas_legajos), len(filas_seguimientos))
+        else:
+            cantidades = MetricasLegajosService.reconciliar()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Métricas reconciliadas: {cantidades[0]} filas de legajos, '
+            f'{cantidades[1]} días de seguimientos ({time.monotonic() - inicio:.1f}s)'
+        ))
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.20 on 2026-10-17 17:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_initial'),
+        ('legajos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaSeguimientoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('seguimientos', models.IntegerField(default=0)),
+                ('adherencia_adecuada', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Métrica diaria de seguimientos',
+                'verbose_name_plural': 'Métricas diarias de seguimientos',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MetricaLegajoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Fecha de apertura de los legajos contados')),
+                ('estado', models.CharField(max_length=20)),
+                ('nivel_riesgo', models.CharField(max_length=20)),
+                ('legajos', models.IntegerField(default=0)),
+                ('con_seguimiento', models.IntegerField(default=0, help_text='Legajos del grupo con al menos un seguimiento')),
+                ('dias_primer_contacto', models.IntegerField(default=0, help_text='Suma de días admisión → primer seguimiento de los legajos con seguimiento')),
+                ('derivaciones', models.IntegerField(default=0)),
+                ('derivaciones_aceptadas', models.IntegerField(default=0)),
+                ('eventos_criticos', models.IntegerField(default=0)),
+                ('dispositivo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='metricas_legajos', to='core.institucion')),
+            ],
+            options={
+                'verbose_name': 'Métrica diaria de legajos',
+                'verbose_name_plural': 'Métricas diarias de legajos',
+                'indexes': [models.Index(fields=['estado', 'nivel_riesgo'], name='legajos_met_estado_ef8263_idx'), models.Index(fields=['dispositivo', 'fecha'], name='legajos_met_disposi_01c7e8_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='metricalegajodiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'dispositivo', 'estado', 'nivel_riesgo'), name='uniq_metrica_legajo_diaria'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-17 17:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legajos', '0002_metricas_preagregadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrediccionRiesgo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score_abandono', models.PositiveSmallIntegerField(default=0)),
+                ('nivel_abandono', models.CharField(max_length=10)),
+                ('factores_abandono', models.JSONField(blank=True, default=list)),
+                ('score_evento', models.PositiveSmallIntegerField(default=0)),
+                ('nivel_evento', models.CharField(max_length=10)),
+                ('factores_evento', models.JSONField(blank=True, default=list)),
+                ('recomendaciones', models.JSONField(blank=True, default=list)),
+                ('calculado', models.DateTimeField()),
+                ('ciudadano', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='predicciones_riesgo', to='legajos.ciudadano')),
+                ('legajo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='prediccion_riesgo', to='legajos.legajoatencion')),
+            ],
+            options={
+                'verbose_name': 'Predicción de riesgo',
+                'verbose_name_plural': 'Predicciones de riesgo',
+                'indexes': [models.Index(fields=['-score_abandono'], name='legajos_pre_score_a_eb0a88_idx'), models.Index(fields=['-score_evento'], name='legajos_pre_score_e_bb6e99_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.20 on 2026-10-17 18:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def indexar_ciudadanos(apps, schema_editor):
+    """Carga inicial del índice de búsqueda por lotes"""
+    from legajos.services_busqueda import tokenizar, clave_fonetica
+
+    Ciudadano = apps.get_model('legajos', 'Ciudadano')
+    TokenCiudadano = apps.get_model('legajos', 'TokenCiudadano')
+    ultimo = 0
+    while True:
+        lote = list(
+            Ciudadano.objects.filter(pk__gt=ultimo).order_by('pk')
+            .values_list('pk', 'nombre', 'apellido')[:5000]
+        )
+        if not lote:
+            return
+        tokens = []
+        for ciudadano_id, nombre, apellido in lote:
+            for campo, texto in (('A', apellido), ('N', nombre)):
+                for token in dict.fromkeys(tokenizar(texto)):
+                    token = token[:60]
+                    tokens.append(TokenCiudadano(
+                        ciudadano_id=ciudadano_id, campo=campo, token=token, fonetico=clave_fonetica(token)
+                    ))
+        TokenCiudadano.objects.bulk_create(tokens, batch_size=5000)
+        ultimo = lote[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legajos', '0003_predicciones_riesgo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenCiudadano',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campo', models.CharField(choices=[('A', 'Apellido'), ('N', 'Nombre')], max_length=1)),
+                ('token', models.CharField(max_length=60)),
+                ('fonetico', models.CharField(max_length=60)),
+                ('ciudadano', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_busqueda', to='legajos.ciudadano')),
+            ],
+            options={
+                'verbose_name': 'Token de búsqueda de ciudadano',
+                'verbose_name_plural': 'Tokens de búsqueda de ciudadanos',
+                'indexes': [models.Index(fields=['campo', 'token', 'ciudadano'], name='legajos_tok_campo_8be407_idx'), models.Index(fields=['token', 'ciudadano'], name='legajos_tok_token_ee2895_idx'), models.Index(fields=['fonetico', 'ciudadano'], name='legajos_tok_fonetic_3ad49c_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_ciudadanos, migrations.RunPython.noop),
+    ]
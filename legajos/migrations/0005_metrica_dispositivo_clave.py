@@ -0,0 +1,54 @@
+# Generated by Django 4.2.20 on 2026-10-17 18:52
+
+from django.db import migrations, models
+
+CONTADORES = (
+    'legajos', 'con_seguimiento', 'dias_primer_contacto',
+    'derivaciones', 'derivaciones_aceptadas', 'eventos_criticos',
+)
+
+
+def cargar_dispositivo_clave(apps, schema_editor):
+    """Copia dispositivo_id y une las filas sin dispositivo que la clave anterior dejó duplicar"""
+    from django.db.models import F
+
+    MetricaLegajoDiaria = apps.get_model('legajos', 'MetricaLegajoDiaria')
+    MetricaLegajoDiaria.objects.filter(dispositivo__isnull=False).update(dispositivo_clave=F('dispositivo_id'))
+
+    vistas = {}
+    duplicadas = []
+    for fila in MetricaLegajoDiaria.objects.filter(dispositivo__isnull=True).order_by('pk'):
+        clave = (fila.fecha, fila.estado, fila.nivel_riesgo)
+        destino = vistas.setdefault(clave, fila)
+        if destino is fila:
+            continue
+        for campo in CONTADORES:
+            setattr(destino, campo, getattr(destino, campo) + getattr(fila, campo))
+        duplicadas.append(fila.pk)
+    if duplicadas:
+        MetricaLegajoDiaria.objects.bulk_update(list(vistas.values()), list(CONTADORES))
+        MetricaLegajoDiaria.objects.filter(pk__in=duplicadas).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legajos', '0004_busqueda_ciudadanos'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='metricalegajodiaria',
+            name='uniq_metrica_legajo_diaria',
+        ),
+        migrations.AddField(
+            model_name='metricalegajodiaria',
+            name='dispositivo_clave',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(cargar_dispositivo_clave, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='metricalegajodiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'dispositivo_clave', 'estado', 'nivel_riesgo'), name='uniq_metrica_legajo_diaria'),
+        ),
+    ]
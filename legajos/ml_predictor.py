@@ -1,314 +1,272 @@
 """
 Sistema de predicción de riesgo basado en análisis de patrones
+
+Las reglas de puntaje son funciones puras sobre las features de un legajo
+(ver ScoringRiesgoService.cargar_features): el cálculo en lote (comando
+`calcular_riesgo`) y el cálculo puntual usan exactamente las mismas reglas.
 """
-from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db.models import Count, Avg
+
+
+def nivel_de_score(score):
+    """Nivel de riesgo correspondiente a un score 0-100"""
+    if score >= 70:
+        return 'CRITICO'
+    elif score >= 50:
+        return 'ALTO'
+    elif score >= 30:
+        return 'MEDIO'
+    return 'BAJO'
+
+
+def puntuar_abandono(f):
+    """Probabilidad de abandono del tratamiento (0-100) a partir de las features"""
+    score = 0
+    factores = []
+
+    # Factor 1: Tiempo sin contacto (peso: 35%)
+    dias_sin_contacto = f['dias_sin_contacto']
+    if dias_sin_contacto is not None:
+        if dias_sin_contacto > 30:
+            score += 35
+            factores.append(f'Sin contacto hace {dias_sin_contacto} días')
+        elif dias_sin_contacto > 15:
+            score += 20
+            factores.append(f'Contacto irregular ({dias_sin_contacto} días)')
+        elif dias_sin_contacto > 7:
+            score += 10
+            factores.append('Contacto espaciado')
+    else:
+        score += 35
+        factores.append('Sin seguimientos registrados')
+
+    # Factor 2: Adherencia histórica (peso: 25%)
+    if f['seguimientos_30d']:
+        tasa_problemas = (
+            f['adherencia_nula_30d'] * 2 + f['adherencia_parcial_30d']
+        ) / f['seguimientos_30d']
+        if tasa_problemas > 0.6:
+            score += 25
+            factores.append('Adherencia muy baja')
+        elif tasa_problemas > 0.3:
+            score += 15
+            factores.append('Adherencia irregular')
+
+    # Factor 3: Eventos críticos recientes (peso: 20%)
+    eventos_recientes = f['eventos_30d']
+    if eventos_recientes >= 2:
+        score += 20
+        factores.append(f'{eventos_recientes} eventos críticos recientes')
+    elif eventos_recientes == 1:
+        score += 10
+        factores.append('Evento crítico reciente')
+
+    # Factor 4: Falta de plan vigente (peso: 10%)
+    if not f['plan_vigente']:
+        score += 10
+        factores.append('Sin plan de intervención vigente')
+
+    # Factor 5: Nivel de riesgo del legajo (peso: 10%)
+    if f['nivel_riesgo'] == 'ALTO':
+        score += 10
+        factores.append('Nivel de riesgo alto')
+    elif f['nivel_riesgo'] == 'MEDIO':
+        score += 5
+
+    return {'score': min(score, 100), 'nivel': nivel_de_score(score), 'factores': factores}
+
+
+def puntuar_evento_critico(f):
+    """Probabilidad de evento crítico en próximos 30 días (0-100) a partir de las features"""
+    score = 0
+    factores = []
+
+    # Factor 1: Historial de eventos (peso: 40%)
+    eventos_historicos = f['eventos_90d']
+    if eventos_historicos >= 3:
+        score += 40
+        factores.append(f'{eventos_historicos} eventos en últimos 90 días')
+    elif eventos_historicos >= 2:
+        score += 30
+        factores.append('Múltiples eventos recientes')
+    elif eventos_historicos == 1:
+        score += 15
+        factores.append('Evento crítico reciente')
+
+    # Factor 2: Evaluación de riesgo (peso: 30%)
+    if f['riesgo_suicida']:
+        score += 30
+        factores.append('⚠️ Riesgo suicida identificado')
+    if f['violencia']:
+        score += 20
+        factores.append('⚠️ Situación de violencia')
+
+    # Factor 3: Nivel de riesgo del legajo (peso: 20%)
+    if f['nivel_riesgo'] == 'ALTO':
+        score += 20
+        factores.append('Clasificación de riesgo alto')
+    elif f['nivel_riesgo'] == 'MEDIO':
+        score += 10
+
+    # Factor 4: Falta de seguimiento (peso: 10%)
+    if f['seguimientos_30d'] == 0:
+        score += 10
+        factores.append('Sin seguimiento en 30 días')
+
+    return {'score': min(score, 100), 'nivel': nivel_de_score(score), 'factores': factores}
+
+
+def recomendar(f):
+    """Recomendaciones automáticas a partir de las features (máximo 5)"""
+    recomendaciones = []
+
+    # Recomendación 1: Contacto
+    dias_sin_contacto = f['dias_sin_contacto']
+    if dias_sin_contacto is not None:
+        if dias_sin_contacto > 15:
+            recomendaciones.append({
+                'prioridad': 'ALTA',
+                'icono': '📞',
+                'texto': f'Contactar urgente - {dias_sin_contacto} días sin seguimiento'
+            })
+        elif dias_sin_contacto > 7:
+            recomendaciones.append({
+                'prioridad': 'MEDIA',
+                'icono': '📅',
+                'texto': 'Programar seguimiento próximamente'
+            })
+    else:
+        recomendaciones.append({
+            'prioridad': 'ALTA',
+            'icono': '🚨',
+            'texto': 'Realizar primer seguimiento'
+        })
+
+    # Recomendación 2: Plan de intervención
+    if not f['plan_vigente']:
+        recomendaciones.append({
+            'prioridad': 'ALTA',
+            'icono': '📋',
+            'texto': 'Crear plan de intervención'
+        })
+
+    # Recomendación 3: Evaluación
+    if not f['tiene_evaluacion']:
+        recomendaciones.append({
+            'prioridad': 'MEDIA',
+            'icono': '🩺',
+            'texto': 'Completar evaluación inicial'
+        })
+    elif f['riesgo_suicida'] or f['violencia']:
+        recomendaciones.append({
+            'prioridad': 'CRITICA',
+            'icono': '⚠️',
+            'texto': 'Monitoreo intensivo requerido - Riesgos identificados'
+        })
+
+    # Recomendación 4: Red de apoyo
+    if f['vinculos'] == 0:
+        recomendaciones.append({
+            'prioridad': 'MEDIA',
+            'icono': '👥',
+            'texto': 'Identificar y registrar red de apoyo familiar'
+        })
+
+    # Recomendación 5: Derivaciones pendientes
+    derivaciones_pendientes = f['derivaciones_pendientes']
+    if derivaciones_pendientes > 0:
+        recomendaciones.append({
+            'prioridad': 'MEDIA',
+            'icono': '🔄',
+            'texto': f'Seguir {derivaciones_pendientes} derivación(es) pendiente(s)'
+        })
+
+    return recomendaciones[:5]  # Máximo 5 recomendaciones
+
+
+SIN_LEGAJO = {'score': 0, 'nivel': 'BAJO', 'factores': ['Sin legajo activo']}
 
 
 class RiskPredictor:
     """Predictor de riesgo para ciudadanos"""
-    
+
     @staticmethod
-    def calcular_riesgo_abandono(ciudadano):
+    def obtener_features(ciudadano, ahora=None):
+        """Features del legajo activo del ciudadano, o None si no tiene legajo activo"""
+        from .services_riesgo import ScoringRiesgoService
+
+        legajos = ScoringRiesgoService.legajos_activos().filter(ciudadano=ciudadano)
+        features = ScoringRiesgoService.cargar_features(legajos, ahora=ahora)
+        return features[0] if features else None
+
+    @staticmethod
+    def calcular_riesgo_abandono(ciudadano, features=None):
         """
         Calcula probabilidad de abandono del tratamiento (0-100)
         """
-        from .models import LegajoAtencion, SeguimientoContacto
-        
-        score = 0
-        factores = []
-        
-        # Obtener legajo activo
-        legajo = LegajoAtencion.objects.filter(
-            ciudadano=ciudadano,
-            estado__in=['ABIERTO', 'EN_SEGUIMIENTO']
-        ).first()
-        
-        if not legajo:
-            return {'score': 0, 'nivel': 'BAJO', 'factores': ['Sin legajo activo']}
-        
-        ahora = timezone.now()
-        hace_30_dias = ahora - timedelta(days=30)
-        hace_15_dias = ahora - timedelta(days=15)
-        hace_7_dias = ahora - timedelta(days=7)
-        
-        # Factor 1: Tiempo sin contacto (peso: 35%)
-        ultimo_seguimiento = SeguimientoContacto.objects.filter(
-            legajo=legajo
-        ).order_by('-creado').first()
-        
-        if ultimo_seguimiento:
-            dias_sin_contacto = (ahora - ultimo_seguimiento.creado).days
-            if dias_sin_contacto > 30:
-                score += 35
-                factores.append(f'Sin contacto hace {dias_sin_contacto} días')
-            elif dias_sin_contacto > 15:
-                score += 20
-                factores.append(f'Contacto irregular ({dias_sin_contacto} días)')
-            elif dias_sin_contacto > 7:
-                score += 10
-                factores.append('Contacto espaciado')
-        else:
-            score += 35
-            factores.append('Sin seguimientos registrados')
-        
-        # Factor 2: Adherencia histórica (peso: 25%)
-        seguimientos_recientes = SeguimientoContacto.objects.filter(
-            legajo=legajo,
-            creado__gte=hace_30_dias,
-            adherencia__isnull=False
-        )
-        
-        if seguimientos_recientes.exists():
-            adherencia_nula = seguimientos_recientes.filter(adherencia='NULA').count()
-            adherencia_parcial = seguimientos_recientes.filter(adherencia='PARCIAL').count()
-            total = seguimientos_recientes.count()
-            
-            tasa_problemas = (adherencia_nula * 2 + adherencia_parcial) / total
-            if tasa_problemas > 0.6:
-                score += 25
-                factores.append('Adherencia muy baja')
-            elif tasa_problemas > 0.3:
-                score += 15
-                factores.append('Adherencia irregular')
-        
-        # Factor 3: Eventos críticos recientes (peso: 20%)
-        from .models import EventoCritico
-        eventos_recientes = EventoCritico.objects.filter(
-            legajo=legajo,
-            creado__gte=hace_30_dias
-        ).count()
-        
-        if eventos_recientes >= 2:
-            score += 20
-            factores.append(f'{eventos_recientes} eventos críticos recientes')
-        elif eventos_recientes == 1:
-            score += 10
-            factores.append('Evento crítico reciente')
-        
-        # Factor 4: Falta de plan vigente (peso: 10%)
-        if not legajo.plan_vigente:
-            score += 10
-            factores.append('Sin plan de intervención vigente')
-        
-        # Factor 5: Nivel de riesgo del legajo (peso: 10%)
-        if legajo.nivel_riesgo == 'ALTO':
-            score += 10
-            factores.append('Nivel de riesgo alto')
-        elif legajo.nivel_riesgo == 'MEDIO':
-            score += 5
-        
-        # Determinar nivel
-        if score >= 70:
-            nivel = 'CRITICO'
-        elif score >= 50:
-            nivel = 'ALTO'
-        elif score >= 30:
-            nivel = 'MEDIO'
-        else:
-            nivel = 'BAJO'
-        
-        return {
-            'score': min(score, 100),
-            'nivel': nivel,
-            'factores': factores
-        }
-    
+        features = features or RiskPredictor.obtener_features(ciudadano)
+        if not features:
+            return dict(SIN_LEGAJO)
+        return puntuar_abandono(features)
+
     @staticmethod
-    def calcular_riesgo_evento_critico(ciudadano):
+    def calcular_riesgo_evento_critico(ciudadano, features=None):
         """
         Calcula probabilidad de evento crítico en próximos 30 días (0-100)
         """
-        from .models import LegajoAtencion, EventoCritico, EvaluacionInicial
-        
-        score = 0
-        factores = []
-        
-        legajo = LegajoAtencion.objects.filter(
-            ciudadano=ciudadano,
-            estado__in=['ABIERTO', 'EN_SEGUIMIENTO']
-        ).first()
-        
-        if not legajo:
-            return {'score': 0, 'nivel': 'BAJO', 'factores': ['Sin legajo activo']}
-        
-        ahora = timezone.now()
-        hace_90_dias = ahora - timedelta(days=90)
-        hace_30_dias = ahora - timedelta(days=30)
-        
-        # Factor 1: Historial de eventos (peso: 40%)
-        eventos_historicos = EventoCritico.objects.filter(
-            legajo=legajo,
-            creado__gte=hace_90_dias
-        ).count()
-        
-        if eventos_historicos >= 3:
-            score += 40
-            factores.append(f'{eventos_historicos} eventos en últimos 90 días')
-        elif eventos_historicos >= 2:
-            score += 30
-            factores.append('Múltiples eventos recientes')
-        elif eventos_historicos == 1:
-            score += 15
-            factores.append('Evento crítico reciente')
-        
-        # Factor 2: Evaluación de riesgo (peso: 30%)
-        try:
-            evaluacion = legajo.evaluacion
-            if evaluacion.riesgo_suicida:
-                score += 30
-                factores.append('⚠️ Riesgo suicida identificado')
-            if evaluacion.violencia:
-                score += 20
-                factores.append('⚠️ Situación de violencia')
-        except:
-            pass
-        
-        # Factor 3: Nivel de riesgo del legajo (peso: 20%)
-        if legajo.nivel_riesgo == 'ALTO':
-            score += 20
-            factores.append('Clasificación de riesgo alto')
-        elif legajo.nivel_riesgo == 'MEDIO':
-            score += 10
-        
-        # Factor 4: Falta de seguimiento (peso: 10%)
-        from .models import SeguimientoContacto
-        seguimientos_recientes = SeguimientoContacto.objects.filter(
-            legajo=legajo,
-            creado__gte=hace_30_dias
-        ).count()
-        
-        if seguimientos_recientes == 0:
-            score += 10
-            factores.append('Sin seguimiento en 30 días')
-        
-        # Determinar nivel
-        if score >= 70:
-            nivel = 'CRITICO'
-        elif score >= 50:
-            nivel = 'ALTO'
-        elif score >= 30:
-            nivel = 'MEDIO'
-        else:
-            nivel = 'BAJO'
-        
-        return {
-            'score': min(score, 100),
-            'nivel': nivel,
-            'factores': factores
-        }
-    
+        features = features or RiskPredictor.obtener_features(ciudadano)
+        if not features:
+            return dict(SIN_LEGAJO)
+        return puntuar_evento_critico(features)
+
     @staticmethod
-    def generar_recomendaciones(ciudadano):
+    def generar_recomendaciones(ciudadano, features=None):
         """
         Genera recomendaciones automáticas basadas en el análisis
         """
-        from .models import LegajoAtencion, SeguimientoContacto
-        
-        recomendaciones = []
-        
-        legajo = LegajoAtencion.objects.filter(
-            ciudadano=ciudadano,
-            estado__in=['ABIERTO', 'EN_SEGUIMIENTO']
-        ).first()
-        
-        if not legajo:
+        features = features or RiskPredictor.obtener_features(ciudadano)
+        if not features:
             return ['Considerar apertura de nuevo legajo si requiere atención']
-        
-        ahora = timezone.now()
-        hace_15_dias = ahora - timedelta(days=15)
-        hace_30_dias = ahora - timedelta(days=30)
-        
-        # Recomendación 1: Contacto
-        ultimo_seguimiento = SeguimientoContacto.objects.filter(
-            legajo=legajo
-        ).order_by('-creado').first()
-        
-        if ultimo_seguimiento:
-            dias_sin_contacto = (ahora - ultimo_seguimiento.creado).days
-            if dias_sin_contacto > 15:
-                recomendaciones.append({
-                    'prioridad': 'ALTA',
-                    'icono': '📞',
-                    'texto': f'Contactar urgente - {dias_sin_contacto} días sin seguimiento'
-                })
-            elif dias_sin_contacto > 7:
-                recomendaciones.append({
-                    'prioridad': 'MEDIA',
-                    'icono': '📅',
-                    'texto': 'Programar seguimiento próximamente'
-                })
-        else:
-            recomendaciones.append({
-                'prioridad': 'ALTA',
-                'icono': '🚨',
-                'texto': 'Realizar primer seguimiento'
-            })
-        
-        # Recomendación 2: Plan de intervención
-        if not legajo.plan_vigente:
-            recomendaciones.append({
-                'prioridad': 'ALTA',
-                'icono': '📋',
-                'texto': 'Crear plan de intervención'
-            })
-        
-        # Recomendación 3: Evaluación
-        try:
-            evaluacion = legajo.evaluacion
-            if evaluacion.riesgo_suicida or evaluacion.violencia:
-                recomendaciones.append({
-                    'prioridad': 'CRITICA',
-                    'icono': '⚠️',
-                    'texto': 'Monitoreo intensivo requerido - Riesgos identificados'
-                })
-        except:
-            recomendaciones.append({
-                'prioridad': 'MEDIA',
-                'icono': '🩺',
-                'texto': 'Completar evaluación inicial'
-            })
-        
-        # Recomendación 4: Red de apoyo
-        from .models_contactos import VinculoFamiliar
-        vinculos = VinculoFamiliar.objects.filter(ciudadano_principal=ciudadano).count()
-        
-        if vinculos == 0:
-            recomendaciones.append({
-                'prioridad': 'MEDIA',
-                'icono': '👥',
-                'texto': 'Identificar y registrar red de apoyo familiar'
-            })
-        
-        # Recomendación 5: Derivaciones pendientes
-        from .models import Derivacion
-        derivaciones_pendientes = Derivacion.objects.filter(
-            legajo=legajo,
-            estado='PENDIENTE'
-        ).count()
-        
-        if derivaciones_pendientes > 0:
-            recomendaciones.append({
-                'prioridad': 'MEDIA',
-                'icono': '🔄',
-                'texto': f'Seguir {derivaciones_pendientes} derivación(es) pendiente(s)'
-            })
-        
-        return recomendaciones[:5]  # Máximo 5 recomendaciones
-    
+        return recomendar(features)
+
     @staticmethod
     def obtener_prediccion_completa(ciudadano):
         """
-        Obtiene predicción completa con todos los indicadores
+        Obtiene predicción completa con todos los indicadores (cálculo en vivo)
         """
-        riesgo_abandono = RiskPredictor.calcular_riesgo_abandono(ciudadano)
-        riesgo_evento = RiskPredictor.calcular_riesgo_evento_critico(ciudadano)
-        recomendaciones = RiskPredictor.generar_recomendaciones(ciudadano)
-        
+        features = RiskPredictor.obtener_features(ciudadano)
+        if not features:
+            return {
+                'abandono': dict(SIN_LEGAJO),
+                'evento_critico': dict(SIN_LEGAJO),
+                'recomendaciones': ['Considerar apertura de nuevo legajo si requiere atención'],
+                'timestamp': timezone.now().isoformat()
+            }
         return {
-            'abandono': riesgo_abandono,
-            'evento_critico': riesgo_evento,
-            'recomendaciones': recomendaciones,
+            'abandono': puntuar_abandono(features),
+            'evento_critico': puntuar_evento_critico(features),
+            'recomendaciones': recomendar(features),
             'timestamp': timezone.now().isoformat()
         }
+
+    @staticmethod
+    def obtener_prediccion_precalculada(ciudadano):
+        """
+        Predicción guardada por el último `calcular_riesgo`; si el legajo activo todavía
+        no tiene una (p. ej. se abrió después del último cálculo), la calcula y la guarda.
+        """
+        from .models import PrediccionRiesgo
+        from .services_riesgo import ScoringRiesgoService
+
+        prediccion = PrediccionRiesgo.objects.filter(
+            ciudadano=ciudadano,
+            legajo__estado__in=ScoringRiesgoService.ESTADOS_ACTIVOS
+        ).first()
+        if prediccion is not None:
+            return prediccion.como_prediccion()
+
+        legajos = ScoringRiesgoService.legajos_activos().filter(ciudadano=ciudadano)
+        predicciones = ScoringRiesgoService.guardar(legajos)
+        if not predicciones:
+            return RiskPredictor.obtener_prediccion_completa(ciudadano)
+        return predicciones[0].como_prediccion()
@@ -200,11 +200,13 @@ class LegajoAtencion(LegajoBase):
     
     @property
     def tiempo_primer_contacto(self):
-        """Días hasta el primer seguimiento"""
-        primer_seguimiento = self.seguimientos.order_by('creado').first()
-        if primer_seguimiento:
-            return (primer_seguimiento.creado.date() - self.fecha_admision).days
-        return None
+        """Días hasta el primer seguimiento (usa `primer_seguimiento` si el queryset lo anotó)"""
+        from .services_agregaciones import dias_primer_contacto
+        if hasattr(self, 'primer_seguimiento'):
+            primer = self.primer_seguimiento
+        else:
+            primer = self.seguimientos.order_by('creado').values_list('creado', flat=True).first()
+        return dias_primer_contacto(primer, self.fecha_admision)
 
 
 class Consentimiento(TimeStamped):
@@ -366,6 +368,7 @@ class PlanIntervencion(TimeStamped):
     
     def save(self, *args, **kwargs):
         from django.db import transaction
+        from core.etag_versionado import invalidar_version
         self.clean()
         with transaction.atomic():
             if self.vigente:
@@ -373,6 +376,8 @@ class PlanIntervencion(TimeStamped):
                     legajo=self.legajo, vigente=True
                 ).exclude(pk=self.pk).update(vigente=False)
                 LegajoAtencion.objects.filter(pk=self.legajo_id).update(plan_vigente=True)
+                # update() no emite post_save: los ETags de legajos deben ver plan_vigente
+                invalidar_version(LegajoAtencion)
             super().save(*args, **kwargs)
 
 
@@ -991,6 +996,15 @@ from .models_contactos import (
     DispositivoVinculado, ContactoEmergencia
 )
 
+# Importar modelos de métricas pre-agregadas
+from .models_metricas import MetricaLegajoDiaria, MetricaSeguimientoDiaria
+
+# Importar predicciones de riesgo precalculadas
+from .models_riesgo import PrediccionRiesgo
+
+# Importar índice de búsqueda de ciudadanos
+from .models_busqueda import TokenCiudadano
+
 # Importar timezone
 from django.utils import timezone
 
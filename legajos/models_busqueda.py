@@ -0,0 +1,36 @@
+from django.db import models
+from .models import Ciudadano
+
+
+class TokenCiudadano(models.Model):
+    """
+    Índice de búsqueda de ciudadanos: una fila por palabra normalizada (sin
+    acentos, minúsculas) de apellido o nombre, con su clave fonética.
+    Lo mantienen los signals de legajos.signals_busqueda y el comando
+    `indexar_ciudadanos`; lo consulta CiudadanoSearch con prefijos (LIKE 'x%').
+    """
+
+    class Campo(models.TextChoices):
+        APELLIDO = "A", "Apellido"
+        NOMBRE = "N", "Nombre"
+
+    ciudadano = models.ForeignKey(
+        Ciudadano,
+        on_delete=models.CASCADE,
+        related_name="tokens_busqueda"
+    )
+    campo = models.CharField(max_length=1, choices=Campo.choices)
+    token = models.CharField(max_length=60)
+    fonetico = models.CharField(max_length=60)
+
+    class Meta:
+        verbose_name = "Token de búsqueda de ciudadano"
+        verbose_name_plural = "Tokens de búsqueda de ciudadanos"
+        indexes = [
+            models.Index(fields=["campo", "token", "ciudadano"]),
+            models.Index(fields=["token", "ciudadano"]),
+            models.Index(fields=["fonetico", "ciudadano"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_campo_display()}: {self.token} ({self.ciudadano_id})"
@@ -0,0 +1,73 @@
+from django.db import models
+from core.models import Institucion
+
+
+class MetricaLegajoDiaria(models.Model):
+    """
+    Contadores pre-agregados de legajos por día de apertura x dispositivo x estado x nivel de riesgo.
+    Se mantienen incrementalmente por signals (signals_metricas) y se reconcilian con
+    el comando `reconciliar_metricas`.
+    """
+
+    fecha = models.DateField(help_text="Fecha de apertura de los legajos contados")
+    dispositivo = models.ForeignKey(
+        Institucion,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="metricas_legajos"
+    )
+    # dispositivo_id o 0: MySQL no aplica UNIQUE sobre NULL, la clave única usa este campo
+    dispositivo_clave = models.IntegerField(default=0, editable=False)
+    estado = models.CharField(max_length=20)
+    nivel_riesgo = models.CharField(max_length=20)
+
+    legajos = models.IntegerField(default=0)
+    con_seguimiento = models.IntegerField(
+        default=0,
+        help_text="Legajos del grupo con al menos un seguimiento"
+    )
+    dias_primer_contacto = models.IntegerField(
+        default=0,
+        help_text="Suma de días admisión → primer seguimiento de los legajos con seguimiento"
+    )
+    derivaciones = models.IntegerField(default=0)
+    derivaciones_aceptadas = models.IntegerField(default=0)
+    eventos_criticos = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Métrica diaria de legajos"
+        verbose_name_plural = "Métricas diarias de legajos"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fecha", "dispositivo_clave", "estado", "nivel_riesgo"],
+                name="uniq_metrica_legajo_diaria",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["estado", "nivel_riesgo"]),
+            models.Index(fields=["dispositivo", "fecha"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.dispositivo_clave = self.dispositivo_id or 0
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.fecha} {self.dispositivo_id} {self.estado}/{self.nivel_riesgo}: {self.legajos}"
+
+
+class MetricaSeguimientoDiaria(models.Model):
+    """Contadores de seguimientos por día de registro"""
+
+    fecha = models.DateField(unique=True)
+    seguimientos = models.IntegerField(default=0)
+    adherencia_adecuada = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Métrica diaria de seguimientos"
+        verbose_name_plural = "Métricas diarias de seguimientos"
+        ordering = ["-fecha"]
+
+    def __str__(self):
+        return f"{self.fecha}: {self.seguimientos}"
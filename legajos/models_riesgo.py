@@ -0,0 +1,57 @@
+from django.db import models
+from .models import Ciudadano, LegajoAtencion
+
+
+class PrediccionRiesgo(models.Model):
+    """
+    Predicción de riesgo precalculada para cada legajo activo.
+    La recalcula en lote el comando `calcular_riesgo` (ScoringRiesgoService);
+    prediccion_riesgo_api y el ranking de riesgo leen de esta tabla.
+    """
+
+    legajo = models.OneToOneField(
+        LegajoAtencion,
+        on_delete=models.CASCADE,
+        related_name="prediccion_riesgo"
+    )
+    ciudadano = models.ForeignKey(
+        Ciudadano,
+        on_delete=models.CASCADE,
+        related_name="predicciones_riesgo"
+    )
+    score_abandono = models.PositiveSmallIntegerField(default=0)
+    nivel_abandono = models.CharField(max_length=10)
+    factores_abandono = models.JSONField(default=list, blank=True)
+    score_evento = models.PositiveSmallIntegerField(default=0)
+    nivel_evento = models.CharField(max_length=10)
+    factores_evento = models.JSONField(default=list, blank=True)
+    recomendaciones = models.JSONField(default=list, blank=True)
+    calculado = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Predicción de riesgo"
+        verbose_name_plural = "Predicciones de riesgo"
+        indexes = [
+            models.Index(fields=["-score_abandono"]),
+            models.Index(fields=["-score_evento"]),
+        ]
+
+    def __str__(self):
+        return f"{self.legajo_id}: abandono {self.score_abandono}, evento {self.score_evento}"
+
+    def como_prediccion(self):
+        """Mismo formato que RiskPredictor.obtener_prediccion_completa"""
+        return {
+            'abandono': {
+                'score': self.score_abandono,
+                'nivel': self.nivel_abandono,
+                'factores': self.factores_abandono,
+            },
+            'evento_critico': {
+                'score': self.score_evento,
+                'nivel': self.nivel_evento,
+                'factores': self.factores_evento,
+            },
+            'recomendaciones': self.recomendaciones,
+            'timestamp': self.calculado.isoformat(),
+        }
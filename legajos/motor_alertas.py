@@ -0,0 +1,446 @@
+"""
+Motor incremental de alertas de ciudadanos.
+
+Cada regla se evalúa con una sola query sobre un conjunto de legajos (o de
+ciudadanos) y devuelve los que la cumplen. ``MotorAlertas.sincronizar`` compara
+las alertas deseadas contra las activas existentes en memoria y aplica la
+diferencia en bloque: bulk_create de las nuevas, bulk_update de las que cambiaron
+de mensaje/prioridad y desactivación de las resueltas (solo prioridades MEDIA y
+BAJA, igual que la regeneración completa original: las ALTA/CRITICA las cierra
+un operador). Como esas escrituras no emiten post_save, el motor registra en
+bloque las filas de LogAccion que escribiría alerta_ciudadano_post_save.
+
+El mismo motor sirve para un legajo recién guardado (solo las reglas afectadas
+por los campos modificados), para un legajo o ciudadano cuyos datos relacionados
+cambiaron (evaluación, contactos, eventos...: solo las reglas de ese modelo) y
+para el barrido masivo de toda la población (las condiciones que dependen del
+paso del tiempo).
+"""
+
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from core.buffer_auditoria import registrar_lote
+from core.etag_versionado import invalidar_version
+from core.models_auditoria import LogAccion
+from core.signals_auditoria import get_request_info, modelo_a_dict
+
+from .models import (
+    AlertaCiudadano, Ciudadano, Consentimiento, Derivacion, EvaluacionInicial, EventoCritico,
+    LegajoAtencion, SeguimientoContacto,
+)
+from .models_contactos import HistorialContacto, VinculoFamiliar
+
+ESTADOS_ACTIVOS = ['ABIERTO', 'EN_SEGUIMIENTO']
+
+# Prioridades que el motor desactiva cuando la condición deja de cumplirse
+PRIORIDADES_AUTORESOLUBLES = ('MEDIA', 'BAJA')
+
+TAMANO_LOTE = 1000
+
+
+class Regla:
+    """
+    Regla de alerta evaluada en conjunto.
+    ``evaluar(queryset, ahora)`` retorna {id: mensaje} para los legajos/ciudadanos que la cumplen.
+    ``campos``: campos de LegajoAtencion cuyo cambio obliga a reevaluarla al guardar el legajo.
+    ``modelos``: modelos relacionados cuyas altas, cambios o bajas obligan a reevaluarla
+    (para el legajo o ciudadano de la fila; ver signals_alertas).
+    """
+
+    def __init__(self, tipo, prioridad, evaluar, campos=(), modelos=()):
+        self.tipo = tipo
+        self.prioridad = prioridad
+        self.evaluar = evaluar
+        self.campos = frozenset(campos)
+        self.modelos = frozenset(modelos)
+
+    def __repr__(self):
+        return f'<Regla {self.tipo}>'
+
+
+def _contar_por_legajo(queryset, legajos, minimo=1):
+    """{legajo_id: cantidad} de filas del queryset por legajo, con al menos ``minimo`` filas"""
+    return dict(
+        queryset.filter(legajo__in=legajos)
+        .order_by()
+        .values('legajo_id')
+        .annotate(total=Count('id'))
+        .filter(total__gte=minimo)
+        .values_list('legajo_id', 'total')
+    )
+
+
+# ============================================================================
+# REGLAS POR LEGAJO
+# ============================================================================
+
+def _riesgo_alto(legajos, ahora):
+    return {
+        pk: 'Legajo con nivel de riesgo alto'
+        for pk in legajos.filter(nivel_riesgo='ALTO').values_list('pk', flat=True)
+    }
+
+
+def _sin_evaluacion(legajos, ahora):
+    hoy = ahora.date()
+    filas = legajos.filter(
+        evaluacion__isnull=True,
+        fecha_apertura__lt=hoy - timedelta(days=15),
+    ).values_list('pk', 'fecha_apertura')
+    return {pk: f'Sin evaluación inicial hace {(hoy - apertura).days} días' for pk, apertura in filas}
+
+
+def _riesgo_suicida(legajos, ahora):
+    return {
+        pk: 'Riesgo suicida identificado en evaluación'
+        for pk in legajos.filter(evaluacion__riesgo_suicida=True).values_list('pk', flat=True)
+    }
+
+
+def _violencia(legajos, ahora):
+    return {
+        pk: 'Situación de violencia identificada'
+        for pk in legajos.filter(evaluacion__violencia=True).values_list('pk', flat=True)
+    }
+
+
+def _sin_plan(legajos, ahora):
+    return {
+        pk: 'Legajo activo sin plan de intervención'
+        for pk in legajos.filter(estado__in=ESTADOS_ACTIVOS, plan_vigente=False).values_list('pk', flat=True)
+    }
+
+
+def _sin_contacto(legajos, ahora):
+    hoy = ahora.date()
+    ultimos = (
+        HistorialContacto.objects.filter(legajo__in=legajos)
+        .order_by()
+        .values('legajo_id')
+        .annotate(ultimo=Max('fecha_contacto'))
+        .filter(ultimo__lt=ahora - timedelta(days=30))
+        .values_list('legajo_id', 'ultimo')
+    )
+    alertas = {}
+    for legajo_id, ultimo in ultimos:
+        dias = (hoy - ultimo.date()).days
+        if dias > 30:
+            alertas[legajo_id] = f'Sin contacto hace {dias} días'
+    return alertas
+
+
+def _contactos_fallidos(legajos, ahora):
+    fallidos = _contar_por_legajo(
+        HistorialContacto.objects.filter(estado='NO_CONTESTA', fecha_contacto__gte=ahora - timedelta(days=30)),
+        legajos, minimo=3,
+    )
+    return {pk: f'{total} contactos fallidos en el último mes' for pk, total in fallidos.items()}
+
+
+def _evento_critico(legajos, ahora):
+    eventos = _contar_por_legajo(
+        EventoCritico.objects.filter(creado__gte=ahora - timedelta(days=7)), legajos
+    )
+    return {pk: f'{total} evento(s) crítico(s) en la última semana' for pk, total in eventos.items()}
+
+
+def _derivacion_pendiente(legajos, ahora):
+    pendientes = _contar_por_legajo(
+        Derivacion.objects.filter(estado='PENDIENTE', creado__lte=ahora - timedelta(days=7)), legajos
+    )
+    return {pk: f'{total} derivación(es) pendiente(s)' for pk, total in pendientes.items()}
+
+
+def _adherencia_baja(legajos, ahora):
+    bajas = _contar_por_legajo(
+        SeguimientoContacto.objects.filter(
+            creado__gte=ahora - timedelta(days=30), adherencia__in=['BAJA', 'NULA']
+        ),
+        legajos, minimo=2,
+    )
+    return {pk: f'Adherencia baja en {total} seguimientos recientes' for pk, total in bajas.items()}
+
+
+REGLAS_LEGAJO = (
+    Regla('RIESGO_ALTO', 'ALTA', _riesgo_alto, campos=('nivel_riesgo',)),
+    Regla('SIN_EVALUACION', 'MEDIA', _sin_evaluacion, campos=('fecha_apertura',), modelos=(EvaluacionInicial,)),
+    Regla('RIESGO_SUICIDA', 'CRITICA', _riesgo_suicida, modelos=(EvaluacionInicial,)),
+    Regla('VIOLENCIA', 'CRITICA', _violencia, modelos=(EvaluacionInicial,)),
+    Regla('SIN_PLAN', 'MEDIA', _sin_plan, campos=('estado', 'plan_vigente')),
+    Regla('SIN_CONTACTO', 'ALTA', _sin_contacto, modelos=(HistorialContacto,)),
+    Regla('CONTACTOS_FALLIDOS', 'MEDIA', _contactos_fallidos, modelos=(HistorialContacto,)),
+    Regla('EVENTO_CRITICO', 'CRITICA', _evento_critico, modelos=(EventoCritico,)),
+    Regla('DERIVACION_PENDIENTE', 'MEDIA', _derivacion_pendiente, modelos=(Derivacion,)),
+    Regla('ADHERENCIA_BAJA', 'ALTA', _adherencia_baja, modelos=(SeguimientoContacto,)),
+)
+
+
+# ============================================================================
+# REGLAS POR CIUDADANO
+# ============================================================================
+
+def _sin_red_familiar(ciudadanos, ahora):
+    con_red = VinculoFamiliar.objects.filter(activo=True).values('ciudadano_principal_id')
+    return {
+        pk: 'Sin vínculos familiares registrados'
+        for pk in ciudadanos.exclude(pk__in=con_red).values_list('pk', flat=True)
+    }
+
+
+def _sin_consentimiento(ciudadanos, ahora):
+    con_consentimiento = Consentimiento.objects.filter(vigente=True).values('ciudadano_id')
+    return {
+        pk: 'Sin consentimiento informado vigente'
+        for pk in ciudadanos.exclude(pk__in=con_consentimiento).values_list('pk', flat=True)
+    }
+
+
+REGLAS_CIUDADANO = (
+    Regla('SIN_RED_FAMILIAR', 'BAJA', _sin_red_familiar, modelos=(VinculoFamiliar,)),
+    Regla('SIN_CONSENTIMIENTO', 'MEDIA', _sin_consentimiento, modelos=(Consentimiento,)),
+)
+
+
+def reglas_afectadas(campos):
+    """Reglas de legajo que dependen de alguno de los campos modificados"""
+    campos = set(campos)
+    return tuple(regla for regla in REGLAS_LEGAJO if regla.campos & campos)
+
+
+def reglas_de_modelo(modelo, reglas):
+    """Reglas (de legajo o de ciudadano) que dependen de las filas de ``modelo``"""
+    return tuple(regla for regla in reglas if modelo in regla.modelos)
+
+
+CAMPOS_REGLAS = frozenset().union(*(regla.campos for regla in REGLAS_LEGAJO))
+
+
+# ============================================================================
+# MOTOR
+# ============================================================================
+
+class MotorAlertas:
+    """Evaluación en conjunto y sincronización en bloque de alertas"""
+
+    @staticmethod
+    def evaluar_legajos(legajos, reglas=REGLAS_LEGAJO, ahora=None, tiempos=None):
+        """
+        {(ciudadano_id, legajo_id, tipo): (prioridad, mensaje)} deseadas para los legajos.
+        ``tiempos``: dict opcional donde se registra {tipo: (coincidencias, segundos)} por regla.
+        """
+        ahora = ahora or timezone.now()
+        ciudadano_de = dict(legajos.order_by().values_list('pk', 'ciudadano_id'))
+        deseadas = {}
+        for regla in reglas:
+            inicio = time.monotonic()
+            coincidencias = regla.evaluar(legajos, ahora)
+            for legajo_id, mensaje in coincidencias.items():
+                deseadas[(ciudadano_de[legajo_id], legajo_id, regla.tipo)] = (regla.prioridad, mensaje)
+            if tiempos is not None:
+                tiempos[regla.tipo] = (len(coincidencias), time.monotonic() - inicio)
+        return deseadas
+
+    @staticmethod
+    def evaluar_ciudadanos(ciudadanos, reglas=REGLAS_CIUDADANO, ahora=None, tiempos=None):
+        """{(ciudadano_id, None, tipo): (prioridad, mensaje)} deseadas para los ciudadanos"""
+        ahora = ahora or timezone.now()
+        deseadas = {}
+        for regla in reglas:
+            inicio = time.monotonic()
+            coincidencias = regla.evaluar(ciudadanos, ahora)
+            for ciudadano_id, mensaje in coincidencias.items():
+                deseadas[(ciudadano_id, None, regla.tipo)] = (regla.prioridad, mensaje)
+            if tiempos is not None:
+                tiempos[regla.tipo] = (len(coincidencias), time.monotonic() - inicio)
+        return deseadas
+
+    @staticmethod
+    def sincronizar(deseadas, existentes, recuperar=True):
+        """
+        Aplica la diferencia entre las alertas deseadas y las activas existentes.
+        ``existentes``: queryset de AlertaCiudadano activas dentro del ámbito evaluado
+        (mismos legajos/ciudadanos y tipos de las reglas evaluadas).
+        ``recuperar``: releer las alertas creadas con PK y ciudadano (para notificarlas);
+        si es False se devuelven las instancias insertadas (con su PK).
+        Retorna {'creadas': [AlertaCiudadano], 'actualizadas': n, 'desactivadas': n}.
+        """
+        actuales = {}
+        resueltas = []
+        # {pk: (ciudadano_id, tipo)} de las activas, para auditar las modificadas y resueltas
+        datos = {}
+        for pk, ciudadano_id, legajo_id, tipo, prioridad, mensaje in existentes.order_by('pk').values_list(
+            'pk', 'ciudadano_id', 'legajo_id', 'tipo', 'prioridad', 'mensaje'
+        ):
+            datos[pk] = (ciudadano_id, tipo)
+            clave = (ciudadano_id, legajo_id, tipo)
+            if clave not in actuales:
+                actuales[clave] = (pk, prioridad, mensaje)
+            elif prioridad in PRIORIDADES_AUTORESOLUBLES:
+                resueltas.append(pk)  # Duplicada de regeneraciones anteriores
+
+        nuevas = []
+        modificadas = []
+        for clave, (prioridad, mensaje) in deseadas.items():
+            actual = actuales.get(clave)
+            if actual is None:
+                ciudadano_id, legajo_id, tipo = clave
+                nuevas.append(AlertaCiudadano(
+                    ciudadano_id=ciudadano_id, legajo_id=legajo_id,
+                    tipo=tipo, prioridad=prioridad, mensaje=mensaje,
+                ))
+            elif actual[1:] != (prioridad, mensaje):
+                modificadas.append(AlertaCiudadano(pk=actual[0], prioridad=prioridad, mensaje=mensaje))
+
+        resueltas.extend(
+            pk for clave, (pk, prioridad, _) in actuales.items()
+            if clave not in deseadas and prioridad in PRIORIDADES_AUTORESOLUBLES
+        )
+
+        desactivadas = 0
+        for inicio in range(0, len(resueltas), TAMANO_LOTE):
+            desactivadas += AlertaCiudadano.objects.filter(
+                pk__in=resueltas[inicio:inicio + TAMANO_LOTE]
+            ).update(activa=False)
+        if modificadas:
+            AlertaCiudadano.objects.bulk_update(modificadas, ['prioridad', 'mensaje'], batch_size=TAMANO_LOTE)
+
+        creadas = nuevas
+        if nuevas:
+            AlertaCiudadano.objects.bulk_create(nuevas, batch_size=TAMANO_LOTE)
+            MotorAlertas._asignar_pks(nuevas, existentes, actuales)
+            if recuperar:
+                creadas = list(
+                    AlertaCiudadano.objects.filter(pk__in=[alerta.pk for alerta in nuevas]).select_related('ciudadano')
+                )
+
+        if nuevas or modificadas or desactivadas:
+            # bulk_create/bulk_update/update no emiten post_save
+            invalidar_version(AlertaCiudadano)
+            MotorAlertas._auditar(nuevas, modificadas, resueltas, datos)
+
+        return {'creadas': creadas, 'actualizadas': len(modificadas), 'desactivadas': desactivadas}
+
+    @staticmethod
+    def _asignar_pks(nuevas, existentes, actuales):
+        """Completa la PK de las alertas recién insertadas"""
+        if connection.features.can_return_rows_from_bulk_insert:
+            return
+        # MySQL no devuelve las PKs de un INSERT múltiple: se releen del ámbito
+        previas = {pk for pk, _, _ in actuales.values()}
+        claves = {(a.ciudadano_id, a.legajo_id, a.tipo) for a in nuevas}
+        pks = {
+            (ciudadano_id, legajo_id, tipo): pk
+            for pk, ciudadano_id, legajo_id, tipo
+            in existentes.values_list('pk', 'ciudadano_id', 'legajo_id', 'tipo')
+            if pk not in previas and (ciudadano_id, legajo_id, tipo) in claves
+        }
+        for alerta in nuevas:
+            alerta.pk = pks.get((alerta.ciudadano_id, alerta.legajo_id, alerta.tipo))
+
+    @staticmethod
+    def _auditar(nuevas, modificadas, resueltas, datos):
+        """LogAccion en bloque de las alertas creadas, actualizadas y desactivadas (ver alerta_ciudadano_post_save)"""
+        ciudadano_ids = {alerta.ciudadano_id for alerta in nuevas}
+        ciudadano_ids.update(datos[alerta.pk][0] for alerta in modificadas)
+        ciudadano_ids.update(datos[pk][0] for pk in resueltas)
+        ciudadanos = Ciudadano.objects.only('apellido', 'nombre', 'dni').in_bulk(ciudadano_ids)
+        request_info = get_request_info()
+
+        def fila(accion, pk, ciudadano_id, tipo, detalles):
+            return {
+                'usuario': request_info['usuario'],
+                'accion': accion,
+                'modelo': 'AlertaCiudadano',
+                'objeto_id': str(pk),
+                'objeto_repr': f"Alerta {tipo} - {ciudadanos.get(ciudadano_id, ciudadano_id)}"[:200],
+                'detalles': detalles,
+                'ip_address': request_info['ip_address'],
+                'user_agent': request_info['user_agent'],
+            }
+
+        filas = [
+            fila('CREATE', alerta.pk, alerta.ciudadano_id, alerta.tipo, modelo_a_dict(alerta))
+            for alerta in nuevas
+        ]
+        filas.extend(
+            fila('UPDATE', alerta.pk, *datos[alerta.pk], {'prioridad': alerta.prioridad, 'mensaje': alerta.mensaje})
+            for alerta in modificadas
+        )
+        filas.extend(fila('UPDATE', pk, *datos[pk], {'activa': False}) for pk in resueltas)
+        registrar_lote(LogAccion, filas)
+
+    @staticmethod
+    def alertas_activas(legajos=None, ciudadanos=None, tipos=()):
+        """Queryset de alertas activas del ámbito: de legajos, o generales (sin legajo) de ciudadanos"""
+        queryset = AlertaCiudadano.objects.filter(activa=True, tipo__in=tipos)
+        if legajos is not None:
+            return queryset.filter(legajo__in=legajos)
+        return queryset.filter(ciudadano__in=ciudadanos, legajo__isnull=True)
+
+    @staticmethod
+    def actualizar_legajos(legajos, reglas=REGLAS_LEGAJO, ahora=None):
+        """Evalúa y sincroniza las reglas de legajo sobre el queryset de legajos"""
+        if not reglas:
+            return {'creadas': [], 'actualizadas': 0, 'desactivadas': 0}
+        deseadas = MotorAlertas.evaluar_legajos(legajos, reglas, ahora)
+        existentes = MotorAlertas.alertas_activas(legajos=legajos, tipos=[r.tipo for r in reglas])
+        return MotorAlertas.sincronizar(deseadas, existentes)
+
+    @staticmethod
+    def actualizar_ciudadanos(ciudadanos, reglas=REGLAS_CIUDADANO, ahora=None):
+        """Evalúa y sincroniza las reglas generales sobre el queryset de ciudadanos"""
+        deseadas = MotorAlertas.evaluar_ciudadanos(ciudadanos, reglas, ahora)
+        existentes = MotorAlertas.alertas_activas(ciudadanos=ciudadanos, tipos=[r.tipo for r in reglas])
+        return MotorAlertas.sincronizar(deseadas, existentes)
+
+    @staticmethod
+    def actualizar_ciudadano(ciudadano_id, ahora=None):
+        """Todas las reglas de todos los legajos del ciudadano más sus reglas generales"""
+        ahora = ahora or timezone.now()
+        legajo = MotorAlertas.actualizar_legajos(
+            LegajoAtencion.objects.filter(ciudadano_id=ciudadano_id), ahora=ahora
+        )
+        general = MotorAlertas.actualizar_ciudadanos(
+            Ciudadano.objects.filter(pk=ciudadano_id), ahora=ahora
+        )
+        return {
+            'creadas': legajo['creadas'] + general['creadas'],
+            'actualizadas': legajo['actualizadas'] + general['actualizadas'],
+            'desactivadas': legajo['desactivadas'] + general['desactivadas'],
+        }
+
+    @staticmethod
+    def barrer(ahora=None, recuperar=False):
+        """
+        Barrido completo: todas las reglas sobre todos los legajos (una query por regla)
+        y las reglas generales sobre los ciudadanos con legajo. Retorna estadísticas
+        con el detalle por regla ({tipo: (coincidencias, segundos)}).
+        """
+        ahora = ahora or timezone.now()
+        tipos_legajo = [regla.tipo for regla in REGLAS_LEGAJO]
+        tipos_ciudadano = [regla.tipo for regla in REGLAS_CIUDADANO]
+        legajos = LegajoAtencion.objects.all()
+        ciudadanos = Ciudadano.objects.filter(pk__in=legajos.values('ciudadano_id'))
+        tiempos = {}
+
+        deseadas = MotorAlertas.evaluar_legajos(legajos, ahora=ahora, tiempos=tiempos)
+        existentes = AlertaCiudadano.objects.filter(activa=True, tipo__in=tipos_legajo, legajo__isnull=False)
+        por_legajo = MotorAlertas.sincronizar(deseadas, existentes, recuperar=recuperar)
+
+        deseadas = MotorAlertas.evaluar_ciudadanos(ciudadanos, ahora=ahora, tiempos=tiempos)
+        existentes = MotorAlertas.alertas_activas(ciudadanos=ciudadanos, tipos=tipos_ciudadano)
+        generales = MotorAlertas.sincronizar(deseadas, existentes, recuperar=recuperar)
+
+        return {
+            'legajos': legajos.count(),
+            'ciudadanos': ciudadanos.count(),
+            'creadas': por_legajo['creadas'] + generales['creadas'],
+            'actualizadas': por_legajo['actualizadas'] + generales['actualizadas'],
+            'desactivadas': por_legajo['desactivadas'] + generales['desactivadas'],
+            'reglas': tiempos,
+        }
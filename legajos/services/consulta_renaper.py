@@ -1,14 +1,113 @@
-from django.conf import settings
-import requests
+"""
+Cliente de la API de RENAPER.
+
+- El token se guarda en la cache de Django (Redis) hasta poco antes de su
+  vencimiento: todos los workers lo comparten y solo se hace login al vencer.
+- Las consultas exitosas se guardan por (dni, sexo) ``RENAPER_CACHE_TTL``
+  segundos: alta de ciudadano y chat repiten las mismas consultas.
+- Las llamadas comparten una ``requests.Session`` con conexiones keep-alive.
+- Cortacircuito: con ``RENAPER_CIRCUITO_UMBRAL`` fallas del servicio (conexión,
+  timeout, 5xx) dentro de ``RENAPER_CIRCUITO_VENTANA`` segundos, las consultas
+  fallan en el acto durante ``RENAPER_CIRCUITO_ESPERA`` segundos. Después pasa
+  una sola consulta de prueba: si responde se cierra, si falla vuelve a abrirse.
+  El estado vive en la cache, así que vale para todos los workers.
+"""
+
 import datetime
+import logging
+import threading
+import time
 import unicodedata
-from core.models import Provincia
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, ConnectionError
 
+from core.models import Provincia
+
+logger = logging.getLogger("django")
+
 API_BASE = settings.RENAPER_API_URL
 LOGIN_URL = f"{API_BASE}/auth/login"
 CONSULTA_URL = f"{API_BASE}/consultarenaper"
 
+CACHE_TOKEN = "renaper:token"
+CACHE_CONSULTA = "renaper:consulta:{}:{}"
+CACHE_FALLOS = "renaper:fallos"
+CACHE_CIRCUITO = "renaper:circuito"
+CACHE_PRUEBA = "renaper:circuito_prueba"
+
+# Segundos antes del vencimiento en que el token deja de usarse
+MARGEN_TOKEN = 60
+TIMEOUT_CONEXION = 3
+
+_session_lock = threading.Lock()
+_login_lock = threading.Lock()
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=10)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _timeout():
+    return (TIMEOUT_CONEXION, getattr(settings, "RENAPER_TIMEOUT_SECONDS", 10))
+
+
+class ServicioNoDisponible(Exception):
+    """RENAPER no respondió (conexión, timeout o error 5xx)"""
+
+
+class CircuitoRenaper:
+    """Cortacircuito compartido entre workers a través de la cache"""
+
+    @staticmethod
+    def permitir():
+        hasta = cache.get(CACHE_CIRCUITO)
+        if hasta is None:
+            return True
+        if time.time() < hasta:
+            return False
+        # Semiabierto: una sola consulta de prueba por vez
+        return cache.add(CACHE_PRUEBA, 1, getattr(settings, "RENAPER_TIMEOUT_SECONDS", 10) + TIMEOUT_CONEXION)
+
+    @staticmethod
+    def registrar_exito():
+        cache.delete_many([CACHE_FALLOS, CACHE_CIRCUITO, CACHE_PRUEBA])
+
+    @staticmethod
+    def registrar_fallo():
+        if cache.get(CACHE_CIRCUITO) is not None:
+            # Falló la consulta de prueba: vuelve a abrirse
+            CircuitoRenaper._abrir()
+            return
+        cache.add(CACHE_FALLOS, 0, getattr(settings, "RENAPER_CIRCUITO_VENTANA", 60))
+        try:
+            fallos = cache.incr(CACHE_FALLOS)
+        except ValueError:
+            fallos = 1
+            cache.set(CACHE_FALLOS, fallos, getattr(settings, "RENAPER_CIRCUITO_VENTANA", 60))
+        if fallos >= getattr(settings, "RENAPER_CIRCUITO_UMBRAL", 5):
+            CircuitoRenaper._abrir()
+
+    @staticmethod
+    def _abrir():
+        espera = getattr(settings, "RENAPER_CIRCUITO_ESPERA", 30)
+        cache.set(CACHE_CIRCUITO, time.time() + espera, None)
+        cache.delete_many([CACHE_FALLOS, CACHE_PRUEBA])
+        logger.warning(f"RENAPER no responde: consultas suspendidas por {espera}s")
+
 
 class APIClient:
     def __init__(self):
@@ -19,16 +118,18 @@ class APIClient:
 
     def login(self):
         try:
-            response = requests.post(
+            response = _get_session().post(
                 LOGIN_URL,
                 json={"username": self.username, "password": self.password},
-                timeout=10,
+                timeout=_timeout(),
             )
         except ConnectionError:
-            raise Exception("Error de conexión con el servicio.")
+            raise ServicioNoDisponible("Error de conexión con el servicio.")
         except RequestException as e:
-            raise Exception(f"No se pudo conectar al servicio de login: {str(e)}")
+            raise ServicioNoDisponible(f"No se pudo conectar al servicio de login: {str(e)}")
 
+        if response.status_code >= 500:
+            raise ServicioNoDisponible(f"Login fallido: {response.status_code}")
         if response.status_code != 200:
             raise Exception(f"Login fallido: {response.status_code} {response.text}")
 
@@ -36,66 +137,101 @@ class APIClient:
         self.token = data.get("token")
         self.token_expiration = datetime.datetime.fromisoformat(
             data["expiration"].replace("Z", "+00:00")
-        )
+        ) - datetime.timedelta(seconds=MARGEN_TOKEN)
+        vigencia = (self.token_expiration - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        if vigencia > 0:
+            cache.set(CACHE_TOKEN, (self.token, self.token_expiration), int(vigencia))
 
     def get_token(self):
-        if (
-            not self.token
-            or datetime.datetime.now(datetime.timezone.utc) >= self.token_expiration
-        ):
-            self.login()
+        if self._token_vigente():
+            return self.token
+        with _login_lock:
+            # Otro hilo (o worker) pudo haber hecho login mientras se esperaba
+            guardado = cache.get(CACHE_TOKEN)
+            if guardado:
+                self.token, self.token_expiration = guardado
+            if not self._token_vigente():
+                self.login()
         return self.token
 
+    def _token_vigente(self):
+        return bool(
+            self.token
+            and datetime.datetime.now(datetime.timezone.utc) < self.token_expiration
+        )
+
+    def invalidar_token(self):
+        self.token = None
+        cache.delete(CACHE_TOKEN)
+
     def consultar_ciudadano(self, dni, sexo):
+        clave = CACHE_CONSULTA.format(str(dni).strip(), sexo.upper())
+        datos = cache.get(clave)
+        if datos is not None:
+            return {"success": True, "data": datos}
+
+        if not CircuitoRenaper.permitir():
+            return {"success": False, "error": "Servicio RENAPER no disponible momentáneamente."}
+
+        resultado = self._consultar(dni, sexo)
+        if resultado.pop("servicio_caido", False):
+            CircuitoRenaper.registrar_fallo()
+        else:
+            CircuitoRenaper.registrar_exito()
+        if resultado["success"]:
+            cache.set(clave, resultado["data"], getattr(settings, "RENAPER_CACHE_TTL", 3600))
+        return resultado
+
+    def _consultar(self, dni, sexo):
         try:
             token = self.get_token()
-        except Exception as e:
-            import logging
-
-            logging.getLogger("django").exception("Error al obtener token")
+        except ServicioNoDisponible:
+            logger.exception("Error al obtener token")
+            return {"success": False, "error": "Error de conexión al servicio.", "servicio_caido": True}
+        except Exception:
+            logger.exception("Error al obtener token")
             return {"success": False, "error": "Error interno al obtener token"}
 
-        headers = {"Authorization": f"Bearer {token}"}
         params = {"dni": dni, "sexo": sexo.upper()}
 
         try:
-            response = requests.get(
-                CONSULTA_URL, headers=headers, params=params, timeout=10
+            response = _get_session().get(
+                CONSULTA_URL, headers={"Authorization": f"Bearer {token}"}, params=params, timeout=_timeout()
             )
+            if response.status_code == 401:
+                # Token revocado antes de su vencimiento: un nuevo login y un reintento
+                self.invalidar_token()
+                response = _get_session().get(
+                    CONSULTA_URL, headers={"Authorization": f"Bearer {self.get_token()}"}, params=params, timeout=_timeout()
+                )
+        except ServicioNoDisponible:
+            logger.exception("Error al renovar token")
+            return {"success": False, "error": "Error de conexión al servicio.", "servicio_caido": True}
         except ConnectionError:
-            return {"success": False, "error": "Error de conexión al servicio."}
-        except RequestException as e:
-            import logging
-
-            logging.getLogger("django").exception(
-                "RequestException al conectar con Renaper"
-            )
+            return {"success": False, "error": "Error de conexión al servicio.", "servicio_caido": True}
+        except RequestException:
+            logger.exception("RequestException al conectar con Renaper")
             return {
                 "success": False,
                 "error": "Error interno de conexión al servicio.",
+                "servicio_caido": True,
             }
+        except Exception:
+            logger.exception("Error al obtener token")
+            return {"success": False, "error": "Error interno al obtener token"}
 
         if response.status_code != 200:
-            try:
-                error_data = response.json()
-            except Exception:
-                error_data = (
-                    response.text[:500]
-                    if hasattr(response, "text")
-                    else "Sin contenido"
-                )
             return {
                 "success": False,
                 "error": f"Error HTTP {response.status_code}: Error en la respuesta del servicio.",
                 "status_code": response.status_code,
+                "servicio_caido": response.status_code >= 500 or response.status_code == 429,
             }
 
         try:
             data = response.json()
-        except Exception as e:
-            import logging
-
-            logging.getLogger("django").exception("Respuesta no es JSON válido")
+        except Exception:
+            logger.exception("Respuesta no es JSON válido")
             raw_text = (
                 response.text[:500] if hasattr(response, "text") else "No response text"
             )
@@ -103,6 +239,7 @@ class APIClient:
                 "success": False,
                 "error": "Error interno: respuesta no es JSON válido.",
                 "raw_response": raw_text,
+                "servicio_caido": True,
             }
 
         if not data.get("isSuccess", False):
@@ -0,0 +1,134 @@
+"""
+Agregaciones SQL de indicadores por legajo.
+
+Adherencia, primer/último contacto y conteos de seguimientos y eventos críticos
+se definen una sola vez como expresiones de agregación y se pueden usar de dos formas:
+
+    - ``anotar_indicadores(queryset)``: anota cada legajo con subconsultas correlacionadas
+      (una sola query; pensado para un legajo o pocos)
+    - ``indicadores_por_legajo(legajos)``: dos queries agrupadas (seguimientos y eventos)
+      para un conjunto arbitrario de legajos, sin importar su tamaño
+"""
+
+from datetime import timedelta
+
+from django.db.models import (
+    Avg, Case, Count, FloatField, IntegerField, Max, Min, OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import EventoCritico, SeguimientoContacto
+
+# Puntaje de adherencia por seguimiento (los valores sin mapear cuentan como 0)
+PUNTAJE_ADHERENCIA = {'ADECUADA': 100, 'PARCIAL': 50, 'NULA': 0}
+
+INDICADORES_SEGUIMIENTOS = (
+    'total_seguimientos', 'adherencia_promedio', 'primer_seguimiento', 'ultimo_seguimiento',
+    'seguimientos_30d', 'adherencia_nula_30d', 'adherencia_parcial_30d',
+)
+INDICADORES_EVENTOS = ('eventos_30d', 'eventos_90d')
+INDICADORES = INDICADORES_SEGUIMIENTOS + INDICADORES_EVENTOS
+
+# Indicadores de conteo: 0 (no NULL) cuando el legajo no tiene filas relacionadas
+_CONTEOS = {
+    'total_seguimientos', 'seguimientos_30d', 'adherencia_nula_30d',
+    'adherencia_parcial_30d', 'eventos_30d', 'eventos_90d',
+}
+
+
+def puntaje_adherencia():
+    """CASE adherencia WHEN 'ADECUADA' THEN 100 WHEN 'PARCIAL' THEN 50 ELSE 0 END"""
+    return Case(
+        *[When(adherencia=valor, then=Value(puntos)) for valor, puntos in PUNTAJE_ADHERENCIA.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _agregados(ahora):
+    """Expresiones de agregación por modelo, relativas al instante ``ahora``"""
+    hace_30_dias = ahora - timedelta(days=30)
+    hace_90_dias = ahora - timedelta(days=90)
+    recientes = Q(creado__gte=hace_30_dias)
+    return {
+        SeguimientoContacto: {
+            'total_seguimientos': Count('id'),
+            'adherencia_promedio': Avg(puntaje_adherencia(), output_field=FloatField()),
+            'primer_seguimiento': Min('creado'),
+            'ultimo_seguimiento': Max('creado'),
+            'seguimientos_30d': Count('id', filter=recientes),
+            'adherencia_nula_30d': Count('id', filter=recientes & Q(adherencia='NULA')),
+            'adherencia_parcial_30d': Count('id', filter=recientes & Q(adherencia='PARCIAL')),
+        },
+        EventoCritico: {
+            'eventos_30d': Count('id', filter=recientes),
+            'eventos_90d': Count('id', filter=Q(creado__gte=hace_90_dias)),
+        },
+    }
+
+
+def dias_primer_contacto(primer_seguimiento, fecha_admision):
+    """Días admisión → primer seguimiento, o None si no hubo seguimientos"""
+    if primer_seguimiento is None:
+        return None
+    return (primer_seguimiento.date() - fecha_admision).days
+
+
+class AgregacionesLegajoService:
+    """Indicadores de seguimiento y eventos por legajo calculados en la base"""
+
+    @staticmethod
+    def anotar_indicadores(queryset, *campos, ahora=None):
+        """
+        Anota el queryset de LegajoAtencion con los indicadores pedidos (todos por defecto)
+        como subconsultas correlacionadas: el resultado sigue siendo una sola query.
+        """
+        campos = campos or INDICADORES
+        anotaciones = {}
+        for modelo, agregados in _agregados(ahora or timezone.now()).items():
+            for campo, agregado in agregados.items():
+                if campo not in campos:
+                    continue
+                subconsulta = Subquery(
+                    modelo.objects.filter(legajo=OuterRef('pk'))
+                    .order_by()
+                    .values('legajo')
+                    .annotate(valor=agregado)
+                    .values('valor')[:1]
+                )
+                anotaciones[campo] = Coalesce(subconsulta, 0) if campo in _CONTEOS else subconsulta
+        return queryset.annotate(**anotaciones)
+
+    @staticmethod
+    def indicadores_por_legajo(legajos, ahora=None):
+        """
+        Indicadores de un conjunto de legajos (queryset de LegajoAtencion o lista de ids)
+        en dos queries agrupadas. Retorna {legajo_id: {indicador: valor}}, con todos los
+        legajos que tengan al menos un seguimiento o evento; el resto usa ``vacio()``.
+        """
+        resultado = {}
+        for modelo, agregados in _agregados(ahora or timezone.now()).items():
+            filas = (
+                modelo.objects.filter(legajo__in=legajos)
+                .order_by()
+                .values('legajo_id')
+                .annotate(**agregados)
+            )
+            for fila in filas:
+                indicadores = resultado.setdefault(fila.pop('legajo_id'), AgregacionesLegajoService.vacio())
+                indicadores.update(fila)
+        return resultado
+
+    @staticmethod
+    def vacio():
+        """Indicadores de un legajo sin seguimientos ni eventos"""
+        return {campo: 0 if campo in _CONTEOS else None for campo in INDICADORES}
+
+    @staticmethod
+    def indicadores_de_legajo(legajo, ahora=None):
+        """Indicadores de un único legajo (instancia o id)"""
+        legajo_id = getattr(legajo, 'pk', legajo)
+        return AgregacionesLegajoService.indicadores_por_legajo(
+            [legajo_id], ahora=ahora
+        ).get(legajo_id, AgregacionesLegajoService.vacio())
@@ -1,13 +1,16 @@
+import logging
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db.models import Q, Count
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from core.notificaciones_ws import notificar
 from .models import (
     AlertaCiudadano, LegajoAtencion, Ciudadano, EvaluacionInicial,
     PlanIntervencion, EventoCritico, Derivacion, Consentimiento
 )
 from .models_contactos import HistorialContacto, VinculoFamiliar
+from .motor_alertas import MotorAlertas, REGLAS_CIUDADANO, REGLAS_LEGAJO, reglas_afectadas, reglas_de_modelo
+
+logger = logging.getLogger("django")
 
 
 class AlertasService:
@@ -15,258 +18,104 @@ class AlertasService:
     
     @staticmethod
     def generar_alertas_ciudadano(ciudadano_id):
-        """Genera todas las alertas para un ciudadano específico"""
+        """
+        Reevalúa todas las reglas de los legajos del ciudadano y sus reglas generales.
+        Retorna las alertas activas de esas reglas.
+        """
         try:
-            ciudadano = Ciudadano.objects.get(id=ciudadano_id)
-            legajos = LegajoAtencion.objects.filter(ciudadano=ciudadano).select_related(
-                'ciudadano', 'dispositivo', 'responsable'
-            ).prefetch_related('evaluacion', 'seguimientos', 'eventos', 'derivaciones')
+            resultado = MotorAlertas.actualizar_ciudadano(ciudadano_id)
+            AlertasService._notificar_alertas(resultado['creadas'])
             
-            # Limpiar alertas existentes no críticas
-            AlertaCiudadano.objects.filter(
-                ciudadano=ciudadano,
+            tipos = [regla.tipo for regla in REGLAS_LEGAJO + REGLAS_CIUDADANO]
+            return list(AlertaCiudadano.objects.filter(
+                ciudadano_id=ciudadano_id,
                 activa=True,
-                prioridad__in=['MEDIA', 'BAJA']
-            ).update(activa=False)
-            
-            alertas_generadas = []
-            
-            for legajo in legajos:
-                alertas_generadas.extend(AlertasService._generar_alertas_legajo(legajo))
-            
-            # Alertas generales del ciudadano
-            alertas_generadas.extend(AlertasService._generar_alertas_generales(ciudadano))
-            
-            return alertas_generadas
+                tipo__in=tipos
+            ).select_related('ciudadano', 'legajo'))
             
         except Exception as e:
-            print(f"Error generando alertas: {e}")
+            logger.error(f"Error generando alertas: {e}", exc_info=True)
             return []
     
     @staticmethod
-    def _generar_alertas_legajo(legajo):
-        """Genera alertas específicas de un legajo"""
-        alertas = []
-        
-        # 1. Riesgo Alto
-        if legajo.nivel_riesgo == 'ALTO':
-            alertas.append(AlertasService._crear_alerta(
-                legajo.ciudadano, legajo, 'RIESGO_ALTO', 'ALTA',
-                f'Legajo con nivel de riesgo alto'
-            ))
-        
-        # 2. Sin Evaluación Inicial
-        if not hasattr(legajo, 'evaluacion'):
-            dias_sin_eval = (timezone.now().date() - legajo.fecha_apertura).days
-            if dias_sin_eval > 15:
-                alertas.append(AlertasService._crear_alerta(
-                    legajo.ciudadano, legajo, 'SIN_EVALUACION', 'MEDIA',
-                    f'Sin evaluación inicial hace {dias_sin_eval} días'
-                ))
-        
-        # 3. Evaluación con riesgos
-        try:
-            evaluacion = legajo.evaluacion
-            if evaluacion.riesgo_suicida:
-                alertas.append(AlertasService._crear_alerta(
-                    legajo.ciudadano, legajo, 'RIESGO_SUICIDA', 'CRITICA',
-                    'Riesgo suicida identificado en evaluación'
-                ))
-            if evaluacion.violencia:
-                alertas.append(AlertasService._crear_alerta(
-                    legajo.ciudadano, legajo, 'VIOLENCIA', 'CRITICA',
-                    'Situación de violencia identificada'
-                ))
-        except:
-            pass
-        
-        # 4. Sin Plan de Intervención
-        if legajo.estado in ['ABIERTO', 'EN_SEGUIMIENTO'] and not legajo.plan_vigente:
-            alertas.append(AlertasService._crear_alerta(
-                legajo.ciudadano, legajo, 'SIN_PLAN', 'MEDIA',
-                'Legajo activo sin plan de intervención'
-            ))
-        
-        # 5. Sin Contacto Prolongado
-        ultimo_contacto = HistorialContacto.objects.filter(
-            legajo=legajo
-        ).select_related('legajo__ciudadano').order_by('-fecha_contacto').first()
-        
-        if ultimo_contacto:
-            dias_sin_contacto = (timezone.now().date() - ultimo_contacto.fecha_contacto.date()).days
-            if dias_sin_contacto > 30:
-                alertas.append(AlertasService._crear_alerta(
-                    legajo.ciudadano, legajo, 'SIN_CONTACTO', 'ALTA',
-                    f'Sin contacto hace {dias_sin_contacto} días'
-                ))
-        
-        # 6. Contactos Fallidos
-        contactos_fallidos = HistorialContacto.objects.filter(
-            legajo=legajo,
-            estado='NO_CONTESTA',
-            fecha_contacto__gte=timezone.now() - timedelta(days=30)
-        ).count()
-        
-        if contactos_fallidos >= 3:
-            alertas.append(AlertasService._crear_alerta(
-                legajo.ciudadano, legajo, 'CONTACTOS_FALLIDOS', 'MEDIA',
-                f'{contactos_fallidos} contactos fallidos en el último mes'
-            ))
-        
-        # 7. Eventos Críticos Recientes
-        eventos_recientes = EventoCritico.objects.filter(
-            legajo=legajo,
-            creado__gte=timezone.now() - timedelta(days=7)
-        ).count()
-        
-        if eventos_recientes > 0:
-            alertas.append(AlertasService._crear_alerta(
-                legajo.ciudadano, legajo, 'EVENTO_CRITICO', 'CRITICA',
-                f'{eventos_recientes} evento(s) crítico(s) en la última semana'
-            ))
-        
-        # 8. Derivaciones Pendientes
-        derivaciones_pendientes = Derivacion.objects.filter(
-            legajo=legajo,
-            estado='PENDIENTE',
-            creado__lte=timezone.now() - timedelta(days=7)
-        ).count()
-        
-        if derivaciones_pendientes > 0:
-            alertas.append(AlertasService._crear_alerta(
-                legajo.ciudadano, legajo, 'DERIVACION_PENDIENTE', 'MEDIA',
-                f'{derivaciones_pendientes} derivación(es) pendiente(s)'
-            ))
-        
-        # 9. Seguimientos Vencidos
-        try:
-            from .models import SeguimientoContacto
-            seguimientos_vencidos = SeguimientoContacto.objects.filter(
-                legajo=legajo,
-                fecha_proximo_contacto__lt=timezone.now().date(),
-                fecha_proximo_contacto__isnull=False
-            ).count()
-            
-            if seguimientos_vencidos > 0:
-                alertas.append(AlertasService._crear_alerta(
-                    legajo.ciudadano, legajo, 'SEGUIMIENTO_VENCIDO', 'ALTA',
-                    f'{seguimientos_vencidos} seguimiento(s) vencido(s)'
-                ))
-        except:
-            pass
-        
-        # 10. Adherencia Baja
+    def actualizar_alertas_legajo(legajo, campos=None):
+        """
+        Reevalúa las alertas de un legajo guardado.
+        ``campos=None`` (legajo nuevo): todas sus reglas y las generales del ciudadano;
+        si no, solo las reglas que dependen de los campos modificados.
+        """
         try:
-            seguimientos_recientes = SeguimientoContacto.objects.filter(
-                legajo=legajo,
-                creado__gte=timezone.now() - timedelta(days=30),
-                adherencia__in=['BAJA', 'NULA']
-            ).count()
-            
-            if seguimientos_recientes >= 2:
-                alertas.append(AlertasService._crear_alerta(
-                    legajo.ciudadano, legajo, 'ADHERENCIA_BAJA', 'ALTA',
-                    f'Adherencia baja en {seguimientos_recientes} seguimientos recientes'
-                ))
-        except:
-            pass
-        
-        return alertas
+            legajos = LegajoAtencion.objects.filter(pk=legajo.pk)
+            if campos is None:
+                resultado = MotorAlertas.actualizar_legajos(legajos)
+                creadas_generales = MotorAlertas.actualizar_ciudadanos(
+                    Ciudadano.objects.filter(pk=legajo.ciudadano_id)
+                )['creadas']
+                creadas = resultado['creadas'] + creadas_generales
+            else:
+                creadas = MotorAlertas.actualizar_legajos(legajos, reglas_afectadas(campos))['creadas']
+            AlertasService._notificar_alertas(creadas)
+        except Exception as e:
+            logger.error(f"Error actualizando alertas del legajo {legajo.pk}: {e}", exc_info=True)
     
     @staticmethod
-    def _generar_alertas_generales(ciudadano):
-        """Genera alertas generales del ciudadano"""
-        alertas = []
-        
-        # 1. Sin Red Familiar
-        vinculos = VinculoFamiliar.objects.filter(
-            ciudadano_principal=ciudadano,
-            activo=True
-        ).count()
-        
-        if vinculos == 0:
-            alertas.append(AlertasService._crear_alerta(
-                ciudadano, None, 'SIN_RED_FAMILIAR', 'BAJA',
-                'Sin vínculos familiares registrados'
-            ))
-        
-        # 2. Sin Consentimiento
-        consentimiento_vigente = Consentimiento.objects.filter(
-            ciudadano=ciudadano,
-            vigente=True
-        ).exists()
-        
-        if not consentimiento_vigente:
-            alertas.append(AlertasService._crear_alerta(
-                ciudadano, None, 'SIN_CONSENTIMIENTO', 'MEDIA',
-                'Sin consentimiento informado vigente'
-            ))
-        
-        return alertas
+    def reevaluar_relacionado(modelo, legajo_id=None, ciudadano_id=None):
+        """
+        Reevalúa las reglas que dependen de ``modelo`` (ver Regla.modelos) tras guardar
+        o borrar una de sus filas: las de legajo para ``legajo_id`` y las generales
+        para ``ciudadano_id`` (si tiene legajos, como en el barrido).
+        """
+        try:
+            creadas = []
+            reglas = reglas_de_modelo(modelo, REGLAS_LEGAJO)
+            if legajo_id is not None and reglas:
+                creadas += MotorAlertas.actualizar_legajos(
+                    LegajoAtencion.objects.filter(pk=legajo_id), reglas
+                )['creadas']
+            reglas = reglas_de_modelo(modelo, REGLAS_CIUDADANO)
+            if ciudadano_id is not None and reglas:
+                creadas += MotorAlertas.actualizar_ciudadanos(
+                    Ciudadano.objects.filter(pk=ciudadano_id, legajos__isnull=False).distinct(), reglas
+                )['creadas']
+            AlertasService._notificar_alertas(creadas)
+        except Exception as e:
+            logger.error(f"Error reevaluando alertas por {modelo.__name__}: {e}", exc_info=True)
     
     @staticmethod
-    def _crear_alerta(ciudadano, legajo, tipo, prioridad, mensaje):
-        """Crea una alerta si no existe una similar activa"""
-        alerta_existente = AlertaCiudadano.objects.filter(
-            ciudadano=ciudadano,
-            legajo=legajo,
-            tipo=tipo,
-            activa=True
-        ).first()
-        
-        if not alerta_existente:
-            alerta = AlertaCiudadano.objects.create(
-                ciudadano=ciudadano,
-                legajo=legajo,
-                tipo=tipo,
-                prioridad=prioridad,
-                mensaje=mensaje
-            )
-            
-            # Enviar notificación WebSocket
+    def _notificar_alertas(alertas):
+        """Notifica por WebSocket las alertas recién creadas"""
+        for alerta in alertas:
             AlertasService._enviar_notificacion_alerta(alerta)
-            
-            return alerta
-        
-        return alerta_existente
     
     @staticmethod
     def _enviar_notificacion_alerta(alerta):
-        """Envía notificación WebSocket para nueva alerta"""
+        """Encola la notificación WebSocket de una nueva alerta (se envía agrupada tras el commit)"""
         try:
-            channel_layer = get_channel_layer()
-            
             alerta_data = {
                 'id': alerta.id,
                 'ciudadano': alerta.ciudadano.nombre_completo,
-                'ciudadano_id': alerta.ciudadano.id,
+                'ciudadano_id': alerta.ciudadano_id,
                 'tipo': alerta.tipo,
                 'prioridad': alerta.prioridad,
                 'mensaje': alerta.mensaje,
                 'fecha': alerta.creado.strftime('%d/%m/%Y %H:%M'),
-                'legajo_id': alerta.legajo.id if alerta.legajo else None
+                'legajo_id': str(alerta.legajo_id) if alerta.legajo_id else None
             }
             
             # Notificación general
-            async_to_sync(channel_layer.group_send)(
-                'alertas_sistema',
-                {
-                    'type': 'nueva_alerta',
-                    'alerta': alerta_data
-                }
-            )
+            notificar('alertas_sistema', {
+                'type': 'nueva_alerta',
+                'alerta': alerta_data
+            }, clave=('nueva_alerta', alerta.id))
             
             # Notificación especial para alertas críticas
             if alerta.prioridad == 'CRITICA':
-                async_to_sync(channel_layer.group_send)(
-                    'alertas_sistema',
-                    {
-                        'type': 'alerta_critica',
-                        'alerta': alerta_data
-                    }
-                )
+                notificar('alertas_sistema', {
+                    'type': 'alerta_critica',
+                    'alerta': alerta_data
+                }, clave=('alerta_critica', alerta.id))
         except Exception as e:
-            print(f"Error enviando notificación WebSocket: {e}")
+            logger.error(f"Error enviando notificación WebSocket: {e}")
     
     @staticmethod
     def obtener_alertas_ciudadano(ciudadano_id):
@@ -284,17 +133,10 @@ class AlertasService:
             alerta.cerrar(usuario)
             
             # Notificar cierre de alerta
-            try:
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    'alertas_sistema',
-                    {
-                        'type': 'alerta_cerrada',
-                        'alerta_id': alerta_id
-                    }
-                )
-            except:
-                pass
+            notificar('alertas_sistema', {
+                'type': 'alerta_cerrada',
+                'alerta_id': alerta_id
+            }, clave=('alerta_cerrada', alerta_id))
             
             return True
         except AlertaCiudadano.DoesNotExist:
@@ -314,7 +156,7 @@ class AlertasService:
                     )
                     AlertasService._enviar_notificacion_alerta(alerta)
         except Exception as e:
-            print(f"Error generando alerta de mensaje: {e}")
+            logger.error(f"Error generando alerta de mensaje: {e}")
     
     @staticmethod
     def generar_alerta_seguimiento_vencido(seguimiento):
@@ -335,7 +177,7 @@ class AlertasService:
                 AlertasService._enviar_notificacion_alerta(alerta)
                 return alerta
         except Exception as e:
-            print(f"Error generando alerta de seguimiento vencido: {e}")
+            logger.error(f"Error generando alerta de seguimiento vencido: {e}")
             return None
     
     @staticmethod
@@ -353,5 +195,5 @@ class AlertasService:
             AlertasService._enviar_notificacion_alerta(alerta)
             return alerta
         except Exception as e:
-            print(f"Error generando alerta crítica: {e}")
+            logger.error(f"Error generando alerta crítica: {e}")
             return None
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Búsqueda de ciudadanos por DNI, apellido y nombre.
+
+Reemplaza los ``icontains`` (LIKE '%x%', que no usa índices y recorre la tabla
+en cada tecla) por búsquedas de prefijo sobre índices:
+
+- DNI: prefijo sobre el índice único de ``Ciudadano.dni``.
+- Apellido / nombre: prefijo sobre TokenCiudadano, una fila por palabra
+  normalizada con ``consulta_renaper.normalizar`` (sin acentos ni mayúsculas).
+- Difusa: prefijo sobre la clave fonética de cada palabra (v/b, z/s, ll/y, h muda,
+  letras dobles...), para "Gonzales" -> "González" o "Vazques" -> "Vázquez".
+
+Los resultados se ordenan por etapas: DNI exacto > prefijo de DNI > prefijo de
+apellido > prefijo de nombre > difusa. Cada etapa es un range scan con LIMIT y
+solo se ejecuta si las anteriores no completaron el límite.
+"""
+
+import re
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import Ciudadano, TokenCiudadano
+from .services.consulta_renaper import normalizar
+
+SEPARADORES = re.compile(r'[^a-z0-9]+')
+
+# Resultados máximos de un listado paginado (CiudadanoListView)
+MAXIMO_LISTADO = 500
+
+TAMANO_LOTE = 5000
+
+REEMPLAZOS_FONETICOS = (
+    (re.compile(r'(?<!c)h'), ''),       # h muda (se conserva la de "ch")
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'qu'), 'k'),
+    (re.compile(r'c(?=[ei])'), 's'),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'c(?!h)'), 'k'),
+    (re.compile(r'[zx]'), 's'),
+    (re.compile(r'v'), 'b'),
+    (re.compile(r'w'), 'u'),
+)
+LETRAS_DOBLES = re.compile(r'(.)\1+')
+
+
+def tokenizar(texto):
+    """Palabras normalizadas (minúsculas, sin acentos) del texto"""
+    return [token for token in SEPARADORES.split(normalizar(texto or '')) if token]
+
+
+def clave_fonetica(token):
+    """Clave fonética aproximada del castellano rioplatense para una palabra normalizada"""
+    for patron, reemplazo in REEMPLAZOS_FONETICOS:
+        token = patron.sub(reemplazo, token)
+    return LETRAS_DOBLES.sub(r'\1', token)
+
+
+def tokens_de_ciudadano(ciudadano_id, nombre, apellido):
+    """Filas de TokenCiudadano (sin guardar) para un ciudadano"""
+    filas = []
+    for campo, texto in ((TokenCiudadano.Campo.APELLIDO, apellido), (TokenCiudadano.Campo.NOMBRE, nombre)):
+        for token in dict.fromkeys(tokenizar(texto)):
+            token = token[:60]
+            filas.append(TokenCiudadano(
+                ciudadano_id=ciudadano_id, campo=campo, token=token, fonetico=clave_fonetica(token)
+            ))
+    return filas
+
+
+def _solo_dni(texto):
+    """Dígitos del texto si es un DNI (admite puntos y espacios), si no None"""
+    digitos = re.sub(r'[\s.]', '', texto or '')
+    return digitos if digitos.isdigit() else None
+
+
+class CiudadanoSearch:
+    """Búsqueda indexada de ciudadanos compartida por listados y autocompletados"""
+
+    @staticmethod
+    def buscar_ids(texto, limite=10, solo_activos=True):
+        """IDs de ciudadanos que coinciden con el texto, en orden de relevancia"""
+        dni = _solo_dni(texto)
+        if dni:
+            return CiudadanoSearch._por_dni(dni, limite, solo_activos)
+
+        tokens = tokenizar(texto)
+        if not tokens:
+            return []
+        # El token más largo es el más selectivo: guía el range scan; el resto filtra
+        otros = list(tokens)
+        principal = otros.pop(otros.index(max(tokens, key=len)))
+
+        ids = []
+        etapas = (
+            ('token', principal, TokenCiudadano.Campo.APELLIDO),
+            ('token', principal, TokenCiudadano.Campo.NOMBRE),
+            ('fonetico', clave_fonetica(principal), None),
+        )
+        for columna, valor, campo in etapas:
+            faltan = limite - len(ids)
+            if faltan <= 0:
+                break
+            ids.extend(CiudadanoSearch._por_token(
+                columna, valor, campo, otros, faltan, ids, solo_activos
+            ))
+        return ids
+
+    @staticmethod
+    def buscar(texto, limite=10, solo_activos=True, campos=None):
+        """Ciudadanos que coinciden con el texto, en orden de relevancia"""
+        ids = CiudadanoSearch.buscar_ids(texto, limite, solo_activos)
+        if not ids:
+            return []
+        queryset = Ciudadano.objects.all()
+        if campos:
+            queryset = queryset.only(*campos)
+        por_id = queryset.in_bulk(ids)
+        return [por_id[pk] for pk in ids if pk in por_id]
+
+    @staticmethod
+    def queryset(texto, limite=MAXIMO_LISTADO, solo_activos=True):
+        """Queryset ordenado por relevancia (para paginar: solo se leen las filas de cada página)"""
+        ids = CiudadanoSearch.buscar_ids(texto, limite, solo_activos)
+        if not ids:
+            return Ciudadano.objects.none()
+        orden = Case(
+            *[When(pk=pk, then=Value(posicion)) for posicion, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+        return Ciudadano.objects.filter(pk__in=ids).order_by(orden)
+
+    @staticmethod
+    def _por_dni(dni, limite, solo_activos):
+        base = Ciudadano.objects.all()
+        if solo_activos:
+            base = base.filter(activo=True)
+        ids = list(base.filter(dni=dni).values_list('pk', flat=True)[:1])
+        if len(ids) < limite:
+            ids.extend(
+                base.filter(dni__istartswith=dni).exclude(pk__in=ids)
+                .order_by('dni').values_list('pk', flat=True)[:limite - len(ids)]
+            )
+        return ids
+
+    @staticmethod
+    def _por_token(columna, valor, campo, otros, limite, excluir, solo_activos):
+        queryset = TokenCiudadano.objects.filter(**{f'{columna}__istartswith': valor})
+        if campo is not None:
+            queryset = queryset.filter(campo=campo)
+        for token in otros:
+            # Cada palabra adicional debe ser prefijo de alguna palabra del mismo ciudadano:
+            # un JOIN por palabra que se resuelve por ciudadano a medida que avanza el range scan
+            if columna == 'fonetico':
+                queryset = queryset.filter(ciudadano__tokens_busqueda__fonetico__istartswith=clave_fonetica(token))
+            else:
+                queryset = queryset.filter(ciudadano__tokens_busqueda__token__istartswith=token)
+        if solo_activos:
+            queryset = queryset.filter(ciudadano__activo=True)
+        if excluir:
+            queryset = queryset.exclude(ciudadano_id__in=excluir)
+
+        # Un ciudadano puede coincidir con varias palabras: se piden filas de más y se deduplica
+        ids = []
+        filas = queryset.order_by(columna, 'ciudadano_id').values_list('ciudadano_id', flat=True)[:limite * 3]
+        for ciudadano_id in filas:
+            if ciudadano_id not in ids:
+                ids.append(ciudadano_id)
+                if len(ids) == limite:
+                    break
+        return ids
+
+    # ------------------------------------------------------------------
+    # Mantenimiento del índice
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def indexar(filas):
+        """Reemplaza los tokens de los ciudadanos dados como (id, nombre, apellido)"""
+        filas = list(filas)
+        if not filas:
+            return 0
+        tokens = []
+        for ciudadano_id, nombre, apellido in filas:
+            tokens.extend(tokens_de_ciudadano(ciudadano_id, nombre, apellido))
+        with transaction.atomic():
+            TokenCiudadano.objects.filter(ciudadano_id__in=[fila[0] for fila in filas]).delete()
+            TokenCiudadano.objects.bulk_create(tokens, batch_size=TAMANO_LOTE)
+        return len(tokens)
+
+    @staticmethod
+    def indexar_ciudadano(ciudadano):
+        return CiudadanoSearch.indexar([(ciudadano.pk, ciudadano.nombre, ciudadano.apellido)])
+
+    @staticmethod
+    def reindexar_todo(tamano_lote=TAMANO_LOTE, progreso=None):
+        """Reconstruye el índice completo por lotes (keyset sobre pk). Retorna ciudadanos indexados."""
+        total = 0
+        ultimo = 0
+        while True:
+            lote = list(
+                Ciudadano.objects.filter(pk__gt=ultimo).order_by('pk')
+                .values_list('pk', 'nombre', 'apellido')[:tamano_lote]
+            )
+            if not lote:
+                return total
+            CiudadanoSearch.indexar(lote)
+            total += len(lote)
+            ultimo = lote[-1][0]
+            if progreso is not None:
+                progreso(total)
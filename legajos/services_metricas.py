@@ -0,0 +1,284 @@
+"""
+Servicio de métricas pre-agregadas de legajos.
+
+Las vistas de reportes y dashboard leen de MetricaLegajoDiaria / MetricaSeguimientoDiaria
+(tablas chicas, proporcionales a días x dispositivos) en lugar de contar sobre
+LegajoAtencion, SeguimientoContacto, Derivacion y EventoCritico en cada request.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import Derivacion, EventoCritico, LegajoAtencion, SeguimientoContacto
+from .models_metricas import MetricaLegajoDiaria, MetricaSeguimientoDiaria
+from .services_agregaciones import AgregacionesLegajoService, dias_primer_contacto
+
+ESTADOS_ACTIVOS = ['ABIERTO', 'EN_SEGUIMIENTO']
+
+CONTADORES_LEGAJO = (
+    'legajos', 'con_seguimiento', 'dias_primer_contacto',
+    'derivaciones', 'derivaciones_aceptadas', 'eventos_criticos',
+)
+
+
+def _incrementar(modelo, claves, deltas):
+    """
+    UPDATE ... SET campo = campo + delta; crea la fila si no existe.
+
+    ``claves`` debe cubrir una restricción única sin columnas NULL
+    (MetricaLegajoDiaria usa dispositivo_clave): así la creación concurrente
+    choca con IntegrityError y se reintenta como UPDATE.
+    """
+    deltas = {campo: valor for campo, valor in deltas.items() if valor}
+    if not deltas:
+        return
+    expresiones = {campo: F(campo) + valor for campo, valor in deltas.items()}
+    if modelo.objects.filter(**claves).update(**expresiones):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **deltas)
+    except IntegrityError:
+        # Otra request creó la fila en paralelo
+        modelo.objects.filter(**claves).update(**expresiones)
+
+
+class MetricasLegajosService:
+    """Mantenimiento incremental, lectura y reconciliación de métricas de legajos"""
+
+    # ------------------------------------------------------------------
+    # Mantenimiento incremental
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def clave_legajo(fecha_apertura, dispositivo_id, estado, nivel_riesgo):
+        return {
+            'fecha': fecha_apertura,
+            'dispositivo_id': dispositivo_id,
+            'dispositivo_clave': dispositivo_id or 0,
+            'estado': estado,
+            'nivel_riesgo': nivel_riesgo,
+        }
+
+    @staticmethod
+    def clave_de_legajo_id(legajo_id):
+        """(clave de métricas, fecha_admision) de un legajo persistido (1 query); (None, None) si no existe"""
+        datos = LegajoAtencion.objects.filter(pk=legajo_id).values(
+            'fecha_apertura', 'dispositivo_id', 'estado', 'nivel_riesgo', 'fecha_admision'
+        ).first()
+        if datos is None:
+            return None, None
+        fecha_admision = datos.pop('fecha_admision')
+        return MetricasLegajosService.clave_legajo(**datos), fecha_admision
+
+    @staticmethod
+    def incrementar_legajo(clave, **deltas):
+        _incrementar(MetricaLegajoDiaria, clave, deltas)
+
+    @staticmethod
+    def incrementar_seguimientos(fecha, **deltas):
+        _incrementar(MetricaSeguimientoDiaria, {'fecha': fecha}, deltas)
+
+    @staticmethod
+    def dias_primer_contacto(legajo_id, fecha_admision):
+        """Días admisión → primer seguimiento, o None si el legajo no tiene seguimientos"""
+        primer = SeguimientoContacto.objects.filter(legajo_id=legajo_id).aggregate(
+            primer=Min('creado')
+        )['primer']
+        return dias_primer_contacto(primer, fecha_admision)
+
+    @staticmethod
+    def contribucion_legajo(legajo_id, fecha_admision):
+        """Aporte completo de un legajo a los contadores de su grupo"""
+        dias = MetricasLegajosService.dias_primer_contacto(legajo_id, fecha_admision)
+        derivaciones = Derivacion.objects.filter(legajo_id=legajo_id).aggregate(
+            total=Count('id'),
+            aceptadas=Count('id', filter=Q(estado='ACEPTADA')),
+        )
+        return {
+            'legajos': 1,
+            'con_seguimiento': 1 if dias is not None else 0,
+            'dias_primer_contacto': dias or 0,
+            'derivaciones': derivaciones['total'],
+            'derivaciones_aceptadas': derivaciones['aceptadas'],
+            'eventos_criticos': EventoCritico.objects.filter(legajo_id=legajo_id).count(),
+        }
+
+    @staticmethod
+    def mover_legajo(clave_anterior, clave_nueva, contribucion):
+        """Traslada el aporte de un legajo de un grupo a otro"""
+        MetricasLegajosService.incrementar_legajo(
+            clave_anterior, **{campo: -valor for campo, valor in contribucion.items()}
+        )
+        MetricasLegajosService.incrementar_legajo(clave_nueva, **contribucion)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def resumen():
+        """Totales generales de legajos (una query sobre la tabla de métricas)"""
+        hace_una_semana = timezone.localdate() - timedelta(days=7)
+        totales = MetricaLegajoDiaria.objects.aggregate(
+            total_legajos=Sum('legajos'),
+            legajos_activos=Sum('legajos', filter=Q(estado__in=ESTADOS_ACTIVOS)),
+            riesgo_alto=Sum('legajos', filter=Q(nivel_riesgo='ALTO')),
+            nuevos_semana=Sum('legajos', filter=Q(fecha__gte=hace_una_semana)),
+            con_seguimiento=Sum('con_seguimiento'),
+            dias_primer_contacto=Sum('dias_primer_contacto'),
+            derivaciones=Sum('derivaciones'),
+            derivaciones_aceptadas=Sum('derivaciones_aceptadas'),
+            eventos_criticos=Sum('eventos_criticos'),
+        )
+        return {campo: valor or 0 for campo, valor in totales.items()}
+
+    @staticmethod
+    def por_estado():
+        return list(
+            MetricaLegajoDiaria.objects.values('estado')
+            .annotate(total=Sum('legajos'))
+            .filter(total__gt=0)
+            .order_by('-total')
+        )
+
+    @staticmethod
+    def por_riesgo():
+        return list(
+            MetricaLegajoDiaria.objects.values('nivel_riesgo')
+            .annotate(total=Sum('legajos'))
+            .filter(total__gt=0)
+            .order_by('-total')
+        )
+
+    @staticmethod
+    def por_dispositivo(limite=10):
+        return list(
+            MetricaLegajoDiaria.objects.values('dispositivo__nombre', 'dispositivo__tipo')
+            .annotate(total=Sum('legajos'))
+            .filter(total__gt=0)
+            .order_by('-total')[:limite]
+        )
+
+    @staticmethod
+    def por_mes(dias=180, limite=6):
+        fecha_limite = timezone.localdate() - timedelta(days=dias)
+        return list(
+            MetricaLegajoDiaria.objects.filter(fecha__gte=fecha_limite)
+            .annotate(mes=TruncMonth('fecha'))
+            .values('mes')
+            .annotate(total=Sum('legajos'))
+            .order_by('-mes')[:limite]
+        )
+
+    @staticmethod
+    def totales_seguimientos():
+        totales = MetricaSeguimientoDiaria.objects.aggregate(
+            seguimientos=Sum('seguimientos'),
+            adherencia_adecuada=Sum('adherencia_adecuada'),
+        )
+        return {campo: valor or 0 for campo, valor in totales.items()}
+
+    @staticmethod
+    def seguimientos_del_dia(fecha=None):
+        fecha = fecha or timezone.localdate()
+        fila = MetricaSeguimientoDiaria.objects.filter(fecha=fecha).values('seguimientos').first()
+        return fila['seguimientos'] if fila else 0
+
+    @staticmethod
+    def metricas_calidad(resumen=None):
+        """TTR, adherencia, tasa de derivación, eventos cada 100 legajos y cobertura"""
+        resumen = resumen or MetricasLegajosService.resumen()
+        seguimientos = MetricasLegajosService.totales_seguimientos()
+        total_legajos = max(resumen['total_legajos'], 1)
+
+        ttr = (
+            round(resumen['dias_primer_contacto'] / resumen['con_seguimiento'], 1)
+            if resumen['con_seguimiento'] else 0
+        )
+        return {
+            'ttr_promedio': ttr,
+            'adherencia_adecuada': round(
+                (seguimientos['adherencia_adecuada'] / max(seguimientos['seguimientos'], 1)) * 100, 1
+            ),
+            'tasa_derivacion': round(
+                (resumen['derivaciones_aceptadas'] / max(resumen['derivaciones'], 1)) * 100, 1
+            ),
+            'eventos_por_100': round((resumen['eventos_criticos'] / total_legajos) * 100, 1),
+            'cobertura_seguimiento': round((resumen['con_seguimiento'] / total_legajos) * 100, 1),
+        }
+
+    # ------------------------------------------------------------------
+    # Reconciliación
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def calcular_desde_cero():
+        """Recalcula todas las filas de métricas a partir de las tablas operativas"""
+        grupos = defaultdict(lambda: dict.fromkeys(CONTADORES_LEGAJO, 0))
+        campos_clave = ('fecha_apertura', 'dispositivo_id', 'estado', 'nivel_riesgo')
+
+        for fila in LegajoAtencion.objects.values(*campos_clave).annotate(total=Count('id')).order_by():
+            clave = tuple(fila[c] for c in campos_clave)
+            grupos[clave]['legajos'] += fila['total']
+
+        con_primer_contacto = (
+            AgregacionesLegajoService.anotar_indicadores(LegajoAtencion.objects.all(), 'primer_seguimiento')
+            .filter(primer_seguimiento__isnull=False)
+            .values_list(*campos_clave, 'fecha_admision', 'primer_seguimiento')
+            .order_by()
+        )
+        for *clave, fecha_admision, primer in con_primer_contacto.iterator(chunk_size=2000):
+            grupo = grupos[tuple(clave)]
+            grupo['con_seguimiento'] += 1
+            grupo['dias_primer_contacto'] += dias_primer_contacto(primer, fecha_admision)
+
+        campos_legajo = tuple(f'legajo__{c}' for c in campos_clave)
+        derivaciones = Derivacion.objects.values(*campos_legajo).annotate(
+            total=Count('id'),
+            aceptadas=Count('id', filter=Q(estado='ACEPTADA')),
+        ).order_by()
+        for fila in derivaciones:
+            grupo = grupos[tuple(fila[c] for c in campos_legajo)]
+            grupo['derivaciones'] += fila['total']
+            grupo['derivaciones_aceptadas'] += fila['aceptadas']
+
+        eventos = EventoCritico.objects.values(*campos_legajo).annotate(total=Count('id')).order_by()
+        for fila in eventos:
+            grupos[tuple(fila[c] for c in campos_legajo)]['eventos_criticos'] += fila['total']
+
+        filas_legajos = [
+            MetricaLegajoDiaria(
+                **MetricasLegajosService.clave_legajo(fecha, dispositivo_id, estado, nivel_riesgo),
+                **contadores
+            )
+            for (fecha, dispositivo_id, estado, nivel_riesgo), contadores in grupos.items()
+        ]
+
+        por_dia = SeguimientoContacto.objects.annotate(dia=TruncDate('creado')).values('dia').annotate(
+            total=Count('id'),
+            adecuadas=Count('id', filter=Q(adherencia='ADECUADA')),
+        ).order_by()
+        filas_seguimientos = [
+            MetricaSeguimientoDiaria(
+                fecha=fila['dia'], seguimientos=fila['total'], adherencia_adecuada=fila['adecuadas']
+            )
+            for fila in por_dia
+        ]
+        return filas_legajos, filas_seguimientos
+
+    @staticmethod
+    def reconciliar():
+        """Reemplaza las tablas de métricas por el cálculo exacto. Retorna (filas_legajos, filas_seguimientos)."""
+        filas_legajos, filas_seguimientos = MetricasLegajosService.calcular_desde_cero()
+        with transaction.atomic():
+            MetricaLegajoDiaria.objects.all().delete()
+            MetricaSeguimientoDiaria.objects.all().delete()
+            MetricaLegajoDiaria.objects.bulk_create(filas_legajos, batch_size=1000)
+            MetricaSeguimientoDiaria.objects.bulk_create(filas_seguimientos, batch_size=1000)
+        return len(filas_legajos), len(filas_seguimientos)
@@ -0,0 +1,152 @@
+"""
+Scoring de riesgo en lote.
+
+Carga las features de muchos legajos con pocas queries masivas (legajos +
+evaluación, indicadores agrupados de seguimientos y eventos, vínculos y
+derivaciones pendientes), puntúa cada fila con las reglas de ml_predictor y
+guarda el resultado en PrediccionRiesgo.
+"""
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .ml_predictor import puntuar_abandono, puntuar_evento_critico, recomendar
+from .models import Derivacion, LegajoAtencion, PrediccionRiesgo
+from .models_contactos import VinculoFamiliar
+from .services_agregaciones import AgregacionesLegajoService
+
+TAMANO_LOTE = 5000
+
+
+class ScoringRiesgoService:
+    """Carga de features, puntaje y persistencia de predicciones de riesgo"""
+
+    ESTADOS_ACTIVOS = ['ABIERTO', 'EN_SEGUIMIENTO']
+
+    @staticmethod
+    def legajos_activos():
+        return LegajoAtencion.objects.filter(estado__in=ScoringRiesgoService.ESTADOS_ACTIVOS)
+
+    @staticmethod
+    def cargar_features(legajos, ahora=None):
+        """
+        Features de todos los legajos del queryset en cinco queries, sin importar su cantidad.
+        Retorna una lista de dicts (uno por legajo) con ``legajo_id`` y ``ciudadano_id``.
+        """
+        ahora = ahora or timezone.now()
+
+        filas = list(
+            legajos.order_by().values_list(
+                'pk', 'ciudadano_id', 'plan_vigente', 'nivel_riesgo',
+                'evaluacion__id', 'evaluacion__riesgo_suicida', 'evaluacion__violencia',
+            )
+        )
+        if not filas:
+            return []
+
+        indicadores = AgregacionesLegajoService.indicadores_por_legajo(legajos, ahora=ahora)
+        vinculos = dict(
+            VinculoFamiliar.objects.filter(ciudadano_principal__in=legajos.values('ciudadano_id'))
+            .order_by()
+            .values('ciudadano_principal_id')
+            .annotate(total=Count('id'))
+            .values_list('ciudadano_principal_id', 'total')
+        )
+        derivaciones_pendientes = dict(
+            Derivacion.objects.filter(legajo__in=legajos, estado='PENDIENTE')
+            .order_by()
+            .values('legajo_id')
+            .annotate(total=Count('id'))
+            .values_list('legajo_id', 'total')
+        )
+
+        features = []
+        for legajo_id, ciudadano_id, plan_vigente, nivel_riesgo, evaluacion_id, riesgo_suicida, violencia in filas:
+            ind = indicadores.get(legajo_id) or AgregacionesLegajoService.vacio()
+            ultimo = ind['ultimo_seguimiento']
+            features.append({
+                'legajo_id': legajo_id,
+                'ciudadano_id': ciudadano_id,
+                'dias_sin_contacto': (ahora - ultimo).days if ultimo else None,
+                'seguimientos_30d': ind['seguimientos_30d'],
+                'adherencia_nula_30d': ind['adherencia_nula_30d'],
+                'adherencia_parcial_30d': ind['adherencia_parcial_30d'],
+                'eventos_30d': ind['eventos_30d'],
+                'eventos_90d': ind['eventos_90d'],
+                'plan_vigente': plan_vigente,
+                'nivel_riesgo': nivel_riesgo,
+                'tiene_evaluacion': evaluacion_id is not None,
+                'riesgo_suicida': bool(riesgo_suicida),
+                'violencia': bool(violencia),
+                'vinculos': vinculos.get(ciudadano_id, 0),
+                'derivaciones_pendientes': derivaciones_pendientes.get(legajo_id, 0),
+            })
+        return features
+
+    @staticmethod
+    def puntuar(features, ahora=None):
+        """PrediccionRiesgo (sin guardar) para cada fila de features"""
+        ahora = ahora or timezone.now()
+        predicciones = []
+        for f in features:
+            abandono = puntuar_abandono(f)
+            evento = puntuar_evento_critico(f)
+            predicciones.append(PrediccionRiesgo(
+                legajo_id=f['legajo_id'],
+                ciudadano_id=f['ciudadano_id'],
+                score_abandono=abandono['score'],
+                nivel_abandono=abandono['nivel'],
+                factores_abandono=abandono['factores'],
+                score_evento=evento['score'],
+                nivel_evento=evento['nivel'],
+                factores_evento=evento['factores'],
+                recomendaciones=recomendar(f),
+                calculado=ahora,
+            ))
+        return predicciones
+
+    @staticmethod
+    def guardar(legajos, ahora=None):
+        """Calcula y guarda (reemplaza) las predicciones de los legajos del queryset"""
+        ahora = ahora or timezone.now()
+        predicciones = ScoringRiesgoService.puntuar(
+            ScoringRiesgoService.cargar_features(legajos, ahora), ahora
+        )
+        with transaction.atomic():
+            PrediccionRiesgo.objects.filter(legajo__in=legajos).delete()
+            PrediccionRiesgo.objects.bulk_create(predicciones, batch_size=1000)
+        return predicciones
+
+    @staticmethod
+    def recalcular_todo(tamano_lote=TAMANO_LOTE, progreso=None):
+        """
+        Recalcula las predicciones de todos los legajos activos por lotes y reemplaza
+        la tabla en una transacción (los lectores ven la versión anterior hasta el commit).
+        Retorna la cantidad de predicciones guardadas.
+        """
+        ahora = timezone.now()
+        ids = list(ScoringRiesgoService.legajos_activos().order_by('pk').values_list('pk', flat=True))
+        total = 0
+        with transaction.atomic():
+            PrediccionRiesgo.objects.all().delete()
+            for inicio in range(0, len(ids), tamano_lote):
+                lote = LegajoAtencion.objects.filter(pk__in=ids[inicio:inicio + tamano_lote])
+                predicciones = ScoringRiesgoService.puntuar(
+                    ScoringRiesgoService.cargar_features(lote, ahora), ahora
+                )
+                PrediccionRiesgo.objects.bulk_create(predicciones, batch_size=1000)
+                total += len(predicciones)
+                if progreso is not None:
+                    progreso(total, len(ids))
+        return total
+
+    @staticmethod
+    def ranking(limite=20, tipo='abandono'):
+        """Legajos activos con mayor score de riesgo precalculado"""
+        campo = 'score_evento' if tipo == 'evento' else 'score_abandono'
+        return list(
+            PrediccionRiesgo.objects.filter(legajo__estado__in=ScoringRiesgoService.ESTADOS_ACTIVOS)
+            .select_related('legajo', 'ciudadano')
+            .order_by(f'-{campo}', 'legajo_id')[:limite]
+        )
@@ -1,12 +1,20 @@
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import EventoCritico, SeguimientoContacto, LegajoAtencion
+from core.estado_cargado import estado_anterior, rastrear
+from .models import (
+    Consentimiento, Derivacion, EvaluacionInicial, EventoCritico, LegajoAtencion, SeguimientoContacto,
+)
+from .models_contactos import HistorialContacto, VinculoFamiliar
+from .motor_alertas import CAMPOS_REGLAS
 from .services_alertas import AlertasService
 from conversaciones.models import Mensaje, Conversacion
 
+rastrear(LegajoAtencion)
+
 
 @receiver(post_save, sender=EventoCritico)
 def alerta_evento_critico(sender, instance, created, **kwargs):
@@ -35,31 +43,63 @@ def alerta_mensaje_ciudadano(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=LegajoAtencion)
-def verificar_alertas_legajo(sender, instance, created, **kwargs):
+def verificar_alertas_legajo(sender, instance, created, raw=False, **kwargs):
     """Genera alertas automáticas al crear o modificar legajo"""
+    if raw:
+        return
     if created:
         # Generar alertas iniciales
-        AlertasService.generar_alertas_ciudadano(instance.ciudadano.id)
+        AlertasService.actualizar_alertas_legajo(instance)
     else:
-        # Verificar cambios críticos
-        if hasattr(instance, '_state') and instance._state.adding is False:
-            # Legajo modificado - regenerar alertas
-            AlertasService.generar_alertas_ciudadano(instance.ciudadano.id)
+        # Reevaluar solo las reglas que dependen de los campos modificados
+        campos = getattr(instance, '_alertas_campos_modificados', None)
+        if campos:
+            AlertasService.actualizar_alertas_legajo(instance, campos)
+
+
+# Datos relacionados de los que dependen reglas de alertas (Regla.modelos). Se reevalúa al
+# confirmar: si el legajo se está borrando en cascada ya no existe y no se recrean alertas.
+
+@receiver([post_save, post_delete], sender=EvaluacionInicial)
+@receiver([post_save, post_delete], sender=HistorialContacto)
+@receiver([post_save, post_delete], sender=EventoCritico)
+@receiver([post_save, post_delete], sender=Derivacion)
+@receiver([post_save, post_delete], sender=SeguimientoContacto)
+def reevaluar_reglas_legajo(sender, instance, raw=False, **kwargs):
+    """Reevalúa las reglas del legajo que dependen del modelo guardado o borrado"""
+    if raw:
+        return
+    legajo_id = instance.legajo_id
+    transaction.on_commit(lambda: AlertasService.reevaluar_relacionado(sender, legajo_id=legajo_id))
+
+
+@receiver([post_save, post_delete], sender=VinculoFamiliar)
+@receiver([post_save, post_delete], sender=Consentimiento)
+def reevaluar_reglas_ciudadano(sender, instance, raw=False, **kwargs):
+    """Reevalúa las reglas generales del ciudadano que dependen del modelo guardado o borrado"""
+    if raw:
+        return
+    ciudadano_id = (
+        instance.ciudadano_principal_id if sender is VinculoFamiliar else instance.ciudadano_id
+    )
+    transaction.on_commit(lambda: AlertasService.reevaluar_relacionado(sender, ciudadano_id=ciudadano_id))
 
 
 @receiver(pre_save, sender=LegajoAtencion)
-def detectar_cambio_riesgo(sender, instance, **kwargs):
-    """Detecta cambios en el nivel de riesgo"""
-    if instance.pk:
-        try:
-            legajo_anterior = LegajoAtencion.objects.get(pk=instance.pk)
-            if legajo_anterior.nivel_riesgo != instance.nivel_riesgo:
-                if instance.nivel_riesgo == 'ALTO':
-                    # Crear alerta inmediata por cambio a riesgo alto
-                    AlertasService.generar_alerta_evento_critico(
-                        instance,
-                        'CAMBIO_RIESGO',
-                        f'Nivel de riesgo cambiado de {legajo_anterior.nivel_riesgo} a {instance.nivel_riesgo}'
-                    )
-        except LegajoAtencion.DoesNotExist:
-            pass
\ No newline at end of file
+def detectar_cambio_riesgo(sender, instance, raw=False, **kwargs):
+    """Detecta cambios en el nivel de riesgo y en los campos que usan las reglas de alertas"""
+    if raw:
+        return
+    anterior = estado_anterior(instance)
+    instance._alertas_campos_modificados = (
+        {campo for campo in CAMPOS_REGLAS if anterior[campo] != getattr(instance, campo)}
+        if anterior is not None else None
+    )
+    if anterior is not None and anterior['nivel_riesgo'] != instance.nivel_riesgo:
+        if instance.nivel_riesgo == 'ALTO':
+            # Crear alerta inmediata por cambio a riesgo alto
+            AlertasService.generar_alerta_evento_critico(
+                instance,
+                'CAMBIO_RIESGO',
+                f'Nivel de riesgo cambiado de {anterior["nivel_riesgo"]} a {instance.nivel_riesgo}'
+            )
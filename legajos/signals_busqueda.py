@@ -0,0 +1,33 @@
+"""
+Mantenimiento del índice de búsqueda de ciudadanos (TokenCiudadano).
+
+Se reindexa un ciudadano al crearlo o cuando cambia su nombre o apellido.
+Las escrituras que no pasan por signals (bulk_create, queryset.update) se
+corrigen con el comando `indexar_ciudadanos`.
+"""
+
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from core.estado_cargado import estado_anterior, rastrear
+from .models import Ciudadano
+from .services_busqueda import CiudadanoSearch
+
+rastrear(Ciudadano)
+
+
+@receiver(pre_save, sender=Ciudadano)
+def detectar_cambio_nombre(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = estado_anterior(instance)
+    instance._reindexar_busqueda = anterior is None or (
+        anterior['nombre'] != instance.nombre or anterior['apellido'] != instance.apellido
+    )
+
+
+@receiver(post_save, sender=Ciudadano)
+def indexar_ciudadano(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, '_reindexar_busqueda', True):
+        return
+    CiudadanoSearch.indexar_ciudadano(instance)
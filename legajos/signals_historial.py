@@ -1,11 +1,14 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from core.estado_cargado import estado_anterior, rastrear
 from .models import (
     PlanFortalecimiento, StaffActividad, Derivacion, InscriptoActividad,
     HistorialActividad, HistorialStaff, HistorialDerivacion, HistorialInscripto
 )
 
+rastrear(PlanFortalecimiento, Derivacion, InscriptoActividad)
+
 
 @receiver(post_save, sender=PlanFortalecimiento)
 def crear_historial_actividad(sender, instance, created, **kwargs):
@@ -19,23 +22,20 @@ def crear_historial_actividad(sender, instance, created, **kwargs):
 
 @receiver(pre_save, sender=PlanFortalecimiento)
 def guardar_estado_anterior_actividad(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            anterior = PlanFortalecimiento.objects.get(pk=instance.pk)
-            if anterior.estado != instance.estado:
-                accion_map = {
-                    'SUSPENDIDO': 'SUSPENSION',
-                    'FINALIZADO': 'FINALIZACION',
-                    'ACTIVO': 'REACTIVACION'
-                }
-                accion = accion_map.get(instance.estado, 'MODIFICACION')
-                HistorialActividad.objects.create(
-                    actividad=instance,
-                    accion=accion,
-                    descripcion=f'Estado cambiado de {anterior.get_estado_display()} a {instance.get_estado_display()}'
-                )
-        except PlanFortalecimiento.DoesNotExist:
-            pass
+    anterior = estado_anterior(instance)
+    if anterior is not None and anterior['estado'] != instance.estado:
+        accion_map = {
+            'SUSPENDIDO': 'SUSPENSION',
+            'FINALIZADO': 'FINALIZACION',
+            'ACTIVO': 'REACTIVACION'
+        }
+        accion = accion_map.get(instance.estado, 'MODIFICACION')
+        estados = dict(PlanFortalecimiento.Estado.choices)
+        HistorialActividad.objects.create(
+            actividad=instance,
+            accion=accion,
+            descripcion=f'Estado cambiado de {estados.get(anterior["estado"], anterior["estado"])} a {instance.get_estado_display()}'
+        )
 
 
 @receiver(post_save, sender=StaffActividad)
@@ -50,23 +50,19 @@ def crear_historial_staff(sender, instance, created, **kwargs):
 
 @receiver(pre_save, sender=Derivacion)
 def guardar_estado_anterior_derivacion(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            anterior = Derivacion.objects.get(pk=instance.pk)
-            if anterior.estado != instance.estado:
-                accion_map = {
-                    'ACEPTADA': 'ACEPTACION',
-                    'RECHAZADA': 'RECHAZO'
-                }
-                accion = accion_map.get(instance.estado, 'CREACION')
-                HistorialDerivacion.objects.create(
-                    derivacion=instance,
-                    accion=accion,
-                    descripcion=f'Derivación {accion.lower()}',
-                    estado_anterior=anterior.estado
-                )
-        except Derivacion.DoesNotExist:
-            pass
+    anterior = estado_anterior(instance)
+    if anterior is not None and anterior['estado'] != instance.estado:
+        accion_map = {
+            'ACEPTADA': 'ACEPTACION',
+            'RECHAZADA': 'RECHAZO'
+        }
+        accion = accion_map.get(instance.estado, 'CREACION')
+        HistorialDerivacion.objects.create(
+            derivacion=instance,
+            accion=accion,
+            descripcion=f'Derivación {accion.lower()}',
+            estado_anterior=anterior['estado']
+        )
 
 
 @receiver(post_save, sender=InscriptoActividad)
@@ -81,21 +77,17 @@ def crear_historial_inscripto(sender, instance, created, **kwargs):
 
 @receiver(pre_save, sender=InscriptoActividad)
 def guardar_estado_anterior_inscripto(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            anterior = InscriptoActividad.objects.get(pk=instance.pk)
-            if anterior.estado != instance.estado:
-                accion_map = {
-                    'ACTIVO': 'ACTIVACION',
-                    'FINALIZADO': 'FINALIZACION',
-                    'ABANDONADO': 'ABANDONO'
-                }
-                accion = accion_map.get(instance.estado, 'INSCRIPCION')
-                HistorialInscripto.objects.create(
-                    inscripto=instance,
-                    accion=accion,
-                    descripcion=f'Estado cambiado a {instance.get_estado_display()}',
-                    estado_anterior=anterior.estado
-                )
-        except InscriptoActividad.DoesNotExist:
-            pass
\ No newline at end of file
+    anterior = estado_anterior(instance)
+    if anterior is not None and anterior['estado'] != instance.estado:
+        accion_map = {
+            'ACTIVO': 'ACTIVACION',
+            'FINALIZADO': 'FINALIZACION',
+            'ABANDONADO': 'ABANDONO'
+        }
+        accion = accion_map.get(instance.estado, 'INSCRIPCION')
+        HistorialInscripto.objects.create(
+            inscripto=instance,
+            accion=accion,
+            descripcion=f'Estado cambiado a {instance.get_estado_display()}',
+            estado_anterior=anterior['estado']
+        )
\ No newline at end of file
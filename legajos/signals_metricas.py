@@ -0,0 +1,218 @@
+"""
+Mantenimiento incremental de las métricas pre-agregadas de legajos.
+
+Cada alta/cambio/baja de legajo, seguimiento, derivación o evento crítico aplica
+un delta sobre MetricaLegajoDiaria / MetricaSeguimientoDiaria. Las escrituras que
+no pasan por signals (bulk_create, queryset.update) se corrigen con el comando
+nocturno `reconciliar_metricas`.
+"""
+
+import threading
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.estado_cargado import estado_anterior, rastrear
+from .models import Derivacion, EventoCritico, LegajoAtencion, SeguimientoContacto
+from .services_metricas import MetricasLegajosService
+
+rastrear(LegajoAtencion, SeguimientoContacto, Derivacion)
+
+# Primer contacto de legajos con seguimientos en proceso de eliminación
+# (un borrado en cascada dispara N pre_delete/post_delete para el mismo legajo)
+_eliminaciones = threading.local()
+
+
+def _clave(legajo):
+    return MetricasLegajosService.clave_legajo(
+        legajo.fecha_apertura, legajo.dispositivo_id, legajo.estado, legajo.nivel_riesgo
+    )
+
+
+def _clave_desde_estado(estado):
+    return MetricasLegajosService.clave_legajo(
+        estado['fecha_apertura'], estado['dispositivo_id'], estado['estado'], estado['nivel_riesgo']
+    )
+
+
+def _aplicar_primer_contacto(clave, dias_antes, dias_despues):
+    MetricasLegajosService.incrementar_legajo(
+        clave,
+        con_seguimiento=(dias_despues is not None) - (dias_antes is not None),
+        dias_primer_contacto=(dias_despues or 0) - (dias_antes or 0),
+    )
+
+
+# ============================================================================
+# LEGAJOS
+# ============================================================================
+
+@receiver(pre_save, sender=LegajoAtencion)
+def metricas_legajo_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = estado_anterior(instance)
+    instance._metricas_clave_anterior = _clave_desde_estado(anterior) if anterior is not None else None
+
+
+@receiver(post_save, sender=LegajoAtencion)
+def metricas_legajo_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    clave = _clave(instance)
+    if created:
+        MetricasLegajosService.incrementar_legajo(clave, legajos=1)
+        return
+
+    clave_anterior = getattr(instance, '_metricas_clave_anterior', None)
+    if clave_anterior is not None and clave_anterior != clave:
+        contribucion = MetricasLegajosService.contribucion_legajo(instance.pk, instance.fecha_admision)
+        MetricasLegajosService.mover_legajo(clave_anterior, clave, contribucion)
+
+
+@receiver(post_delete, sender=LegajoAtencion)
+def metricas_legajo_post_delete(sender, instance, **kwargs):
+    # Seguimientos, derivaciones y eventos se descuentan en sus propios post_delete (cascada)
+    MetricasLegajosService.incrementar_legajo(_clave(instance), legajos=-1)
+
+
+# ============================================================================
+# SEGUIMIENTOS
+# ============================================================================
+
+@receiver(pre_save, sender=SeguimientoContacto)
+def metricas_seguimiento_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = estado_anterior(instance)
+    instance._metricas_adherencia_anterior = anterior['adherencia'] if anterior is not None else None
+
+
+@receiver(post_save, sender=SeguimientoContacto)
+def metricas_seguimiento_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    fecha = timezone.localdate(instance.creado)
+    adecuada = instance.adherencia == 'ADECUADA'
+
+    if not created:
+        era_adecuada = getattr(instance, '_metricas_adherencia_anterior', None) == 'ADECUADA'
+        if adecuada != era_adecuada:
+            MetricasLegajosService.incrementar_seguimientos(
+                fecha, adherencia_adecuada=1 if adecuada else -1
+            )
+        return
+
+    MetricasLegajosService.incrementar_seguimientos(
+        fecha, seguimientos=1, adherencia_adecuada=1 if adecuada else 0
+    )
+
+    clave, fecha_admision = MetricasLegajosService.clave_de_legajo_id(instance.legajo_id)
+    if clave is None:
+        return
+    primer_previo = (
+        SeguimientoContacto.objects.filter(legajo_id=instance.legajo_id)
+        .exclude(pk=instance.pk)
+        .order_by('creado')
+        .values_list('creado', flat=True)
+        .first()
+    )
+    dias_antes = (primer_previo.date() - fecha_admision).days if primer_previo else None
+    dias_nuevo = (instance.creado.date() - fecha_admision).days
+    dias_despues = dias_nuevo if dias_antes is None else min(dias_antes, dias_nuevo)
+    _aplicar_primer_contacto(clave, dias_antes, dias_despues)
+
+
+@receiver(pre_delete, sender=SeguimientoContacto)
+def metricas_seguimiento_pre_delete(sender, instance, **kwargs):
+    pendientes = getattr(_eliminaciones, 'legajos', None)
+    if pendientes is None:
+        pendientes = _eliminaciones.legajos = {}
+    if instance.legajo_id in pendientes:
+        return
+    clave, fecha_admision = MetricasLegajosService.clave_de_legajo_id(instance.legajo_id)
+    if clave is None:
+        return
+    pendientes[instance.legajo_id] = (
+        clave,
+        fecha_admision,
+        MetricasLegajosService.dias_primer_contacto(instance.legajo_id, fecha_admision),
+    )
+
+
+@receiver(post_delete, sender=SeguimientoContacto)
+def metricas_seguimiento_post_delete(sender, instance, **kwargs):
+    MetricasLegajosService.incrementar_seguimientos(
+        timezone.localdate(instance.creado),
+        seguimientos=-1,
+        adherencia_adecuada=-1 if instance.adherencia == 'ADECUADA' else 0,
+    )
+
+    pendiente = getattr(_eliminaciones, 'legajos', {}).pop(instance.legajo_id, None)
+    if pendiente is None:
+        return
+    clave, fecha_admision, dias_antes = pendiente
+    dias_despues = MetricasLegajosService.dias_primer_contacto(instance.legajo_id, fecha_admision)
+    _aplicar_primer_contacto(clave, dias_antes, dias_despues)
+
+
+# ============================================================================
+# DERIVACIONES
+# ============================================================================
+
+@receiver(pre_save, sender=Derivacion)
+def metricas_derivacion_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = estado_anterior(instance)
+    instance._metricas_estado_anterior = anterior['estado'] if anterior is not None else None
+
+
+@receiver(post_save, sender=Derivacion)
+def metricas_derivacion_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    aceptada = instance.estado == 'ACEPTADA'
+    if created:
+        deltas = {'derivaciones': 1, 'derivaciones_aceptadas': 1 if aceptada else 0}
+    else:
+        era_aceptada = getattr(instance, '_metricas_estado_anterior', None) == 'ACEPTADA'
+        if aceptada == era_aceptada:
+            return
+        deltas = {'derivaciones_aceptadas': 1 if aceptada else -1}
+
+    clave, _ = MetricasLegajosService.clave_de_legajo_id(instance.legajo_id)
+    if clave is not None:
+        MetricasLegajosService.incrementar_legajo(clave, **deltas)
+
+
+@receiver(post_delete, sender=Derivacion)
+def metricas_derivacion_post_delete(sender, instance, **kwargs):
+    clave, _ = MetricasLegajosService.clave_de_legajo_id(instance.legajo_id)
+    if clave is not None:
+        MetricasLegajosService.incrementar_legajo(
+            clave,
+            derivaciones=-1,
+            derivaciones_aceptadas=-1 if instance.estado == 'ACEPTADA' else 0,
+        )
+
+
+# ============================================================================
+# EVENTOS CRÍTICOS
+# ============================================================================
+
+@receiver(post_save, sender=EventoCritico)
+def metricas_evento_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    clave, _ = MetricasLegajosService.clave_de_legajo_id(instance.legajo_id)
+    if clave is not None:
+        MetricasLegajosService.incrementar_legajo(clave, eventos_criticos=1)
+
+
+@receiver(post_delete, sender=EventoCritico)
+def metricas_evento_post_delete(sender, instance, **kwargs):
+    clave, _ = MetricasLegajosService.clave_de_legajo_id(instance.legajo_id)
+    if clave is not None:
+        MetricasLegajosService.incrementar_legajo(clave, eventos_criticos=-1)
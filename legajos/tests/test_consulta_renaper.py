@@ -0,0 +1,153 @@
+"""
+Cliente de RENAPER contra un servidor de prueba.
+
+El servidor cuenta logins y consultas, puede revocar el primer token (401) o
+simular una caída (503), para verificar el token compartido, la cache de
+resultados y el cortacircuito.
+"""
+
+import datetime
+import time
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core.tests.servidor_falso import ConServidorFalso, ManejadorFalso
+from legajos.services import consulta_renaper
+from legajos.services.consulta_renaper import APIClient, CircuitoRenaper
+
+UMBRAL = 3
+
+
+class _RenaperFalso(ManejadorFalso):
+    """POST /auth/login entrega tokens t1, t2...; GET /consultarenaper responde el DNI consultado"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        estado = self.server.estado
+        if estado['caido']:
+            return self.responder({}, 503)
+        estado['logins'] += 1
+        vence = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+        self.responder({
+            'token': f"t{estado['logins']}",
+            'expiration': vence.isoformat().replace('+00:00', 'Z'),
+        })
+
+    def do_GET(self):
+        estado = self.server.estado
+        estado['consultas'] += 1
+        if estado['caido']:
+            return self.responder({}, 503)
+        if estado['revocar'] and self.headers.get('Authorization') == 'Bearer t1':
+            return self.responder({}, 401)
+        dni = parse_qs(urlparse(self.path).query)['dni'][0]
+        self.responder({'isSuccess': True, 'result': {'dni': dni, 'apellido': 'Gómez', 'nombres': 'Ana'}})
+
+
+class ClienteRenaperTests(ConServidorFalso, SimpleTestCase):
+
+    manejador = _RenaperFalso
+
+    @classmethod
+    def ajustes_servidor(cls, url):
+        return {
+            'RENAPER_API_USERNAME': 'usuario',
+            'RENAPER_API_PASSWORD': 'clave',
+            'RENAPER_CIRCUITO_UMBRAL': UMBRAL,
+            'RENAPER_CIRCUITO_VENTANA': 60,
+            'RENAPER_CIRCUITO_ESPERA': 30,
+        }
+
+    @classmethod
+    def parches_servidor(cls, url):
+        return [
+            mock.patch.object(consulta_renaper, 'LOGIN_URL', f'{url}/auth/login'),
+            mock.patch.object(consulta_renaper, 'CONSULTA_URL', f'{url}/consultarenaper'),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.servidor.estado = {'caido': False, 'revocar': False, 'logins': 0, 'consultas': 0}
+
+    @property
+    def estado(self):
+        return self.servidor.estado
+
+    def _expirar_espera(self):
+        """Simula que pasó RENAPER_CIRCUITO_ESPERA sin dormir el test"""
+        cache.set(consulta_renaper.CACHE_CIRCUITO, time.time() - 1, None)
+
+    def test_token_compartido_entre_clientes(self):
+        primero = APIClient().consultar_ciudadano('30111222', 'F')
+        segundo = APIClient().consultar_ciudadano('30111223', 'M')
+
+        self.assertTrue(primero['success'])
+        self.assertTrue(segundo['success'])
+        self.assertEqual(self.estado['logins'], 1)
+        self.assertEqual(self.estado['consultas'], 2)
+
+    def test_token_revocado_reintenta_con_nuevo_login(self):
+        APIClient().get_token()
+        self.estado['revocar'] = True
+
+        resultado = APIClient().consultar_ciudadano('30111222', 'F')
+
+        self.assertTrue(resultado['success'])
+        self.assertEqual(self.estado['logins'], 2)
+        self.assertEqual(self.estado['consultas'], 2)
+        self.assertEqual(cache.get(consulta_renaper.CACHE_TOKEN)[0], 't2')
+
+    def test_resultado_desde_cache(self):
+        primero = APIClient().consultar_ciudadano('30111222', 'F')
+        segundo = APIClient().consultar_ciudadano(' 30111222 ', 'f')
+
+        self.assertEqual(segundo, primero)
+        self.assertEqual(self.estado['consultas'], 1)
+
+    def test_circuito_se_abre_tras_el_umbral_y_falla_en_el_acto(self):
+        APIClient().get_token()
+        self.estado['caido'] = True
+
+        for n in range(UMBRAL):
+            self.assertFalse(APIClient().consultar_ciudadano(f'4000000{n}', 'M')['success'])
+        self.assertEqual(self.estado['consultas'], UMBRAL)
+
+        resultado = APIClient().consultar_ciudadano('40000009', 'M')
+
+        self.assertFalse(resultado['success'])
+        self.assertIn('momentáneamente', resultado['error'])
+        self.assertEqual(self.estado['consultas'], UMBRAL)
+
+    def test_semiabierto_permite_una_sola_prueba(self):
+        CircuitoRenaper._abrir()
+        self.assertFalse(CircuitoRenaper.permitir())
+
+        self._expirar_espera()
+
+        self.assertTrue(CircuitoRenaper.permitir())
+        self.assertFalse(CircuitoRenaper.permitir())
+
+    def test_prueba_fallida_reabre_el_circuito(self):
+        APIClient().get_token()
+        self.estado['caido'] = True
+        CircuitoRenaper._abrir()
+        self._expirar_espera()
+
+        self.assertFalse(APIClient().consultar_ciudadano('50000000', 'M')['success'])
+        self.assertEqual(self.estado['consultas'], 1)
+        self.assertGreater(cache.get(consulta_renaper.CACHE_CIRCUITO), time.time())
+
+        APIClient().consultar_ciudadano('50000001', 'M')
+        self.assertEqual(self.estado['consultas'], 1)
+
+    def test_prueba_exitosa_cierra_el_circuito(self):
+        CircuitoRenaper._abrir()
+        self._expirar_espera()
+
+        self.assertTrue(APIClient().consultar_ciudadano('60000000', 'M')['success'])
+        self.assertIsNone(cache.get(consulta_renaper.CACHE_CIRCUITO))
+        self.assertTrue(APIClient().consultar_ciudadano('60000001', 'M')['success'])
+        self.assertEqual(self.estado['consultas'], 2)
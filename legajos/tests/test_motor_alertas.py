@@ -0,0 +1,88 @@
+"""
+Motor incremental de alertas.
+
+Las alertas se escriben en bloque (sin post_save): el motor debe dejar las
+mismas filas de LogAccion que alerta_ciudadano_post_save. Los cambios en datos
+relacionados (evaluación, consentimiento...) reevalúan las reglas que dependen
+de ellos.
+"""
+
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from core.models_auditoria import LogAccion
+from core.tests.servidor_falso import CACHES_PRUEBA
+from legajos.models import AlertaCiudadano, Ciudadano, Consentimiento, EvaluacionInicial, LegajoAtencion
+from legajos.motor_alertas import MotorAlertas
+
+
+@override_settings(CACHES=CACHES_PRUEBA, AUDITORIA_MODO='sync')
+class AuditoriaMotorAlertasTests(TestCase):
+
+    def setUp(self):
+        self.ciudadano = Ciudadano.objects.create(dni='30111222', nombre='Ana', apellido='Gómez')
+        self.legajo = LegajoAtencion.objects.create(ciudadano=self.ciudadano)
+
+    def _logs(self, accion):
+        return LogAccion.objects.filter(modelo='AlertaCiudadano', accion=accion)
+
+    def test_alertas_creadas_se_auditan(self):
+        alertas = AlertaCiudadano.objects.filter(ciudadano=self.ciudadano)
+
+        self.assertTrue(alertas.filter(tipo='SIN_PLAN').exists())
+        self.assertCountEqual(
+            self._logs('CREATE').values_list('objeto_id', flat=True),
+            [str(pk) for pk in alertas.values_list('pk', flat=True)],
+        )
+        log = self._logs('CREATE').get(objeto_id=str(alertas.get(tipo='SIN_PLAN').pk))
+        self.assertEqual(log.objeto_repr, f'Alerta SIN_PLAN - {self.ciudadano}')
+        self.assertEqual(log.detalles['tipo'], 'SIN_PLAN')
+
+    def test_alertas_actualizadas_y_desactivadas_se_auditan(self):
+        sin_plan = AlertaCiudadano.objects.get(legajo=self.legajo, tipo='SIN_PLAN')
+        sin_red = AlertaCiudadano.objects.get(ciudadano=self.ciudadano, legajo=None, tipo='SIN_RED_FAMILIAR')
+        AlertaCiudadano.objects.filter(pk=sin_red.pk).update(mensaje='Mensaje anterior')
+        LegajoAtencion.objects.filter(pk=self.legajo.pk).update(plan_vigente=True)
+
+        MotorAlertas.actualizar_ciudadano(self.ciudadano.pk)
+
+        desactivada = self._logs('UPDATE').get(objeto_id=str(sin_plan.pk))
+        self.assertEqual(desactivada.detalles, {'activa': False})
+        actualizada = self._logs('UPDATE').get(objeto_id=str(sin_red.pk))
+        self.assertEqual(actualizada.detalles['mensaje'], sin_red.mensaje)
+
+
+@override_settings(CACHES=CACHES_PRUEBA, AUDITORIA_MODO='sync')
+class ReevaluacionPorDatosRelacionadosTests(TestCase):
+
+    def setUp(self):
+        self.ciudadano = Ciudadano.objects.create(dni='30111223', nombre='Luis', apellido='Pérez')
+        responsable = User.objects.create_user('responsable')
+        self.legajo = LegajoAtencion.objects.create(ciudadano=self.ciudadano, responsable=responsable)
+
+    def _activa(self, tipo):
+        return AlertaCiudadano.objects.filter(ciudadano=self.ciudadano, tipo=tipo, activa=True).exists()
+
+    def test_evaluacion_inicial_reevalua_sus_reglas(self):
+        self.assertFalse(self._activa('RIESGO_SUICIDA'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EvaluacionInicial.objects.create(legajo=self.legajo, riesgo_suicida=True)
+
+        self.assertTrue(self._activa('RIESGO_SUICIDA'))
+
+    def test_consentimiento_resuelve_y_su_revocacion_reabre_la_alerta(self):
+        self.assertTrue(self._activa('SIN_CONSENTIMIENTO'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            consentimiento = Consentimiento.objects.create(
+                ciudadano=self.ciudadano, texto='Acepto', firmado_por='Luis Pérez', fecha_firma=date.today()
+            )
+        self.assertFalse(self._activa('SIN_CONSENTIMIENTO'))
+
+        consentimiento.vigente = False
+        with self.captureOnCommitCallbacks(execute=True):
+            consentimiento.save()
+        self.assertTrue(self._activa('SIN_CONSENTIMIENTO'))
@@ -157,6 +157,7 @@ urlpatterns = [
     
     # API Predicción de Riesgo
     path('ciudadanos/<int:ciudadano_id>/prediccion-riesgo/', views_contactos_simple.prediccion_riesgo_api, name='prediccion_riesgo'),
+    path('riesgo/ranking/', views_contactos_simple.ranking_riesgo_api, name='ranking_riesgo'),
     
     # API Evolución de Legajo
     path('<uuid:legajo_id>/evolucion/', views_contactos_simple.evolucion_legajo_api, name='evolucion_legajo'),
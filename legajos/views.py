@@ -10,13 +10,13 @@ from django.core.exceptions import ValidationError
 from django.core.cache import cache
 from django.utils.decorators import method_decorator
 from core.cache_decorators import cache_view, cache_queryset, invalidate_cache_pattern
-import csv
 import json
 from datetime import datetime
 from .models import Ciudadano, LegajoAtencion, EvaluacionInicial, PlanIntervencion, SeguimientoContacto, Profesional, Derivacion, EventoCritico, AlertaEventoCritico, LegajoInstitucional, InscriptoActividad, PlanFortalecimiento
 from core.models import DispositivoRed
 from .forms import ConsultaRenaperForm, CiudadanoForm, BuscarCiudadanoForm, AdmisionLegajoForm, ConsentimientoForm, EvaluacionInicialForm, PlanIntervencionForm, SeguimientoForm, DerivacionForm, EventoCriticoForm, LegajoCerrarForm, InscribirActividadForm
 from .services.consulta_renaper import consultar_datos_renaper
+from .services_busqueda import CiudadanoSearch
 
 # Importar views de contactos
 from .views_dashboard_contactos import dashboard_contactos, metricas_contactos_api, metricas_red_contactos_api, exportar_reporte_contactos
@@ -33,42 +33,33 @@ class CiudadanoListView(LoginRequiredMixin, ListView):
     
     def get_queryset(self):
         search = self.request.GET.get('search', '')
-        queryset = Ciudadano.objects.filter(activo=True)
         
         if search:
-            queryset = queryset.filter(
-                Q(dni__icontains=search) |
-                Q(nombre__icontains=search) |
-                Q(apellido__icontains=search)
-            )
+            # Ordenado por relevancia (DNI exacto > prefijo de DNI > apellido > nombre > difusa)
+            return CiudadanoSearch.queryset(search)
         
-        return queryset.order_by('apellido', 'nombre')
+        return Ciudadano.objects.filter(activo=True).order_by('apellido', 'nombre')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Métricas del dashboard
+        # Métricas del dashboard (tablas pre-agregadas)
+        from .services_metricas import MetricasLegajosService
         total_ciudadanos = Ciudadano.objects.filter(activo=True).count()
-        legajos_activos = LegajoAtencion.objects.filter(estado__in=['ABIERTO', 'EN_SEGUIMIENTO']).count()
-        alertas_criticas = EventoCritico.objects.count()
-        
-        from datetime import date
-        seguimientos_hoy = SeguimientoContacto.objects.filter(creado__date=date.today()).count()
+        resumen = MetricasLegajosService.resumen()
+        seguimientos = MetricasLegajosService.totales_seguimientos()
         
         # Tasa de adherencia
-        total_seguimientos = SeguimientoContacto.objects.count()
-        seguimientos_adecuados = SeguimientoContacto.objects.filter(adherencia='ADECUADA').count()
-        tasa_adherencia = round((seguimientos_adecuados / total_seguimientos * 100) if total_seguimientos > 0 else 0)
-        
-        casos_alto_riesgo = LegajoAtencion.objects.filter(nivel_riesgo='ALTO').count()
+        total_seguimientos = seguimientos['seguimientos']
+        tasa_adherencia = round((seguimientos['adherencia_adecuada'] / total_seguimientos * 100) if total_seguimientos > 0 else 0)
         
         context['metricas'] = {
             'total_ciudadanos': total_ciudadanos,
-            'legajos_activos': legajos_activos,
-            'alertas_criticas': alertas_criticas,
-            'seguimientos_hoy': seguimientos_hoy,
+            'legajos_activos': resumen['legajos_activos'],
+            'alertas_criticas': resumen['eventos_criticos'],
+            'seguimientos_hoy': MetricasLegajosService.seguimientos_del_dia(),
             'tasa_adherencia': tasa_adherencia,
-            'casos_alto_riesgo': casos_alto_riesgo,
+            'casos_alto_riesgo': resumen['riesgo_alto'],
         }
         
         return context
@@ -266,6 +257,11 @@ class LegajoDetailView(LoginRequiredMixin, DetailView):
     template_name = 'legajos/legajo_detail.html'
     context_object_name = 'legajo'
 
+    def get_queryset(self):
+        from .services_agregaciones import AgregacionesLegajoService
+        # primer_seguimiento anotado: tiempo_primer_contacto no consulta seguimientos
+        return AgregacionesLegajoService.anotar_indicadores(super().get_queryset(), 'primer_seguimiento')
+
 
 class LegajoCreateView(LoginRequiredMixin, CreateView):
     """Vista para crear legajo directamente"""
@@ -702,100 +698,32 @@ class ReportesView(LoginRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        from django.db.models import Count
-        from datetime import datetime, timedelta
+        from .services_metricas import MetricasLegajosService
+        
+        # Todas las cifras salen de las tablas de métricas pre-agregadas:
+        # el costo no depende de la cantidad de legajos
+        resumen = MetricasLegajosService.resumen()
         
         # Estadísticas generales
         stats = {
-            'total_legajos': LegajoAtencion.objects.count(),
-            'legajos_activos': LegajoAtencion.objects.filter(estado__in=['ABIERTO', 'EN_SEGUIMIENTO']).count(),
-            'riesgo_alto': LegajoAtencion.objects.filter(nivel_riesgo='ALTO').count(),
-            'nuevos_semana': LegajoAtencion.objects.filter(
-                fecha_apertura__gte=datetime.now().date() - timedelta(days=7)
-            ).count(),
+            'total_legajos': resumen['total_legajos'],
+            'legajos_activos': resumen['legajos_activos'],
+            'riesgo_alto': resumen['riesgo_alto'],
+            'nuevos_semana': resumen['nuevos_semana'],
         }
         
-        # Estadísticas por estado
-        stats['por_estado'] = LegajoAtencion.objects.values('estado').annotate(
-            total=Count('id')
-        ).order_by('-total')
-        
-        # Estadísticas por nivel de riesgo
-        stats['por_riesgo'] = LegajoAtencion.objects.values('nivel_riesgo').annotate(
-            total=Count('id')
-        ).order_by('-total')
-        
-        # Estadísticas por dispositivo
-        stats['por_dispositivo'] = LegajoAtencion.objects.select_related('dispositivo').values(
-            'dispositivo__nombre', 'dispositivo__tipo'
-        ).annotate(total=Count('id')).order_by('-total')[:10]
+        stats['por_estado'] = MetricasLegajosService.por_estado()
+        stats['por_riesgo'] = MetricasLegajosService.por_riesgo()
+        stats['por_dispositivo'] = MetricasLegajosService.por_dispositivo(limite=10)
         
         # Actividad por mes (últimos 6 meses)
-        from django.db.models import DateTimeField
-        from django.db.models.functions import TruncMonth
-        
-        fecha_limite = datetime.now().date() - timedelta(days=180)
-        stats['por_mes'] = LegajoAtencion.objects.filter(
-            fecha_apertura__gte=fecha_limite
-        ).annotate(
-            mes=TruncMonth('fecha_apertura')
-        ).values('mes').annotate(total=Count('id')).order_by('-mes')[:6]
+        stats['por_mes'] = MetricasLegajosService.por_mes(dias=180, limite=6)
         
         # Métricas de calidad
-        legajos_con_seguimiento = LegajoAtencion.objects.filter(
-            seguimientos__isnull=False
-        ).distinct().count()
-        
-        stats['metricas_calidad'] = {
-            'ttr_promedio': self._calcular_ttr_promedio(),
-            'adherencia_adecuada': self._calcular_adherencia(),
-            'tasa_derivacion': self._calcular_tasa_derivacion(),
-            'eventos_por_100': self._calcular_eventos_por_100(),
-            'cobertura_seguimiento': round((legajos_con_seguimiento / max(stats['total_legajos'], 1)) * 100, 1)
-        }
+        stats['metricas_calidad'] = MetricasLegajosService.metricas_calidad(resumen)
         
         context['stats'] = stats
         return context
-    
-    def _calcular_ttr_promedio(self):
-        """Tiempo promedio admisión → primer seguimiento"""
-        legajos_con_seguimiento = LegajoAtencion.objects.filter(
-            seguimientos__isnull=False
-        ).distinct()
-        
-        tiempos = []
-        for legajo in legajos_con_seguimiento:
-            tiempo = legajo.tiempo_primer_contacto
-            if tiempo is not None:
-                tiempos.append(tiempo)
-        
-        return round(sum(tiempos) / len(tiempos), 1) if tiempos else 0
-    
-    def _calcular_adherencia(self):
-        """Porcentaje de seguimientos con adherencia adecuada"""
-        total_seguimientos = SeguimientoContacto.objects.count()
-        adherencia_adecuada = SeguimientoContacto.objects.filter(
-            adherencia='ADECUADA'
-        ).count()
-        
-        return round((adherencia_adecuada / max(total_seguimientos, 1)) * 100, 1)
-    
-    def _calcular_tasa_derivacion(self):
-        """Porcentaje de derivaciones aceptadas"""
-        total_derivaciones = Derivacion.objects.count()
-        derivaciones_aceptadas = Derivacion.objects.filter(
-            estado='ACEPTADA'
-        ).count()
-        
-        return round((derivaciones_aceptadas / max(total_derivaciones, 1)) * 100, 1)
-    
-    def _calcular_eventos_por_100(self):
-        """Eventos críticos por cada 100 legajos"""
-        from legajos.models import EventoCritico
-        total_legajos = LegajoAtencion.objects.count()
-        total_eventos = EventoCritico.objects.count()
-        
-        return round((total_eventos / max(total_legajos, 1)) * 100, 1)
 
 
 class DispositivoDerivacionesView(LoginRequiredMixin, ListView):
@@ -828,21 +756,14 @@ class DispositivoDerivacionesView(LoginRequiredMixin, ListView):
 
 
 class ExportarCSVView(LoginRequiredMixin, View):
-    """Vista para exportar legajos a CSV"""
+    """Vista para exportar legajos a CSV (streaming, ?gzip=1 para comprimir)"""
     
     def get(self, request, *args, **kwargs):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="legajos_export.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Codigo', 'Ciudadano_DNI', 'Ciudadano_Nombre', 'Ciudadano_Apellido',
-            'Dispositivo', 'Estado', 'Nivel_Riesgo', 'Via_Ingreso', 
-            'Fecha_Apertura', 'Fecha_Cierre', 'Dias_Admision', 'Plan_Vigente'
-        ])
+        from datetime import date
+        from core.exportacion import Columna, ExportacionCSV, fmt_choices, fmt_fecha, fmt_si_no
         
         # Aplicar filtros de la request
-        queryset = LegajoAtencion.objects.select_related('ciudadano', 'dispositivo')
+        queryset = LegajoAtencion.objects.all()
         
         estado = request.GET.get('estado')
         if estado:
@@ -852,23 +773,23 @@ class ExportarCSVView(LoginRequiredMixin, View):
         if riesgo:
             queryset = queryset.filter(nivel_riesgo=riesgo)
         
-        for legajo in queryset:
-            writer.writerow([
-                legajo.codigo,
-                legajo.ciudadano.dni,
-                legajo.ciudadano.nombre,
-                legajo.ciudadano.apellido,
-                legajo.dispositivo.nombre,
-                legajo.get_estado_display(),
-                legajo.get_nivel_riesgo_display(),
-                legajo.get_via_ingreso_display(),
-                legajo.fecha_apertura.strftime('%d/%m/%Y'),
-                legajo.fecha_cierre.strftime('%d/%m/%Y') if legajo.fecha_cierre else '',
-                legajo.dias_desde_admision,
-                'Sí' if legajo.plan_vigente else 'No'
-            ])
-        
-        return response
+        hoy = date.today()
+        exportacion = ExportacionCSV(queryset, [
+            Columna('Codigo', 'codigo'),
+            Columna('Ciudadano_DNI', 'ciudadano__dni'),
+            Columna('Ciudadano_Nombre', 'ciudadano__nombre'),
+            Columna('Ciudadano_Apellido', 'ciudadano__apellido'),
+            Columna('Dispositivo', 'dispositivo__nombre'),
+            Columna('Estado', 'estado', fmt_choices(LegajoAtencion.Estado.choices)),
+            Columna('Nivel_Riesgo', 'nivel_riesgo', fmt_choices(LegajoAtencion.NivelRiesgo.choices)),
+            Columna('Via_Ingreso', 'via_ingreso', fmt_choices(LegajoAtencion.ViaIngreso.choices)),
+            Columna('Fecha_Apertura', 'fecha_apertura', fmt_fecha()),
+            Columna('Fecha_Cierre', 'fecha_cierre', fmt_fecha()),
+            Columna('Dias_Admision', 'fecha_admision', lambda fecha: (hoy - fecha).days),
+            Columna('Plan_Vigente', 'plan_vigente', fmt_si_no),
+        ], nombre_archivo='legajos_export.csv')
+        
+        return exportacion.streaming_response(comprimir=request.GET.get('gzip') == '1')
 
 
 class CerrarAlertaEventoView(LoginRequiredMixin, View):
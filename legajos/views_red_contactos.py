@@ -10,6 +10,7 @@ from .models_contactos import (
     ContactoEmergencia
 )
 from core.models import DispositivoRed
+from .services_busqueda import CiudadanoSearch
 
 
 @login_required
@@ -152,11 +153,7 @@ def buscar_ciudadanos_api(request):
     if len(query) < 2:
         return JsonResponse({'ciudadanos': []})
     
-    ciudadanos = Ciudadano.objects.filter(
-        Q(nombre__icontains=query) | 
-        Q(apellido__icontains=query) |
-        Q(dni__icontains=query)
-    )[:10]
+    ciudadanos = CiudadanoSearch.buscar(query, limite=10, solo_activos=False)
     
     data = []
     for ciudadano in ciudadanos:
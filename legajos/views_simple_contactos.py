@@ -1,6 +1,8 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
+from django.contrib.auth.decorators import login_required
 from django.db.models import Q
+from core.etag_versionado import etag_versionado
 from .models import LegajoAtencion, Ciudadano
 from datetime import datetime
 try:
@@ -371,8 +373,15 @@ def eliminar_archivo(request, archivo_id):
     
     return JsonResponse({'success': False, 'error': 'Método no permitido'})
 
+@etag_versionado(
+    'legajos.AlertaCiudadano', 'legajos.Ciudadano', 'legajos.LegajoAtencion',
+    'legajos.EvaluacionInicial', 'legajos.SeguimientoContacto', 'legajos.EventoCritico',
+    'legajos.Derivacion', 'legajos.Consentimiento', 'legajos.HistorialContacto',
+    'legajos.VinculoFamiliar', 'legajos.PlanIntervencion',
+    vigencia=300,
+)
 def alertas_ciudadano_api(request, ciudadano_id):
-    """API para obtener alertas de un ciudadano"""
+    """API para obtener alertas de un ciudadano (304 mientras no cambien sus datos de origen)"""
     try:
         from .services_alertas import AlertasService
         
@@ -431,7 +440,7 @@ def prediccion_riesgo_api(request, ciudadano_id):
         from .ml_predictor import RiskPredictor
         
         ciudadano = get_object_or_404(Ciudadano, id=ciudadano_id)
-        prediccion = RiskPredictor.obtener_prediccion_completa(ciudadano)
+        prediccion = RiskPredictor.obtener_prediccion_precalculada(ciudadano)
         
         return JsonResponse(prediccion)
         
@@ -445,32 +454,50 @@ def prediccion_riesgo_api(request, ciudadano_id):
             'recomendaciones': []
         })
 
+@login_required
+def ranking_riesgo_api(request):
+    """API con los legajos activos de mayor riesgo (predicciones precalculadas)"""
+    from .services_riesgo import ScoringRiesgoService
+    
+    try:
+        limite = min(max(int(request.GET.get('limite', 20)), 1), 100)
+    except ValueError:
+        limite = 20
+    tipo = 'evento' if request.GET.get('tipo') == 'evento' else 'abandono'
+    
+    ranking = []
+    for prediccion in ScoringRiesgoService.ranking(limite, tipo):
+        ranking.append({
+            'legajo_id': str(prediccion.legajo_id),
+            'codigo': prediccion.legajo.codigo,
+            'ciudadano_id': prediccion.ciudadano_id,
+            'ciudadano': prediccion.ciudadano.nombre_completo,
+            'dni': prediccion.ciudadano.dni,
+            'score_abandono': prediccion.score_abandono,
+            'nivel_abandono': prediccion.nivel_abandono,
+            'score_evento': prediccion.score_evento,
+            'nivel_evento': prediccion.nivel_evento,
+            'calculado': prediccion.calculado.isoformat(),
+        })
+    
+    return JsonResponse({'tipo': tipo, 'ranking': ranking})
+
 def evolucion_legajo_api(request, legajo_id):
     """API para obtener datos de evolución de un legajo"""
     try:
         from .models import SeguimientoContacto, PlanIntervencion, Objetivo, EvaluacionInicial, Derivacion, EventoCritico
+        from .services_agregaciones import AgregacionesLegajoService
         
         legajo = get_object_or_404(LegajoAtencion, id=legajo_id)
         
-        # Total de seguimientos
-        total_seguimientos = SeguimientoContacto.objects.filter(legajo=legajo).count()
-        
-        # Adherencia promedio
-        seguimientos_con_adherencia = SeguimientoContacto.objects.filter(
-            legajo=legajo,
-            adherencia__isnull=False
+        # Total de seguimientos y adherencia promedio (una query agregada)
+        indicadores = AgregacionesLegajoService.indicadores_de_legajo(legajo)
+        total_seguimientos = indicadores['total_seguimientos']
+        adherencia_promedio = (
+            round(indicadores['adherencia_promedio'])
+            if indicadores['adherencia_promedio'] is not None else None
         )
         
-        adherencia_promedio = None
-        if seguimientos_con_adherencia.exists():
-            adherencia_map = {'ADECUADA': 100, 'PARCIAL': 50, 'NULA': 0}
-            total = 0
-            count = 0
-            for seg in seguimientos_con_adherencia:
-                total += adherencia_map.get(seg.adherencia, 0)
-                count += 1
-            adherencia_promedio = round(total / count) if count > 0 else None
-        
         # Objetivos (etapas del plan vigente)
         plan_vigente = PlanIntervencion.objects.filter(legajo=legajo, vigente=True).first()
         objetivos_totales = 0
@@ -499,7 +526,6 @@ def evolucion_legajo_api(request, legajo_id):
             })
         
         # Plan vigente
-        plan_vigente = PlanIntervencion.objects.filter(legajo=legajo, vigente=True).first()
         if plan_vigente:
             hitos.append({
                 'tipo': 'PLAN',
@@ -9,6 +9,7 @@
     class AlertasConversacionesFallback {
         constructor() {
             this.polling = null;
+            this.latido = null;
             this.ultimoConteo = 0;
             this.popup = null;
             this.mensajesNuevos = 0;
@@ -52,6 +53,28 @@
             // baseline para no disparar popup con conteo ya existente
             this.verificar(true);
             this.polling = setInterval(() => this.verificar(false), 10000);
+            // Sin WS, el latido de presencia para la asignación automática va por HTTP
+            this.enviarLatido();
+            this.latido = setInterval(() => this.enviarLatido(), 30000);
+        }
+
+        detenerPolling() {
+            if (this.polling) {
+                clearInterval(this.polling);
+                this.polling = null;
+            }
+            if (this.latido) {
+                clearInterval(this.latido);
+                this.latido = null;
+            }
+        }
+
+        enviarLatido() {
+            const match = document.cookie.match(/(?:^|;)\s*csrftoken=([^;]+)/);
+            fetch('/conversaciones/api/presencia/latido/', {
+                method: 'POST',
+                headers: match ? {'X-CSRFToken': decodeURIComponent(match[1])} : {},
+            }).catch(() => {});
         }
 
         async verificar(onlyBaseline) {
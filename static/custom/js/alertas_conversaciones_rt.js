@@ -8,6 +8,7 @@
 class AlertasConversacionesRT {
     constructor() {
         this.socket = null;
+        this.latido = null;
         this.mensajesNuevos = 0;
         this.popupActivo = null;
         this.init();
@@ -33,6 +34,13 @@ class AlertasConversacionesRT {
 
             this.socket.onopen = () => {
                 console.log('[Conversaciones] WS conectado');
+                // Latido de presencia: mantiene al operador elegible para la asignación automática
+                clearInterval(this.latido);
+                this.latido = setInterval(() => {
+                    if (this.socket && this.socket.readyState === 1) {
+                        this.socket.send(JSON.stringify({type: 'latido'}));
+                    }
+                }, 30000);
             };
 
             this.socket.onmessage = (event) => {
@@ -43,6 +51,7 @@ class AlertasConversacionesRT {
             };
 
             this.socket.onclose = () => {
+                clearInterval(this.latido);
                 console.log('[Conversaciones] WS cerrado, reintentando en 3s...');
                 setTimeout(() => this.conectarWebSocket(), 3000);
             };